@@ -21,10 +21,13 @@
 
 import gc
 import logging
+from collections import defaultdict
 from datetime import datetime, timedelta
+from functools import partial
 
 from django.db import transaction, reset_queries
 
+from nav.alertengine.filters import ALERT_RELATIONS, FilterCompiler
 from nav.compatibility import lru_cache
 from nav.models.profiles import (
     Account,
@@ -33,7 +36,9 @@ from nav.models.profiles import (
     AlertSubscription,
     AlertAddress,
     FilterGroup,
+    FilterGroupContent,
     AlertPreference,
+    AlertProfile,
     TimePeriod,
 )
 from nav.models.event import AlertQueue
@@ -51,8 +56,12 @@ DISPATCH_IGNORED = object()
 WEEKEND_DAYS = (6, 7)
 
 
-def check_alerts(debug=False):
-    """Handles all new and user queued alerts"""
+def check_alerts(debug=False, batch=False):
+    """Handles all new and user queued alerts
+
+    :param batch: If True, new alerts are matched against all subscriptions
+                  in a single batch, using handle_new_alerts_in_batch().
+    """
 
     # We use transaction autocommit so that the changes we make only propogate
     # if the entire loop finishes.
@@ -71,7 +80,9 @@ def check_alerts(debug=False):
     now = datetime.now()
 
     # Get all alerts that aren't in alert queue due to subscription
-    new_alerts = AlertQueue.objects.filter(queued_alerts__isnull=True)
+    new_alerts = AlertQueue.objects.filter(queued_alerts__isnull=True).select_related(
+        *ALERT_RELATIONS
+    )
     num_new_alerts = len(new_alerts)
 
     initial_alerts = AlertQueue.objects.values_list('id', flat=True)
@@ -79,7 +90,10 @@ def check_alerts(debug=False):
     _logger.debug('Starting alertengine run, checking %d new alerts', num_new_alerts)
 
     if num_new_alerts:
-        handle_new_alerts(new_alerts)
+        if batch:
+            handle_new_alerts_in_batch(new_alerts)
+        else:
+            handle_new_alerts(new_alerts)
 
     # Get all queued alerts.
     queued_alerts = AccountAlertQueue.objects.all()
@@ -160,26 +174,29 @@ def check_alerts(debug=False):
     gc.collect()
 
 
+def subscription_sort_key(subscription):
+    """Return a key to sort alertsubscriptions in a prioritized order."""
+    sort_order = [
+        AlertSubscription.NOW,
+        AlertSubscription.NEXT,
+        AlertSubscription.DAILY,
+        AlertSubscription.WEEKLY,
+    ]
+    try:
+        return sort_order.index(subscription.type)
+    except ValueError:
+        return subscription.type
+
+
 @transaction.atomic()
 def handle_new_alerts(new_alerts):
     """Handles new alerts on the queue"""
-    memoized_check_alert = lru_cache()(check_alert_against_filtergroupcontents)
+    memoized_check_alert = lru_cache()(
+        partial(check_alert_against_filtergroupcontents, compiler=FilterCompiler())
+    )
     _logger = logging.getLogger('nav.alertengine.handle_new_alerts')
     accounts = []
 
-    def subscription_sort_key(subscription):
-        """Return a key to sort alertsubscriptions in a prioritized order."""
-        sort_order = [
-            AlertSubscription.NOW,
-            AlertSubscription.NEXT,
-            AlertSubscription.DAILY,
-            AlertSubscription.WEEKLY,
-        ]
-        try:
-            return sort_order.index(subscription.type)
-        except ValueError:
-            return subscription.type
-
     # Build datastructure that contains accounts and corresponding
     # filter_group_contents so that we don't redo db queries to much
     for account in Account.objects.filter(
@@ -244,6 +261,171 @@ def handle_new_alerts(new_alerts):
     gc.collect()
 
 
+@transaction.atomic()
+def handle_new_alerts_in_batch(new_alerts, now=None):
+    """Handles new alerts on the queue in a single batch.
+
+    This produces the same result as handle_new_alerts(), but instead of
+    checking every alert against every subscription of every account one by
+    one, all active subscriptions, permissions and filters are loaded up
+    front in a fixed number of queries. Every filter group in use is then
+    evaluated exactly once per alert, and the resulting AccountAlertQueue
+    entries are created in bulk.
+
+    :param now: Set only when testing, to force what value should be considered
+                the current time.
+    """
+    _logger = logging.getLogger('nav.alertengine.handle_new_alerts_in_batch')
+    if not now:
+        now = datetime.now()
+
+    subscribers = _load_active_subscribers(now)
+    if not subscribers:
+        _logger.debug("no active subscriptions")
+        return
+
+    group_ids = set()
+    for _account, subscriptions, permissions in subscribers:
+        group_ids.update(sub.filter_group_id for sub in subscriptions)
+        group_ids.update(permissions)
+    contents = _load_filter_group_contents(group_ids)
+
+    # Evaluate every alert against every filter group in use
+    compiler = FilterCompiler()
+    matrix = {
+        alert.id: {
+            group_id: check_alert_against_filtergroupcontents(
+                alert, contents.get(group_id), 'batch check', compiler=compiler
+            )
+            for group_id in group_ids
+        }
+        for alert in new_alerts
+    }
+
+    # Remember which alerts are sent where to avoid duplicates
+    dupemap = set()
+    queue = []
+    for account, subscriptions, permissions in subscribers:
+        _logger.debug("Checking new alerts for account '%s'", account)
+        for alert in new_alerts:
+            matches = matrix[alert.id]
+            permitted = any(matches[group_id] for group_id in permissions)
+            for subscription in subscriptions:
+                if not matches[subscription.filter_group_id]:
+                    _logger.debug(
+                        'alert %d: did not match the alertsubscription %d of user '
+                        '%s',
+                        alert.id,
+                        subscription.id,
+                        account,
+                    )
+                elif not permitted:
+                    _logger.warning(
+                        'alert %d not queued to %s due to lacking permissions',
+                        alert.id,
+                        account,
+                    )
+                elif (alert.id, subscription.alert_address_id) in dupemap:
+                    _logger.debug(
+                        'alert %d was already queued for %s (address %s)',
+                        alert.id,
+                        account,
+                        subscription.alert_address_id,
+                    )
+                else:
+                    queue.append(
+                        AccountAlertQueue(
+                            account=account, alert=alert, subscription=subscription
+                        )
+                    )
+                    dupemap.add((alert.id, subscription.alert_address_id))
+                    _logger.info(
+                        'alert %d queued for %s due to subscription %d',
+                        alert.id,
+                        account,
+                        subscription.id,
+                    )
+
+    if queue:
+        AccountAlertQueue.objects.bulk_create(queue)
+    _logger.debug(
+        "matched %d alerts against %d filter groups for %d accounts, queued %d",
+        len(matrix),
+        len(group_ids),
+        len(subscribers),
+        len(queue),
+    )
+
+
+def _load_active_subscribers(now):
+    """Loads the currently active alert subscriptions and the filter group
+    permissions of all accounts that have an active alert profile.
+
+    :returns: A list of (account, subscriptions, permitted_filter_group_ids)
+              tuples, where subscriptions are sorted in prioritized order.
+    """
+    preferences = (
+        AlertPreference.objects.filter(active_profile__isnull=False)
+        .select_related('account')
+        .order_by('account__login')
+    )
+    accounts = {pref.active_profile_id: pref.account for pref in preferences}
+    if not accounts:
+        return []
+
+    timeperiods = defaultdict(list)
+    for period in TimePeriod.objects.filter(
+        profile__in=accounts.keys(),
+        valid_during__in=TimePeriod.get_valid_during_for(now),
+    ).order_by('start'):
+        timeperiods[period.profile_id].append(period)
+
+    active_periods = {}
+    for profile_id, periods in timeperiods.items():
+        period = AlertProfile.find_active_timeperiod(periods, now)
+        if period:
+            active_periods[period.id] = accounts[profile_id]
+
+    subscriptions = defaultdict(list)
+    for subscription in AlertSubscription.objects.filter(
+        time_period__in=active_periods.keys()
+    ):
+        account = active_periods[subscription.time_period_id]
+        subscriptions[account.id].append(subscription)
+
+    permissions = defaultdict(set)
+    for group_id, account_id in FilterGroup.objects.filter(
+        group_permissions__accounts__in=subscriptions.keys()
+    ).values_list('id', 'group_permissions__accounts'):
+        permissions[account_id].add(group_id)
+
+    return [
+        (
+            account,
+            sorted(subscriptions[account.id], key=subscription_sort_key),
+            permissions[account.id],
+        )
+        for account in accounts.values()
+        if subscriptions[account.id]
+    ]
+
+
+def _load_filter_group_contents(group_ids):
+    """Loads the contents of a set of filter groups, with their filters.
+
+    :returns: A dict mapping filter group ids to lists of FilterGroupContent
+              objects, ordered by priority.
+    """
+    contents = defaultdict(list)
+    for content in (
+        FilterGroupContent.objects.filter(filter_group__in=group_ids)
+        .select_related('filter')
+        .order_by('priority')
+    ):
+        contents[content.filter_group_id].append(content)
+    return contents
+
+
 def _check_match_and_permission(
     account,
     alert,
@@ -599,8 +781,15 @@ def alert_should_be_ignored(queued_alert, subscription, now):
     )
 
 
-def check_alert_against_filtergroupcontents(alert, filtergroupcontents, atype):
-    """Checks a given alert against an array of filtergroupcontents"""
+def check_alert_against_filtergroupcontents(
+    alert, filtergroupcontents, atype, compiler=None
+):
+    """Checks a given alert against an array of filtergroupcontents
+
+    :param compiler: An optional FilterCompiler, used to evaluate filters in
+                     memory rather than by querying the database for every
+                     single filter.
+    """
 
     _logger = logging.getLogger(
         'nav.alertengine.check_alert_against_filtergroupcontents'
@@ -610,6 +799,11 @@ def check_alert_against_filtergroupcontents(alert, filtergroupcontents, atype):
         _logger.debug("Emtpy filtergroup")
         return False
 
+    if compiler:
+        verify = compiler.verify
+    else:
+        verify = _verify_filter
+
     # Allways assume that the match will fail
     matches = False
 
@@ -618,7 +812,7 @@ def check_alert_against_filtergroupcontents(alert, filtergroupcontents, atype):
 
         # If we have not matched the message see if we can match it
         if not matches and content.include:
-            matches = content.filter.verify(alert) == content.positive
+            matches = verify(content.filter, alert) == content.positive
 
             if matches:
                 _logger.debug(
@@ -630,7 +824,7 @@ def check_alert_against_filtergroupcontents(alert, filtergroupcontents, atype):
 
         # If the alert has been matched try excluding it
         elif matches and not content.include:
-            matches = content.filter.verify(alert) != content.positive
+            matches = verify(content.filter, alert) != content.positive
 
             # Log that we excluded the alert
             if not matches:
@@ -652,6 +846,10 @@ def check_alert_against_filtergroupcontents(alert, filtergroupcontents, atype):
     return matches
 
 
+def _verify_filter(filtr, alert):
+    return filtr.verify(alert)
+
+
 def clear_blacklisted_status_of_alert_senders():
     blacklisted_alert_senders = AlertSender.objects.exclude(
         blacklisted_reason__isnull=True
@@ -0,0 +1,368 @@
+#
+# Copyright (C) 2024 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License version 3 as published by the Free
+# Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.  You should have received a copy of the GNU General Public
+# License along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""Compilation of alert profile filters into in-memory predicates.
+
+:py:meth:`nav.models.profiles.Filter.verify` builds and runs one SQL query
+for every alert it verifies. This module instead compiles a Filter's
+expressions into plain Python predicates once, which can then be evaluated
+against any number of alerts without touching the database, as long as the
+alerts' related objects have been prefetched (see :py:data:`ALERT_RELATIONS`).
+
+The predicates mimic the semantics of the query built by
+:py:meth:`Filter.verify`. Expressions that cannot be faithfully evaluated in
+memory (mostly those that match on multi-valued relations of a netbox, such as
+ARP, CAM or module data) cause the whole filter to fall back to
+:py:meth:`Filter.verify`.
+
+"""
+import itertools
+import logging
+import re
+
+from django.core.exceptions import ValidationError
+from django.db import models
+from IPy import IP
+
+from nav.models.manage import Location
+from nav.models.profiles import MatchField, Operator
+
+_logger = logging.getLogger(__name__)
+
+# Relations of an AlertQueue object that should be prefetched using
+# select_related() to evaluate compiled filters without further queries
+ALERT_RELATIONS = (
+    'netbox__room__location',
+    'netbox__organization',
+    'netbox__category',
+    'netbox__type__vendor',
+    'event_type',
+    'alert_type',
+)
+
+# Match field tables that are single-valued relations of an alert, and can be
+# evaluated from prefetched alert attributes
+IN_MEMORY_TABLES = frozenset(
+    (
+        MatchField.ALERT,
+        MatchField.ALERTTYPE,
+        MatchField.EVENT_TYPE,
+        MatchField.NETBOX,
+        MatchField.CATEGORY,
+        MatchField.LOCATION,
+        MatchField.ORGANIZATION,
+        MatchField.ROOM,
+        MatchField.TYPE,
+        MatchField.VENDOR,
+    )
+)
+
+TEXT_FIELDS = (models.CharField, models.TextField)
+NUMERIC_FIELDS = (models.IntegerField, models.AutoField, models.FloatField)
+ORDERED_FIELDS = NUMERIC_FIELDS + (models.DateField, models.TimeField)
+
+
+class NotCompilable(Exception):
+    """Raised when an expression cannot be evaluated in memory"""
+
+
+class FilterCompiler(object):
+    """Compiles and caches alert profile filters for the duration of a single
+    alertengine run.
+    """
+
+    def __init__(self):
+        self._compiled = {}
+
+    def get(self, filtr):
+        """Returns a CompiledFilter for filtr, compiling it if necessary"""
+        try:
+            return self._compiled[filtr.id]
+        except KeyError:
+            compiled = self._compiled[filtr.id] = compile_filter(filtr)
+            return compiled
+
+    def verify(self, filtr, alert):
+        """Verifies whether alert matches filtr"""
+        return self.get(filtr).verify(alert)
+
+
+def compile_filter(filtr):
+    """Compiles a Filter from the database.
+
+    :type filtr: nav.models.profiles.Filter
+    :rtype: CompiledFilter
+    """
+    expressions = filtr.expressions.select_related('match_field')
+    return CompiledFilter(filtr, expressions)
+
+
+class CompiledFilter(object):
+    """A Filter whose expressions have been compiled into in-memory
+    predicates.
+
+    Like the ORM query built by Filter.verify(), the compiled predicates are
+    keyed by their ORM lookup, so that a later expression on the same lookup
+    replaces an earlier one.
+    """
+
+    def __init__(self, filtr, expressions):
+        self.filter = filtr
+        self.fallback = False
+        self._filter = {}
+        self._exclude = {}
+        self._extra = []
+        try:
+            for expression in expressions:
+                self._compile_expression(expression)
+        except NotCompilable as error:
+            _logger.debug(
+                "filter %s cannot be evaluated in memory, using SQL: %s",
+                filtr.id,
+                error,
+            )
+            self.fallback = True
+
+    def __repr__(self):
+        return "<CompiledFilter %s fallback=%s>" % (self.filter.id, self.fallback)
+
+    def verify(self, alert):
+        """Verifies whether an alert matches this filter.
+
+        :type alert: nav.models.event.AlertQueue
+        """
+        if self.fallback:
+            return self.filter.verify(alert)
+
+        matches = (
+            all(predicate(alert) for predicate in self._filter.values())
+            and all(predicate(alert) for predicate in self._extra)
+            and not (
+                self._exclude
+                and all(predicate(alert) for predicate in self._exclude.values())
+            )
+        )
+        _logger.debug(
+            'alert %d: %s filter %d',
+            alert.id,
+            'matches' if matches else 'did not match',
+            self.filter.id,
+        )
+        return matches
+
+    def _compile_expression(self, expression):
+        match_field = expression.match_field
+        table = match_field.value_id.split('.')[0]
+        if table not in IN_MEMORY_TABLES:
+            raise NotCompilable("%s is not a single-valued relation" % table)
+
+        lookup = match_field.get_lookup_mapping()
+        if not lookup:
+            raise NotCompilable("no lookup mapping for %s" % match_field.value_id)
+        getter = _make_getter(lookup)
+        field = _get_model_field(match_field.value_id)
+        operator = expression.operator
+        value = expression.value
+
+        if match_field.data_type == MatchField.IP:
+            self._filter['%s__isnull' % lookup] = _is_not_null(getter)
+            self._extra.append(_compile_ip(getter, operator, value))
+
+        elif match_field.name == 'Location':
+            lookup = "{}__in".format(MatchField.FOREIGN_MAP[MatchField.LOCATION])
+            locations = Location.objects.filter(pk__in=value.split('|'))
+            descendants = set(
+                loc.pk
+                for loc in itertools.chain(
+                    *[loc.get_descendants(include_self=True) for loc in locations]
+                )
+            )
+            location_id = _make_getter('netbox__room__location_id')
+            self._filter[lookup] = lambda alert: location_id(alert) in descendants
+
+        elif operator == Operator.WILDCARD:
+            if not isinstance(field, TEXT_FIELDS):
+                raise NotCompilable("wildcard match on non-text field")
+            self._filter['%s__isnull' % lookup] = _is_not_null(getter)
+            self._extra.append(_make_like_matcher(getter, value, ignore_case=True))
+
+        else:
+            lookup = lookup + expression.get_operator_mapping()
+            if operator == Operator.NOT_EQUAL:
+                self._exclude[lookup] = _compile_lookup(
+                    getter, field, Operator.EQUALS, value
+                )
+            else:
+                self._filter[lookup] = _compile_lookup(getter, field, operator, value)
+
+
+def _compile_lookup(getter, field, operator, value):
+    """Compiles a plain ORM field lookup into a predicate"""
+    if operator == Operator.IN:
+        wanted = set(_to_python(field, v) for v in value.split('|'))
+        return _not_none(getter, lambda actual: actual in wanted)
+
+    if operator == Operator.EQUALS:
+        wanted = _to_python(field, value)
+        return _not_none(getter, lambda actual: actual == wanted)
+
+    if operator in (
+        Operator.GREATER,
+        Operator.GREATER_EQ,
+        Operator.LESS,
+        Operator.LESS_EQ,
+    ):
+        # string ordering depends on the database collation
+        if not isinstance(field, ORDERED_FIELDS):
+            raise NotCompilable("ordering comparison on %s" % type(field).__name__)
+        wanted = _to_python(field, value)
+        compare = {
+            Operator.GREATER: lambda actual: actual > wanted,
+            Operator.GREATER_EQ: lambda actual: actual >= wanted,
+            Operator.LESS: lambda actual: actual < wanted,
+            Operator.LESS_EQ: lambda actual: actual <= wanted,
+        }[operator]
+        return _not_none(getter, compare)
+
+    # The remaining operators compare text representations, which only
+    # correspond to the database's for text and numeric fields
+    if not isinstance(field, TEXT_FIELDS + NUMERIC_FIELDS):
+        raise NotCompilable("text comparison on %s" % type(field).__name__)
+
+    wanted = value.upper()
+    if operator == Operator.STARTSWITH:
+        return _not_none(getter, lambda actual: str(actual).upper().startswith(wanted))
+    if operator == Operator.ENDSWITH:
+        return _not_none(getter, lambda actual: str(actual).upper().endswith(wanted))
+    if operator == Operator.CONTAINS:
+        return _not_none(getter, lambda actual: wanted in str(actual).upper())
+    if operator == Operator.REGEXP:
+        try:
+            regexp = re.compile(value, re.IGNORECASE)
+        except re.error:
+            raise NotCompilable("invalid regexp %r" % value)
+        return _not_none(getter, lambda actual: bool(regexp.search(str(actual))))
+
+    raise NotCompilable("unsupported operator %s" % operator)
+
+
+def _compile_ip(getter, operator, value):
+    """Compiles an IP operator (as used in Operator.IP_OPERATOR_MAPPING) into a
+    predicate.
+    """
+    if operator in (Operator.WILDCARD, Operator.REGEXP):
+        if operator == Operator.WILDCARD:
+            return _make_like_matcher(getter, value, ignore_case=False)
+        try:
+            regexp = re.compile(value, re.IGNORECASE)
+        except re.error:
+            raise NotCompilable("invalid regexp %r" % value)
+        return _not_none(getter, lambda actual: bool(regexp.search(str(actual))))
+
+    if operator in (Operator.IN, Operator.CONTAINS):
+        networks = [_to_ip(v) for v in value.split('|')]
+        if operator == Operator.IN:  # <<=
+            return _not_none(
+                getter, lambda actual: any(IP(actual) in net for net in networks)
+            )
+        else:  # >>=
+            return _not_none(
+                getter, lambda actual: any(net in IP(actual) for net in networks)
+            )
+
+    if operator in (Operator.EQUALS, Operator.NOT_EQUAL):
+        wanted = _to_ip(value)
+        if operator == Operator.EQUALS:
+            return _not_none(getter, lambda actual: IP(actual) == wanted)
+        return _not_none(getter, lambda actual: IP(actual) != wanted)
+
+    raise NotCompilable("unsupported IP operator %s" % operator)
+
+
+def _make_like_matcher(getter, pattern, ignore_case):
+    """Makes a predicate that matches a value against an SQL LIKE pattern"""
+    regexp = []
+    chars = iter(pattern)
+    for char in chars:
+        if char == '\\':
+            regexp.append(re.escape(next(chars, '\\')))
+        elif char == '%':
+            regexp.append('.*')
+        elif char == '_':
+            regexp.append('.')
+        else:
+            regexp.append(re.escape(char))
+    compiled = re.compile(
+        ''.join(regexp), re.DOTALL | (re.IGNORECASE if ignore_case else 0)
+    )
+    return _not_none(getter, lambda actual: bool(compiled.fullmatch(str(actual))))
+
+
+def _make_getter(lookup):
+    """Makes a function that follows an ORM lookup path from an alert object,
+    returning None if any part of the path is None.
+    """
+    path = lookup.split('__')
+
+    def _getter(alert):
+        value = alert
+        for attr in path:
+            value = getattr(value, attr, None)
+            if value is None:
+                return None
+        return value
+
+    return _getter
+
+
+def _not_none(getter, predicate):
+    """Wraps predicate to receive the value of getter, and to be false for NULL
+    values, as they would be in SQL.
+    """
+
+    def _predicate(alert):
+        actual = getter(alert)
+        return actual is not None and predicate(actual)
+
+    return _predicate
+
+
+def _is_not_null(getter):
+    return lambda alert: getter(alert) is not None
+
+
+def _get_model_field(value_id):
+    try:
+        model, attname = MatchField.MODEL_MAP[value_id]
+    except KeyError:
+        raise NotCompilable("unknown match field %s" % value_id)
+    field = model._meta.get_field(attname)
+    if field.is_relation:
+        field = field.target_field
+    return field
+
+
+def _to_python(field, value):
+    try:
+        return field.to_python(value)
+    except ValidationError:
+        raise NotCompilable("%r is not a valid %s" % (value, type(field).__name__))
+
+
+def _to_ip(value):
+    try:
+        return IP(value)
+    except ValueError:
+        raise NotCompilable("%r is not a valid IP address" % value)
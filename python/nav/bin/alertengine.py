@@ -79,6 +79,7 @@ def main():
         'mailserver': 'localhost',
         'mailaddr': nav.config.NAV_CONFIG['ADMIN_MAIL'],
         'fromaddr': nav.config.NAV_CONFIG['DEFAULT_FROM_EMAIL'],
+        'batch': 'no',
     }
 
     # Read config file
@@ -95,6 +96,7 @@ def main():
     mailserver = config['main']['mailserver']
     mailaddr = config['main']['mailaddr']
     fromaddr = config['main']['fromaddr']
+    batch = config['main']['batch'].lower() in ('yes', 'true', 'on', '1')
 
     # Switch user to $NAV_USER (navcron) (only works if we're root)
     if os.geteuid() == 0 and not args.test:
@@ -146,7 +148,7 @@ def main():
     _logger.info('Starting alertengine loop.')
     while True:
         try:
-            check_alerts(debug=args.test)
+            check_alerts(debug=args.test, batch=batch)
             # nav.db connections are currently not in autocommit mode, and
             # since the current auth code uses legacy db connections we need to
             # be sure that we end all and any transactions so that we don't
@@ -28,6 +28,8 @@ import sys
 import signal
 import argparse
 import logging
+import time
+from configparser import ConfigParser
 
 import nav.daemon
 from nav import buildconf
@@ -36,6 +38,8 @@ from nav.daemon import safesleep as sleep
 from nav.logs import init_generic_logging
 from nav.statemon import statistics
 from nav.statemon import megaping
+from nav.statemon import icmpengine
+from nav.statemon import shard
 from nav.statemon import db
 from nav.statemon import config
 from nav.statemon import circbuf
@@ -53,9 +57,14 @@ def main():
         print("Must be started as root")
         sys.exit(1)
 
-    socket = megaping.make_sockets()  # make raw sockets while we have root
+    # make raw sockets while we have root, including one pair per worker
+    socket = megaping.make_sockets()
+    workers = int(config.pingconf().get("workers", 1))
+    shard_sockets = []
+    if workers > 1:  # a single worker is no better than none
+        shard_sockets = [megaping.make_sockets() for _ in range(workers)]
     nav.daemon.switchuser(NAV_CONFIG['NAV_USER'])
-    start(args.foreground, socket)
+    start(args.foreground, socket, shard_sockets)
 
 
 def make_argparser():
@@ -66,8 +75,48 @@ def make_argparser():
     return parser
 
 
+def make_pinger(socket, conf, shard_sockets=()):
+    """Returns a pinger object using the ping engine selected in conf.
+
+    If any shard_sockets are given, the hosts are partitioned between one
+    worker process per socket pair, each running its own engine.
+    """
+    engine = conf.get("engine", "megaping")
+    if engine == "scheduled":
+        engine_class = icmpengine.IcmpEngine
+    else:
+        if engine != "megaping":
+            _logger.error("Unknown ping engine %r, using megaping", engine)
+        engine_class = megaping.MegaPing
+
+    if not shard_sockets:
+        return engine_class(socket, conf)
+
+    def make_engine(sockets, ident):
+        return engine_class(sockets, conf, ident=ident)
+
+    base_ident = os.getpid() % 65536
+    for sock, ipv6 in zip(socket, (True, False)):
+        shard.attach_ident_filter(sock, base_ident, ipv6)
+    _logger.info("Using %d ping worker processes", len(shard_sockets))
+    timeout = shard.get_sweep_timeout(conf)
+    return shard.ShardedPinger(shard_sockets, make_engine, base_ident, timeout)
+
+
+def make_confirmer(socket, conf):
+    """Returns a pinger object for fast confirmation of suspected down hosts,
+    or None if this is disabled in conf.
+    """
+    enabled = conf.get("fast_confirm", "no").lower()
+    if not ConfigParser.BOOLEAN_STATES.get(enabled, False):
+        return None
+    confirm_conf = dict(conf)
+    confirm_conf["timeout"] = conf.get("confirm_timeout", 1)
+    return icmpengine.IcmpEngine(socket, confirm_conf)
+
+
 class Pinger(object):
-    def __init__(self, socket=None, foreground=False):
+    def __init__(self, socket=None, foreground=False, shard_sockets=()):
         if not foreground:
             signal.signal(signal.SIGHUP, self.signalhandler)
         signal.signal(signal.SIGTERM, self.signalhandler)
@@ -79,13 +128,18 @@ class Pinger(object):
         self._looptime = int(self.config.get("checkinterval", 60))
         _logger.info("Setting checkinterval=%i", self._looptime)
         self.db = db.db()
-        self.pinger = megaping.MegaPing(socket)
+        self.pinger = make_pinger(socket, self.config, shard_sockets)
+        self.confirmer = make_confirmer(socket, self.config)
+        self._confirm_probes = int(self.config.get("confirm_probes", 5))
+        self._confirm_interval = float(self.config.get("confirm_interval", 200)) / 1000
         self._nrping = int(self.config.get("nrping", 3))
         # To keep status...
         self.netboxmap = {}  # hash netboxid -> netbox
         self.down = []  # list of netboxids down
         self.replies = {}  # hash netboxid -> circbuf
         self.ip_to_netboxid = {}
+        self.suspected_since = {}  # hash netboxid -> time of first missed reply
+        self._sweep_start = time.time()
 
     def update_host_list(self):
         """
@@ -117,24 +171,69 @@ class Pinger(object):
             self.ip_to_netboxid[netbox.ip] = netbox.netboxid
         # Update netboxmap
         self.netboxmap = netboxmap
+        self.suspected_since = {
+            netboxid: since
+            for netboxid, since in self.suspected_since.items()
+            if netboxid in netboxmap
+        }
         _logger.debug("We now got %i hosts in our list to ping", len(self.netboxmap))
         # then update our pinger object
         self.pinger.set_hosts(self.ip_to_netboxid.keys())
 
-    def generate_events(self):
+    def confirm_suspects(self, answers):
+        """
+        Probes hosts that didn't answer in the last sweep, and which aren't
+        already marked as down, with a short burst of requests.
+
+        Returns a tuple of the answers, updated with any round trip times
+        from the burst, the set of IP addresses that didn't answer the burst
+        either, and the time used.
+        """
+        suspects = [
+            ip
+            for ip, rtt in answers
+            if rtt == -1 and self.ip_to_netboxid.get(ip) not in self.down
+        ]
+        if not suspects:
+            return answers, set(), 0
+        _logger.debug("Confirming %i suspected down hosts", len(suspects))
+        self.confirmer.set_hosts(suspects)
+        elapsedtime = self.confirmer.burst(self._confirm_probes, self._confirm_interval)
+        confirmed = dict(self.confirmer.results())
+        answers = [(ip, confirmed.get(ip, rtt)) for ip, rtt in answers]
+        down = set(ip for ip, rtt in confirmed.items() if rtt == -1)
+        _logger.debug(
+            "%i of %i suspected down hosts confirmed down in %03.3f secs",
+            len(down),
+            len(suspects),
+            elapsedtime,
+        )
+        return answers, down, elapsedtime
+
+    def generate_events(self, answers=None, confirmed_down=()):
         """
         Report state changes to event engine.
+
+        :param answers: A list of (ip, rtt) tuples, as returned by the
+                        pinger's results() method, which is called if omitted.
+        :param confirmed_down: IP addresses to consider down right away,
+                               instead of after nrping missed replies.
         """
         _logger.debug("Checks which hosts didn't answer")
-        answers = self.pinger.results()
+        if answers is None:
+            answers = self.pinger.results()
         for ip, rtt in answers:
             # rtt = round trip time (-1 => host didn't reply)
             netboxid = self.ip_to_netboxid.get(ip)
             self.replies[netboxid].push(rtt)
+            if ip in confirmed_down:
+                self.replies[netboxid].reset_all_to(-1)
             netbox = self.netboxmap[netboxid]
             if rtt != -1:
+                self.suspected_since.pop(netboxid, None)
                 statistics.update(netbox.sysname, 'N', 'UP', rtt)
             else:
+                self.suspected_since.setdefault(netboxid, self._sweep_start)
                 # ugly...
                 statistics.update(netbox.sysname, 'N', 'DOWN', 5)
 
@@ -163,6 +262,7 @@ class Pinger(object):
                 Event.DOWN,
             )
             self.db.new_event(new_event)
+            self._report_detection_latency(netbox)
             _logger.info("%s marked as down.", netbox)
         # Reporting netboxes as up
         _logger.debug("Starts reporting %i hosts as up", len(report_up))
@@ -183,6 +283,14 @@ class Pinger(object):
             self.db.new_event(new_event)
             _logger.info("%s marked as up.", netbox)
 
+    def _report_detection_latency(self, netbox):
+        since = self.suspected_since.get(netbox.netboxid)
+        if since is None:
+            return
+        latency = time.time() - since
+        _logger.debug("%s detected down after %03.3f secs", netbox, latency)
+        statistics.update_detection_latency(netbox.sysname, 'N', latency)
+
     def main(self):
         """
         Loops until SIGTERM is caught.
@@ -191,8 +299,14 @@ class Pinger(object):
         while self._isrunning:
             _logger.debug("Starts pinging....")
             self.update_host_list()
+            self._sweep_start = time.time()
             elapsedtime = self.pinger.ping()
-            self.generate_events()
+            answers = self.pinger.results()
+            confirmed_down = set()
+            if self.confirmer:
+                answers, confirmed_down, confirmtime = self.confirm_suspects(answers)
+                elapsedtime += confirmtime
+            self.generate_events(answers, confirmed_down)
             _logger.info(
                 "%i hosts checked in %03.3f secs. %i hosts "
                 "currently marked as down.",
@@ -231,7 +345,7 @@ class Pinger(object):
             _logger.critical("Caught %s. Resuming operation.", signum)
 
 
-def start(foreground, socket):
+def start(foreground, socket, shard_sockets=()):
     """
     Starts a new process, letting the service run as a daemon if `foreground`
     is false.
@@ -253,7 +367,9 @@ def start(foreground, socket):
     else:
         nav.daemon.writepidfile(pidfilename)
 
-    my_pinger = Pinger(socket=socket, foreground=foreground)
+    my_pinger = Pinger(
+        socket=socket, foreground=foreground, shard_sockets=shard_sockets
+    )
     my_pinger.main()
 
 
@@ -0,0 +1,40 @@
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.  You should have received a copy of the GNU General Public License
+# along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""Database routers for NAV"""
+from django.conf import settings
+
+# The app label of the model Django's database cache backend uses for its table
+CACHE_APP_LABEL = 'django_cache'
+
+
+class GraphiteCacheRouter(object):
+    """Routes the queries of the database cache backend to the graphite_cache
+    database connection, if one is configured.
+
+    That connection is in autocommit mode and is never part of a request's
+    transaction, so render cache leases and results are visible to other
+    processes right away, and don't wait for, or block, other transactions.
+    """
+
+    def db_for_read(self, model, **_hints):
+        if (
+            model._meta.app_label == CACHE_APP_LABEL
+            and 'graphite_cache' in settings.DATABASES
+        ):
+            return 'graphite_cache'
+        return None
+
+    db_for_write = db_for_read
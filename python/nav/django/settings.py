@@ -70,9 +70,16 @@ try:
             },
         }
     }
+    # A separate connection to the same database, for the Graphite render
+    # cache. Its writes are committed right away, and so become visible to
+    # other processes even when made from within a transaction.
+    DATABASES['graphite_cache'] = copy.deepcopy(DATABASES['default'])
+    DATABASES['graphite_cache']['TEST'] = {'MIRROR': 'default'}
 except (IOError, OSError) as e:
     warnings.warn(f"Could not get connection parameters from db.conf: {e}")
 
+DATABASE_ROUTERS = ['nav.django.routers.GraphiteCacheRouter']
+
 # URLs configuration
 ROOT_URLCONF = 'nav.django.urls'
 
@@ -178,6 +185,19 @@ CACHES = {
         'LOCATION': '/tmp/nav_cache',
         'TIMEOUT': '900',
     },
+    # Graphite render results, shared between all NAV processes regardless of
+    # which user they run as. The database backend is used because its add()
+    # is atomic, which the render cache relies on to coalesce requests. Its
+    # queries are routed to the graphite_cache database connection.
+    'graphite': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'graphite_render_cache',
+        'TIMEOUT': '60',
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+            'CULL_FREQUENCY': 4,
+        },
+    },
 }
 
 SECRET_KEY = NAV_CONFIG.get('SECRET_KEY', 'Very bad default value!')
@@ -195,8 +195,8 @@ class EventEngine(object):
                 len(new_events),
                 len(old_events),
             )
+            unresolved.refresh()
             for event in new_events:
-                unresolved.update()
                 try:
                     self.handle_event(event)
                 except Exception:
@@ -204,6 +204,10 @@ class EventEngine(object):
                         "Unhandled exception while " "handling %s, deleting event",
                         event,
                     )
+                    # the handler's transaction was rolled back, so the
+                    # unresolved alert map may no longer reflect the database
+                    unresolved.invalidate()
+                    unresolved.refresh()
                     if event.id:
                         event.delete()
 
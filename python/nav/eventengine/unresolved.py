@@ -13,15 +13,30 @@
 # details.  You should have received a copy of the GNU General Public License
 # along with NAV. If not, see <http://www.gnu.org/licenses/>.
 #
-"""Loading and caching of unresolved alert states from the database"""
+"""Loading and caching of unresolved alert states from the database.
+
+The cache is an index of unresolved AlertHistory entries, keyed by the same
+identity key as events (see :py:meth:`EventMixIn.get_key`). It is loaded in
+full only once, and is then kept up to date incrementally:
+
+* :py:func:`track` is called by the alert generator whenever it opens or
+  resolves an AlertHistory entry.
+* :py:func:`reconcile` is a cheap check (a single id-only query) that picks
+  up alert states opened or resolved by other processes, such as manual
+  resolution from the web interface.
+
+"""
 
 import logging
 
 from nav.models.event import AlertHistory
-from nav.models.fields import INFINITY
+from nav.models.fields import INFINITY, UNRESOLVED
 
 _logger = logging.getLogger(__name__)
 _unresolved_alerts_map = {}
+_alerts_by_id = {}
+_ids_by_key = {}
+_loaded = False
 
 
 def get_map():
@@ -30,12 +45,79 @@ def get_map():
 
 
 def update():
-    """Updates the map of unresolved alerts from the database"""
-    # yes mr. pylint, we use global state, this module acts as a singleton
-    # pylint: disable=W0603
-    global _unresolved_alerts_map
-    unresolved = AlertHistory.objects.filter(end_time__gte=INFINITY)
-    _unresolved_alerts_map = dict((alert.get_key(), alert) for alert in unresolved)
+    """Updates the map of unresolved alerts from the database by reloading it
+    in full.
+    """
+    _clear()
+    for alert in AlertHistory.objects.filter(UNRESOLVED):
+        _add(alert)
+    _set_loaded(True)
+    _logger.debug("loaded %d unresolved alerts", len(_alerts_by_id))
+
+
+def refresh():
+    """Ensures the map of unresolved alerts is current.
+
+    The map is loaded in full the first time (or after an
+    :py:func:`invalidate`), otherwise it is cheaply reconciled against the
+    database.
+    """
+    if _loaded:
+        reconcile()
+    else:
+        update()
+
+
+def invalidate():
+    """Marks the map as untrustworthy, forcing a full reload on the next
+    :py:func:`refresh`. Typically used after a database transaction that
+    may have modified alert states was rolled back.
+    """
+    _set_loaded(False)
+
+
+def reconcile():
+    """Reconciles the map with unresolved alert states in the database,
+    adding and removing entries that were changed behind our back.
+
+    Only the primary keys of unresolved alerts are fetched, and full objects
+    are only loaded for alerts that are missing from the map.
+    """
+    current_ids = set(
+        AlertHistory.objects.filter(UNRESOLVED).values_list('id', flat=True)
+    )
+    known_ids = set(_alerts_by_id)
+
+    gone = known_ids - current_ids
+    for alert_id in gone:
+        _remove_id(alert_id)
+
+    new = current_ids - known_ids
+    if new:
+        for alert in AlertHistory.objects.filter(id__in=new):
+            _add(alert)
+
+    if gone or new:
+        _logger.debug(
+            "reconciled unresolved alerts: %d added, %d removed", len(new), len(gone)
+        )
+
+
+def track(alert):
+    """Updates the map according to the state of a single AlertHistory entry.
+
+    Unresolved alerts are added to (or replaced in) the map, while resolved
+    ones are removed from it.
+
+    :param alert: An AlertHistory instance that has been saved to the database
+    """
+    if alert is None or not alert.id:
+        return
+    if alert.end_time and alert.end_time >= INFINITY:
+        _remove_id(alert.id)
+        _add(alert)
+    else:
+        _remove_id(alert.id)
 
 
 def refers_to_unresolved_alert(event):
@@ -57,3 +139,39 @@ def refers_to_unresolved_alert(event):
         )
         _logger.debug("unresolved map contains: %r", _unresolved_alerts_map)
         return False
+
+
+def _add(alert):
+    key = alert.get_key()
+    _alerts_by_id[alert.id] = alert
+    _ids_by_key.setdefault(key, []).append(alert.id)
+    _unresolved_alerts_map[key] = alert
+
+
+def _remove_id(alert_id):
+    alert = _alerts_by_id.pop(alert_id, None)
+    if alert is None:
+        return
+    key = alert.get_key()
+    ids = _ids_by_key.get(key, [])
+    if alert_id in ids:
+        ids.remove(alert_id)
+    if ids:
+        # there are other unresolved alerts with the same key
+        _unresolved_alerts_map[key] = _alerts_by_id[ids[-1]]
+    else:
+        _ids_by_key.pop(key, None)
+        _unresolved_alerts_map.pop(key, None)
+
+
+def _clear():
+    _unresolved_alerts_map.clear()
+    _alerts_by_id.clear()
+    _ids_by_key.clear()
+
+
+def _set_loaded(value):
+    # yes mr. pylint, we use global state, this module acts as a singleton
+    # pylint: disable=W0603
+    global _loaded
+    _loaded = value
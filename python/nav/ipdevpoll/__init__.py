@@ -35,6 +35,14 @@ class Plugin(object):
 
     _logger = ContextLogger()
     RESTRICT_TO_VENDORS = []
+    # OIDs whose values change whenever the data collected by this plugin may
+    # have changed, and the shadow classes that only this plugin can populate
+    # completely. See nav.ipdevpoll.fingerprint.
+    FINGERPRINT_OIDS = ()
+    FINGERPRINT_SHADOWS = ()
+    # Set by the job when this plugin's fingerprint was checked and it must run,
+    # in which case any change detection of the plugin's own should be ignored
+    forced_run = False
 
     def __init__(self, netbox, agent, containers, config: IpdevpollConfig = None):
         """
@@ -0,0 +1,323 @@
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.  You should have received a copy of the GNU General Public
+# License along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""Load-aware job scheduling support for ipdevpoll.
+
+In the default *fixed* scheduling mode, every newly loaded netbox gets its
+jobs started immediately, which means that thousands of netboxes added at once
+will stay synchronized and hit the database thread pool and the worker
+processes in bursts, interval after interval.
+
+In the *adaptive* scheduling mode:
+
+* The first runs of newly loaded jobs are spread across the job interval.
+  Each batch of netboxes is laid out in a deterministic order (derived from a
+  hash of the job name and netbox id, so it is stable across restarts), and
+  each netbox is given a share of the interval proportional to the historical
+  average runtime of its job, as recorded in the ipdevpoll job log.
+
+* A :py:class:`LoadMonitor` keeps an eye on the backlog of the reactor's
+  thread pool and on the latency of a trivial database query. While either is
+  above its configured limit, jobs that are due to run are held back in a
+  queue, from which they are released at a limited rate once the pressure
+  subsides.
+
+In both modes, schedule skew (how late jobs start compared to when they were
+due) and queue depths are reported as Graphite metrics.
+
+"""
+import hashlib
+import logging
+import time
+
+from django.db import connection
+from django.db.models import Avg
+from twisted.internet import reactor
+from twisted.internet.task import LoopingCall
+
+from nav.ipdevpoll import db
+from nav.models.manage import IpdevpollJobLog
+
+_logger = logging.getLogger(__name__)
+
+SCHEDULING_FIXED = 'fixed'
+SCHEDULING_ADAPTIVE = 'adaptive'
+MONITOR_INTERVAL = 1.0  # seconds
+LATENCY_SMOOTHING = 0.3
+
+
+def get_scheduling_mode(config=None):
+    """Returns the configured job scheduling mode"""
+    if config is None:
+        from nav.ipdevpoll.config import ipdevpoll_conf as config
+
+    mode = config.get('scheduling', 'mode', fallback=SCHEDULING_FIXED).strip()
+    if mode not in (SCHEDULING_FIXED, SCHEDULING_ADAPTIVE):
+        _logger.warning(
+            "unknown scheduling mode %r, using %r instead", mode, SCHEDULING_FIXED
+        )
+        mode = SCHEDULING_FIXED
+    return mode
+
+
+def get_jitter(job_name, netbox_id):
+    """Returns a deterministic pseudo-random fraction in the range [0, 1) for a
+    job/netbox combination.
+    """
+    key = "{}:{}".format(job_name, netbox_id).encode('utf-8')
+    digest = hashlib.md5(key).digest()
+    return int.from_bytes(digest[:8], 'big') / 2.0**64
+
+
+def get_average_runtimes(job_name, netbox_ids):
+    """Returns the average logged runtime of a job for a set of netboxes.
+
+    This accesses the database synchronously, and should be run in a thread.
+
+    :returns: A dict of {netbox_id: average runtime in seconds}. Netboxes for
+              which the job has never been logged are omitted.
+    """
+    if not netbox_ids:
+        return {}
+    averages = (
+        IpdevpollJobLog.objects.filter(
+            job_name=job_name, netbox__in=netbox_ids, duration__isnull=False
+        )
+        .values_list('netbox')
+        .annotate(runtime=Avg('duration'))
+    )
+    return {netbox_id: runtime for netbox_id, runtime in averages}
+
+
+def get_start_delays(job_name, interval, runtimes, netbox_ids):
+    """Spreads the first runs of a job for a batch of netboxes across the job
+    interval.
+
+    The netboxes are ordered by their :py:func:`get_jitter` value. The batch
+    starts at the jitter offset of its first netbox, and every netbox then
+    occupies a slot of the interval proportional to the average runtime of its
+    job. Netboxes with no known runtime are weighted by the median of the known
+    runtimes.
+
+    :param runtimes: A dict of average job runtimes, as returned by
+                     :py:func:`get_average_runtimes`.
+    :returns: A dict of {netbox_id: delay in seconds}
+    """
+    if not netbox_ids:
+        return {}
+
+    jitter = {netbox_id: get_jitter(job_name, netbox_id) for netbox_id in netbox_ids}
+    ordered = sorted(netbox_ids, key=jitter.get)
+    weights = _get_weights(runtimes, ordered)
+    total = sum(weights.values())
+
+    start = jitter[ordered[0]]
+    delays = {}
+    elapsed = 0.0
+    for netbox_id in ordered:
+        delays[netbox_id] = ((start + elapsed / total) % 1.0) * interval
+        elapsed += weights[netbox_id]
+    return delays
+
+
+def _get_weights(runtimes, netbox_ids):
+    known = sorted(runtime for runtime in runtimes.values() if runtime and runtime > 0)
+    default = known[len(known) // 2] if known else 1.0
+    weights = {}
+    for netbox_id in netbox_ids:
+        runtime = runtimes.get(netbox_id)
+        weights[netbox_id] = runtime if runtime and runtime > 0 else default
+    return weights
+
+
+class ScheduleStats(object):
+    """Accumulates schedule skew statistics between metric flushes"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Resets all statistics"""
+        self.started = 0
+        self.total_skew = 0.0
+        self.max_skew = 0.0
+
+    def add_skew(self, skew):
+        """Records the skew of a single job start"""
+        skew = max(skew, 0.0)
+        self.started += 1
+        self.total_skew += skew
+        self.max_skew = max(self.max_skew, skew)
+
+    def get_metrics(self, prefix, timestamp):
+        """Returns the accumulated statistics as Graphite metrics, and resets
+        them.
+        """
+        average = self.total_skew / self.started if self.started else 0.0
+        metrics = [
+            (prefix + '.jobs-started', (timestamp, self.started)),
+            (prefix + '.skew.avg', (timestamp, average)),
+            (prefix + '.skew.max', (timestamp, self.max_skew)),
+        ]
+        self.reset()
+        return metrics
+
+
+class LoadMonitor(object):
+    """Monitors thread pool backlog and database latency, and holds back jobs
+    while either is too high.
+
+    Schedulers of jobs that should be held back are put in :py:attr:`queue`.
+    They are released (by calling their ``start()`` method) at a rate of at
+    most `release_rate` jobs per second while the load is acceptable.
+    """
+
+    def __init__(
+        self,
+        max_queue_depth=10,
+        max_db_latency=1.0,
+        release_rate=10,
+        threadpool=None,
+        interval=MONITOR_INTERVAL,
+    ):
+        self.max_queue_depth = max_queue_depth
+        self.max_db_latency = max_db_latency
+        self.release_rate = release_rate
+        self.threadpool = threadpool
+        self.interval = interval
+        self.queue = []
+        self.db_latency = 0.0
+        self._probe_started_at = None
+        self._loop = LoopingCall(self.check)
+
+    @classmethod
+    def from_config(cls, config=None):
+        """Creates a LoadMonitor from the [scheduling] section of the
+        ipdevpoll config.
+        """
+        if config is None:
+            from nav.ipdevpoll.config import ipdevpoll_conf as config
+
+        return cls(
+            max_queue_depth=config.getint('scheduling', 'max_queue_depth', fallback=10),
+            max_db_latency=config.getfloat(
+                'scheduling', 'max_db_latency', fallback=1.0
+            ),
+            release_rate=config.getint('scheduling', 'release_rate', fallback=10),
+        )
+
+    def __repr__(self):
+        return "<LoadMonitor queue_depth={} db_latency={:.3f} held_back={}>".format(
+            self.get_threadpool_queue_depth(), self.db_latency, len(self.queue)
+        )
+
+    def start(self):
+        """Starts monitoring"""
+        if not self._loop.running:
+            self._loop.start(self.interval, now=True)
+
+    def stop(self):
+        """Stops monitoring"""
+        if self._loop.running:
+            self._loop.stop()
+
+    def check(self):
+        """Probes the current load and releases held back jobs, if possible"""
+        self._probe_db_latency()
+        if self.queue and not self.is_overloaded():
+            self.release(max(1, int(self.release_rate * self.interval)))
+
+    def is_overloaded(self):
+        """Returns True if the thread pool backlog or the database latency is
+        above its configured limit.
+        """
+        return (
+            self.get_threadpool_queue_depth() > self.max_queue_depth
+            or self.get_db_latency() > self.max_db_latency
+        )
+
+    def hold_back(self, scheduler):
+        """Queues a job scheduler for later release"""
+        self.queue.append(scheduler)
+
+    def release(self, count):
+        """Releases up to count held back job schedulers"""
+        released = 0
+        while self.queue and released < count:
+            scheduler = self.queue.pop(0)
+            if scheduler.cancelled:
+                continue
+            scheduler.start()
+            released += 1
+        if released:
+            _logger.debug(
+                "released %d held back jobs, %d still waiting",
+                released,
+                len(self.queue),
+            )
+
+    def get_threadpool_queue_depth(self):
+        """Returns the number of functions waiting for a thread pool thread"""
+        return get_threadpool_queue_depth(self.threadpool)
+
+    def get_db_latency(self):
+        """Returns the smoothed database probe latency in seconds.
+
+        If the current probe has been outstanding for longer than the smoothed
+        latency, its elapsed time is returned instead, so that a stalled
+        database is detected before the probe returns.
+        """
+        if self._probe_started_at is not None:
+            return max(self.db_latency, time.time() - self._probe_started_at)
+        return self.db_latency
+
+    def _probe_db_latency(self):
+        if self._probe_started_at is not None:
+            return  # the previous probe has not returned yet
+        self._probe_started_at = time.time()
+        df = db.run_in_thread(_ping_database)
+        df.addCallbacks(self._record_db_latency, self._probe_failed)
+
+    def _record_db_latency(self, _result):
+        latency = time.time() - self._probe_started_at
+        self._probe_started_at = None
+        self.db_latency += LATENCY_SMOOTHING * (latency - self.db_latency)
+
+    def _probe_failed(self, failure):
+        self._probe_started_at = None
+        _logger.warning("database latency probe failed: %s", failure.getErrorMessage())
+
+    def get_metrics(self, prefix, timestamp):
+        """Returns the monitored values as Graphite metrics"""
+        return [
+            (prefix + '.db-latency', (timestamp, self.get_db_latency())),
+            (prefix + '.overloaded', (timestamp, int(self.is_overloaded()))),
+            (prefix + '.queue.backpressure', (timestamp, len(self.queue))),
+        ]
+
+
+def get_threadpool_queue_depth(threadpool=None):
+    """Returns the number of functions waiting for a free thread in the
+    reactor's thread pool.
+    """
+    pool = threadpool or reactor.getThreadPool()
+    return pool._queue.qsize()
+
+
+@db.cleanup_django_debug_after
+def _ping_database():
+    cursor = connection.cursor()
+    cursor.execute("SELECT 1")
+    cursor.fetchone()
@@ -34,6 +34,15 @@ class IpdevpollConfig(NAVConfigParser):
 [ipdevpoll]
 logfile = ipdevpolld.log
 max_concurrent_jobs = 500
+profiling = no
+
+[scheduling]
+mode = fixed
+max_queue_depth = 10
+max_db_latency = 1.0
+release_rate = 10
+netbox_notifications = yes
+full_reload_interval = 30m
 
 [netbox_filters]
 groups_included=
@@ -43,10 +52,27 @@ groups_excluded=
 timeout = 1.5
 max-repetitions = 10
 
+[snmp_cache]
+enabled = no
+max_size = 32
+ttl = 0
+
+[snmp_cache_ttl]
+.1.3.6.1.2.1.2.2.1.2 = 5m
+.1.3.6.1.2.1.31.1.1.1.1 = 5m
+.1.3.6.1.2.1.17.1.4.1.2 = 5m
+.1.3.6.1.2.1.47.1.1.1 = 15m
+
 [multiprocess]
 ping_workers = true
 ping_interval = 30
 ping_timeout = 10
+placement = least-active
+affinity_max_imbalance = 2.0
+max_rss = 0
+startup = spawn
+preload_mibs = SNMPv2-MIB IF-MIB IP-MIB ENTITY-MIB BRIDGE-MIB Q-BRIDGE-MIB LLDP-MIB
+ CISCO-CDP-MIB
 
 [plugins]
 
@@ -64,6 +90,12 @@ alert_ibgp = yes
 [interfaces]
 always_use_ifhighspeed = false
 
+[cam]
+bulk_reconcile = no
+
+[arp]
+bulk_reconcile = no
+
 [sensors]
 loadmodules = nav.mibs.*
 
@@ -130,6 +162,16 @@ def get_netbox_filter(section, config=None):
     return []
 
 
+def get_full_reload_interval(config=None):
+    """Returns the interval of full netbox reloads, in seconds, to use while
+    listening for netbox change notifications.
+    """
+    if config is None:
+        config = ipdevpoll_conf
+
+    return parse_interval(config.get('scheduling', 'full_reload_interval'))
+
+
 # this is a data container class, mr. pylint!
 # pylint: disable=R0913,R0903
 class JobDescriptor(object):
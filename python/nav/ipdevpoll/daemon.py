@@ -44,7 +44,7 @@ import nav.logs
 from nav.models import manage
 
 from nav.ipdevpoll import ContextFormatter, schedule, db
-from . import plugins, pool
+from . import plugins, pool, forkserver
 
 
 class NetboxAction(argparse.Action):
@@ -188,8 +188,16 @@ class IPDevPollProcess(object):
         from .schedule import JobScheduler
 
         plugins.import_plugins()
+        fork_server = None
+        if forkserver.get_startup_mode() == forkserver.STARTUP_FORK:
+            fork_server = forkserver.ForkServer(self.run_forked_worker)
+            fork_server.start()
+            reactor.addSystemEventTrigger("after", "shutdown", fork_server.stop)
         self.work_pool = pool.WorkerPool(
-            process_count, max_jobs, self.options.threadpoolsize
+            process_count,
+            max_jobs,
+            self.options.threadpoolsize,
+            fork_server=fork_server,
         )
         reactor.callWhenRunning(
             JobScheduler.initialize_from_config_and_run,
@@ -208,6 +216,20 @@ class IPDevPollProcess(object):
 
         self.reloaders.append(reload_netboxes)
 
+    def run_forked_worker(self):
+        """Runs a worker process forked from the fork server of this master
+        process, as if it had been started with the --worker option.
+        """
+        options = argparse.Namespace(**vars(self.options))
+        options.multiprocess = None
+        options.worker = True
+        options.foreground = True
+        options.pidlog = True
+        formatter = ContextFormatter(options.pidlog)
+        for handler in logging.getLogger().handlers:
+            handler.setFormatter(formatter)
+        IPDevPollProcess(options).run()
+
     def sighup_handler(self, _signum, _frame):
         """Reopens log files."""
         self._logger.info("SIGHUP received; reopening log files")
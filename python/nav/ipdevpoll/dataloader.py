@@ -42,7 +42,7 @@ from nav.models import manage, event
 from nav import ipdevpoll
 from nav.ipdevpoll.db import django_debug_cleanup, run_in_thread
 from nav.ipdevpoll.config import get_netbox_filter
-from . import storage
+from . import signals, storage
 
 
 _logger = logging.getLogger(__name__)
@@ -75,6 +75,7 @@ class NetboxLoader(dict):
     def __init__(self):
         super(NetboxLoader, self).__init__()
         self.peak_count = 0
+        self.type_changes = {}
         # touch _logger to initialize logging context right away
         # pylint: disable=W0104
         self._logger
@@ -96,14 +97,33 @@ class NetboxLoader(dict):
             changed in the database since the last load operation.
 
         """
+        return self._load_s()
+
+    def load_some_s(self, netbox_ids):
+        """Synchronously reload a subset of netboxes from database.
+
+        Netboxes whose IDs are not in `netbox_ids` are left untouched. An ID
+        that is no longer present in the database, or that is excluded by the
+        netbox filters, is considered lost, while an ID that is not already
+        loaded is considered new.
+
+        :param netbox_ids: A collection of netbox IDs to reload.
+        :returns: A three-tuple, like :py:meth:`load_all_s`, which only
+                  contains IDs from `netbox_ids`.
+
+        """
+        return self._load_s(set(netbox_ids))
+
+    def _load_s(self, netbox_ids=None):
         related = ('room__location', 'type__vendor', 'category', 'organization')
-        snmp_down = set(
-            event.AlertHistory.objects.unresolved('snmpAgentState').values_list(
-                'netbox__id', flat=True
-            )
-        )
-        self._logger.debug("These netboxes have active snmpAgentStates: %r", snmp_down)
+        snmp_down = event.AlertHistory.objects.unresolved('snmpAgentState')
         queryset = manage.Netbox.objects.filter(deleted_at__isnull=True)
+        if netbox_ids is not None:
+            snmp_down = snmp_down.filter(netbox__id__in=netbox_ids)
+            queryset = queryset.filter(id__in=netbox_ids)
+
+        snmp_down = set(snmp_down.values_list('netbox__id', flat=True))
+        self._logger.debug("These netboxes have active snmpAgentStates: %r", snmp_down)
 
         filter_groups_included = get_netbox_filter('groups_included')
         if filter_groups_included:
@@ -119,13 +139,24 @@ class NetboxLoader(dict):
         netbox_list = storage.shadowify_queryset(queryset)
         netbox_dict = dict((netbox.id, netbox) for netbox in netbox_list)
 
-        times = load_last_updated_times()
+        times = load_last_updated_times(netbox_ids)
         for netbox in netbox_list:
             netbox.last_updated = times.get(netbox.id, {})
 
         django_debug_cleanup()
 
+        return self._update(netbox_dict, netbox_ids)
+
+    def _update(self, netbox_dict, netbox_ids=None):
+        """Updates self with freshly loaded netboxes.
+
+        :param netbox_dict: A dict of the loaded netbox shadows.
+        :param netbox_ids: The set of netbox IDs that were loaded, or None if
+                           all netboxes were loaded.
+        """
         previous_ids = set(self.keys())
+        if netbox_ids is not None:
+            previous_ids.intersection_update(netbox_ids)
         current_ids = set(netbox_dict.keys())
         lost_ids = previous_ids.difference(current_ids)
         new_ids = current_ids.difference(previous_ids)
@@ -134,6 +165,8 @@ class NetboxLoader(dict):
         changed_ids = set(
             i for i in same_ids if is_netbox_changed(self[i], netbox_dict[i])
         )
+        for i in changed_ids:
+            self._check_type_change(self[i], netbox_dict[i])
 
         # update self
         for i in lost_ids:
@@ -149,9 +182,10 @@ class NetboxLoader(dict):
         log = self._logger.info if anything_changed else self._logger.debug
 
         log(
-            "Loaded %d netboxes from database "
+            "Loaded %d %snetboxes from database "
             "(%d new, %d removed, %d changed, %d peak)",
             len(netbox_dict),
+            "" if netbox_ids is None else "changed ",
             len(new_ids),
             len(lost_ids),
             len(changed_ids),
@@ -160,10 +194,57 @@ class NetboxLoader(dict):
 
         return (new_ids, lost_ids, changed_ids)
 
+    def _check_type_change(self, old, new):
+        """Records a netbox' change from a known type to a new type"""
+        if old.type is not None and _type_id(old.type) != _type_id(new.type):
+            self.type_changes[new.id] = new.type
+
+    def pop_type_changes(self):
+        """Returns and forgets the type changes detected by previous loads,
+        except those that have already been signalled by this process.
+
+        :returns: A dict of {netbox_id: new NetboxType shadow}.
+        """
+        changes, self.type_changes = self.type_changes, {}
+        return {
+            netbox_id: new_type
+            for netbox_id, new_type in changes.items()
+            if _remember_type(netbox_id, new_type)
+        }
+
     def load_all(self):
         """Asynchronously load netboxes from database."""
         return run_in_thread(self.load_all_s)
 
+    def load_some(self, netbox_ids):
+        """Asynchronously reload a subset of netboxes from database."""
+        return run_in_thread(self.load_some_s, netbox_ids)
+
+
+# The most recent type of each netbox whose type change has been signalled by
+# this process, to avoid signalling the same change more than once.
+_signalled_types = {}
+
+
+def _type_id(netbox_type):
+    return netbox_type.id if netbox_type is not None else None
+
+
+def _remember_type(netbox_id, new_type):
+    """Remembers a netbox' new type, returning False if it was already known"""
+    type_id = _type_id(new_type)
+    if _signalled_types.get(netbox_id) == type_id:
+        return False
+    _signalled_types[netbox_id] = type_id
+    return True
+
+
+def _on_netbox_type_changed(netbox_id, new_type, **_kwargs):
+    _remember_type(netbox_id, new_type)
+
+
+signals.netbox_type_changed.connect(_on_netbox_type_changed)
+
 
 def is_netbox_changed(netbox1, netbox2):
     """Determine whether a netbox' information has changed enough to
@@ -199,8 +280,12 @@ def is_netbox_changed(netbox1, netbox2):
     return False
 
 
-def load_last_updated_times():
-    """Loads the last-successful timestamps of each job of each netbox"""
+def load_last_updated_times(netbox_ids=None):
+    """Loads the last-successful timestamps of each job of each netbox.
+
+    :param netbox_ids: If given, only the timestamps of these netboxes are
+                       loaded.
+    """
     sql = """SELECT
                netboxid,
                job_name,
@@ -209,10 +294,16 @@ def load_last_updated_times():
                ipdevpoll_job_log
              WHERE
                success
+               {netbox_filter}
              GROUP BY netboxid, job_name
              """
+    params = []
+    netbox_filter = ""
+    if netbox_ids is not None:
+        netbox_filter = "AND netboxid = ANY(%s)"
+        params.append(list(netbox_ids))
     cursor = django.db.connection.cursor()
-    cursor.execute(sql)
+    cursor.execute(sql.format(netbox_filter=netbox_filter), params)
     times = defaultdict(dict)
     for netboxid, job_name, end_time in cursor.fetchall():
         times[netboxid][job_name] = end_time
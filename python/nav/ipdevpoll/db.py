@@ -16,9 +16,11 @@
 """Database related functionality for ipdevpoll."""
 
 import gc
+import io
 import logging
 from pprint import pformat
 import threading
+import time
 from functools import wraps
 
 from twisted.internet import threads
@@ -28,6 +30,8 @@ from django.db.utils import OperationalError as DjangoOperationalError
 from django.db.utils import InterfaceError as DjangoInterfaceError
 from psycopg2 import InterfaceError, OperationalError
 
+from nav.ipdevpoll.profiling import get_current_profile
+
 _logger = logging.getLogger(__name__)
 _query_logger = logging.getLogger(".".join((__name__, "query")))
 
@@ -91,10 +95,28 @@ def run_in_thread(func, *args, **kwargs):
     """Runs a synchronous function in a thread, with special handling of
     database errors.
 
+    If called on behalf of a job that is being profiled, the function's
+    thread pool queue wait time and database queries are recorded in the
+    job's profile.
+
     """
-    return threads.deferToThread(
-        reset_connection_on_interface_error(func), *args, **kwargs
-    )
+    func = reset_connection_on_interface_error(func)
+    profile = get_current_profile()
+    if profile:
+        func = _profiled_in_thread(func, profile)
+    return threads.deferToThread(func, *args, **kwargs)
+
+
+def _profiled_in_thread(func, profile):
+    stage = profile.stage
+    submitted = time.time()
+
+    def _profiled(*args, **kwargs):
+        profile.add_queue_wait(stage, time.time() - submitted)
+        with django.db.connection.execute_wrapper(profile.execute_wrapper):
+            return func(*args, **kwargs)
+
+    return wraps(func)(_profiled)
 
 
 def reset_connection_on_interface_error(func):
@@ -159,3 +181,55 @@ def purge_old_job_log_entries():
               WHERE ipdevpoll_job_log.id = ranked.id AND rank > 100;
         """
     )
+
+
+def copy_to_temporary_table(cursor, table, columns, rows):
+    """Creates a temporary table and fills it with rows using COPY.
+
+    The table is dropped at the end of the current transaction, so this must
+    be called from within one (e.g. from a function decorated with
+    :py:func:`django.db.transaction.atomic`). Any existing temporary table of
+    the same name is replaced.
+
+    :param cursor: A database cursor.
+    :param table: The name of the temporary table.
+    :param columns: A sequence of (column name, SQL type) tuples.
+    :param rows: An iterable of tuples of column values. None values are
+                 copied as NULL, all other values as their string
+                 representations.
+    :returns: The number of copied rows.
+
+    """
+    cursor.execute("DROP TABLE IF EXISTS pg_temp.{0}".format(table))
+    cursor.execute(
+        "CREATE TEMPORARY TABLE {0} ({1}) ON COMMIT DROP".format(
+            table, ", ".join("{0} {1}".format(*column) for column in columns)
+        )
+    )
+    data = io.StringIO()
+    count = 0
+    for row in rows:
+        data.write("\t".join(_copy_escape(value) for value in row))
+        data.write("\n")
+        count += 1
+    data.seek(0)
+    cursor.copy_expert(
+        "COPY {0} ({1}) FROM STDIN".format(
+            table, ", ".join(name for name, _type in columns)
+        ),
+        data,
+    )
+    # autovacuum never analyzes temporary tables, but the planner needs
+    # statistics to pick sensible join strategies for large ones
+    cursor.execute("ANALYZE {0}".format(table))
+    return count
+
+
+_COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def _copy_escape(value):
+    """Formats a value as a column of PostgreSQL's COPY text format"""
+    if value is None:
+        return '\\N'
+    return str(value).translate(_COPY_ESCAPES)
@@ -0,0 +1,172 @@
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.  You should have received a copy of the GNU General Public
+# License along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""Database change notifications for ipdevpoll.
+
+Triggers in the NAV database send a notification on the
+``ipdevpoll_netbox_changed`` channel, with a netbox id as its payload, whenever
+anything that affects the job schedules of a netbox changes (the netbox row
+itself, its management profiles, its group memberships or its SNMP agent
+state).
+
+:py:class:`NetboxChangeListener` subscribes to these notifications on a
+dedicated PostgreSQL connection, which is watched by the Twisted reactor, so
+that no thread is tied up waiting for them.
+
+"""
+import logging
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from twisted.internet import reactor
+from twisted.internet.interfaces import IReadDescriptor
+from zope.interface import implementer
+
+from nav.db import get_connection_string
+
+_logger = logging.getLogger(__name__)
+
+CHANNEL = 'ipdevpoll_netbox_changed'
+RECONNECT_INTERVAL = 60.0  # seconds
+
+
+@implementer(IReadDescriptor)
+class NetboxChangeListener(object):
+    """Listens for netbox change notifications from the database.
+
+    `callback` is called with a set of changed netbox ids every time
+    notifications arrive. It is called with None whenever notifications may
+    have been missed, i.e. when the listening connection has been lost or has
+    been re-established, to signal that a full reload is needed.
+    """
+
+    def __init__(self, callback, reconnect_interval=RECONNECT_INTERVAL):
+        self.callback = callback
+        self.reconnect_interval = reconnect_interval
+        self.connection = None
+        self._reconnect_call = None
+
+    def __repr__(self):
+        return "<NetboxChangeListener listening=%r>" % self.is_listening()
+
+    def is_listening(self):
+        """Returns True if notifications are currently being listened for"""
+        return self.connection is not None
+
+    def start(self):
+        """Opens a database connection and starts listening for notifications.
+
+        :raises psycopg2.Error: if the connection could not be established.
+        """
+        connection = psycopg2.connect(get_connection_string())
+        try:
+            connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            connection.cursor().execute('LISTEN %s' % CHANNEL)
+        except psycopg2.Error:
+            connection.close()
+            raise
+        self.connection = connection
+        reactor.addReader(self)
+        _logger.debug("listening for %s notifications", CHANNEL)
+
+    def stop(self):
+        """Stops listening and closes the database connection"""
+        if self._reconnect_call and self._reconnect_call.active():
+            self._reconnect_call.cancel()
+        self._reconnect_call = None
+        self._close()
+
+    def _close(self):
+        if self.connection is None:
+            return
+        reactor.removeReader(self)
+        try:
+            self.connection.close()
+        except psycopg2.Error:
+            pass
+        self.connection = None
+
+    def fileno(self):
+        """Returns the file descriptor of the listening connection"""
+        if self.connection is None:
+            return -1
+        return self.connection.fileno()
+
+    def doRead(self):
+        """Collects the netbox ids of all pending notifications"""
+        try:
+            self.connection.poll()
+        except psycopg2.Error as error:
+            self._connection_failed(error)
+            return
+
+        netbox_ids = get_netbox_ids(self.connection.notifies)
+        del self.connection.notifies[:]
+        if netbox_ids:
+            self.callback(netbox_ids)
+
+    def connectionLost(self, reason):
+        """Called by the reactor if the connection is lost"""
+        self._connection_failed(reason)
+
+    def logPrefix(self):
+        return self.__class__.__name__
+
+    def _connection_failed(self, error):
+        _logger.warning(
+            "lost database connection listening for netbox changes, "
+            "retrying in %ds: %s",
+            self.reconnect_interval,
+            error,
+        )
+        self._close()
+        self._schedule_reconnect()
+        self.callback(None)
+
+    def _schedule_reconnect(self):
+        if self._reconnect_call is None or not self._reconnect_call.active():
+            self._reconnect_call = reactor.callLater(
+                self.reconnect_interval, self._reconnect
+            )
+
+    def _reconnect(self):
+        self._reconnect_call = None
+        try:
+            self.start()
+        except psycopg2.Error as error:
+            _logger.warning(
+                "could not listen for netbox changes, retrying in %ds: %s",
+                self.reconnect_interval,
+                error,
+            )
+            self._schedule_reconnect()
+        else:
+            _logger.info("listening for netbox changes again")
+            self.callback(None)
+
+
+def get_netbox_ids(notifies):
+    """Returns the set of netbox ids in a list of psycopg2 notifications,
+    ignoring notifications on other channels and malformed payloads.
+    """
+    netbox_ids = set()
+    for notify in notifies:
+        if notify.channel != CHANNEL:
+            continue
+        try:
+            netbox_ids.add(int(notify.payload))
+        except ValueError:
+            _logger.debug("ignoring malformed notification payload %r", notify.payload)
+    return netbox_ids
@@ -0,0 +1,213 @@
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.  You should have received a copy of the GNU General Public
+# License along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""Change detection for ipdevpoll jobs.
+
+Plugins that collect large amounts of data that rarely change can declare a
+list of cheap *fingerprint* OIDs (such as ENTITY-MIB::entLastChangeTime) in
+their ``FINGERPRINT_OIDS`` attribute. If a job is configured with a
+``full_run_every`` option, a :py:class:`FingerprintChecker` will fetch all the
+fingerprint OIDs of the job's plugins (along with sysUpTime) in a single GET
+request before any plugin is run, and compare them to the values stored by the
+previous run of the job. Plugins whose fingerprints are unchanged are skipped.
+
+A plugin is never skipped if:
+
+* no fingerprint has been stored for it before;
+* any of its fingerprint values are unavailable;
+* sysUpTime indicates that the device has restarted since the last run; or
+* it has already been skipped ``full_run_every - 1`` times in a row.
+
+The shadow classes listed in a skipped plugin's ``FINGERPRINT_SHADOWS``
+attribute are discarded from the job before it is saved, so that their storage
+managers won't mistake the absence of data for data that has disappeared from
+the device.
+
+Fingerprints are stored in the NetboxInfo table, using the ``fingerprint``
+key and the plugin name as the variable name.
+
+"""
+import json
+import time
+
+from twisted.internet import defer
+
+from nav.ipdevpoll import db, shadows
+from nav.ipdevpoll.config import JOB_PREFIX
+from nav.ipdevpoll.log import ContextLogger
+from nav.ipdevpoll.snmpcache import SYSUPTIME
+from nav.mibs.snmpv2_mib import Snmpv2Mib
+from nav.models import manage
+from nav.oids import OID
+
+INFO_KEY_NAME = 'fingerprint'
+MAX_UPTIME_DEVIATION = 60  # seconds
+ENTLASTCHANGETIME = OID('.1.3.6.1.2.1.47.1.4.1.0')
+
+
+def get_full_run_every(config, job_name):
+    """Returns the configured full_run_every value of a job, or 0 if
+    fingerprinting is not enabled for the job.
+    """
+    section = JOB_PREFIX + job_name
+    if not config.has_section(section):
+        return 0
+    return max(0, config.getint(section, 'full_run_every', fallback=0))
+
+
+class FingerprintChecker(object):
+    """Decides which of a job's plugins can be skipped, based on their
+    fingerprint OIDs.
+
+    :param agent: The job's AgentProxy.
+    :param containers: The job's ContainerRepository.
+    :param full_run_every: Every plugin is run at least every this many runs.
+    """
+
+    _logger = ContextLogger()
+
+    def __init__(self, agent, containers, full_run_every):
+        # pylint: disable=W0104
+        self._logger
+        self.agent = agent
+        self.containers = containers
+        self.full_run_every = full_run_every
+        self.collected = {}
+        self.loaded = {}
+
+    @defer.inlineCallbacks
+    def get_unchanged(self, plugins):
+        """Finds the plugins whose fingerprints are unchanged since the last
+        run, and stores the new fingerprints of all fingerprinted plugins.
+
+        :param plugins: A list of plugin classes.
+        :returns: A deferred whose result is the list of plugin classes that
+                  can be skipped.
+        """
+        fingerprinted = [cls for cls in plugins if cls.FINGERPRINT_OIDS]
+        if not fingerprinted or self.full_run_every < 1:
+            defer.returnValue([])
+
+        self.collected = yield self.collect(fingerprinted)
+        self.loaded = yield db.run_in_thread(
+            self._load, [_get_name(cls) for cls in fingerprinted]
+        )
+
+        unchanged = []
+        for cls in fingerprinted:
+            name = _get_name(cls)
+            skipped = self._get_skip_count(name, cls.FINGERPRINT_OIDS)
+            if skipped is None:
+                self._save(name, cls.FINGERPRINT_OIDS, 0)
+            else:
+                self._save(name, cls.FINGERPRINT_OIDS, skipped + 1)
+                unchanged.append(cls)
+        defer.returnValue(unchanged)
+
+    @defer.inlineCallbacks
+    def collect(self, plugins):
+        """Collects sysUpTime and the fingerprint OIDs of plugins in a single
+        request.
+
+        :returns: A deferred whose result is a dict of {OID string: value},
+                  including a timestamp under the ``None`` key.
+        """
+        oids = sorted(
+            set(str(OID(oid)) for cls in plugins for oid in cls.FINGERPRINT_OIDS)
+            | {str(SYSUPTIME)}
+        )
+        timestamp = time.time()
+        result = yield self.agent.get(oids)
+        collected = {None: timestamp}
+        for oid in oids:
+            collected[oid] = _normalize(result.get(oid, result.get(OID(oid))))
+        defer.returnValue(collected)
+
+    def _get_skip_count(self, name, oids):
+        """Returns the number of consecutive times a plugin has been skipped if
+        it can be skipped this time, or None if it must run.
+        """
+        loaded = self.loaded.get(name)
+        if not loaded:
+            self._logger.debug("%s: no previous fingerprint found", name)
+            return None
+
+        values = [self.collected[str(OID(oid))] for oid in oids]
+        if None in values:
+            self._logger.debug("%s: fingerprint is incomplete: %r", name, values)
+            return None
+        if values != loaded.get('values'):
+            self._logger.debug(
+                "%s: fingerprint has changed: %r / %r",
+                name,
+                loaded.get('values'),
+                values,
+            )
+            return None
+
+        deviation = Snmpv2Mib.get_uptime_deviation(
+            tuple(loaded.get('uptime') or (None, None)), self._get_uptime()
+        )
+        if deviation is None or abs(deviation) > MAX_UPTIME_DEVIATION:
+            self._logger.debug("%s: sysUpTime deviation, possible reboot", name)
+            return None
+
+        skipped = loaded.get('skipped', 0)
+        if skipped + 1 >= self.full_run_every:
+            self._logger.debug("%s: forcing a full run", name)
+            return None
+        return skipped
+
+    def _get_uptime(self):
+        return self.collected[None], self.collected[str(SYSUPTIME)]
+
+    def _load(self, names):
+        infos = manage.NetboxInfo.objects.filter(
+            netbox__id=self._get_netbox().id, key=INFO_KEY_NAME, variable__in=names
+        )
+        loaded = {}
+        for info in infos:
+            try:
+                loaded[info.variable] = json.loads(info.value)
+            except ValueError:
+                continue
+        return loaded
+
+    def _save(self, name, oids, skipped):
+        info = self.containers.factory((INFO_KEY_NAME, name), shadows.NetboxInfo)
+        info.netbox = self._get_netbox()
+        info.key = INFO_KEY_NAME
+        info.variable = name
+        info.value = json.dumps(
+            dict(
+                uptime=self._get_uptime(),
+                values=[self.collected[str(OID(oid))] for oid in oids],
+                skipped=skipped,
+            )
+        )
+
+    def _get_netbox(self):
+        return self.containers.factory(None, shadows.Netbox)
+
+
+def _get_name(plugin):
+    return getattr(plugin, 'alias', plugin.__name__)
+
+
+def _normalize(value):
+    """Makes a collected fingerprint value JSON serializable"""
+    if isinstance(value, bytes):
+        return value.hex()
+    return value
@@ -0,0 +1,270 @@
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.  You should have received a copy of the GNU General Public
+# License along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""Fork-based worker startup for ipdevpoll's multiprocess mode.
+
+In the default *spawn* startup mode, every worker process is a new ipdevpolld
+program instance, which must import Django, all the plugins and their MIB
+modules, before it can do any work. This is repeated every time a worker is
+recycled, and none of the imported state is shared between workers.
+
+In the *fork* startup mode, the master process forks a *fork server* before it
+starts its reactor. The fork server preloads the configured MIB modules,
+freezes the garbage collector's view of everything loaded so far, and then
+waits for the master to ask for new workers. Every worker is forked from the
+fork server, and so starts out with everything already imported, sharing the
+memory pages of the fork server copy-on-write.
+
+The master and a forked worker talk AMP over a UNIX socket pair, one end of
+which is passed to the fork server with each request, to become the stdin and
+stdout of the new worker.
+
+The fork server never runs the Twisted reactor it inherits from the master.
+Each forked worker gives its copy of the never-run reactor a private epoll
+instance and waker before using it, see :py:func:`reinitialize_reactor`.
+
+"""
+import array
+import gc
+import logging
+import os
+import signal
+import socket
+import struct
+
+_logger = logging.getLogger(__name__)
+
+STARTUP_SPAWN = 'spawn'
+STARTUP_FORK = 'fork'
+PID_FORMAT = '!i'
+
+
+class ForkServerError(Exception):
+    """Signals a failure to communicate with the fork server"""
+
+
+def get_startup_mode(config=None):
+    """Returns the configured worker startup mode"""
+    if config is None:
+        from nav.ipdevpoll.config import ipdevpoll_conf as config
+
+    mode = config.get('multiprocess', 'startup', fallback=STARTUP_SPAWN).strip()
+    if mode not in (STARTUP_SPAWN, STARTUP_FORK):
+        _logger.warning(
+            "unknown worker startup mode %r, using %r instead", mode, STARTUP_SPAWN
+        )
+        mode = STARTUP_SPAWN
+    return mode
+
+
+def preload(config=None):
+    """Loads the MIBs listed in the preload_mibs option, so that they can be
+    shared by all forked workers, and freezes all objects loaded so far.
+
+    Plugins (and the MIB retriever classes they use) are expected to have been
+    imported already.
+    """
+    if config is None:
+        from nav.ipdevpoll.config import ipdevpoll_conf as config
+    from nav.mibs.mibretriever import MibRetrieverMaker
+
+    names = config.get('multiprocess', 'preload_mibs', fallback='').split()
+    for name in names:
+        retriever = MibRetrieverMaker.modules.get(name)
+        if retriever:
+            retriever.load_mib()
+        else:
+            _logger.warning("cannot preload unknown MIB %s", name)
+
+    # keep the garbage collector from touching (and thereby un-sharing) the
+    # memory pages of everything loaded so far
+    gc.collect()
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+
+
+class ForkServer(object):
+    """Forks ipdevpoll worker processes from a preloaded template process.
+
+    :param worker_main: A callable that runs a worker in a newly forked
+                        process. It is called after the worker's stdin and
+                        stdout have been connected to the master, and after
+                        the reactor has been reinitialized.
+    """
+
+    def __init__(self, worker_main):
+        self.worker_main = worker_main
+        self.pid = None
+        self._control = None
+
+    def __repr__(self):
+        return "<ForkServer pid=%r alive=%r>" % (self.pid, self.is_alive())
+
+    def is_alive(self):
+        """Returns True if the fork server is believed to be running"""
+        return self._control is not None
+
+    def start(self):
+        """Forks the fork server process.
+
+        This must be done before the master process' reactor is started.
+        """
+        _close_django_connections()
+        ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        pid = os.fork()
+        if pid == 0:
+            ours.close()
+            status = 0
+            try:
+                self._serve(theirs)
+            except Exception:  # pylint: disable=broad-except
+                _logger.exception("fork server failed")
+                status = 1
+            finally:
+                os._exit(status)
+
+        theirs.close()
+        self._control = ours
+        self.pid = pid
+        _logger.info("started worker fork server with pid %s", pid)
+
+    def stop(self):
+        """Tells the fork server to exit, by closing the control connection"""
+        if self._control:
+            self._control.close()
+            self._control = None
+
+    def spawn(self):
+        """Forks a new worker process.
+
+        :returns: A tuple of (pid, socket), where socket is connected to the
+                  stdin and stdout of the new worker.
+        :raises ForkServerError: if the fork server did not respond properly.
+        """
+        if not self.is_alive():
+            raise ForkServerError("fork server is not running")
+        ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            fds = array.array('i', [theirs.fileno()])
+            self._control.sendmsg(
+                [b'F'], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, fds.tobytes())]
+            )
+            response = _receive_exactly(self._control, struct.calcsize(PID_FORMAT))
+        except (OSError, EOFError) as error:
+            ours.close()
+            self.stop()
+            raise ForkServerError("fork server failed: %s" % error)
+        finally:
+            theirs.close()
+
+        (pid,) = struct.unpack(PID_FORMAT, response)
+        if pid <= 0:
+            ours.close()
+            raise ForkServerError("fork server could not fork a worker")
+        return pid, ours
+
+    def _serve(self, control):
+        """Runs the fork server loop until the master goes away"""
+        # forked workers are reaped automatically
+        signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        preload()
+
+        fd_size = array.array('i').itemsize
+        while True:
+            message, ancdata, _flags, _addr = control.recvmsg(
+                1, socket.CMSG_LEN(fd_size)
+            )
+            if not message:
+                return  # the master has gone away
+
+            fds = array.array('i')
+            for level, kind, data in ancdata:
+                if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+                    fds.frombytes(data[: len(data) - (len(data) % fd_size)])
+            if not fds:
+                control.sendall(struct.pack(PID_FORMAT, -1))
+                continue
+
+            try:
+                pid = os.fork()
+            except OSError:
+                _logger.exception("could not fork a worker")
+                pid = -1
+            if pid == 0:
+                control.close()
+                self._become_worker(fds[0])
+            for fd in fds:
+                os.close(fd)
+            control.sendall(struct.pack(PID_FORMAT, pid))
+
+    def _become_worker(self, fd):
+        """Runs a worker process connected to the master through fd"""
+        status = 0
+        try:
+            for signum in (signal.SIGCHLD, signal.SIGHUP, signal.SIGINT):
+                signal.signal(signum, signal.SIG_DFL)
+            os.dup2(fd, 0)
+            os.dup2(fd, 1)
+            os.close(fd)
+            reinitialize_reactor()
+            self.worker_main()
+        except Exception:  # pylint: disable=broad-except
+            _logger.exception("forked worker failed")
+            status = 1
+        finally:
+            os._exit(status)
+
+
+def reinitialize_reactor(reactor=None):
+    """Gives the never-run Twisted reactor inherited by a forked process an epoll
+    instance and a waker of its own.
+
+    The inherited epoll instance is shared with the process that created the
+    reactor, so it must not be used by the forked process.
+    """
+    if reactor is None:
+        from twisted.internet import reactor
+
+    if reactor.running or reactor._startedBefore:
+        raise RuntimeError("cannot reinitialize a reactor that has been run")
+    waker = reactor.waker
+    poller = getattr(reactor, '_poller', None)
+    reactor.__init__()
+    if waker is not None:
+        waker.connectionLost(None)
+    if poller is not None and hasattr(poller, 'close'):
+        poller.close()
+
+
+def _receive_exactly(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise EOFError("connection closed")
+        data += chunk
+    return data
+
+
+def _close_django_connections():
+    """Closes the database connections of this process, so that none are
+    inherited by forked processes.
+    """
+    from django.db import connections
+
+    connections.close_all()
@@ -17,10 +17,12 @@
 """Job handling."""
 import time
 import datetime
+import json
 import pprint
 import logging
 import threading
 import gc
+from contextlib import nullcontext
 from itertools import cycle
 
 from twisted.internet import defer, reactor
@@ -35,7 +37,7 @@ from nav.models import manage
 from nav.util import splitby
 from nav.ipdevpoll import db
 from .plugins import plugin_registry
-from . import storage, shadows, dataloader
+from . import storage, shadows, dataloader, profiling, snmpcache, fingerprint
 from .utils import log_unhandled_failure
 
 _logger = logging.getLogger(__name__)
@@ -80,6 +82,8 @@ class JobHandler(object):
     _logger = ContextLogger()
     _queue_logger = ContextLogger(suffix='queue')
     _timing_logger = ContextLogger(suffix='timings')
+    _profile_logger = ContextLogger(suffix='profile')
+    _cache_logger = ContextLogger(suffix='snmpcache')
     _start_time = datetime.datetime.min
 
     def __init__(self, name, netbox, plugins=None, interval=None):
@@ -90,11 +94,14 @@ class JobHandler(object):
         self.interval = interval
 
         self.plugins = plugins or []
+        self.skipped_plugins = []
+        self.forced_plugins = []
         self._log_context = {}
         self.containers = storage.ContainerRepository()
         self.storage_queue = []
 
         self.agent = None
+        self.profile = None
 
     def _create_agentproxy(self):
         if self.agent:
@@ -111,6 +118,9 @@ class JobHandler(object):
             protocol=port.protocol,
             snmp_parameters=self.netbox.snmp_parameters,
         )
+        self.agent.profile = self.profile
+        self.agent.netbox_id = self.netbox.id
+        self.agent.response_cache = snmpcache.get_response_cache()
         try:
             self.agent.open()
         except SnmpError as error:
@@ -133,6 +143,11 @@ class JobHandler(object):
         if self.agent:
             self._logger.debug("Destroying agentproxy", self.agent)
             self.agent.close()
+            stats = self.agent.response_cache_stats
+            if stats:
+                self._cache_logger.info(
+                    "SNMP response cache: %d hits, %d misses", stats.hits, stats.misses
+                )
         self.agent = None
 
     @defer.inlineCallbacks
@@ -142,6 +157,7 @@ class JobHandler(object):
 
         plugin_classes = [plugin_registry[name] for name in self._get_valid_plugins()]
         willing_plugins = yield self._get_willing_plugins(plugin_classes)
+        willing_plugins = yield self._skip_unchanged_plugins(willing_plugins)
 
         plugins = [
             cls(
@@ -152,6 +168,8 @@ class JobHandler(object):
             )
             for cls in willing_plugins
         ]
+        for plugin in plugins:
+            plugin.forced_run = type(plugin) in self.forced_plugins
 
         if not plugins:
             defer.returnValue(None)
@@ -204,6 +222,46 @@ class JobHandler(object):
 
         defer.returnValue(willing_plugins)
 
+    @defer.inlineCallbacks
+    def _skip_unchanged_plugins(self, plugin_classes):
+        """Removes the plugins whose fingerprints are unchanged since the last
+        run of this job from plugin_classes, if the job is configured for it.
+        """
+        from nav.ipdevpoll.config import ipdevpoll_conf
+
+        full_run_every = fingerprint.get_full_run_every(ipdevpoll_conf, self.name)
+        if not full_run_every or not self.agent:
+            defer.returnValue(plugin_classes)
+
+        checker = fingerprint.FingerprintChecker(
+            self.agent, self.containers, full_run_every
+        )
+        try:
+            unchanged = yield checker.get_unchanged(plugin_classes)
+        except db.ResetDBConnectionError:
+            raise
+        # Failing to collect fingerprints is no reason to abort the job, we just
+        # need to run every plugin
+        # pylint: disable = broad-except
+        except Exception as error:
+            self._logger.debug(
+                "could not check fingerprints, running all plugins: %s", error
+            )
+            defer.returnValue(plugin_classes)
+
+        if unchanged:
+            self._logger.debug(
+                "skipping plugins with unchanged fingerprints: %r",
+                [cls.__name__ for cls in unchanged],
+            )
+        self.skipped_plugins = unchanged
+        self.forced_plugins = [
+            cls
+            for cls in plugin_classes
+            if cls.FINGERPRINT_OIDS and cls not in unchanged
+        ]
+        defer.returnValue([cls for cls in plugin_classes if cls not in unchanged])
+
     def _iterate_plugins(self, plugins):
         """Iterates plugins."""
         plugins = iter(plugins)
@@ -243,7 +301,7 @@ class JobHandler(object):
             self._logger.debug("Now calling plugin: %s", plugin_instance)
             self._start_plugin_timer(plugin_instance)
 
-            df = defer.maybeDeferred(plugin_instance.handle)
+            df = self._call_profiled(defer.maybeDeferred, plugin_instance.handle)
             df.addErrback(self._stop_plugin_timer)
             df.addErrback(log_plugin_failure, plugin_instance)
             df.addCallback(self._stop_plugin_timer)
@@ -261,6 +319,9 @@ class JobHandler(object):
                   plugins ran).
 
         """
+        if profiling.is_enabled():
+            self.profile = profiling.JobProfile()
+            profiling.set_current_profile(self.profile)
         self.netbox = yield db.run_in_thread(dataloader.load_netbox, self.netbox_id)
         self._log_context.update(dict(job=self.name, sysname=self.netbox.sysname))
         self._logger.debug(
@@ -277,7 +338,7 @@ class JobHandler(object):
         self._create_agentproxy()
         plugins = yield self._find_plugins()
         self._reset_timers()
-        if not plugins:
+        if not plugins and not self.skipped_plugins:
             self._destroy_agentproxy()
             defer.returnValue(False)
 
@@ -322,7 +383,7 @@ class JobHandler(object):
             if self.cancelled.is_set():
                 return wrap_up_job(result)
 
-            df = self._save_container()
+            df = self._call_profiled(self._save_container)
             df.addErrback(save_failure)
             df.addCallback(wrap_up_job)
             return df
@@ -347,7 +408,7 @@ class JobHandler(object):
             return result
 
         # The action begins here
-        df = self._iterate_plugins(plugins)
+        df = self._iterate_plugins(plugins or [])
         df.addErrback(plugin_failure)
         df.addCallback(save)
         df.addErrback(log_abort)
@@ -372,12 +433,49 @@ class JobHandler(object):
         now = datetime.datetime.now()
         timings = [plugin.__class__.__name__, now, now]
         self._plugin_times.append(timings)
+        if self.profile:
+            alias = getattr(plugin, "alias", plugin.__class__.__name__)
+            self.profile.set_stage("plugin." + alias)
 
     def _stop_plugin_timer(self, result=None):
         timings = self._plugin_times[-1]
         timings[-1] = datetime.datetime.now()
+        if self.profile:
+            self.profile.set_stage()
         return result
 
+    def _call_profiled(self, func, *args, **kwargs):
+        """Calls func, making this job's profile (if any) the current one"""
+        if self.profile:
+            return self.profile.run(func, *args, **kwargs)
+        return func(*args, **kwargs)
+
+    def _profile_storage(self, manager):
+        """Returns a context manager that attributes everything within it to
+        the storage manager stage of this job's profile (if any).
+        """
+        if self.profile:
+            return self.profile.in_stage("storage." + manager.cls.__name__)
+        return nullcontext()
+
+    def _log_profile(self, timestamp, duration):
+        """Logs this job's profile as JSON and sends it to Graphite"""
+        stages = self.profile.as_dict()
+        self._profile_logger.info(
+            "%s",
+            json.dumps(
+                dict(
+                    job=self.name,
+                    sysname=self.netbox.sysname,
+                    netboxid=self.netbox.id,
+                    runtime=duration,
+                    stages=stages,
+                )
+            ),
+        )
+        prefix = metric_prefix_for_ipdevpoll_job(self.netbox.sysname, self.name)
+        send_metrics(self.profile.get_metrics(prefix, timestamp))
+
     def _log_timings(self):
         stop_time = datetime.datetime.now()
         job_total = stop_time - self._start_time
@@ -417,6 +515,8 @@ class JobHandler(object):
 
         @db.cleanup_django_debug_after
         def complete_save_cycle():
+            # Leave the data of skipped plugins alone
+            self._discard_skipped_containers()
             # Traverse all the classes in the container repository and
             # generate the storage queue
             self._populate_storage_queue()
@@ -431,11 +531,25 @@ class JobHandler(object):
         df = db.run_in_thread(complete_save_cycle)
         return df
 
+    def _discard_skipped_containers(self):
+        """Discards any containers of the shadow classes owned by skipped
+        plugins, as they would be incomplete.
+        """
+        for plugin in self.skipped_plugins:
+            for shadow_class in plugin.FINGERPRINT_SHADOWS:
+                if self.containers.pop(shadow_class, None):
+                    self._logger.debug(
+                        "discarded %s containers owned by skipped plugin %s",
+                        shadow_class.__name__,
+                        plugin.__name__,
+                    )
+
     def _prepare_containers_for_save(self):
         """Runs every queued manager's prepare routine"""
         for manager in self.storage_queue:
             self._raise_if_cancelled()
-            manager.prepare()
+            with self._profile_storage(manager):
+                manager.prepare()
 
     def _cleanup_containers_after_save(self):
         """Runs every queued manager's cleanup routine"""
@@ -447,7 +561,8 @@ class JobHandler(object):
         try:
             for manager in self.storage_queue:
                 self._raise_if_cancelled()
-                manager.cleanup()
+                with self._profile_storage(manager):
+                    manager.cleanup()
         except AbortedJobError:
             raise
         except Exception:
@@ -473,7 +588,8 @@ class JobHandler(object):
 
             for manager in self.storage_queue:
                 self._raise_if_cancelled()
-                manager.save()
+                with self._profile_storage(manager):
+                    manager.save()
 
             end_time = time.time()
             total_time = (end_time - start_time) * 1000.0
@@ -572,6 +688,8 @@ class JobHandler(object):
             send_metrics([runtime])
 
         _log_to_graphite()
+        if self.profile:
+            self._log_profile(timestamp, duration_in_seconds)
         try:
             yield db.run_in_thread(_create_record, timestamp)
         except db.ResetDBConnectionError:
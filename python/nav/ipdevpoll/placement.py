@@ -0,0 +1,214 @@
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.  You should have received a copy of the GNU General Public
+# License along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""Job placement policies for the ipdevpoll worker pool.
+
+A placement policy decides which of the ready worker processes of a
+:py:class:`nav.ipdevpoll.pool.WorkerPool` should run a given job:
+
+least-active
+  The worker with the fewest active jobs (the traditional behavior).
+
+least-runtime
+  The worker with the least outstanding runtime, i.e. the sum of the expected
+  remaining runtimes of its active jobs. Expected runtimes are learned from
+  previously completed runs of the same job for the same netbox.
+
+affinity
+  Each netbox is mapped to a preferred worker slot using a consistent hash
+  ring, so that the same netbox keeps being polled by the same worker process
+  (and the worker's caches stay warm), and so that only a minimal share of
+  netboxes move when workers come and go. If the preferred worker isn't ready
+  (e.g. because it is being recycled), the next worker on the ring is used. If
+  a worker is much busier than the average, jobs fall back to least-runtime
+  placement.
+
+Workers are identified to the affinity policy by their *slot* number, which is
+inherited by the replacement of a recycled worker.
+
+"""
+import bisect
+import hashlib
+import time
+
+LEAST_ACTIVE = 'least-active'
+LEAST_RUNTIME = 'least-runtime'
+AFFINITY = 'affinity'
+
+DEFAULT_RUNTIME = 10.0  # seconds, assumed for jobs that have never completed
+RUNTIME_SMOOTHING = 0.3
+VIRTUAL_NODES = 64
+
+
+class RuntimeEstimator(object):
+    """Keeps running estimates of job runtimes per job/netbox combination"""
+
+    def __init__(self, smoothing=RUNTIME_SMOOTHING, default=DEFAULT_RUNTIME):
+        self.smoothing = smoothing
+        self.default = default
+        self._runtimes = {}
+        self._job_runtimes = {}
+
+    def record(self, job, netbox, runtime):
+        """Records the runtime of a completed job"""
+        self._runtimes[(job, netbox)] = self._smooth(
+            self._runtimes.get((job, netbox)), runtime
+        )
+        self._job_runtimes[job] = self._smooth(self._job_runtimes.get(job), runtime)
+
+    def _smooth(self, current, runtime):
+        if current is None:
+            return runtime
+        return current + self.smoothing * (runtime - current)
+
+    def estimate(self, job, netbox):
+        """Returns the expected runtime of a job for a netbox.
+
+        Falls back to the expected runtime of the job in general, if this
+        netbox has not been seen before.
+        """
+        try:
+            return self._runtimes[(job, netbox)]
+        except KeyError:
+            return self._job_runtimes.get(job, self.default)
+
+
+def get_outstanding_runtime(worker, now=None):
+    """Returns the sum of the expected remaining runtimes of a worker's active
+    jobs.
+
+    A job that has already run for longer than expected is assumed to be
+    almost done, but is still counted with a nominal second.
+    """
+    now = now or time.time()
+    return sum(
+        max(expected - (now - started), 1.0)
+        for started, expected in worker.expected_runtimes.values()
+    )
+
+
+class LeastActivePolicy(object):
+    """Places jobs on the worker with the fewest active jobs"""
+
+    name = LEAST_ACTIVE
+
+    def __init__(self, **_kwargs):
+        self.stats = {}
+
+    # pylint: disable=unused-argument
+    def choose(self, workers, job, netbox):
+        """Chooses a worker from a list of ready workers"""
+        return min(workers, key=lambda w: w.active_jobs)
+
+
+class LeastRuntimePolicy(object):
+    """Places jobs on the worker with the least outstanding runtime"""
+
+    name = LEAST_RUNTIME
+
+    def __init__(self, **_kwargs):
+        self.stats = {}
+
+    # pylint: disable=unused-argument
+    def choose(self, workers, job, netbox):
+        """Chooses a worker from a list of ready workers"""
+        now = time.time()
+        return min(
+            workers, key=lambda w: (get_outstanding_runtime(w, now), w.active_jobs)
+        )
+
+
+class AffinityPolicy(object):
+    """Places jobs on a netbox' preferred worker, according to a consistent
+    hash ring of worker slots.
+    """
+
+    name = AFFINITY
+
+    def __init__(self, slots=1, max_imbalance=2.0, **_kwargs):
+        self.max_imbalance = max_imbalance
+        self.fallback = LeastRuntimePolicy()
+        self.stats = dict(preferred=0, rehashed=0, overloaded=0)
+        self._ring = []
+        self._ring_slots = []
+        self.set_slots(slots)
+
+    def set_slots(self, slots):
+        """Builds the hash ring for a number of worker slots"""
+        ring = sorted(
+            (_hash("slot-{}-{}".format(slot, node)), slot)
+            for slot in range(slots)
+            for node in range(VIRTUAL_NODES)
+        )
+        self._ring = [point for point, _slot in ring]
+        self._ring_slots = [slot for _point, slot in ring]
+
+    def get_slots(self, netbox):
+        """Returns the worker slots in order of preference for a netbox"""
+        start = bisect.bisect(self._ring, _hash("netbox-{}".format(netbox)))
+        seen = []
+        for index in range(len(self._ring_slots)):
+            slot = self._ring_slots[(start + index) % len(self._ring_slots)]
+            if slot not in seen:
+                seen.append(slot)
+        return seen
+
+    def choose(self, workers, job, netbox):
+        """Chooses a worker from a list of ready workers"""
+        by_slot = {worker.slot: worker for worker in workers}
+        preferred = self.get_slots(netbox)
+        candidates = [by_slot[slot] for slot in preferred if slot in by_slot]
+        if not candidates:
+            return self.fallback.choose(workers, job, netbox)
+
+        worker = candidates[0]
+        if self._is_overloaded(worker, workers):
+            self.stats['overloaded'] += 1
+            return self.fallback.choose(workers, job, netbox)
+
+        if worker.slot == preferred[0]:
+            self.stats['preferred'] += 1
+        else:
+            self.stats['rehashed'] += 1
+        return worker
+
+    def _is_overloaded(self, worker, workers):
+        average = sum(w.active_jobs for w in workers) / len(workers)
+        return worker.active_jobs >= max(1.0, average * self.max_imbalance)
+
+
+POLICIES = {
+    policy.name: policy
+    for policy in (LeastActivePolicy, LeastRuntimePolicy, AffinityPolicy)
+}
+
+
+def get_policy(name, **kwargs):
+    """Returns a placement policy instance by name.
+
+    :raises ValueError: if there is no policy by that name.
+    """
+    try:
+        return POLICIES[name](**kwargs)
+    except KeyError:
+        raise ValueError(
+            "Unknown placement policy {!r}, must be one of {}".format(
+                name, ", ".join(sorted(POLICIES))
+            )
+        )
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
@@ -35,7 +35,6 @@ the name for historical reasons.
 
 """
 
-import operator
 from datetime import datetime, timedelta
 
 from IPy import IP
@@ -43,6 +42,7 @@ from twisted.internet import defer
 
 from nav.enterprise.ids import VENDOR_ID_ARISTA_NETWORKS_INC_FORMERLY_ARASTRA_INC
 from nav.ipdevpoll.utils import get_arista_vrf_instances
+from nav.iptrie import PrefixTrie
 from nav.mibs.ip_mib import IpMib, MultiIpMib
 from nav.mibs.ipv6_mib import Ipv6Mib
 from nav.mibs.cisco_ietf_ip_mib import CiscoIetfIpMib
@@ -57,7 +57,7 @@ INCOMPLETE_MAC = '00:00:00:00:00:00'
 class Arp(Plugin):
     """Collects ARP records for IPv4 devices and NDP cache for IPv6 devices."""
 
-    prefix_cache = []  # prefix cache, should be sorted by descending mask length
+    prefix_cache = PrefixTrie()  # maps all known prefixes to their IDs
     prefix_cache_update_time = datetime.min
     prefix_cache_max_age = timedelta(minutes=5)
 
@@ -133,6 +133,10 @@ class Arp(Plugin):
         if stripped:
             self._logger.debug("stripped %d incomplete mappings", stripped)
 
+        if self.config.getboolean('arp', 'bulk_reconcile'):
+            self._store_found_mappings(found_mappings)
+            return
+
         # Get open mappings from database to compare with
         open_mappings = yield self._load_existing_mappings()
 
@@ -188,11 +192,8 @@ class Arp(Plugin):
     def _update_prefix_cache_with_result(cls, prefixes):
         cls._logger.debug("Populating prefix cache with %d prefixes", len(prefixes))
 
-        prefixes = [(IP(p['net_address']), p['id']) for p in prefixes]
-        prefixes.sort(key=operator.itemgetter(1), reverse=True)
-
-        del cls.prefix_cache[:]
-        cls.prefix_cache.extend(prefixes)
+        cls.prefix_cache.clear()
+        cls.prefix_cache.update((IP(p['net_address']), p['id']) for p in prefixes)
 
     def _make_new_mappings(self, mappings):
         """Convert a sequence of (ip, mac) tuples into a Arp shadow containers.
@@ -218,6 +219,28 @@ class Arp(Plugin):
             arp.start_time = timestamp
             arp.end_time = infinity
 
+    def _store_found_mappings(self, mappings):
+        """Convert a sequence of (ip, mac) tuples into ArpMapping containers,
+        to be reconciled with the open arp records in bulk.
+
+        Arguments:
+
+          mappings -- An iterable containing tuples: (ip, mac)
+
+        """
+        self.containers.factory(None, shadows.Netbox)
+        for ip, mac in mappings:
+            if not ip or not mac:
+                continue  # Some devices seem to return empty results!
+            self.containers.factory(
+                (ip, mac),
+                shadows.ArpMapping,
+                ip,
+                mac,
+                self._find_largest_matching_prefix(ip),
+            )
+        shadows.ArpMapping.manager.add_sentinel(self.containers)
+
     def _expire_arp_records(self, arp_ids):
         """Create containers to force expiry of a set of Arp records.
 
@@ -240,9 +263,7 @@ class Arp(Plugin):
 
           An integer prefix ID, or None if no matches were found.
         """
-        for prefix_addr, prefix_id in self.prefix_cache:
-            if ip in prefix_addr:
-                return prefix_id
+        return self.prefix_cache.lookup(ip)
 
 
 def ipv6_address_in_mappings(mappings):
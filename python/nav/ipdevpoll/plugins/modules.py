@@ -33,6 +33,7 @@ from twisted.internet import defer
 
 from nav.mibs.entity_mib import EntityMib, EntityTable
 from nav.ipdevpoll import Plugin, shadows
+from nav.ipdevpoll.fingerprint import ENTLASTCHANGETIME
 from nav.ipdevpoll.timestamps import TimestampChecker
 
 INFO_VAR_NAME = 'modules'
@@ -41,6 +42,9 @@ INFO_VAR_NAME = 'modules'
 class Modules(Plugin):
     """Plugin to collect module data from devices"""
 
+    FINGERPRINT_OIDS = (ENTLASTCHANGETIME,)
+    FINGERPRINT_SHADOWS = (shadows.Module,)
+
     def __init__(self, *args, **kwargs):
         super(Modules, self).__init__(*args, **kwargs)
         self.alias_mapping = {}
@@ -57,7 +61,7 @@ class Modules(Plugin):
     def handle(self):
         self._logger.debug("Collecting ENTITY-MIB module data")
         need_to_collect = yield self._need_to_collect()
-        if need_to_collect:
+        if need_to_collect or self.forced_run:
             physical_table = yield self.entitymib.get_entity_physical_table()
 
             self.alias_mapping = yield self.entitymib.get_alias_mapping()
@@ -22,7 +22,7 @@ from twisted.internet import defer
 from nav.ipdevpoll import Plugin
 from nav.ipdevpoll import db
 from nav.metrics.carbon import send_metrics
-from nav.metrics.templates import metric_path_for_interface
+from nav.metrics.templates import metric_prefix_for_interface
 from nav.mibs import reduce_index
 from nav.mibs.if_mib import IfMib
 from nav.mibs.ip_mib import IpMib
@@ -113,17 +113,18 @@ class StatPorts(Plugin):
 
         for row in stats.values():
             hc_counters = use_hc_counters(row) or hc_counters
-            for key in LOGGED_COUNTERS:
-                if key not in row:
-                    continue
-                value = row[key]
-                if value is not None:
-                    for netbox in netboxes:
-                        # duplicate metrics for all involved netboxes
-                        path = metric_path_for_interface(
-                            netbox, row['ifName'] or row['ifDescr'], key
-                        )
-                        yield (path, (timestamp, value))
+            counters = [
+                (key, row[key]) for key in LOGGED_COUNTERS if row.get(key) is not None
+            ]
+            if not counters:
+                continue
+            ifname = row['ifName'] or row['ifDescr']
+            for netbox in netboxes:
+                # duplicate metrics for all involved netboxes, escaping the
+                # interface path only once per netbox
+                prefix = metric_prefix_for_interface(netbox, ifname)
+                for key, value in counters:
+                    yield (prefix + "." + key, (timestamp, value))
 
         if stats:
             if hc_counters:
@@ -20,8 +20,11 @@ from __future__ import print_function
 import datetime
 import os
 import signal
+import socket
 import sys
 import logging
+import time
+from collections import namedtuple
 
 from twisted.protocols import amp
 from twisted.internet import reactor, protocol
@@ -30,7 +33,12 @@ from twisted.internet.endpoints import ProcessEndpoint, StandardIOEndpoint
 import twisted.internet.endpoints
 
 from nav.ipdevpoll.config import ipdevpoll_conf
-from . import control, jobs
+from nav.metrics.carbon import send_metrics
+from nav.metrics.templates import metric_prefix_for_ipdevpoll_workerpool
+from . import control, forkserver, jobs, placement
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+STATS_INTERVAL = 60  # seconds
 
 
 def initialize_worker():
@@ -134,6 +142,8 @@ class JobHandler(amp.CommandLocator):
     def shutdown(self):
         """Shuts down the worker process"""
         self.done = True
+        if not self.jobs:
+            reactor.callLater(3, reactor.stop)
         return {}
 
     # pylint: disable=no-self-use
@@ -222,15 +232,20 @@ class Worker(object):
 
     _logger = logging.getLogger(__name__ + '.worker')
 
-    def __init__(self, pool, threadpoolsize, max_jobs):
+    def __init__(self, pool, threadpoolsize, max_jobs, slot=0, fork_server=None):
         self._pid = None
         self.process = None
         self.active_jobs = 0
         self.total_jobs = 0
         self.max_concurrent_jobs = 0
+        self.expected_runtimes = {}
         self.pool = pool
         self.threadpoolsize = threadpoolsize
         self.max_jobs = max_jobs
+        self.slot = slot
+        self.fork_server = fork_server
+        self.rss = None
+        self.retired = False
         self.started_at = None
         self._ping_loop = twisted.internet.task.LoopingCall(
             self._euthanize_unresponsive_worker,
@@ -239,29 +254,41 @@ class Worker(object):
 
     def __repr__(self):
         return (
-            "<Worker pid={pid} ready={ready} active={active} max={max} "
-            "total={total} started_at={started_at}>"
+            "<Worker pid={pid} slot={slot} ready={ready} active={active} max={max} "
+            "total={total} outstanding={outstanding:.1f}s rss={rss} "
+            "started_at={started_at}>"
         ).format(
             pid=self.pid,
+            slot=self.slot,
             ready=not self.done(),
             active=self.active_jobs,
             max=self.max_concurrent_jobs,
             total=self.total_jobs,
+            outstanding=placement.get_outstanding_runtime(self),
+            rss="%dMiB" % (self.rss // 2**20) if self.rss is not None else None,
             started_at=self.started_at,
         )
 
     @inlineCallbacks
     def start(self):
         """Starts a new child worker process"""
-        args = [control.get_process_command(), '--worker', '-f', '-s', '-P']
-        if self.threadpoolsize:
-            args.append('--threadpoolsize=%d' % self.threadpoolsize)
-        endpoint = ProcessEndpoint(
-            reactor, control.get_process_command(), args, os.environ
-        )
         factory = protocol.Factory()
         factory.protocol = lambda: ProcessAMP(is_worker=False, locator=JobHandler())
-        self.process = yield endpoint.connect(factory)
+        if self.fork_server and self.fork_server.is_alive():
+            try:
+                self.process = self._fork(factory)
+            except forkserver.ForkServerError as error:
+                self._logger.warning(
+                    "Could not fork worker, spawning it instead: %s", error
+                )
+        if not self.process:
+            args = [control.get_process_command(), '--worker', '-f', '-s', '-P']
+            if self.threadpoolsize:
+                args.append('--threadpoolsize=%d' % self.threadpoolsize)
+            endpoint = ProcessEndpoint(
+                reactor, control.get_process_command(), args, os.environ
+            )
+            self.process = yield endpoint.connect(factory)
         self.process.lost_handler = self._worker_died
         self.started_at = datetime.datetime.now()
         self._logger.debug("Started new worker %r", self)
@@ -276,6 +303,24 @@ class Worker(object):
 
         returnValue(self)
 
+    def _fork(self, factory):
+        """Forks a new worker from the fork server, and returns its AMP protocol
+        instance.
+        """
+        pid, sock = self.fork_server.spawn()
+        process = factory.protocol()
+        try:
+            sock.setblocking(False)
+            reactor.adoptStreamConnection(
+                sock.fileno(),
+                socket.AF_UNIX,
+                protocol.Factory.forProtocol(lambda: process),
+            )
+        finally:
+            sock.close()
+        self._pid = pid
+        return process
+
     @property
     def pid(self):
         """Returns the PID number of the worker process, if started"""
@@ -289,7 +334,28 @@ class Worker(object):
 
     def done(self):
         """Returns True if this worker process will take no more jobs"""
-        return self.max_jobs and (self.total_jobs >= self.max_jobs)
+        return self.retired or (self.max_jobs and (self.total_jobs >= self.max_jobs))
+
+    def retire(self):
+        """Tells the worker process to exit once its active jobs are done"""
+        if self.done():
+            return
+        self.retired = True
+        self._logger.debug("Retiring worker %r", self)
+        self.process.callRemote(Shutdown)
+
+    def update_rss(self):
+        """Updates and returns the resident set size of the worker process, in
+        bytes, or None if it cannot be determined.
+        """
+        try:
+            with open("/proc/%d/statm" % self.pid) as statm:
+                pages = int(statm.read().split()[1])
+        except (OSError, TypeError, ValueError, IndexError):
+            self.rss = None
+        else:
+            self.rss = pages * PAGE_SIZE
+        return self.rss
 
     def _worker_died(self, _process, _reason):
         if self._ping_loop.running:
@@ -374,50 +440,110 @@ class Worker(object):
         return self.process.callRemote(Cancel, serial=serial)
 
 
+DispatchedJob = namedtuple("DispatchedJob", "serial worker job netbox")
+
+
 class WorkerPool(object):
     """This class represent a pool of worker processes to which jobs can
     be scheduled"""
 
     _logger = logging.getLogger(__name__ + '.workerpool')
 
-    def __init__(self, workers, max_jobs, threadpoolsize=None):
+    def __init__(
+        self,
+        workers,
+        max_jobs,
+        threadpoolsize=None,
+        policy=None,
+        max_rss=None,
+        fork_server=None,
+    ):
+        """Initializes a worker pool.
+
+        :param workers: The number of worker processes to run.
+        :param max_jobs: The number of jobs after which a worker is recycled.
+        :param threadpoolsize: The thread pool size of each worker process.
+        :param policy: The name of the job placement policy to use (see
+                       :py:mod:`nav.ipdevpoll.placement`). Read from the
+                       config file if omitted.
+        :param max_rss: The resident set size (in bytes) above which a worker
+                        is recycled. Read from the config file if omitted.
+        :param fork_server: A started :py:class:`nav.ipdevpoll.forkserver.
+                            ForkServer` to fork workers from. Workers are
+                            spawned as new processes if omitted.
+        """
         twisted.internet.endpoints.log = HackLog
         self.workers = set()
         self.target_count = workers
         self.max_jobs = max_jobs
         self.threadpoolsize = threadpoolsize
-        for _ in range(self.target_count):
-            self._spawn_worker()
+        self.fork_server = fork_server
+        if policy is None:
+            policy = ipdevpoll_conf.get(
+                "multiprocess", "placement", fallback=placement.LEAST_ACTIVE
+            )
+        self.policy = placement.get_policy(
+            policy,
+            slots=self.target_count,
+            max_imbalance=ipdevpoll_conf.getfloat(
+                "multiprocess", "affinity_max_imbalance", fallback=2.0
+            ),
+        )
+        if max_rss is None:
+            max_rss = (
+                ipdevpoll_conf.getint("multiprocess", "max_rss", fallback=0) * 2**20
+            )
+        self.max_rss = max_rss
+        self.runtimes = placement.RuntimeEstimator()
+        self.stats = dict(
+            dispatched=0, recycled_max_jobs=0, recycled_rss=0, lost_workers=0
+        )
+        for slot in range(self.target_count):
+            self._spawn_worker(slot)
         self.serial = 0
         self.jobs = dict()
+        self._stats_loop = twisted.internet.task.LoopingCall(self.check_workers)
+        self._stats_loop.start(interval=STATS_INTERVAL, now=False)
 
     def worker_died(self, worker):
         """Called to signal the death of a worker process"""
         self.workers.remove(worker)
         if not worker.done():
-            self._spawn_worker()
+            self.stats['lost_workers'] += 1
+            self._spawn_worker(worker.slot)
 
     @inlineCallbacks
-    def _spawn_worker(self):
-        worker = yield Worker(self, self.threadpoolsize, self.max_jobs).start()
+    def _spawn_worker(self, slot):
+        worker = yield Worker(
+            self, self.threadpoolsize, self.max_jobs, slot, self.fork_server
+        ).start()
         self.workers.add(worker)
 
     def _cleanup(self, result, deferred):
-        _serial, worker = self.jobs[deferred]
-        del self.jobs[deferred]
+        dispatched = self.jobs.pop(deferred)
+        worker = dispatched.worker
         worker.active_jobs -= 1
+        started, _expected = worker.expected_runtimes.pop(dispatched.serial)
+        self.runtimes.record(dispatched.job, dispatched.netbox, time.time() - started)
         return result
 
     def _execute(self, command, **kwargs):
         ready_workers = [w for w in self.workers if not w.done()]
         if not ready_workers:
             raise RuntimeError("No ready workers")
-        worker = min(ready_workers, key=lambda x: x.active_jobs)  # type: Worker
+        job, netbox = kwargs.get("job"), kwargs.get("netbox")
+        worker = self.policy.choose(ready_workers, job, netbox)  # type: Worker
         self.serial += 1
+        worker.expected_runtimes[self.serial] = (
+            time.time(),
+            self.runtimes.estimate(job, netbox),
+        )
         deferred = worker.execute(self.serial, command, **kwargs)
+        self.stats['dispatched'] += 1
         if worker.done():
-            self._spawn_worker()
-        self.jobs[deferred] = (self.serial, worker)
+            self.stats['recycled_max_jobs'] += 1
+            self._spawn_worker(worker.slot)
+        self.jobs[deferred] = DispatchedJob(self.serial, worker, job, netbox)
         deferred.addBoth(self._cleanup, deferred)
         return deferred
 
@@ -426,8 +552,52 @@ class WorkerPool(object):
         if deferred not in self.jobs:
             self._logger.debug("Cancelling job that isn't known")
             return
-        serial, worker = self.jobs[deferred]
-        return worker.cancel(serial)
+        dispatched = self.jobs[deferred]
+        return dispatched.worker.cancel(dispatched.serial)
+
+    def check_workers(self):
+        """Updates the memory usage of all workers, recycles those that use
+        too much, and sends pool statistics to Carbon.
+        """
+        for worker in list(self.workers):
+            rss = worker.update_rss()
+            if self.max_rss and rss and rss > self.max_rss and not worker.done():
+                self._logger.info(
+                    "Recycling worker using %dMiB of memory: %r", rss // 2**20, worker
+                )
+                worker.retire()
+                self.stats['recycled_rss'] += 1
+                self._spawn_worker(worker.slot)
+        self.send_stats()
+
+    def get_stats(self):
+        """Returns a dict of pool-level statistics"""
+        now = time.time()
+        stats = dict(self.stats)
+        stats.update(
+            workers=len(self.workers),
+            ready_workers=len([w for w in self.workers if not w.done()]),
+            active_jobs=sum(w.active_jobs for w in self.workers),
+            outstanding_runtime=sum(
+                placement.get_outstanding_runtime(w, now) for w in self.workers
+            ),
+            rss=sum(w.rss or 0 for w in self.workers),
+        )
+        stats.update(
+            ("placement_" + key, value) for key, value in self.policy.stats.items()
+        )
+        return stats
+
+    def send_stats(self):
+        """Sends pool-level statistics to Carbon"""
+        prefix = metric_prefix_for_ipdevpoll_workerpool(socket.gethostname())
+        timestamp = time.time()
+        send_metrics(
+            [
+                ("%s.%s" % (prefix, key), (timestamp, value))
+                for key, value in sorted(self.get_stats().items())
+            ]
+        )
 
     def execute_job(self, job, netbox, plugins=None, interval=None):
         """Executes a single job on an available worker"""
@@ -448,9 +618,19 @@ class WorkerPool(object):
     def log_summary(self):
         """Logs a summary of currently running workers"""
         self._logger.info(
-            "%s out of %s workers running", len(self.workers), self.target_count
+            "%s out of %s workers running, using %s job placement",
+            len(self.workers),
+            self.target_count,
+            self.policy.name,
+        )
+        self._logger.info(
+            "pool stats: %s",
+            ", ".join(
+                "%s=%s" % (key, round(value, 1) if isinstance(value, float) else value)
+                for key, value in sorted(self.get_stats().items())
+            ),
         )
-        for worker in self.workers:
+        for worker in sorted(self.workers, key=lambda w: w.slot):
             self._logger.info(" - %r", worker)
 
 
@@ -0,0 +1,194 @@
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.  You should have received a copy of the GNU General Public
+# License along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""Per-job resource profiling for ipdevpoll.
+
+When profiling is enabled in ipdevpoll.conf, every job gets a
+:py:class:`JobProfile`, which attributes SNMP requests, database queries and
+thread pool queue wait times to the stage of the job that was active when they
+were issued. A stage is either a plugin (``plugin.<alias>``), a storage
+manager (``storage.<shadow class>``) or the job itself (``job``).
+
+Since the plugins and storage managers of a single job run one at a time,
+the active stage is simply tracked as an attribute of the profile. The profile
+of the currently running job is made available to code that has no reference
+to its job handler (such as :py:func:`nav.ipdevpoll.db.run_in_thread`) through
+a context variable.
+
+"""
+import contextvars
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from nav.metrics.names import escape_metric_name
+
+JOB_STAGE = "job"
+COUNTERS = (
+    "snmp_requests",
+    "snmp_bytes",
+    "snmp_time",
+    "db_queries",
+    "db_time",
+    "queue_wait",
+)
+
+_current_profile = contextvars.ContextVar("ipdevpoll_profile", default=None)
+
+
+def is_enabled(config=None):
+    """Returns True if job profiling is enabled in the ipdevpoll config"""
+    if config is None:
+        from nav.ipdevpoll.config import ipdevpoll_conf as config
+
+    return config.getboolean("ipdevpoll", "profiling", fallback=False)
+
+
+def get_current_profile():
+    """Returns the JobProfile of the currently running job, if any"""
+    return _current_profile.get()
+
+
+def set_current_profile(profile):
+    """Sets the JobProfile of the currently running job in the current
+    execution context.
+    """
+    _current_profile.set(profile)
+
+
+class JobProfile(object):
+    """Collects resource usage counters for the stages of a single job run"""
+
+    def __init__(self):
+        self.stage = JOB_STAGE
+        self.stages = OrderedDict()
+        self._stage_for(JOB_STAGE)
+
+    def __repr__(self):
+        return "<JobProfile stage=%r stages=%r>" % (self.stage, list(self.stages))
+
+    def _stage_for(self, stage):
+        if stage not in self.stages:
+            self.stages[stage] = dict.fromkeys(COUNTERS, 0)
+        return self.stages[stage]
+
+    def set_stage(self, stage=JOB_STAGE):
+        """Sets the currently active job stage"""
+        self.stage = stage
+        self._stage_for(stage)
+
+    @contextmanager
+    def in_stage(self, stage):
+        """Context manager to attribute everything within it to stage"""
+        previous = self.stage
+        self.set_stage(stage)
+        try:
+            yield self
+        finally:
+            self.set_stage(previous)
+
+    def run(self, func, *args, **kwargs):
+        """Calls func in a copy of the current execution context in which this
+        is the current profile.
+
+        Deferred callbacks run in the context of whoever fires them, so this is
+        needed to make the profile visible to plugins started from a callback.
+        """
+        context = contextvars.copy_context()
+        return context.run(self._run, func, *args, **kwargs)
+
+    def _run(self, func, *args, **kwargs):
+        set_current_profile(self)
+        return func(*args, **kwargs)
+
+    def add_snmp_request(self, stage, elapsed, size):
+        """Records a completed SNMP request"""
+        counters = self._stage_for(stage)
+        counters["snmp_requests"] += 1
+        counters["snmp_bytes"] += size
+        counters["snmp_time"] += elapsed
+
+    def add_db_query(self, elapsed, stage=None):
+        """Records a completed database query"""
+        counters = self._stage_for(stage or self.stage)
+        counters["db_queries"] += 1
+        counters["db_time"] += elapsed
+
+    def add_queue_wait(self, stage, elapsed):
+        """Records the time a function waited for a free thread pool thread"""
+        self._stage_for(stage)["queue_wait"] += elapsed
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        """A Django database execute wrapper that times every query.
+
+        Install using :py:meth:`django.db.connection.execute_wrapper`.
+        """
+        start = time.time()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add_db_query(time.time() - start)
+
+    def as_dict(self):
+        """Returns the profile as a dict of dicts, omitting idle stages"""
+        return OrderedDict(
+            (stage, counters)
+            for stage, counters in self.stages.items()
+            if any(counters.values())
+        )
+
+    def get_metrics(self, prefix, timestamp=None):
+        """Returns the profile as a list of Graphite metric tuples"""
+        timestamp = timestamp or time.time()
+        return [
+            (
+                "%s.profile.%s.%s" % (prefix, _stage_to_path(stage), counter),
+                (timestamp, value),
+            )
+            for stage, counters in self.as_dict().items()
+            for counter, value in counters.items()
+        ]
+
+
+def _stage_to_path(stage):
+    return ".".join(escape_metric_name(part) for part in stage.split(".", 1))
+
+
+def estimate_snmp_response_size(result):
+    """Roughly estimates the size in bytes of the varbinds of an SNMP response.
+
+    :param result: The result of an AgentProxy request; a dict or a list of
+                   (oid, value) tuples.
+    """
+    if isinstance(result, dict):
+        result = result.items()
+    elif not isinstance(result, (list, tuple)):
+        return 0
+    size = 0
+    for item in result:
+        try:
+            oid, value = item
+        except (TypeError, ValueError):
+            continue
+        size += len(str(oid)) + _value_size(value)
+    return size
+
+
+def _value_size(value):
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    if value is None:
+        return 0
+    return 8
@@ -18,6 +18,7 @@
 
 import logging
 import datetime
+import socket
 import time
 from operator import itemgetter
 from collections import defaultdict
@@ -26,20 +27,24 @@ from math import ceil
 
 from twisted.python.failure import Failure
 from twisted.internet import task, reactor
-from twisted.internet.defer import Deferred
+from twisted.internet.defer import Deferred, DeferredLock
 from twisted.internet.task import LoopingCall
 from twisted.python.log import err
 
 from nav import ipdevpoll
 from nav.ipdevpoll import db
 from nav.ipdevpoll.snmp import SnmpError, AgentProxy
+from nav.ipdevpoll.dbnotify import NetboxChangeListener
 from nav.metrics.carbon import send_metrics
-from nav.metrics.templates import metric_prefix_for_ipdevpoll_job
+from nav.metrics.templates import (
+    metric_prefix_for_ipdevpoll_job,
+    metric_prefix_for_ipdevpoll_scheduler,
+)
 from nav.tableformat import SimpleTableFormatter
 
 from nav.ipdevpoll.utils import log_unhandled_failure
 
-from . import shadows, config, signals
+from . import shadows, config, signals, adaptive
 from .dataloader import NetboxLoader
 from .jobs import JobHandler, AbortedJobError, SuggestedReschedule
 
@@ -58,6 +63,8 @@ class NetboxJobScheduler(object):
     job_queues = {}
     global_job_queue = []
     global_intensity = config.ipdevpoll_conf.getint('ipdevpoll', 'max_concurrent_jobs')
+    load_monitor = None
+    schedule_stats = adaptive.ScheduleStats()
     _logger = ipdevpoll.ContextLogger()
 
     def __init__(self, job, netbox, pool):
@@ -72,6 +79,7 @@ class NetboxJobScheduler(object):
         self._deferred = Deferred()
         self._next_call = None
         self._last_job_started_at = 0
+        self._due_time = None
         self.running = False
         self._start_time = None
         self._current_job = None
@@ -81,9 +89,14 @@ class NetboxJobScheduler(object):
         """Returns time elapsed since the start of the job as a timedelta."""
         return datetime.datetime.now() - self._start_time
 
-    def start(self):
-        """Start polling schedule."""
-        self._next_call = self.callLater(0, self.run_job)
+    def start(self, delay=0):
+        """Start polling schedule.
+
+        :param delay: The number of seconds to wait before the first run.
+        """
+        if self._due_time is None:
+            self._due_time = time.time() + delay
+        self._next_call = self.callLater(delay, self.run_job)
         return self._deferred
 
     def cancel(self):
@@ -147,6 +160,15 @@ class NetboxJobScheduler(object):
             self.queue_myself(self.global_job_queue)
             return
 
+        if self.load_monitor and self.load_monitor.is_overloaded():
+            self._logger.debug(
+                "holding back job for %s due to high load: %r",
+                self.netbox.sysname,
+                self.load_monitor,
+            )
+            self.load_monitor.hold_back(self)
+            return
+
         # We're ok to start a polling run.
         try:
             self._start_time = datetime.datetime.now()
@@ -164,6 +186,9 @@ class NetboxJobScheduler(object):
 
         self.count_job()
         self._last_job_started_at = time.time()
+        if self._due_time is not None:
+            self.schedule_stats.add_skew(self._last_job_started_at - self._due_time)
+            self._due_time = None
 
         deferred.addErrback(self._adjust_intensity_on_snmperror)
         deferred.addCallbacks(self._reschedule_on_success, self._reschedule_on_failure)
@@ -261,6 +286,7 @@ class NetboxJobScheduler(object):
             next_time,
         )
 
+        self._due_time = time.time() + delay
         if self._next_call.active():
             self._next_call.reset(delay)
         else:
@@ -336,12 +362,24 @@ class NetboxJobScheduler(object):
             self.job_queues[self.job.name] = []
         return self.job_queues[self.job.name]
 
+    @classmethod
+    def get_queued_job_count(cls):
+        "Returns the number of jobs waiting because of intensity limits"
+        return len(cls.global_job_queue) + sum(
+            len(queue) for queue in cls.job_queues.values()
+        )
+
 
 class JobScheduler(object):
     active_schedulers = set()
     job_logging_loop = None
+    scheduling_mode = adaptive.SCHEDULING_FIXED
+    scheduler_metrics_interval = 60.0  # seconds
+    scheduler_metrics_loop = None
     netbox_reload_interval = 2 * 60.0  # seconds
     netbox_reload_loop = None
+    netbox_change_listener = None
+    netbox_change_delay = 1.0  # seconds
     _logger = ipdevpoll.ContextLogger()
 
     def __init__(self, job, pool):
@@ -351,11 +389,22 @@ class JobScheduler(object):
         self.pool = pool
         self.netboxes = NetboxLoader()
         self.active_netboxes = {}
+        self.changed_netboxes = set()
+        self.replaced_netboxes = set()
+        self._changed_netboxes_call = None
+        self._reload_lock = DeferredLock()
 
         self.active_schedulers.add(self)
 
     @classmethod
     def initialize_from_config_and_run(cls, pool, onlyjob=None):
+        cls.scheduling_mode = adaptive.get_scheduling_mode()
+        if cls.scheduling_mode == adaptive.SCHEDULING_ADAPTIVE:
+            NetboxJobScheduler.load_monitor = adaptive.LoadMonitor.from_config()
+            NetboxJobScheduler.load_monitor.start()
+        _logger.info("using %s job scheduling", cls.scheduling_mode)
+        cls._start_netbox_change_listener()
+
         descriptors = config.get_jobs()
         schedulers = [
             JobScheduler(d, pool)
@@ -365,10 +414,51 @@ class JobScheduler(object):
         for scheduler in schedulers:
             scheduler.run()
 
+    @classmethod
+    def _start_netbox_change_listener(cls):
+        """Starts listening for netbox change notifications from the database,
+        if enabled.
+
+        While listening, the full netbox reload is only needed as a safety net,
+        and runs at the slower configured full reload interval.
+        """
+        if not config.ipdevpoll_conf.getboolean(
+            'scheduling', 'netbox_notifications', fallback=True
+        ):
+            return
+        listener = NetboxChangeListener(cls.on_netboxes_changed)
+        try:
+            listener.start()
+        except Exception as error:  # pylint: disable=broad-except
+            _logger.warning(
+                "cannot listen for netbox changes, reloading all netboxes every "
+                "%ds: %s",
+                cls.netbox_reload_interval,
+                error,
+            )
+            return
+        cls.netbox_change_listener = listener
+        cls.netbox_reload_interval = config.get_full_reload_interval()
+        _logger.info(
+            "listening for netbox changes, reloading all netboxes every %ds",
+            cls.netbox_reload_interval,
+        )
+
+    @classmethod
+    def on_netboxes_changed(cls, netbox_ids):
+        """Reloads changed netboxes for all jobs.
+
+        :param netbox_ids: A set of changed netbox ids, or None if all
+                           netboxes should be reloaded.
+        """
+        for scheduler in cls.active_schedulers:
+            scheduler.reload_netboxes(netbox_ids)
+
     def run(self):
         """Initiate scheduling of this job."""
         signals.netbox_type_changed.connect(self.on_netbox_type_changed)
         self._setup_active_job_logging()
+        self._setup_scheduler_metrics()
         self._start_netbox_reload_loop()
 
     def _start_netbox_reload_loop(self):
@@ -391,8 +481,8 @@ class JobScheduler(object):
         """Performs various cleanup and reload actions on a netbox type change
         signal.
 
-        The netbox' data are cleaned up, and the next netbox data reload is
-        scheduled to take place immediately.
+        The netbox' data are cleaned up, and the netbox is reloaded
+        immediately afterwards.
 
         """
         sysname = (
@@ -406,7 +496,11 @@ class JobScheduler(object):
         df = db.run_in_thread(
             shadows.Netbox.cleanup_replaced_netbox, netbox_id, new_type
         )
-        return df.addCallback(lambda x: self._start_netbox_reload_loop())
+        return df.addCallback(self._reload_replaced_netbox, netbox_id)
+
+    def _reload_replaced_netbox(self, _result, netbox_id):
+        self.replaced_netboxes.add(netbox_id)
+        self.reload_netboxes({netbox_id})
 
     def _setup_active_job_logging(self):
         if self.__class__.job_logging_loop is None:
@@ -414,9 +508,75 @@ class JobScheduler(object):
             self.__class__.job_logging_loop = loop
             loop.start(interval=5 * 60.0, now=False)
 
+    def _setup_scheduler_metrics(self):
+        if self.__class__.scheduler_metrics_loop is None:
+            loop = task.LoopingCall(self.__class__.send_scheduler_metrics)
+            self.__class__.scheduler_metrics_loop = loop
+            loop.start(interval=self.scheduler_metrics_interval, now=False)
+
+    @classmethod
+    def send_scheduler_metrics(cls):
+        """Sends schedule skew and queue depth metrics to Graphite"""
+        prefix = metric_prefix_for_ipdevpoll_scheduler(socket.gethostname())
+        timestamp = time.time()
+        metrics = NetboxJobScheduler.schedule_stats.get_metrics(prefix, timestamp)
+        metrics.extend(
+            [
+                (
+                    prefix + '.queue.intensity',
+                    (timestamp, NetboxJobScheduler.get_queued_job_count()),
+                ),
+                (
+                    prefix + '.queue.threadpool',
+                    (timestamp, adaptive.get_threadpool_queue_depth()),
+                ),
+            ]
+        )
+        if NetboxJobScheduler.load_monitor:
+            metrics.extend(
+                NetboxJobScheduler.load_monitor.get_metrics(prefix, timestamp)
+            )
+        send_metrics(metrics)
+
     def _reload_netboxes(self):
         """Reload the set of netboxes to poll and update schedules."""
-        deferred = self.netboxes.load_all()
+        return self._reload_lock.run(self._do_reload, self.netboxes.load_all)
+
+    def reload_netboxes(self, netbox_ids=None):
+        """Reloads a set of changed netboxes and updates their schedules.
+
+        Changes are collected for a short while before being reloaded, so
+        that a burst of notifications results in a single reload.
+
+        :param netbox_ids: A set of netbox ids, or None to reload all netboxes.
+        """
+        if netbox_ids is None:
+            return self._reload_netboxes()
+        self.changed_netboxes.update(netbox_ids)
+        if self._changed_netboxes_call and self._changed_netboxes_call.active():
+            return
+        self._changed_netboxes_call = reactor.callLater(
+            self.netbox_change_delay, self._reload_changed_netboxes
+        )
+
+    def _reload_changed_netboxes(self):
+        netbox_ids, self.changed_netboxes = self.changed_netboxes, set()
+        if not netbox_ids:
+            return None
+        deferred = self._reload_lock.run(
+            self._do_reload, self.netboxes.load_some, netbox_ids
+        )
+        return deferred.addErrback(self._log_changed_netbox_reload_failure)
+
+    def _log_changed_netbox_reload_failure(self, failure):
+        log_unhandled_failure(
+            self._logger, failure, "Unhandled failure while reloading netboxes"
+        )
+
+    def _do_reload(self, loader, *args):
+        # Full and partial reloads modify the same NetboxLoader from a thread,
+        # and must never run concurrently
+        deferred = loader(*args)
         deferred.addCallbacks(
             self._process_reloaded_netboxes, self._handle_reload_failures
         )
@@ -427,6 +587,23 @@ class JobScheduler(object):
         """Process the result of a netbox reload and update schedules."""
         (new_ids, removed_ids, changed_ids) = result
 
+        # Type changes are handled by the netbox_type_changed signal receivers,
+        # which will reload these netboxes when their data has been cleaned up
+        type_changes = self.netboxes.pop_type_changes()
+        for netbox_id, new_type in type_changes.items():
+            signals.netbox_type_changed.send(
+                sender=self.netboxes, netbox_id=netbox_id, new_type=new_type
+            )
+        # Replaced netboxes have been descheduled, and must be rescheduled even
+        # if the reload found nothing else about them to have changed
+        replaced_ids = set(
+            netbox_id
+            for netbox_id in self.replaced_netboxes
+            if netbox_id in self.netboxes and netbox_id not in self.active_netboxes
+        )
+        self.replaced_netboxes.clear()
+        changed_ids = changed_ids.union(replaced_ids).difference(type_changes)
+
         # Deschedule removed and changed boxes
         for netbox_id in removed_ids.union(changed_ids):
             self.cancel_netbox_scheduler(netbox_id)
@@ -438,9 +615,35 @@ class JobScheduler(object):
             )
 
         new_and_changed = sorted(new_ids.union(changed_ids), key=_lastupdated)
+        if new_and_changed and self.scheduling_mode == adaptive.SCHEDULING_ADAPTIVE:
+            deferred = db.run_in_thread(
+                adaptive.get_average_runtimes, self.job.name, new_and_changed
+            )
+            deferred.addErrback(self._handle_runtime_load_failure)
+            deferred.addCallback(self._spread_netbox_schedulers, new_and_changed)
+            return deferred
+
         for netbox_id in new_and_changed:
             self.add_netbox_scheduler(netbox_id)
 
+    def _handle_runtime_load_failure(self, failure):
+        self._logger.warning(
+            "could not load historical job runtimes, weighing all jobs " "equally: %s",
+            failure.getErrorMessage(),
+        )
+        return {}
+
+    def _spread_netbox_schedulers(self, runtimes, netbox_ids):
+        """Schedules the first runs for a batch of netboxes, spread across the
+        job interval according to their historical job runtimes.
+        """
+        delays = adaptive.get_start_delays(
+            self.job.name, self.job.interval, runtimes, netbox_ids
+        )
+        for netbox_id in netbox_ids:
+            if netbox_id in self.netboxes and netbox_id not in self.active_netboxes:
+                self.add_netbox_scheduler(netbox_id, delays[netbox_id])
+
     def _handle_reload_failures(self, failure):
         failure.trap(db.ResetDBConnectionError)
         self._logger.error(
@@ -448,11 +651,11 @@ class JobScheduler(object):
             "database connection was reset"
         )
 
-    def add_netbox_scheduler(self, netbox_id):
+    def add_netbox_scheduler(self, netbox_id, delay=0):
         netbox = self.netboxes[netbox_id]
         scheduler = NetboxJobScheduler(self.job, netbox, self.pool)
         self.active_netboxes[netbox_id] = scheduler
-        return scheduler.start()
+        return scheduler.start(delay)
 
     def cancel_netbox_scheduler(self, netbox_id):
         if netbox_id not in self.active_netboxes:
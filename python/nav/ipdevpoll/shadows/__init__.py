@@ -29,7 +29,7 @@ from django.db.models import Q
 from nav.models import manage
 from nav.event2 import EventFactory
 
-from nav.ipdevpoll.storage import MetaShadow, Shadow, shadowify
+from nav.ipdevpoll.storage import BulkManager, MetaShadow, Shadow, shadowify
 from nav.ipdevpoll import descrparsers
 from nav.ipdevpoll import utils
 from nav.oids import get_enterprise_id
@@ -38,6 +38,7 @@ from .netbox import Netbox
 from .interface import Interface, InterfaceStack, InterfaceAggregate
 from .swportblocked import SwPortBlocked
 from .cam import Cam
+from .arpmapping import ArpMapping
 from .adjacency import AdjacencyCandidate, UnrecognizedNeighbor
 from .entity import NetboxEntity
 from .prefix import Prefix
@@ -730,6 +731,7 @@ class SwPortAllowedVlan(Shadow):
 class Sensor(Shadow):
     __shadowclass__ = manage.Sensor
     __lookups__ = [('netbox', 'internal_name', 'mib')]
+    manager = BulkManager
 
     @classmethod
     def cleanup_after_save(cls, containers):
@@ -842,6 +844,7 @@ class PowerSupplyOrFan(Shadow):
 class POEPort(Shadow):
     __shadowclass__ = manage.POEPort
     __lookups__ = [('netbox', 'poegroup', 'index')]
+    manager = BulkManager
 
     @classmethod
     def cleanup_after_save(cls, containers):
@@ -853,6 +856,7 @@ class POEPort(Shadow):
 class POEGroup(Shadow):
     __shadowclass__ = manage.POEGroup
     __lookups__ = [('netbox', 'index')]
+    manager = BulkManager
     phy_index = None
 
     @classmethod
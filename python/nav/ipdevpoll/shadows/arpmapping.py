@@ -0,0 +1,114 @@
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.  You should have received a copy of the GNU General Public
+# License along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""Bulk reconciliation of arp records.
+
+By default, the arp plugin loads a netbox' open arp records from the database,
+compares them to the collected IP/MAC mappings, and adds one Arp container per
+new mapping and one per record to expire, each of which is saved by a separate
+SQL statement.
+
+When bulk reconciliation is enabled in the ``[arp]`` section of ipdevpoll.conf,
+the plugin instead adds one ArpMapping container per collected mapping. These
+are copied into a temporary table, which is then used to close missing records
+and open new ones using one SQL statement each.
+
+"""
+import datetime
+from collections import namedtuple
+
+from django.db import connection, transaction
+
+from nav.ipdevpoll.db import copy_to_temporary_table
+from nav.ipdevpoll.storage import DefaultManager
+from .netbox import Netbox
+
+ArpMapping = namedtuple('ArpMapping', 'ip mac prefix_id')
+ArpMapping.sentinel = ArpMapping(None, None, None)
+
+
+class ArpMappingManager(DefaultManager):
+    """Manages ArpMapping records"""
+
+    def __init__(self, *args, **kwargs):
+        super(ArpMappingManager, self).__init__(*args, **kwargs)
+        self.netbox = self.containers.get(None, Netbox)
+
+    def prepare(self):
+        if ArpMapping.sentinel in self.containers[ArpMapping]:
+            del self.containers[ArpMapping][ArpMapping.sentinel]
+
+    @transaction.atomic()
+    def save(self):
+        cursor = connection.cursor()
+        found = copy_to_temporary_table(
+            cursor,
+            'arp_found',
+            [('ip', 'INET'), ('mac', 'MACADDR'), ('prefixid', 'INTEGER')],
+            (
+                (mapping.ip.strCompressed(), mapping.mac, mapping.prefix_id)
+                for mapping in self.get_managed()
+            ),
+        )
+        params = {
+            'netboxid': self.netbox.id,
+            'sysname': self.netbox.sysname,
+            'now': datetime.datetime.now(),
+        }
+        cursor.execute(SQL_CLOSE_ARP, params)
+        closed = cursor.rowcount
+        cursor.execute(SQL_OPEN_ARP, params)
+        opened = cursor.rowcount
+        self._logger.debug("found=%d (new=%d expired=%d)", found, opened, closed)
+
+    def cleanup(self):
+        pass
+
+    @classmethod
+    def add_sentinel(cls, containers):
+        """Adds an ArpMapping sentinel to a ContainerRepository, signifying
+        that a full ARP collection has taken place and that old arp records
+        can be safely expired, even if no mappings were found.
+
+        """
+        containers.setdefault(ArpMapping, {})[ArpMapping.sentinel] = ArpMapping.sentinel
+
+
+SQL_CLOSE_ARP = """
+UPDATE arp SET end_time = %(now)s
+WHERE arp.netboxid = %(netboxid)s
+  AND arp.end_time >= 'infinity'
+  AND NOT EXISTS (
+    SELECT 1 FROM arp_found found
+    WHERE found.ip = arp.ip AND found.mac = arp.mac
+  )
+"""
+
+SQL_OPEN_ARP = """
+INSERT INTO arp (netboxid, prefixid, sysname, ip, mac, start_time, end_time)
+SELECT %(netboxid)s, found.prefixid, %(sysname)s, found.ip, found.mac,
+       %(now)s, 'infinity'
+FROM arp_found found
+WHERE NOT EXISTS (
+  SELECT 1 FROM arp
+  WHERE arp.netboxid = %(netboxid)s
+    AND arp.ip = found.ip
+    AND arp.mac = found.mac
+    AND arp.end_time >= 'infinity'
+)
+"""
+
+ArpMapping.manager = ArpMappingManager
+ArpMappingManager.sentinel = ArpMapping.sentinel
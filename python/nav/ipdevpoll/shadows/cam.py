@@ -42,16 +42,23 @@ grace period of MAX_MISS_COUNT collector runs.  If a "closed" cam record is
 found again within MAX_MISS_COUNT collector runs, the existing record can be
 reclaimed by resetting end_time to infinity.
 
+When bulk reconciliation is enabled in the ``[cam]`` section of
+ipdevpoll.conf, the same algorithm is instead run inside the database: The
+collected ifindex+mac combinations are copied into a temporary table, and
+records are opened, reclaimed and closed using three set-based SQL statements,
+rather than one statement per record.
+
 """
 import datetime
 import logging
 from collections import namedtuple
 
 from django.db.models import Q
-from django.db import transaction
+from django.db import connection, transaction
 
 from nav.models import manage
 from nav.models.fields import INFINITY
+from nav.ipdevpoll.db import copy_to_temporary_table
 from nav.ipdevpoll.storage import DefaultManager
 from .netbox import Netbox
 from .interface import Interface
@@ -78,9 +85,12 @@ class CamManager(DefaultManager):
     def __init__(self, *args, **kwargs):
         super(CamManager, self).__init__(*args, **kwargs)
         self.netbox = self.containers.get(None, Netbox)
+        self.bulk = use_bulk_reconciliation()
 
     def prepare(self):
         self._remove_sentinel()
+        if self.bulk:
+            return
         self._load_open_records()
         self._map_found_to_open()
         self._log_stats()
@@ -124,8 +134,14 @@ class CamManager(DefaultManager):
             len(self._missing),
         )
 
-    @transaction.atomic()
     def save(self):
+        if self.bulk:
+            self._reconcile()
+        else:
+            self._save_new_and_reclaimed()
+
+    @transaction.atomic()
+    def _save_new_and_reclaimed(self):
         # Reuse the same object over and over in an attempt to avoid the
         # overhead of Python object creation
         record = manage.Cam(
@@ -172,7 +188,45 @@ class CamManager(DefaultManager):
 
         return self._ifnames.get(ifindex, '')
 
+    @transaction.atomic()
+    def _reconcile(self):
+        """Opens, reclaims and closes all of this netbox' cam records in the
+        database, using the collected records copied to a temporary table.
+        """
+        now = datetime.datetime.now()
+        cursor = connection.cursor()
+        found = copy_to_temporary_table(
+            cursor,
+            'cam_found',
+            [('ifindex', 'INTEGER'), ('mac', 'MACADDR'), ('port', 'VARCHAR')],
+            (
+                (cam.ifindex, cam.mac, self._get_port_for(cam.ifindex))
+                for cam in self.get_managed()
+            ),
+        )
+        params = {
+            'netboxid': self.netbox.id,
+            'sysname': self.netbox.sysname,
+            'now': now,
+            'max_miss_count': MAX_MISS_COUNT,
+        }
+        cursor.execute(SQL_RECLAIM_CAM, params)
+        reclaimed = cursor.rowcount
+        cursor.execute(SQL_OPEN_CAM, params)
+        opened = cursor.rowcount
+        cursor.execute(SQL_CLOSE_CAM, params)
+        closed = cursor.rowcount
+        self._logger.debug(
+            "found=%d (new=%d reclaimed=%d missing=%d)",
+            found,
+            opened,
+            reclaimed,
+            closed,
+        )
+
     def cleanup(self):
+        if self.bulk:
+            return  # missing records were already closed by _reconcile()
         for cam_detail in self._missing:
             self._close_missing(cam_detail)
 
@@ -200,5 +254,57 @@ class CamManager(DefaultManager):
         containers.setdefault(Cam, {})[Cam.sentinel] = Cam.sentinel
 
 
+def use_bulk_reconciliation():
+    """Returns True if cam records should be reconciled in bulk"""
+    from nav.ipdevpoll.config import ipdevpoll_conf as conf
+
+    return conf.getboolean('cam', 'bulk_reconcile')
+
+
+_OPEN_CAM = "(cam.end_time >= 'infinity' OR cam.misscnt >= 0)"
+
+SQL_RECLAIM_CAM = """
+UPDATE cam SET end_time = 'infinity', misscnt = 0
+FROM cam_found found
+WHERE cam.netboxid = %(netboxid)s
+  AND cam.ifindex = found.ifindex
+  AND cam.mac = found.mac
+  AND cam.end_time < 'infinity'
+  AND cam.misscnt >= 0
+"""
+
+SQL_OPEN_CAM = """
+INSERT INTO cam (netboxid, sysname, ifindex, port, mac, start_time, end_time,
+                 misscnt)
+SELECT %(netboxid)s, %(sysname)s, found.ifindex, found.port, found.mac,
+       %(now)s, 'infinity', 0
+FROM cam_found found
+WHERE NOT EXISTS (
+  SELECT 1 FROM cam
+  WHERE cam.netboxid = %(netboxid)s
+    AND cam.ifindex = found.ifindex
+    AND cam.mac = found.mac
+    AND {open}
+)
+""".format(
+    open=_OPEN_CAM
+)
+
+SQL_CLOSE_CAM = """
+UPDATE cam SET
+  end_time = CASE WHEN cam.end_time >= 'infinity' THEN %(now)s
+                  ELSE cam.end_time END,
+  misscnt = CASE WHEN cam.misscnt + 1 < %(max_miss_count)s THEN cam.misscnt + 1
+                 ELSE NULL END
+WHERE cam.netboxid = %(netboxid)s
+  AND {open}
+  AND NOT EXISTS (
+    SELECT 1 FROM cam_found found
+    WHERE found.ifindex = cam.ifindex AND found.mac = cam.mac
+  )
+""".format(
+    open=_OPEN_CAM
+)
+
 Cam.manager = CamManager
 CamManager.sentinel = Cam.sentinel
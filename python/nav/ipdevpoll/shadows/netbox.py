@@ -20,6 +20,7 @@ from django.db.models import Q
 from django.db import transaction
 
 from nav.ipdevpoll.snmp.common import SNMPParameters
+from nav.metrics.templates import invalidate_sysname
 from nav.models import manage
 from nav.ipdevpoll.storage import Shadow
 
@@ -77,6 +78,14 @@ class Netbox(Shadow):
 
     def prepare(self, containers):
         self._handle_sysname_conflicts(containers)
+        self._handle_sysname_change(containers)
+
+    def _handle_sysname_change(self, containers):
+        if not (self.id and self.sysname):
+            return
+        existing = self.get_existing_model(containers)
+        if existing and existing.sysname != self.sysname:
+            invalidate_sysname(existing.sysname)
 
     def _handle_sysname_conflicts(self, containers):
         if self.id and self.sysname:
@@ -0,0 +1,172 @@
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.  You should have received a copy of the GNU General Public
+# License along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""Lockstep walking of multiple table columns using GET-BULK requests.
+
+Walking each column of a table separately means one full walk of the table
+per column. A :py:class:`ColumnWalker` instead walks several columns at once,
+asking for the next rows of every unfinished column in the same multi-varbind
+GET-BULK request. The varbinds of a GET-BULK response are interleaved, i.e.
+the first repetition of every requested column comes first, followed by the
+second repetition of every column, and so on.
+
+The number of repetitions per request is chosen adaptively:
+
+* The total response size is kept below a byte budget, based on the average
+  size of the varbinds the agent has returned so far.
+
+* If the agent truncates a response (which it is allowed to do if the response
+  won't fit in its maximum message size), the number of varbinds it returned
+  is taken as the agent's limit for subsequent requests.
+
+* If the agent returns an error response (such as tooBig), the request is
+  retried with half as many varbinds.
+
+Columns that end (i.e. whose next varbind belongs to a different column) are
+dropped from subsequent requests, so columns of different lengths are handled
+efficiently.
+
+"""
+import logging
+
+from twisted.internet import defer
+
+from nav.ipdevpoll.profiling import estimate_snmp_response_size
+from nav.oids import OID
+
+_logger = logging.getLogger(__name__)
+
+MAX_RESPONSE_SIZE = 8192  # bytes
+INITIAL_VARBIND_SIZE = 48  # bytes
+VARBIND_SIZE_SMOOTHING = 0.5
+
+
+class _Column(object):
+    """The state of a single column walk"""
+
+    def __init__(self, oid):
+        self.oid_str = oid
+        self.oid = OID(oid)
+        self.last_oid = self.oid
+        self.result = {}
+        self.finished = False
+
+    def __repr__(self):
+        return "<_Column %s rows=%d finished=%r>" % (
+            self.oid_str,
+            len(self.result),
+            self.finished,
+        )
+
+    def add(self, oid, value):
+        """Adds a varbind to the column, or finishes the column if the varbind
+        is past its end.
+        """
+        if self.finished:
+            return
+        oid = OID(oid)
+        # defend against agents that go backwards, or never leave the column
+        if self.oid.is_a_prefix_of(oid) and oid > self.last_oid:
+            self.result[str(oid)] = value
+            self.last_oid = oid
+        else:
+            self.finished = True
+
+
+class ColumnWalker(object):
+    """Walks multiple table columns in lockstep using GET-BULK requests.
+
+    :param agent: An AgentProxy, whose ``_getbulk()`` method will be used.
+    :param oids: A list of column OID strings.
+    :param max_repetitions: The maximum number of repetitions to request per
+                            column in a single request.
+    :param max_response_size: The approximate maximum size of a response, in
+                              bytes.
+    """
+
+    def __init__(
+        self, agent, oids, max_repetitions=10, max_response_size=MAX_RESPONSE_SIZE
+    ):
+        self.agent = agent
+        self.columns = [_Column(oid) for oid in oids]
+        self.max_repetitions = max(1, max_repetitions)
+        self.max_response_size = max_response_size
+        self.varbind_size = float(INITIAL_VARBIND_SIZE)
+        self.max_varbinds = None
+        self.requests = 0
+
+    def __repr__(self):
+        return "<ColumnWalker columns=%d requests=%d max_varbinds=%r>" % (
+            len(self.columns),
+            self.requests,
+            self.max_varbinds,
+        )
+
+    @defer.inlineCallbacks
+    def walk(self):
+        """Walks all the columns.
+
+        :returns: A deferred whose result is a dict of the same format as the
+                  result of AgentProxy.getTable(): {column_oid_str: {oid_str:
+                  value}}
+        """
+        active = list(self.columns)
+        while active:
+            column_count, repetitions = self.plan(len(active))
+            batch = active[:column_count]
+            response = yield self.agent._getbulk(
+                0, repetitions, [column.last_oid for column in batch]
+            )
+            self.requests += 1
+            self.update(batch, repetitions, response)
+            active = [column for column in active if not column.finished]
+
+        _logger.debug("%r finished", self)
+        return {column.oid_str: column.result for column in self.columns}
+
+    def plan(self, active_columns):
+        """Plans the next request.
+
+        :returns: A tuple of (number of columns, repetitions).
+        """
+        budget = max(1, int(self.max_response_size / self.varbind_size))
+        if self.max_varbinds:
+            budget = min(budget, self.max_varbinds)
+        column_count = max(1, min(active_columns, budget))
+        repetitions = max(1, min(self.max_repetitions, budget // column_count))
+        return column_count, repetitions
+
+    def update(self, batch, repetitions, response):
+        """Updates the requested columns and the request planning parameters
+        from a GET-BULK response.
+        """
+        requested = len(batch) * repetitions
+        if not response:
+            if requested > 1:
+                # probably an error response, such as tooBig: back off
+                self.max_varbinds = max(1, requested // 2)
+            else:
+                batch[0].finished = True
+            return
+
+        for index, (oid, value) in enumerate(response):
+            batch[index % len(batch)].add(oid, value)
+
+        if len(response) < requested and not all(column.finished for column in batch):
+            # the agent truncated its response
+            self.max_varbinds = len(response)
+
+        size = estimate_snmp_response_size(response) / len(response)
+        self.varbind_size += VARBIND_SIZE_SMOOTHING * (size - self.varbind_size)
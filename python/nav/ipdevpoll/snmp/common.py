@@ -20,11 +20,14 @@ from dataclasses import dataclass
 from functools import wraps
 from typing import Optional, Any, Dict
 
-from twisted.internet import reactor
+from twisted.internet import defer, reactor
 from twisted.internet.defer import succeed
 from twisted.internet.task import deferLater
 
 from nav.Snmp.defines import SecurityLevel, AuthenticationProtocol, PrivacyProtocol
+from nav.ipdevpoll.profiling import estimate_snmp_response_size
+from nav.ipdevpoll.snmp.bulkwalk import ColumnWalker
+from nav.ipdevpoll.snmpcache import CacheStats, IFTABLELASTCHANGE, SYSUPTIME
 from nav.models.manage import Netbox
 
 _logger = logging.getLogger(__name__)
@@ -53,6 +56,30 @@ def _cache_result(result, cache, key):
     return result
 
 
+def cache_across_jobs(func):
+    """Decorator for AgentProxyMixIn.getTable to use the agent's response
+    cache, which lives across jobs, if it has one.
+    """
+
+    @defer.inlineCallbacks
+    def _wrapper(self, oids, *args, **kwargs):
+        if not self.response_cache or len(oids) != 1:
+            result = yield func(self, oids, *args, **kwargs)
+            return result
+
+        oid = oids[0]
+        yield self.validate_response_cache()
+        cached = self._get_cached_column(oid)
+        if cached is not None:
+            return {oid: cached}
+        result = yield func(self, oids, *args, **kwargs)
+        if oid in result:
+            self._cache_column(oid, result[oid])
+        return result
+
+    return wraps(func)(_wrapper)
+
+
 def throttled(func):
     """Decorator for AgentProxyMixIn.getTable to throttle requests"""
 
@@ -71,6 +98,33 @@ def throttled(func):
     return wraps(func)(_wrapper)
 
 
+def profiled(func):
+    """Decorator for AgentProxyMixIn request methods to record requests in the
+    agent's job profile, if it has one.
+    """
+
+    def _wrapper(*args, **kwargs):
+        self = args[0]
+        profile = getattr(self, 'profile', None)
+        if not profile:
+            return func(*args, **kwargs)
+
+        stage = profile.stage
+        start = time.time()
+
+        def _record(result):
+            size = estimate_snmp_response_size(result)
+            profile.add_snmp_request(stage, time.time() - start, size)
+            return result
+
+        df = func(*args, **kwargs)
+        if df:
+            df.addBoth(_record)
+        return df
+
+    return wraps(func)(_wrapper)
+
+
 # pylint: disable=R0903
 class AgentProxyMixIn(object):
     """Common AgentProxy mix-in class.
@@ -96,6 +150,11 @@ class AgentProxyMixIn(object):
             self.snmp_parameters = SNMPParameters()
         self._result_cache = {}
         self._last_request = 0
+        self.profile = None
+        self.netbox_id = None
+        self.response_cache = None
+        self.response_cache_stats = CacheStats()
+        self._response_cache_validated = False
         self.throttle_delay = self.snmp_parameters.throttle_delay
 
         kwargs_out = self.snmp_parameters.as_agentproxy_args()
@@ -117,29 +176,126 @@ class AgentProxyMixIn(object):
     # hey, we're mimicking someone else's API here, never mind the bollocks:
     # pylint: disable=C0111,C0103
     @cache_for_session
+    @cache_across_jobs
     def getTable(self, *args, **kwargs):
         kwargs['maxRepetitions'] = self.snmp_parameters.max_repetitions
         return super(AgentProxyMixIn, self).getTable(*args, **kwargs)
 
+    # pylint: disable=C0103
+    @defer.inlineCallbacks
+    def getColumns(self, oids):
+        """Retrieves several table columns, walking them in lockstep using
+        multi-varbind GET-BULK requests, if supported by the SNMP version.
+
+        Column results are cached per session, and in the response cache (if
+        any), just like getTable() results.
+
+        :param oids: A list of column OID strings.
+        :returns: A deferred whose result is of the same format as that of
+                  getTable(): {column_oid_str: {oid_str: value}}
+        """
+        result = {}
+        missing = []
+        for oid in oids:
+            key = (oid,)
+            if key in self._result_cache:
+                result.update(self._result_cache[key])
+            else:
+                missing.append(oid)
+
+        if len(missing) == 1 or self.snmp_parameters.version == 1:
+            for oid in missing:
+                column = yield self.getTable([oid])
+                result.update(column)
+            return result
+
+        if missing and self.response_cache:
+            yield self.validate_response_cache()
+            for oid in list(missing):
+                cached = self._get_cached_column(oid)
+                if cached is not None:
+                    self._result_cache[(oid,)] = {oid: cached}
+                    result[oid] = cached
+                    missing.remove(oid)
+
+        if missing:
+            walker = ColumnWalker(
+                self, missing, max_repetitions=self.snmp_parameters.max_repetitions
+            )
+            columns = yield walker.walk()
+            for oid, column in columns.items():
+                self._result_cache[(oid,)] = {oid: column}
+                self._cache_column(oid, column)
+            result.update(columns)
+
+        return result
+
+    @defer.inlineCallbacks
+    def validate_response_cache(self):
+        """Validates the response cache entries of this agent's netbox against
+        the current sysUpTime and ifTableLastChange values of the device.
+
+        This is done once per session, before the response cache is first used.
+        """
+        if self._response_cache_validated:
+            return
+        self._response_cache_validated = True
+        values = {}
+        try:
+            response = yield self._get([SYSUPTIME, IFTABLELASTCHANGE])
+        except Exception as error:  # pylint: disable=broad-except
+            _logger.debug("could not validate response cache: %s", error)
+        else:
+            values = {tuple(oid): value for oid, value in response or []}
+        self.response_cache.validate(
+            self.netbox_id,
+            _as_int(values.get(tuple(SYSUPTIME))),
+            _as_int(values.get(tuple(IFTABLELASTCHANGE))),
+        )
+
+    def _get_cached_column(self, oid):
+        if not self.response_cache:
+            return None
+        column = self.response_cache.get(self.netbox_id, oid)
+        if column is None:
+            self.response_cache_stats.misses += 1
+        else:
+            self.response_cache_stats.hits += 1
+        return column
+
+    def _cache_column(self, oid, column):
+        if self.response_cache:
+            self.response_cache.put(self.netbox_id, oid, column)
+
     # hey, we're mimicking someone else's API here, never mind the bollocks:
     # pylint: disable=C0111,C0103
     @throttled
+    @profiled
     def _get(self, *args, **kwargs):
         return super(AgentProxyMixIn, self)._get(*args, **kwargs)
 
     # hey, we're mimicking someone else's API here, never mind the bollocks:
     # pylint: disable=C0111,C0103
     @throttled
+    @profiled
     def _walk(self, *args, **kwargs):
         return super(AgentProxyMixIn, self)._walk(*args, **kwargs)
 
     # hey, we're mimicking someone else's API here, never mind the bollocks:
     # pylint: disable=C0111,C0103
     @throttled
+    @profiled
     def _getbulk(self, *args, **kwargs):
         return super(AgentProxyMixIn, self)._getbulk(*args, **kwargs)
 
 
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
 @dataclass
 class SNMPParameters:
     """SNMP session parameters common to all SNMP protocol versions"""
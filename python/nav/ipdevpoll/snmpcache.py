@@ -0,0 +1,207 @@
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.  You should have received a copy of the GNU General Public
+# License along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""A cross-job SNMP response cache for ipdevpoll.
+
+The results of table walks are normally only cached for the duration of a
+single job (i.e. a single AgentProxy session), which means that separate jobs
+for the same netbox will walk the same tables (such as ifName or the
+ENTITY-MIB) again within minutes. When enabled in ipdevpoll.conf, a
+:py:class:`ResponseCache` keeps table walk results per netbox across jobs
+within the same ipdevpoll (worker) process.
+
+* Results are only cached for OID subtrees that have been configured with a
+  time-to-live in the ``[snmp_cache_ttl]`` section. The most specific matching
+  subtree applies.
+
+* All cached results for a netbox are invalidated when its sysUpTime goes
+  backwards (i.e. the device has restarted) or its ifTableLastChange value
+  changes (i.e. interfaces have been added or removed).
+
+* The cache is bounded by an estimate of its memory usage. When full, the least
+  recently used results are evicted.
+
+"""
+import logging
+import time
+from collections import OrderedDict
+
+from nav.ipdevpoll.profiling import estimate_snmp_response_size
+from nav.oids import OID
+from nav.util import parse_interval
+
+_logger = logging.getLogger(__name__)
+
+SYSUPTIME = OID('.1.3.6.1.2.1.1.3.0')
+IFTABLELASTCHANGE = OID('.1.3.6.1.2.1.31.1.5.0')
+ENTRY_OVERHEAD = 200  # rough estimate of the per-entry bookkeeping cost in bytes
+
+_response_cache = None
+
+
+def get_response_cache(config=None):
+    """Returns this process' ResponseCache, or None if it's disabled"""
+    global _response_cache  # pylint: disable=global-statement
+    if _response_cache is None:
+        if config is None:
+            from nav.ipdevpoll.config import ipdevpoll_conf as config
+
+        if not config.getboolean('snmp_cache', 'enabled', fallback=False):
+            return None
+        _response_cache = ResponseCache.from_config(config)
+    return _response_cache
+
+
+class ResponseCache(object):
+    """A per-netbox, memory-bounded LRU cache of SNMP table walk results.
+
+    :param max_size: The maximum estimated size of all cached results, in
+                     bytes.
+    :param ttls: A dict of {OID subtree: time-to-live in seconds}.
+    :param default_ttl: The time-to-live of results that are not in any of the
+                        listed subtrees. 0 means these results are not cached.
+    """
+
+    def __init__(self, max_size=32 * 1024 * 1024, ttls=None, default_ttl=0):
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self.ttls = sorted(
+            ((OID(subtree), ttl) for subtree, ttl in (ttls or {}).items()),
+            key=lambda item: len(item[0]),
+            reverse=True,
+        )
+        self.size = 0
+        self.stats = dict(hits=0, misses=0, evictions=0, invalidations=0)
+        self._entries = OrderedDict()
+        self._markers = {}
+
+    @classmethod
+    def from_config(cls, config):
+        """Creates a ResponseCache from the [snmp_cache] and [snmp_cache_ttl]
+        sections of the ipdevpoll config.
+        """
+        ttls = {}
+        if config.has_section('snmp_cache_ttl'):
+            for subtree, ttl in config.items('snmp_cache_ttl'):
+                try:
+                    ttls[subtree] = parse_interval(ttl)
+                except ValueError:
+                    _logger.warning(
+                        "ignoring invalid SNMP cache TTL for %s: %r", subtree, ttl
+                    )
+        return cls(
+            max_size=config.getint('snmp_cache', 'max_size', fallback=32) * 1024 * 1024,
+            ttls=ttls,
+            default_ttl=parse_interval(config.get('snmp_cache', 'ttl', fallback='')),
+        )
+
+    def __repr__(self):
+        return "<ResponseCache entries=%d size=%d stats=%r>" % (
+            len(self._entries),
+            self.size,
+            self.stats,
+        )
+
+    def get_ttl(self, oid):
+        """Returns the time-to-live of results for oid"""
+        oid = OID(oid)
+        for subtree, ttl in self.ttls:
+            if subtree.is_a_prefix_of(oid) or subtree == oid:
+                return ttl
+        return self.default_ttl
+
+    def get(self, netbox_id, oid):
+        """Returns the cached result for oid from netbox_id, or None"""
+        key = (netbox_id, str(oid))
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, result, _size = entry
+            if expires > time.time():
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return result
+            self._remove(key)
+        self.stats['misses'] += 1
+        return None
+
+    def put(self, netbox_id, oid, result):
+        """Caches a result for oid from netbox_id, if oid has a time-to-live"""
+        ttl = self.get_ttl(oid)
+        if ttl <= 0:
+            return
+        key = (netbox_id, str(oid))
+        if key in self._entries:
+            self._remove(key)
+        size = estimate_snmp_response_size(result) + ENTRY_OVERHEAD
+        if size > self.max_size:
+            return
+        self._entries[key] = (time.time() + ttl, result, size)
+        self.size += size
+        while self.size > self.max_size:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats['evictions'] += 1
+
+    def _remove(self, key):
+        _expires, _result, size = self._entries.pop(key)
+        self.size -= size
+
+    def invalidate(self, netbox_id):
+        """Removes all cached results for netbox_id"""
+        doomed = [key for key in self._entries if key[0] == netbox_id]
+        for key in doomed:
+            self._remove(key)
+        if doomed:
+            self.stats['invalidations'] += 1
+            _logger.debug(
+                "invalidated %d cached SNMP responses for netbox %s",
+                len(doomed),
+                netbox_id,
+            )
+
+    def validate(self, netbox_id, sysuptime=None, iftablelastchange=None):
+        """Invalidates the cached results for netbox_id if its sysUpTime has
+        gone backwards, or its ifTableLastChange has changed, since the last
+        time it was validated.
+
+        Unknown (None) values invalidate everything, since nothing can be known
+        about a device that doesn't respond to these.
+        """
+        previous = self._markers.get(netbox_id)
+        self._markers[netbox_id] = (sysuptime, iftablelastchange)
+        if previous is None:
+            return
+        last_uptime, last_change = previous
+        if (
+            sysuptime is None
+            or last_uptime is None
+            or sysuptime < last_uptime
+            or iftablelastchange != last_change
+        ):
+            self.invalidate(netbox_id)
+
+
+class CacheStats(object):
+    """Counts the cache hits and misses of a single job"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return "<CacheStats hits=%d misses=%d>" % (self.hits, self.misses)
+
+    def __bool__(self):
+        return bool(self.hits or self.misses)
@@ -16,11 +16,17 @@
 #
 """Storage layer for ipdevpoll"""
 
+from collections import defaultdict
+from functools import reduce
+import operator
+
 import django.db.models
 from django.db import transaction
+from django.db.models import Q
 
 from nav import toposort
 from nav import ipdevpoll
+from nav.util import chunks
 
 
 class MetaShadow(type):
@@ -106,6 +112,205 @@ class DefaultManager(object):
         )
 
 
+class BulkManager(DefaultManager):
+    """A storage manager that resolves and writes all managed shadows in bulk.
+
+    Instead of looking up and saving one object at a time, existing database
+    objects are resolved using a single query per primary key or
+    ``__lookups__`` entry (see :py:meth:`resolve_existing`). Only touched
+    attributes that differ from the existing objects are written, using one
+    ``bulk_update()`` per distinct set of changed attributes, while new
+    objects are inserted using ``bulk_create()``. Since managers are run in
+    the topological order of their shadow classes, objects referred to by
+    foreign keys have already been saved.
+
+    Shadow classes opt in by setting their ``manager`` attribute to this
+    class, or a subclass of it. As this bypasses the ``save()`` and
+    ``update()`` methods of the shadow and its Django model, and any model
+    save signals, it is only suitable for classes that do not rely on those.
+
+    """
+
+    batch_size = 1000
+
+    def save(self):
+        """Saves managed shadows in containers"""
+        shadows = list(self.get_managed())
+        missing = self.resolve_existing(shadows)
+
+        created = []
+        updated = defaultdict(list)
+        for shadow in shadows:
+            if shadow in missing:
+                existing = None
+            else:
+                existing = shadow.get_existing_model(self.containers)
+
+            if shadow.delete:
+                if existing:
+                    existing.delete()
+            elif existing:
+                diff = shadow.get_diff_attrs(existing)
+                if diff:
+                    obj = shadow.convert_to_model(self.containers)
+                    updated[tuple(sorted(diff))].append((shadow, obj))
+            elif not shadow.update_only:
+                if shadow in missing:
+                    # avoid convert_to_model() looking it up all over again
+                    obj = shadow._copy_touched_to(  # pylint: disable=W0212
+                        self.cls.__shadowclass__(), self.containers
+                    )
+                else:
+                    obj = shadow.convert_to_model(self.containers)
+                if obj:
+                    created.append((shadow, obj))
+
+        self._update(updated)
+        self._create(created)
+
+    def _update(self, updated):
+        model = self.cls.__shadowclass__
+        for fields, pairs in updated.items():
+            model.objects.bulk_update(
+                [obj for _, obj in pairs], fields, batch_size=self.batch_size
+            )
+            for shadow, _ in pairs:
+                shadow._touched.clear()  # pylint: disable=W0212
+        if updated:
+            self._logger.debug(
+                "updated %d %s objects",
+                sum(len(pairs) for pairs in updated.values()),
+                model.__name__,
+            )
+
+    def _create(self, created):
+        if not created:
+            return
+        model = self.cls.__shadowclass__
+        model.objects.bulk_create(
+            [obj for _, obj in created], batch_size=self.batch_size
+        )
+        for shadow, obj in created:
+            # Ensure other shadows referring to this one know its new pk
+            if not shadow.get_primary_key():
+                shadow.set_primary_key(obj.pk)
+            shadow._touched.clear()  # pylint: disable=W0212
+        self._logger.debug("created %d %s objects", len(created), model.__name__)
+
+    def resolve_existing(self, shadows):
+        """Resolves the existing models of shadows in bulk.
+
+        Shadows with a primary key are resolved using a single query, and the
+        remaining ones using a single query per entry in the ``__lookups__``
+        list of the shadow class. Shadows that cannot be resolved with
+        certainty (e.g. when a lookup matches multiple objects) are left for
+        the shadow's own :py:meth:`Shadow.get_existing_model` to deal with.
+
+        :returns: The set of shadows that are known not to exist in the
+                  database.
+
+        """
+        pending = [s for s in shadows if not getattr(s, '_cached_existing_model', None)]
+        if not pending:
+            return set()
+        missing = self._resolve_by_primary_key(pending)
+        if self.cls.get_existing_model is Shadow.get_existing_model:
+            pending = [s for s in pending if s.get_primary_key() is None]
+            missing.update(self._resolve_by_lookups(pending))
+        return missing
+
+    def _resolve_by_primary_key(self, shadows):
+        model = self.cls.__shadowclass__
+        by_pk = defaultdict(list)
+        for shadow in shadows:
+            pkey = shadow.get_primary_key()
+            if pkey is not None and not isinstance(pkey, Shadow):
+                by_pk[pkey].append(shadow)
+        if not by_pk:
+            return set()
+
+        found = model.objects.in_bulk(list(by_pk))
+        missing = set()
+        for pkey, members in by_pk.items():
+            if pkey in found:
+                for shadow in members:
+                    shadow.set_existing_model(found[pkey])
+            elif not isinstance(self.cls._meta.pk, django.db.models.AutoField):
+                # a missing AutoField pk is an error get_existing_model() raises
+                missing.update(members)
+        return missing
+
+    def _resolve_by_lookups(self, shadows):
+        model = self.cls.__shadowclass__
+        uncertain = set()
+        for lookup in self.cls.__lookups__:
+            if not shadows:
+                break
+            fields = [
+                self.cls._meta.get_field(name)
+                for name in (lookup if isinstance(lookup, tuple) else (lookup,))
+            ]
+            keyed = defaultdict(list)
+            for shadow in shadows:
+                key = _get_lookup_key(shadow, fields)
+                if key is _UNRESOLVABLE:
+                    uncertain.add(shadow)
+                elif key is not None:
+                    keyed[key].append(shadow)
+            if not keyed:
+                continue
+
+            found = defaultdict(list)
+            for chunk in chunks(keyed, self.batch_size):
+                query = reduce(
+                    operator.or_,
+                    (Q(**{f.attname: v for f, v in zip(fields, key)}) for key in chunk),
+                )
+                for obj in model.objects.filter(query):
+                    found[tuple(getattr(obj, f.attname) for f in fields)].append(obj)
+
+            if set(found).difference(keyed):
+                # some values were normalized by the database, so we cannot
+                # tell which shadows matched them
+                uncertain.update(shadows)
+                break
+            for key, members in keyed.items():
+                matches = found.get(key, [])
+                if len(matches) == 1:
+                    for shadow in members:
+                        shadow.set_existing_model(matches[0])
+                elif matches:
+                    uncertain.update(members)
+            shadows = [
+                s for s in shadows if s not in uncertain and not s.get_primary_key()
+            ]
+        return set(shadows).difference(uncertain)
+
+
+_UNRESOLVABLE = object()
+
+
+def _get_lookup_key(shadow, fields):
+    """Returns the database values of fields for a shadow as a tuple.
+
+    Returns None if a single-field lookup has no value, as such lookups are
+    skipped by :py:meth:`Shadow.get_existing_model`, or _UNRESOLVABLE if a
+    foreign key refers to a shadow that has no primary key yet.
+
+    """
+    key = []
+    for field in fields:
+        value = getattr(shadow, field.name)
+        if field.is_relation and value is not None:
+            value = value.get_primary_key() if isinstance(value, Shadow) else value.pk
+            if value is None:
+                return _UNRESOLVABLE
+        key.append(value)
+    if len(fields) == 1 and key[0] is None:
+        return None
+    return tuple(key)
+
+
 class Shadow(object, metaclass=MetaShadow):
     """Base class to shadow Django model classes.
 
@@ -308,8 +513,12 @@ class Shadow(object, metaclass=MetaShadow):
             return None
         elif not model:
             model = self.__shadowclass__()
+        return self._copy_touched_to(model, containers)
 
-        # Copy all modified attributes to the empty model object
+    def _copy_touched_to(self, model, containers):
+        """Copies all modified attributes to a model object, and caches it as
+        the converted model of this shadow.
+        """
         for attr in self._touched:
             value = getattr(self, attr)
             if issubclass(value.__class__, Shadow):
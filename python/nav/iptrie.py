@@ -0,0 +1,173 @@
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.  You should have received a copy of the GNU General Public License
+# along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""Longest-prefix matching of IP addresses against a set of prefixes.
+
+Finding the most specific prefix an address belongs to by testing it against a
+list of :py:class:`IPy.IP` prefixes costs one containment test per prefix.
+:py:class:`PrefixTrie` stores the prefixes in a path-compressed binary (radix)
+trie over integer addresses, one per IP version, so that a lookup costs at most
+one step per bit of the address, regardless of how many prefixes are stored.
+"""
+from IPy import IP
+
+WIDTH = {4: 32, 6: 128}
+
+
+class _Node(object):
+    __slots__ = ('key', 'length', 'value', 'has_value', 'children')
+
+    def __init__(self, key, length):
+        self.key = key
+        self.length = length
+        self.value = None
+        self.has_value = False
+        self.children = [None, None]
+
+
+class PrefixTrie(object):
+    """A mapping of IP prefixes to arbitrary values, that supports
+    longest-prefix-match lookups of IP addresses.
+
+    :param items: An optional iterable of (prefix, value) pairs to add.
+                  Prefixes may be :py:class:`IPy.IP` objects or strings.
+    """
+
+    def __init__(self, items=()):
+        self._roots = {}
+        self._count = 0
+        self.update(items)
+
+    def __len__(self):
+        return self._count
+
+    def __repr__(self):
+        return "<PrefixTrie with %d prefixes>" % self._count
+
+    def clear(self):
+        """Removes all prefixes"""
+        self._roots = {}
+        self._count = 0
+
+    def update(self, items):
+        """Adds (prefix, value) pairs from an iterable"""
+        for prefix, value in items:
+            self.add(prefix, value)
+
+    def add(self, prefix, value):
+        """Maps prefix to value, replacing any value it was already mapped to"""
+        prefix = _make_ip(prefix)
+        width = WIDTH[prefix.version()]
+        length = prefix.prefixlen()
+        key = _mask(prefix.int(), length, width)
+
+        node = self._roots.get(prefix.version())
+        if node is None:
+            node = self._roots[prefix.version()] = _Node(key, length)
+        else:
+            node = self._insert(prefix.version(), key, length, width)
+        if not node.has_value:
+            self._count += 1
+        node.value = value
+        node.has_value = True
+
+    def _insert(self, version, key, length, width):
+        """Finds or creates the node for the prefix key/length"""
+        parent, branch = None, None
+        node = self._roots[version]
+        while True:
+            common = _common_length(node.key, node.length, key, length, width)
+            if common < node.length:
+                # the new prefix diverges from this node's prefix: split it
+                split = _Node(_mask(key, common, width), common)
+                split.children[_bit(node.key, common, width)] = node
+                if common == length:
+                    new = split
+                else:
+                    new = _Node(key, length)
+                    split.children[_bit(key, common, width)] = new
+                self._replace(version, parent, branch, split)
+                return new
+            if node.length == length:
+                return node
+
+            branch = _bit(key, node.length, width)
+            child = node.children[branch]
+            if child is None:
+                child = node.children[branch] = _Node(key, length)
+                return child
+            parent, node = node, child
+
+    def _replace(self, version, parent, branch, node):
+        if parent is None:
+            self._roots[version] = node
+        else:
+            parent.children[branch] = node
+
+    def lookup(self, address, default=None):
+        """Returns the value of the longest prefix that contains address, or
+        default if no prefix contains it.
+
+        :param address: An :py:class:`IPy.IP` object or an address string.
+        """
+        match = self._find(_make_ip(address))
+        return match.value if match else default
+
+    def lookup_prefix(self, address):
+        """Returns the longest prefix that contains address as a
+        (prefix, value) tuple, or None if no prefix contains it.
+        """
+        address = _make_ip(address)
+        match = self._find(address)
+        if not match:
+            return None
+        prefix = IP(match.key, ipversion=address.version()).make_net(match.length)
+        return prefix, match.value
+
+    def _find(self, address):
+        width = WIDTH[address.version()]
+        addr = address.int()
+        node = self._roots.get(address.version())
+        best = None
+        while node is not None:
+            if (addr ^ node.key) >> (width - node.length):
+                break
+            if node.has_value:
+                best = node
+            if node.length == width:
+                break
+            node = node.children[(addr >> (width - 1 - node.length)) & 1]
+        return best
+
+
+def _make_ip(address):
+    return address if isinstance(address, IP) else IP(address)
+
+
+def _mask(key, length, width):
+    """Zeroes all but the length most significant bits of key"""
+    return key >> (width - length) << (width - length)
+
+
+def _bit(key, position, width):
+    """Returns the bit at position of key, counting from the most significant"""
+    return (key >> (width - 1 - position)) & 1
+
+
+def _common_length(key1, length1, key2, length2, width):
+    """Returns the length of the common prefix of two prefixes"""
+    length = min(length1, length2)
+    difference = (key1 ^ key2) >> (width - length)
+    return length - difference.bit_length()
@@ -27,10 +27,18 @@ class GraphiteConfigParser(NAVConfigParser):
 [carbon]
 host = 127.0.0.1
 port = 2003
+protocol = udp
+background = no
+queue_size = 100000
+batch_size = 1000
+flush_interval = 1.0
 
 [graphiteweb]
 base=http://localhost:8000/
 format=png
+concurrency = 4
+timeout = 60
+cache_step = 0
 """
 
 
@@ -15,13 +15,28 @@
 #
 """
 This module implements various common API to send metrics to a
-Graphite/Carbon backend. It currently only supports the UDP line protocol,
-as it's the easiest to implement, and will also work without vodoo in
-asynchronous programs (i .e. such as ipdevpoll, which is implemented using
-Twisted).
+Graphite/Carbon backend.
+
+Metrics are sent through a :py:class:`CarbonSender`, which supports Carbon's
+UDP and TCP line receivers, as well as its TCP pickle receiver. A sender keeps
+a persistent connection to the backend, reconnecting with an exponential
+backoff when it is lost.
+
+By default, metrics are sent synchronously from the calling thread using the
+UDP line protocol, as this will work without vodoo in asynchronous programs
+(i .e. such as ipdevpoll, which is implemented using Twisted). If
+background sending is enabled in ``graphite.conf``, metrics are instead put on
+a bounded in-memory queue, which is flushed in batches by a background
+thread.
 """
+import atexit
+from collections import deque
 import logging
+import os
+import pickle
 import socket
+import struct
+import threading
 import time
 import warnings
 from nav.metrics import CONFIG
@@ -38,6 +53,16 @@ MAX_UDP_PAYLOAD = 1400
 # Minimum interval between socket error log entries, in seconds
 SOCKET_ERROR_MESSAGE_INTERVAL = 1
 
+# Interval between log entries with the counters of background senders, in
+# seconds
+STATS_LOG_INTERVAL = 300
+
+PROTOCOL_UDP = 'udp'
+PROTOCOL_TCP = 'tcp'
+PROTOCOL_PICKLE = 'pickle'
+
+_senders = {}
+
 
 class CarbonWarning(UserWarning):
     """Custom warning class for Carbon connection related warnings"""
@@ -47,7 +72,8 @@ class CarbonWarning(UserWarning):
 
 def send_metrics_to(metric_tuples, host, port=2003):
     """
-    Sends a list of metric tuples to a carbon backend.
+    Sends a list of metric tuples to a carbon backend, using the UDP line
+    protocol.
 
     :param metric_tuples: A list of metric tuples in the form
                           [(path, (timestamp, value)), ...]
@@ -55,20 +81,385 @@ def send_metrics_to(metric_tuples, host, port=2003):
     :param port: The carbon backend UDP port
 
     """
-    # pylint: disable=W0601
-    global carbon
-    try:
-        carbon
-    except NameError:
-        carbon = socket.socket(_socktype_from_addr(host), socket.SOCK_DGRAM)
-        carbon.connect((host, port))
+    get_sender(host, port).send(metric_tuples)
 
-    _logger.debug("sending carbon metrics to [%s]:%s: %r", host, port, metric_tuples)
-    try:
+
+def send_metrics(metric_tuples):
+    """Sends a list of metric tuples to the pre-configured carbon backend.
+
+    :param metric_tuples: A list of metric tuples in the form
+                          [(path, (timestamp, value)), ...]
+
+    """
+    get_default_sender().send(metric_tuples)
+
+
+def get_default_sender():
+    """Returns the CarbonSender for the carbon backend configured in
+    graphite.conf.
+    """
+    host = CONFIG.get("carbon", "host")
+    port = CONFIG.getint("carbon", "port")
+    return get_sender(
+        host,
+        port,
+        protocol=CONFIG.get("carbon", "protocol"),
+        background=CONFIG.getboolean("carbon", "background"),
+        queue_size=CONFIG.getint("carbon", "queue_size"),
+        batch_size=CONFIG.getint("carbon", "batch_size"),
+        flush_interval=CONFIG.getfloat("carbon", "flush_interval"),
+    )
+
+
+def get_sender(host, port, protocol=PROTOCOL_UDP, background=False, **kwargs):
+    """Returns a shared CarbonSender for the given backend and protocol.
+
+    Senders are shared per process, and are re-created in forked child
+    processes, since the threads of background senders do not survive a fork.
+
+    :param background: If True, the sender queues metrics and flushes them
+                       from a background thread.
+    :param kwargs: Further keyword arguments to the CarbonSender constructor.
+    """
+    key = (host, port, protocol, background)
+    sender = _senders.get(key)
+    if sender is None or sender.pid != os.getpid():
+        sender = CarbonSender(host, port, protocol=protocol, **kwargs)
+        if background:
+            sender.start()
+        _senders[key] = sender
+    return sender
+
+
+@atexit.register
+def _stop_senders():
+    for sender in _senders.values():
+        if sender.pid == os.getpid():
+            sender.stop()
+
+
+class CarbonSender(object):
+    """Sends metrics to a Carbon backend over a persistent connection.
+
+    Metrics passed to :py:meth:`send` are sent immediately, unless the sender
+    has been started as a background sender using :py:meth:`start`. In the
+    latter case, metrics are put on a bounded queue, which is flushed by a
+    background thread whenever `batch_size` metrics have accumulated, or
+    every `flush_interval` seconds. Metrics are dropped if the queue is full,
+    which will happen if the backend is unavailable for a longer period of
+    time.
+
+    The number of metrics that have been enqueued, sent and dropped are
+    available through the :py:attr:`stats` property. Background senders log
+    them every STATS_LOG_INTERVAL seconds, and all senders log them when
+    stopped.
+    """
+
+    def __init__(
+        self,
+        host,
+        port=2003,
+        protocol=PROTOCOL_UDP,
+        queue_size=100000,
+        batch_size=1000,
+        flush_interval=1.0,
+        max_backoff=60.0,
+    ):
+        self.host = host
+        self.port = port
+        self.protocol = protocol
+        try:
+            self.transport = _TRANSPORTS[protocol](host, port)
+        except KeyError:
+            raise ValueError("unknown carbon protocol: %r" % protocol)
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self.pid = os.getpid()
+
+        self.enqueued = 0
+        self.sent = 0
+        self.dropped = 0
+
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None
+        self._stopping = False
+        self._backoff = 0
+        self._next_attempt = 0
+        self._logged_stats = self.stats
+        self._stats_logged_at = time.time()
+
+    def __repr__(self):
+        return "<CarbonSender %s://[%s]:%s %r>" % (
+            self.protocol,
+            self.host,
+            self.port,
+            self.stats,
+        )
+
+    @property
+    def stats(self):
+        """A dict of counters for enqueued, sent and dropped metrics, and the
+        current length of the queue.
+        """
+        return {
+            'enqueued': self.enqueued,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'queued': len(self._queue),
+        }
+
+    def log_stats(self):
+        """Logs the counters of this sender, as a warning if any metrics have
+        been dropped since the last time they were logged.
+        """
+        stats = self.stats
+        dropped = stats['dropped'] - self._logged_stats['dropped']
+        _logger.log(
+            logging.WARNING if dropped else logging.INFO,
+            "carbon sender %s://[%s]:%s: %d metrics sent, %d dropped since last "
+            "report (%d enqueued, %d sent, %d dropped in total, %d queued)",
+            self.protocol,
+            self.host,
+            self.port,
+            stats['sent'] - self._logged_stats['sent'],
+            dropped,
+            stats['enqueued'],
+            stats['sent'],
+            stats['dropped'],
+            stats['queued'],
+        )
+        self._logged_stats = stats
+        self._stats_logged_at = time.time()
+
+    @property
+    def is_background(self):
+        """True if metrics are sent by a background thread"""
+        return self._thread is not None
+
+    def start(self):
+        """Starts a background thread that flushes queued metrics"""
+        if self._thread:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(
+            target=self._run, name="carbon-sender", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """Stops the background thread, attempting to flush any remaining
+        queued metrics first.
+        """
+        thread = self._thread
+        if thread:
+            with self._lock:
+                self._stopping = True
+                self._wakeup.notify()
+            thread.join(timeout)
+            self._thread = None
+        if self.enqueued:
+            self.log_stats()
+
+    def send(self, metric_tuples):
+        """Sends, or enqueues for sending, a list of metric tuples.
+
+        :param metric_tuples: A list of metric tuples in the form
+                              [(path, (timestamp, value)), ...]
+        """
+        if not self.is_background:
+            metric_tuples = list(metric_tuples)
+            _logger.debug(
+                "sending carbon metrics to [%s]:%s: %r",
+                self.host,
+                self.port,
+                metric_tuples,
+            )
+            self.enqueued += len(metric_tuples)
+            self.dropped += len(self._send_batch(metric_tuples))
+            return
+
+        with self._lock:
+            room = self.queue_size - len(self._queue)
+            accepted = 0
+            for metric in metric_tuples:
+                if accepted < room:
+                    self._queue.append(metric)
+                    accepted += 1
+                else:
+                    self.dropped += 1
+            self.enqueued += accepted
+            if len(self._queue) >= self.batch_size:
+                self._wakeup.notify()
+
+    def flush(self):
+        """Sends all queued metrics from the calling thread.
+
+        :returns: True if the queue was emptied.
+        """
+        while True:
+            with self._lock:
+                batch = self._take_batch()
+            if not batch:
+                return True
+            unsent = self._send_batch(batch)
+            if unsent:
+                self._requeue(unsent)
+                return False
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._stopping and len(self._queue) < self.batch_size:
+                    self._wakeup.wait(self.flush_interval)
+                stopping = self._stopping
+            self.flush()
+            if stopping:
+                break
+            if time.time() - self._stats_logged_at >= STATS_LOG_INTERVAL:
+                self.log_stats()
+            delay = self._next_attempt - time.time()
+            if delay > 0:
+                time.sleep(min(delay, self.flush_interval))
+        self.transport.close()
+
+    def _take_batch(self):
+        count = min(self.batch_size, len(self._queue))
+        return [self._queue.popleft() for _ in range(count)]
+
+    def _requeue(self, batch):
+        with self._lock:
+            room = self.queue_size - len(self._queue)
+            if room < len(batch):
+                self.dropped += len(batch) - room
+                batch = batch[: max(room, 0)]
+            self._queue.extendleft(reversed(batch))
+
+    def _send_batch(self, batch):
+        """Sends a batch of metrics, (re)connecting if necessary.
+
+        After a failure, further attempts are backed off by the background
+        thread, and by synchronous senders that need to reconnect. Synchronous
+        UDP senders have nothing to reconnect, and try again on every call.
+
+        :returns: The list of metrics from the batch that were not sent.
+        """
+        if time.time() < self._next_attempt:
+            return batch
+        try:
+            self.transport.send(batch)
+        except socket.error as error:
+            sent = getattr(error, 'sent', 0)
+            self.sent += sent
+            if self.transport.connection_oriented:
+                self.transport.close()
+            if self.is_background or self.transport.connection_oriented:
+                self._backoff = min(max(self._backoff * 2, 1), self.max_backoff)
+                self._next_attempt = time.time() + self._backoff
+            _handle_error(error, self.host, self.port)
+            return batch[sent:]
+        self._backoff = 0
+        self._next_attempt = 0
+        self.sent += len(batch)
+        return []
+
+
+class _Transport(object):
+    """Base class for a socket connection to a Carbon backend"""
+
+    socket_type = socket.SOCK_STREAM
+    connection_oriented = True
+    timeout = 5.0
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.socket = None
+
+    def connect(self):
+        """Connects to the backend"""
+        sock = socket.socket(_socktype_from_addr(self.host), self.socket_type)
+        if self.connection_oriented:
+            sock.settimeout(self.timeout)
+        try:
+            sock.connect((self.host, self.port))
+        except socket.error:
+            sock.close()
+            raise
+        self.socket = sock
+
+    def close(self):
+        """Closes the connection to the backend, if open"""
+        if self.socket:
+            self.socket.close()
+            self.socket = None
+
+    def send(self, metric_tuples):
+        """Sends a list of metric tuples to the backend, connecting first if
+        necessary.
+        """
+        if not self.socket:
+            self.connect()
+        self._send(metric_tuples)
+
+    def _send(self, metric_tuples):
+        raise NotImplementedError
+
+
+class _UDPTransport(_Transport):
+    """Carbon's line protocol over UDP"""
+
+    socket_type = socket.SOCK_DGRAM
+    connection_oriented = False
+
+    def _send(self, metric_tuples):
+        sent = 0
         for packet in metrics_to_packets(metric_tuples):
-            carbon.send(packet)
-    except socket.error as error:
-        _handle_error(error, host, port)
+            try:
+                self.socket.send(packet)
+            except socket.error as error:
+                if sent:
+                    raise _PartialSendError(error, sent)
+                raise
+            sent += packet.count(b"\n")
+
+
+class _TCPTransport(_Transport):
+    """Carbon's line protocol over TCP"""
+
+    def _send(self, metric_tuples):
+        self.socket.sendall(_encode_lines(metric_tuples))
+
+
+class _PickleTransport(_Transport):
+    """Carbon's pickle protocol over TCP"""
+
+    def _send(self, metric_tuples):
+        payload = pickle.dumps(
+            [(path, (int(ts), float(value))) for path, (ts, value) in metric_tuples],
+            protocol=2,
+        )
+        self.socket.sendall(struct.pack("!L", len(payload)) + payload)
+
+
+class _PartialSendError(socket.error):
+    """A socket error that interrupted the sending of a list of metrics, after
+    the first `sent` of them had been sent.
+    """
+
+    def __init__(self, error, sent):
+        super(_PartialSendError, self).__init__(*error.args)
+        self.sent = sent
+
+
+_TRANSPORTS = {
+    PROTOCOL_UDP: _UDPTransport,
+    PROTOCOL_TCP: _TCPTransport,
+    PROTOCOL_PICKLE: _PickleTransport,
+}
 
 
 def _handle_error(error, host, port):
@@ -108,31 +499,25 @@ def _reset_warning_registry():
                 del __warningregistry__[key]
 
 
-def send_metrics(metric_tuples):
-    """Sends a list of metric tuples to the pre-configured carbon backend.
-
-    :param metric_tuples: A list of metric tuples in the form
-                          [(path, (timestamp, value)), ...]
-
-    """
-    host = CONFIG.get("carbon", "host")
-    port = CONFIG.getint("carbon", "port")
-    return send_metrics_to(metric_tuples, host, port)
-
-
 def _socktype_from_addr(addr):
     info = socket.getaddrinfo(addr, 0)
     socktype = info[0][0]
     return socktype
 
 
-def _metric_to_line(metric_tuple):
-    path, (timestamp, value) = metric_tuple
-    line = "%s %s %s\n" % (path, value, int(timestamp))
-    return line.encode('utf-8')
+def _encode_lines(metric_tuples):
+    """Encodes a list of metric tuples as a single block of Carbon line protocol
+    data, using only a single encode operation.
+    """
+    return "".join(
+        [
+            "%s %s %d\n" % (path, value, timestamp)
+            for path, (timestamp, value) in metric_tuples
+        ]
+    ).encode('utf-8')
 
 
-def metrics_to_packets(metric_tuples):
+def metrics_to_packets(metric_tuples, max_payload=MAX_UDP_PAYLOAD):
     """
     Converts a list of metric tuples to a series of Graphite/Carbon
     protocol packets ready to transmit over the wire (UDP) to a Carbon backend.
@@ -144,16 +529,25 @@ def metrics_to_packets(metric_tuples):
              Carbon backend.
 
     """
-    output = bytearray()
-    for metric in metric_tuples:
-        line = _metric_to_line(metric)
-        if len(output) + len(line) > MAX_UDP_PAYLOAD:
-            packet = bytes(output)
-            yield packet
-            del output[:]
-
-        output.extend(line)
-
-    if output:
-        packet = bytes(output)
-        yield packet
+    return _split_payload(_encode_lines(metric_tuples), max_payload)
+
+
+def _split_payload(data, max_payload):
+    """Splits a block of line protocol data into chunks of no more than
+    max_payload bytes, without splitting any lines.
+
+    A single line that is longer than max_payload is yielded on its own.
+    """
+    start = 0
+    length = len(data)
+    while start < length:
+        end = start + max_payload
+        if end >= length:
+            yield data[start:]
+            return
+        cut = data.rfind(b"\n", start, end) + 1
+        if cut <= start:
+            # a single line is longer than max_payload
+            cut = data.find(b"\n", end) + 1 or length
+        yield data[start:cut]
+        start = cut
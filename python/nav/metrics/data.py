@@ -15,13 +15,19 @@
 # along with NAV. If not, see <http://www.gnu.org/licenses/>.
 #
 """Retrieval and calculations on raw numbers from Graphite metrics"""
-import codecs
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import json
+import hashlib
 import logging
+import os
+from threading import Lock
+import time
 from urllib.parse import urlencode, urljoin
-from urllib.request import Request, urlopen
-from urllib.error import HTTPError, URLError
+
+from django.core.cache import caches
+import requests
+from requests.adapters import HTTPAdapter
 
 from nav.metrics import CONFIG, errors
 from nav.metrics.templates import (
@@ -35,8 +41,12 @@ _logger = logging.getLogger(__name__)
 MAX_TARGETS_PER_REQUEST = 100
 GRAPHITE_TIME_FORMAT = "%H:%M_%Y%m%d"
 
+_client = None
+
 
-def get_metric_average(target, start="-5min", end="now", ignore_unknown=True):
+def get_metric_average(
+    target, start="-5min", end="now", ignore_unknown=True, timeout=None
+):
     """Calculates the average value of a metric over a given period of time
 
     :param target: A metric path string or a list of multiple metric paths
@@ -45,13 +55,14 @@ def get_metric_average(target, start="-5min", end="now", ignore_unknown=True):
     :param ignore_unknown: Ignore unknown values when calculating the average.
                            Unless True, any unknown data in the series will
                            result in an average value of None.
+    :param timeout: See :py:func:`get_metric_data`.
     :returns: A dict of {target: average_value} items. Targets that weren't
               found in Graphite will not be present in the dict.
 
     """
     start_time = datetime.now()
 
-    data = get_metric_data(target, start, end)
+    data = get_metric_data(target, start, end, timeout=timeout)
     result = {}
     for target in data:
         dpoints = [
@@ -72,8 +83,8 @@ def get_metric_average(target, start="-5min", end="now", ignore_unknown=True):
     return result
 
 
-def get_metric_max(target, start="-5min", end="now"):
-    data = get_metric_data(target, start, end)
+def get_metric_max(target, start="-5min", end="now", timeout=None):
+    data = get_metric_data(target, start, end, timeout=timeout)
     result = {}
     for target in data:
         dpoints = [d[0] for d in target['datapoints'] if d[0] is not None]
@@ -86,13 +97,21 @@ def get_metric_max(target, start="-5min", end="now"):
     return result
 
 
-def get_metric_data(target, start="-5min", end="now"):
+def get_metric_data(target, start="-5min", end="now", timeout=None):
     """
     Retrieves raw datapoints from a graphite target for a given period of time.
 
+    Large lists of targets are split into multiple render requests, which are
+    issued concurrently by the shared :py:class:`GraphiteRenderClient`.
+    Results are shared with other callers and processes through a
+    :py:class:`RenderCache`, if `cache_step` is set in graphite.conf.
+
     :param target: A metric path string or a list of multiple metric paths
     :param start: A start time specification that Graphite will accept.
     :param end: An end time specification that Graphite will accept.
+    :param timeout: If given, the number of seconds to wait for graphite-web
+                    to respond, if less than the timeout configured in
+                    graphite.conf.
 
     :returns: A raw, response from Graphite. Normally a list of dicts that
               represent the names and datapoints of each matched target,
@@ -104,9 +123,6 @@ def get_metric_data(target, start="-5min", end="now"):
     if not target:
         return []  # no point in wasting time on http requests for no data
 
-    base = CONFIG.get("graphiteweb", "base")
-    url = urljoin(base, "/render/")
-
     # What does Graphite accept of formats? Lets check if the parameters are
     # datetime objects and try to force a format then
     if isinstance(start, datetime):
@@ -114,39 +130,255 @@ def get_metric_data(target, start="-5min", end="now"):
     if isinstance(end, datetime):
         end = end.strftime(GRAPHITE_TIME_FORMAT)
 
-    query = {
-        'target': target,
-        'from': start,
-        'until': end,
-        'format': 'json',
-    }
-    query = urlencode(query, True)
-
     _logger.debug("get_metric_data%r", (target, start, end))
-    req = Request(url, data=query.encode('utf-8'))
-    try:
-        response = urlopen(req)
-        json_data = json.load(codecs.getreader('utf-8')(response))
-        _logger.debug("get_metric_data: returning %d results", len(json_data))
-        return json_data
-    except HTTPError as err:
-        _logger.error(
-            "Got a 500 error from graphite-web when fetching %s" "with data %s",
-            err.url,
-            query,
+    renderer = get_render_cache() or get_render_client()
+    json_data = renderer.render(target, start, end, timeout=timeout)
+    _logger.debug("get_metric_data: returning %d results", len(json_data))
+    return json_data
+
+
+def get_render_cache():
+    """Returns a RenderCache for this process' shared GraphiteRenderClient, or
+    None unless render caching has been enabled in graphite.conf.
+    """
+    step = CONFIG.getint("graphiteweb", "cache_step")
+    if step <= 0:
+        return None
+    return RenderCache(get_render_client(), caches['graphite'], step=step)
+
+
+def get_render_client():
+    """Returns this process' shared GraphiteRenderClient, configured from
+    graphite.conf.
+    """
+    global _client  # pylint: disable=W0603
+    base = CONFIG.get("graphiteweb", "base")
+    if _client is None or _client.pid != os.getpid() or _client.base != base:
+        if _client is not None:
+            _client.close()
+        _client = GraphiteRenderClient(
+            base,
+            concurrency=CONFIG.getint("graphiteweb", "concurrency"),
+            timeout=CONFIG.getfloat("graphiteweb", "timeout"),
+        )
+    return _client
+
+
+class GraphiteRenderClient(object):
+    """A client for the graphite-web render API.
+
+    HTTP connections are kept alive and reused between requests. A list of
+    targets that is too large for a single request is split into multiple
+    requests, of which up to `concurrency` are run in parallel. Their results
+    are merged in the order of the original target list.
+    """
+
+    def __init__(
+        self,
+        base,
+        concurrency=4,
+        timeout=60.0,
+        max_targets=MAX_TARGETS_PER_REQUEST,
+    ):
+        self.base = base
+        self.url = urljoin(base, "/render/")
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.max_targets = max_targets
+        self.pid = os.getpid()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._executor = None
+        self._lock = Lock()
+
+    def render(self, target, start="-5min", end="now", timeout=None):
+        """Fetches datapoints for a target or a list of targets.
+
+        :param timeout: Overrides the client's request timeout, if lower.
+        :returns: The merged JSON responses from graphite-web.
+        """
+        if isinstance(target, str):
+            target = [target]
+        if timeout is None or timeout > self.timeout:
+            timeout = self.timeout
+        batches = list(chunks(target, self.max_targets))
+        if len(batches) == 1 or self.concurrency == 1:
+            result = []
+            for batch in batches:
+                result.extend(self._render(batch, start, end, timeout))
+            return result
+
+        _logger.debug(
+            "rendering %d targets in %d parallel requests", len(target), len(batches)
         )
-        _logger.error("Graphite output: %s", err.fp.read())
-        raise errors.GraphiteUnreachableError("{0} is unreachable".format(base), err)
-    except URLError as err:
-        raise errors.GraphiteUnreachableError("{0} is unreachable".format(base), err)
-    except ValueError:
-        # response could not be decoded
-        return []
-    finally:
+        futures = [
+            self._get_executor().submit(self._render, batch, start, end, timeout)
+            for batch in batches
+        ]
+        result = []
+        try:
+            for future in futures:
+                result.extend(future.result())
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+        return result
+
+    def close(self):
+        """Closes pooled connections and stops any worker threads"""
+        with self._lock:
+            if self._executor:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+        self.session.close()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.concurrency, thread_name_prefix="graphite-render"
+                )
+            return self._executor
+
+    def _render(self, targets, start, end, timeout):
+        query = {
+            'target': list(targets),
+            'from': start,
+            'until': end,
+            'format': 'json',
+        }
         try:
-            response.close()
-        except NameError:
-            pass
+            response = self.session.post(self.url, data=query, timeout=timeout)
+            response.raise_for_status()
+        except requests.HTTPError as err:
+            _logger.error(
+                "Got a %s error from graphite-web when fetching %s with data %s",
+                err.response.status_code,
+                self.url,
+                urlencode(query, True),
+            )
+            _logger.error("Graphite output: %s", err.response.text)
+            raise errors.GraphiteUnreachableError(
+                "{0} is unreachable".format(self.base), err
+            )
+        except requests.RequestException as err:
+            raise errors.GraphiteUnreachableError(
+                "{0} is unreachable".format(self.base), err
+            )
+
+        try:
+            return response.json()
+        except ValueError:
+            # response could not be decoded
+            return []
+
+
+_Window = namedtuple('_Window', 'bucket start end ttl')
+
+
+class RenderCache(object):
+    """A cache of Graphite render results, shared between processes through
+    a Django cache backend.
+
+    Results are cached per request, keyed on its list of targets, the time
+    window as given to Graphite and the current time quantized to `step`
+    seconds. `step` should match the retention step of the metrics: Within a
+    step, requests for relative windows like `-5min` to `now` will see the
+    same datapoints, so the entries are set to expire at the end of the step.
+
+    Identical concurrent requests are coalesced: The first caller to miss
+    takes a short lease on the request, while other callers that miss the same
+    request wait for the lease holder to fill in the result rather than issuing
+    their own render requests. This requires a cache backend with an atomic
+    add(), such as the database or memcached backends.
+
+    A render costs a fixed number of cache operations regardless of how many
+    targets it has: a lookup, and on a miss, a lease, a store and a release.
+    """
+
+    prefix = 'nav:graphite:render:'
+
+    def __init__(self, client, cache, step=60, lease_timeout=10, poll_interval=0.1):
+        self.client = client
+        self.cache = cache
+        self.step = step
+        self.lease_timeout = lease_timeout
+        self.poll_interval = poll_interval
+
+    def render(self, target, start="-5min", end="now", timeout=None):
+        """Fetches datapoints for a target or a list of targets, from the
+        cache if possible.
+
+        :param timeout: Passed on to the client when fetching from Graphite.
+
+        :returns: The merged JSON responses from graphite-web, in the order
+                  of the targets.
+        """
+        if isinstance(target, str):
+            target = [target]
+        targets = list(OrderedDict.fromkeys(t.strip() for t in target))
+        window = self._make_window(start, end)
+        key = self._make_key(window, *targets)
+
+        result = self.cache.get(key)
+        _logger.debug(
+            "render cache: %s for %d targets (%s to %s)",
+            "miss" if result is None else "hit",
+            len(targets),
+            start,
+            end,
+        )
+        if result is None:
+            result = self._fetch(key, targets, window, timeout)
+        return result
+
+    def _fetch(self, key, targets, window, timeout=None):
+        lease_key = key + ':lease'
+        if self.cache.add(lease_key, True, self.lease_timeout):
+            try:
+                return self._render(key, targets, window, timeout)
+            finally:
+                self.cache.delete(lease_key)
+
+        _logger.debug("render cache: waiting for result fetched by others")
+        result = self._wait_for(key, lease_key)
+        if result is None:
+            result = self._render(key, targets, window, timeout)
+        return result
+
+    def _wait_for(self, key, lease_key):
+        """Waits for another caller to fill in the result for key, for as long
+        as it holds the lease.
+        """
+        deadline = time.time() + self.lease_timeout
+        while time.time() < deadline:
+            time.sleep(self.poll_interval)
+            found = self.cache.get_many([key, lease_key])
+            if key in found:
+                return found[key]
+            if lease_key not in found:
+                break
+        return None
+
+    def _render(self, key, targets, window, timeout=None):
+        data = self.client.render(targets, window.start, window.end, timeout=timeout)
+        self.cache.set(key, data, window.ttl)
+        return data
+
+    def _make_window(self, start="-5min", end="now"):
+        now = time.time()
+        ttl = max(1, int(self.step - now % self.step))
+        return _Window(int(now // self.step), start, end, ttl)
+
+    def _make_key(self, window, *targets):
+        raw = '\0'.join(
+            (str(window.bucket), str(window.start), str(window.end)) + targets
+        )
+        return self.prefix + hashlib.md5(raw.encode('utf-8')).hexdigest()
 
 
 DEFAULT_TIME_FRAMES = ('day', 'week', 'month')
@@ -201,9 +433,7 @@ def get_netboxes_availability(
 
 def populate_for_interval(result, targets, netboxes, start_time, end_time):
     """Populate results based on a time interval"""
-    avg = {}
-    for request in chunks(targets, MAX_TARGETS_PER_REQUEST):
-        avg.update(get_metric_average(request, start=start_time, end=end_time))
+    avg = get_metric_average(targets, start=start_time, end=end_time)
 
     for netbox in netboxes:
         root = result[netbox.id]
@@ -223,9 +453,7 @@ def populate_for_interval(result, targets, netboxes, start_time, end_time):
 def populate_for_time_frame(result, targets, netboxes, time_frames):
     """Populate results based on a list of time frames"""
     for time_frame in time_frames:
-        avg = {}
-        for request in chunks(targets, MAX_TARGETS_PER_REQUEST):
-            avg.update(get_metric_average(request, start="-1%s" % time_frame))
+        avg = get_metric_average(targets, start="-1%s" % time_frame)
 
         for netbox in netboxes:
             root = result[netbox.id]
@@ -17,12 +17,151 @@
 """
 Metric naming templates for various things that NAV sends/retrieves from
 Graphite.
+
+Metric paths are built for every counter of every port on every collection
+run, so all of them are memoized in a bounded LRU cache keyed on the name of
+the function that builds them and its raw, unescaped arguments. Since the
+keys are the raw names, a cached path can never be wrong, only stale:
+:py:func:`invalidate_sysname` is called when a device changes its sysname, to
+evict the entries that will no longer be asked for.
 """
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+
 from nav.metrics.names import escape_metric_name
 
 # pylint: disable=C0111
 
-
+PATH_CACHE_SIZE = 100000
+
+
+class MetricPathCache(object):
+    """A bounded LRU cache of escaped metric paths.
+
+    Keys are tuples whose first element is the raw sysname (or other name) the
+    path was built from, which makes it possible to evict every path of a
+    single device.
+    """
+
+    def __init__(self, maxsize=PATH_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._paths = OrderedDict()
+        self._keys_by_sysname = {}
+        self._lock = Lock()
+
+    def get(self, key, builder):
+        """Returns the cached path for key, calling builder() to build it if
+        it isn't cached.
+        """
+        with self._lock:
+            try:
+                path = self._paths[key]
+            except KeyError:
+                self.misses += 1
+            else:
+                self._paths.move_to_end(key)
+                self.hits += 1
+                return path
+
+        path = builder()
+        with self._lock:
+            self._paths[key] = path
+            self._keys_by_sysname.setdefault(key[0], set()).add(key)
+            while len(self._paths) > self.maxsize:
+                oldest, _ = self._paths.popitem(last=False)
+                self._forget(oldest)
+        return path
+
+    def invalidate_sysname(self, sysname):
+        """Evicts all cached paths built from sysname"""
+        with self._lock:
+            for key in self._keys_by_sysname.pop(sysname, ()):
+                self._paths.pop(key, None)
+
+    def clear(self):
+        """Evicts everything and resets the statistics"""
+        with self._lock:
+            self._paths.clear()
+            self._keys_by_sysname.clear()
+            self.hits = self.misses = 0
+
+    @property
+    def stats(self):
+        """Returns a dict of cache statistics"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._paths),
+            'maxsize': self.maxsize,
+        }
+
+    def _forget(self, key):
+        keys = self._keys_by_sysname.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_sysname[key[0]]
+
+
+_path_cache = MetricPathCache()
+
+
+def get_path_cache_stats():
+    """Returns hit/miss statistics for the metric path cache"""
+    return _path_cache.stats
+
+
+def invalidate_sysname(sysname):
+    """Evicts all cached metric paths for a device. Should be called when a
+    device's sysname changes.
+    """
+    _path_cache.invalidate_sysname(sysname)
+
+
+def clear_path_cache():
+    """Empties the metric path cache"""
+    _path_cache.clear()
+
+
+def _cached_path(builder):
+    """Memoizes a metric path builder in the path cache.
+
+    The builder's first argument is replaced by the raw name it refers to (see
+    :py:func:`_get_name`), which also becomes the first element of the cache
+    key. Calls with unhashable arguments are not cached.
+    """
+    name = builder.__name__
+
+    @wraps(builder)
+    def _wrapper(owner, *args, **kwargs):
+        owner = _get_name(owner)
+        key = (owner, name) + args
+        if kwargs:
+            key += tuple(sorted(kwargs.items()))
+        try:
+            hash(key)
+        except TypeError:
+            return builder(owner, *args, **kwargs)
+        return _path_cache.get(key, lambda: builder(owner, *args, **kwargs))
+
+    return _wrapper
+
+
+def _get_name(obj):
+    """Returns the sysname of a netbox, the network address of a prefix, or
+    obj itself.
+    """
+    if hasattr(obj, 'sysname'):
+        return obj.sysname
+    if hasattr(obj, 'net_address'):
+        return obj.net_address
+    return obj
+
+
+@_cached_path
 def metric_prefix_for_ipdevpoll_job(sysname, job_name):
     tmpl = "{device}.ipdevpoll.{job_name}"
     return tmpl.format(
@@ -30,6 +169,19 @@ def metric_prefix_for_ipdevpoll_job(sysname, job_name):
     )
 
 
+@_cached_path
+def metric_prefix_for_ipdevpoll_scheduler(hostname):
+    tmpl = "nav.ipdevpoll.{hostname}.scheduler"
+    return tmpl.format(hostname=escape_metric_name(hostname))
+
+
+@_cached_path
+def metric_prefix_for_ipdevpoll_workerpool(hostname):
+    tmpl = "nav.ipdevpoll.{hostname}.workerpool"
+    return tmpl.format(hostname=escape_metric_name(hostname))
+
+
+@_cached_path
 def metric_path_for_bandwith(sysname, is_percent):
     tmpl = "{system}.bandwidth{percent}"
     return tmpl.format(
@@ -38,6 +190,7 @@ def metric_path_for_bandwith(sysname, is_percent):
     )
 
 
+@_cached_path
 def metric_path_for_bandwith_peak(sysname, is_percent):
     tmpl = "{system}.bandwidth_peak{percent}"
     return tmpl.format(
@@ -46,6 +199,7 @@ def metric_path_for_bandwith_peak(sysname, is_percent):
     )
 
 
+@_cached_path
 def metric_path_for_cpu_load(sysname, cpu_name, interval):
     tmpl = "{cpu}.{cpu_name}.loadavg{interval}min"
     return tmpl.format(
@@ -55,6 +209,7 @@ def metric_path_for_cpu_load(sysname, cpu_name, interval):
     )
 
 
+@_cached_path
 def metric_path_for_cpu_utilization(sysname, cpu_name):
     tmpl = "{cpu}.{cpu_name}.utilization"
     return tmpl.format(
@@ -62,6 +217,7 @@ def metric_path_for_cpu_utilization(sysname, cpu_name):
     )
 
 
+@_cached_path
 def metric_path_for_interface(sysname, ifname, counter):
     tmpl = "{interface}.{counter}"
     return tmpl.format(
@@ -70,11 +226,19 @@ def metric_path_for_interface(sysname, ifname, counter):
     )
 
 
+@_cached_path
 def metric_path_for_packet_loss(sysname):
     tmpl = "{device}.ping.packetLoss"
     return tmpl.format(device=metric_prefix_for_device(sysname))
 
 
+@_cached_path
+def metric_path_for_ping_detection_latency(sysname):
+    tmpl = "{device}.ping.detectionLatency"
+    return tmpl.format(device=metric_prefix_for_device(sysname))
+
+
+@_cached_path
 def metric_path_for_prefix(netaddr, metric_name):
     tmpl = "{prefix}.{metric_name}"
     return tmpl.format(
@@ -83,16 +247,19 @@ def metric_path_for_prefix(netaddr, metric_name):
     )
 
 
+@_cached_path
 def metric_path_for_roundtrip_time(sysname):
     tmpl = "{device}.ping.roundTripTime"
     return tmpl.format(device=metric_prefix_for_device(sysname))
 
 
+@_cached_path
 def metric_prefix_for_sensors(sysname):
     tmpl = "{device}.sensors"
     return tmpl.format(device=metric_prefix_for_device(sysname))
 
 
+@_cached_path
 def metric_path_for_sensor(sysname, sensor):
     tmpl = "{prefix}.{sensor}"
     return tmpl.format(
@@ -100,38 +267,43 @@ def metric_path_for_sensor(sysname, sensor):
     )
 
 
+@_cached_path
 def metric_path_for_service_availability(sysname, handler, service_id):
     tmpl = "{service}.availability"
     return tmpl.format(service=metric_prefix_for_service(sysname, handler, service_id))
 
 
+@_cached_path
 def metric_path_for_service_response_time(sysname, handler, service_id):
     tmpl = "{service}.responseTime"
     return tmpl.format(service=metric_prefix_for_service(sysname, handler, service_id))
 
 
+@_cached_path
 def metric_path_for_sysuptime(sysname):
     tmpl = "{system}.sysuptime"
     return tmpl.format(system=metric_prefix_for_system(sysname))
 
 
+@_cached_path
 def metric_path_for_power(sysname, index):
     tmpl = "{system}.power.{index}"
     return tmpl.format(system=metric_prefix_for_system(sysname), index=index)
 
 
+@_cached_path
 def metric_prefix_for_cpu(sysname):
     tmpl = "{device}.cpu"
     return tmpl.format(device=metric_prefix_for_device(sysname))
 
 
+@_cached_path
 def metric_prefix_for_device(sysname):
     tmpl = "nav.devices.{sysname}"
-    if hasattr(sysname, 'sysname'):
-        sysname = sysname.sysname
     return tmpl.format(sysname=escape_metric_name(sysname))
 
 
+@_cached_path
 def metric_prefix_for_interface(sysname, ifname):
     tmpl = "{ports}.{ifname}"
     return tmpl.format(
@@ -139,6 +311,7 @@ def metric_prefix_for_interface(sysname, ifname):
     )
 
 
+@_cached_path
 def metric_prefix_for_memory(sysname, memory_name):
     tmpl = "{device}.memory.{memname}"
     return tmpl.format(
@@ -147,18 +320,19 @@ def metric_prefix_for_memory(sysname, memory_name):
     )
 
 
+@_cached_path
 def metric_prefix_for_ports(sysname):
     tmpl = "{device}.ports"
     return tmpl.format(device=metric_prefix_for_device(sysname))
 
 
+@_cached_path
 def metric_prefix_for_prefix(netaddr):
     tmpl = "nav.prefixes.{netaddr}"
-    if hasattr(netaddr, 'net_address'):
-        netaddr = netaddr.net_address
     return tmpl.format(netaddr=escape_metric_name(netaddr))
 
 
+@_cached_path
 def metric_prefix_for_service(sysname, handler, service_id):
     tmpl = "{device}.services.{handler}_{service_id}"
     return tmpl.format(
@@ -166,20 +340,25 @@ def metric_prefix_for_service(sysname, handler, service_id):
     )
 
 
+@_cached_path
 def metric_prefix_for_system(sysname):
     tmpl = "{device}.system"
     return tmpl.format(device=metric_prefix_for_device(sysname))
 
 
+@_cached_path
 def metric_prefix_for_multicast_group(group):
     tmpl = "nav.multicast.groups.{group}"
     return tmpl.format(group=escape_metric_name(str(group)))
 
 
 def metric_path_for_multicast_usage(group, sysname):
+    return _build_path_for_multicast_usage(group, _get_name(sysname))
+
+
+@_cached_path
+def _build_path_for_multicast_usage(group, sysname):
     tmpl = "{group}.igmp_usage.{sysname}"
-    if hasattr(sysname, 'sysname'):
-        sysname = sysname.sysname
     return tmpl.format(
         group=metric_prefix_for_multicast_group(group),
         sysname=escape_metric_name(sysname),
@@ -60,13 +60,20 @@ This module should provide an API for evaluating threshold expressions.
 Alerting is outside of the scope of this module.
 
 """
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import timedelta
 from functools import partial
 import logging
 import re
+import time
 
 from nav.metrics.data import get_metric_average
-from nav.metrics.graphs import get_metric_meta, extract_series_name
+from nav.metrics.graphs import (
+    get_metric_meta,
+    extract_series_name,
+    translate_serieslist_to_regex,
+)
 
 
 # Pattern to extract the ID of a metric from a series name returned in a
@@ -75,6 +82,8 @@ from nav.metrics.lookup import lookup
 from nav.models.manage import Interface
 
 
+WILDCARD_CHARACTERS = frozenset('*?[{')
+
 EXPRESSION_PATTERN = re.compile(
     r'^ \s* (?P<operator> [<>] ) \s* '
     r'(?P<value> ([+-])? [0-9]+(\.[0-9]+)? ) \s*'
@@ -89,6 +98,9 @@ YEAR = timedelta(days=365).total_seconds()
 
 MEGA = 1e6
 
+# The shortest timeout to give Graphite when retrieving values before a deadline
+MIN_TIMEOUT = 0.1
+
 _logger = logging.getLogger(__name__)
 
 
@@ -108,18 +120,22 @@ class ThresholdEvaluator(object):
 
     """
 
-    def __init__(self, target, period=DEFAULT_INTERVAL, raw=False):
+    def __init__(self, target, period=DEFAULT_INTERVAL, raw=False, maxima=None):
         """
         :param target: A graphite target/seriesList to look at.
         :param period: How far back in historic data to look.
         :type period: datetime.timedelta
         :param raw: If True, the target is fed raw to Graphite, otherwise it is
                     evaluated and possibly transformed by NAV's rules first.
+        :param maxima: A dict used to memoize metric maximum values, which may
+                       be shared between evaluators.
         """
         self.target = self.orig_target = target
         self.period = period
         self.raw = raw
         self.result = {}
+        self.fetched = False
+        self.maxima = {} if maxima is None else maxima
 
         if not raw:
             meta = get_metric_meta(target)
@@ -131,13 +147,19 @@ class ThresholdEvaluator(object):
             cls=self.__class__.__name__, **vars(self)
         )
 
-    def get_values(self):
+    def get_values(self, timeout=None):
         """
         Retrieves actual values from Graphite based on the evaluators target.
+
+        :param timeout: The number of seconds to wait for Graphite, if less
+                        than the configured default.
         """
-        start = "-{0}".format(interval_to_graphite(self.period))
         averages = get_metric_average(
-            self.target, start=start, end='now', ignore_unknown=True
+            self.target,
+            start=self.get_start(),
+            end='now',
+            ignore_unknown=True,
+            timeout=timeout,
         )
         _logger.debug(
             "retrieved %d values from graphite for %r, " "period %s: %r",
@@ -146,12 +168,24 @@ class ThresholdEvaluator(object):
             self.period,
             averages,
         )
+        return self.set_values(averages)
+
+    def set_values(self, averages):
+        """
+        Sets the values to evaluate from an already retrieved Graphite
+        response, as returned by get_metric_average().
+        """
         self.result = dict(
             (extract_series_name(key), dict(value=value))
             for key, value in averages.items()
         )
+        self.fetched = True
         return self.result
 
+    def get_start(self):
+        """Returns the Graphite start time specification of this evaluator"""
+        return "-{0}".format(interval_to_graphite(self.period))
+
     def evaluate(self, expression, invert=False):
         """
         Evaluates expression for each of the retrieved values from the last
@@ -200,13 +234,140 @@ class ThresholdEvaluator(object):
         if metric in self.result:
             current = self.result[metric]['value']
             if percent:
-                maximum = get_metric_maximum(metric)
+                maximum = self._get_maximum(metric)
                 if not maximum:
                     return None  # cannot relatively match a maximum=0
                 self.result[metric]['max'] = maximum
                 current = (current / maximum) * 100.0
             return current
 
+    def _get_maximum(self, metric):
+        try:
+            return self.maxima[metric]
+        except KeyError:
+            maximum = self.maxima[metric] = get_metric_maximum(metric)
+            return maximum
+
+
+class ThresholdPlanner(object):
+    """Plans and executes batched value retrieval for multiple evaluators.
+
+    Evaluators are grouped by their period and by the transformation NAV
+    wraps their series in (e.g. deriving rates from octet counters), so that
+    each group can be retrieved using a single multi-target render call.
+    Each retrieved series is then handed to every evaluator in the group whose
+    series pattern matches its name.
+
+    Evaluators that cannot be grouped, or that didn't match any series from
+    their group's response, are left for the caller to retrieve separately,
+    as their :py:attr:`ThresholdEvaluator.fetched` attribute stays False.
+
+    All added evaluators share a memo of metric maximum values.
+    """
+
+    def __init__(self):
+        self.maxima = {}
+        self.timings = {}
+        self._groups = defaultdict(list)
+
+    def add(self, evaluator):
+        """Adds an evaluator to be retrieved by the next call to fetch()"""
+        evaluator.maxima = self.maxima
+        series = extract_series_name(evaluator.target)
+        if not series or series not in evaluator.target:
+            return
+        head, _, tail = evaluator.target.partition(series)
+        self._groups[(evaluator.get_start(), head, tail)].append((series, evaluator))
+
+    def fetch(self, workers=1, timeout=None):
+        """Retrieves values for all added evaluators.
+
+        :param workers: The number of groups to retrieve concurrently.
+        :param timeout: The number of seconds to spend on retrieval. Groups
+                        that are not retrieved by then are abandoned, and their
+                        evaluators left unfetched.
+        """
+        groups = list(self._groups.items())
+        self._groups.clear()
+        deadline = time.time() + timeout if timeout else None
+        if workers > 1 and len(groups) > 1:
+            executor = ThreadPoolExecutor(max_workers=workers)
+            futures = [
+                executor.submit(self._timed_fetch_group, group, deadline)
+                for group in groups
+            ]
+            _done, not_done = wait(futures, timeout=timeout or None)
+            for future in not_done:
+                future.cancel()
+            executor.shutdown(wait=False)
+            if not_done:
+                _logger.error(
+                    "abandoned retrieval of %d groups after %ss", len(not_done), timeout
+                )
+        else:
+            for group in groups:
+                self._timed_fetch_group(group, deadline)
+
+    def _timed_fetch_group(self, group, deadline=None):
+        key, members = group
+        start = time.time()
+        if deadline and start >= deadline:
+            return
+        try:
+            self._fetch_group(key, members, deadline)
+        except Exception:  # pylint: disable=W0703
+            _logger.exception(
+                "unable to retrieve values for %d evaluators, period %s",
+                len(members),
+                key[0],
+            )
+        self.timings[key] = time.time() - start
+
+    def _fetch_group(self, key, members, deadline=None):
+        period, head, tail = key
+        targets = sorted(set(head + series + tail for series, _ in members))
+        timeout = max(deadline - time.time(), MIN_TIMEOUT) if deadline else None
+        averages = get_metric_average(
+            targets, start=period, end='now', ignore_unknown=True, timeout=timeout
+        )
+        _logger.debug(
+            "retrieved %d values for %d targets in group %s%%s%s, period %s",
+            len(averages),
+            len(targets),
+            head,
+            tail,
+            period,
+        )
+
+        index = defaultdict(list)
+        for series, evaluator in members:
+            pattern = translate_serieslist_to_regex(series)
+            index[_get_literal_prefix(series)].append((pattern, evaluator))
+
+        matched = defaultdict(dict)
+        for name, value in averages.items():
+            series = extract_series_name(name)
+            parts = tuple(series.split('.'))
+            for length in range(len(parts) + 1):
+                for pattern, evaluator in index.get(parts[:length], ()):
+                    if pattern.fullmatch(series):
+                        matched[evaluator][name] = value
+
+        if deadline and time.time() > deadline:
+            return  # abandoned by fetch(), leave the evaluators to the caller
+        for evaluator, values in matched.items():
+            evaluator.set_values(values)
+
+
+def _get_literal_prefix(series):
+    """Returns the leading path elements of series that contain no wildcards"""
+    prefix = []
+    for part in series.split('.'):
+        if WILDCARD_CHARACTERS.intersection(part):
+            break
+        prefix.append(part)
+    return tuple(prefix)
+
 
 def get_metric_maximum(metric):
     """
@@ -29,8 +29,14 @@ several convenience methods to work with data retrieval.  An instance
 of a MibRetriever class is tied to a TwistedSNMP AgentProxy and uses
 this to allow asynchronous data retrieval.
 
+If the MIB data structure is a :py:class:`nav.smidumps.LazyMib`, as returned by
+:py:func:`nav.smidumps.get_mib`, the MIB is not loaded, and the class is not
+imbued with its knowledge, until the class is first instantiated (or one of
+its MIB-derived class attributes is first accessed).
+
 """
 
+from collections.abc import Mapping
 import logging
 
 from pynetsnmp.netsnmp import SnmpTimeoutError
@@ -44,12 +50,19 @@ from nav.ipdevpoll import ContextLogger
 from nav.ipdevpoll.utils import fire_eventually
 from nav.errors import GeneralException
 from nav.oids import OID
-from nav.smidumps import get_mib
+from nav.smidumps import get_mib, LazyMib
+from nav.smidumps.compiled import MibIndex, get_syntax_type_names
 
 _logger = logging.getLogger(__name__)
 TEXT_TYPES = ("DisplayString", "SnmpAdminString")
 
 
+def _snmp_timeout_handler(failure: Failure):
+    """Transforms SnmpTimeoutErrors into "regular" TimeoutErrors"""
+    failure.trap(SnmpTimeoutError)
+    raise TimeoutError(failure.value)
+
+
 class MibRetrieverError(GeneralException):
     """MIB retriever error"""
 
@@ -176,29 +189,22 @@ class MibTableDescriptor(object):
         table_name -- the name of the table from the mib.
 
         """
-        if (
-            table_name not in mib.nodes
-            or mib.nodes[table_name].raw_mib_data['nodetype'] != 'table'
-        ):
+        index = mib.node_index
+        if table_name not in index or index.get_nodetype(table_name) != 'table':
             raise MibRetrieverError("%s is not a table" % table_name)
 
         table_object = mib.nodes[table_name]
-        for node in mib.nodes.values():
-            if (
-                table_object.oid.is_a_prefix_of(node.oid)
-                and node.raw_mib_data['nodetype'] == 'row'
-            ):
-                row_object = mib.nodes[node.name]
+        for name in index.get_descendants(table_object.oid):
+            if index.get_nodetype(name) == 'row':
+                row_object = mib.nodes[name]
                 # Only one row node type per table
                 break
 
-        columns = {}
-        for node in mib.nodes.values():
-            if (
-                row_object.oid.is_a_prefix_of(node.oid)
-                and node.raw_mib_data['nodetype'] == 'column'
-            ):
-                columns[node.name] = mib.nodes[node.name]
+        columns = {
+            name: mib.nodes[name]
+            for name in index.get_descendants(row_object.oid)
+            if index.get_nodetype(name) == 'column'
+        }
 
         return cls(table_object, row_object, columns)
 
@@ -207,11 +213,10 @@ class MibTableDescriptor(object):
         """Build table descriptors for all tables in a mib.
 
         mib -- MibRetriever instance"""
-        table_descriptors = []
-        for node in mib.nodes.values():
-            if node.raw_mib_data['nodetype'] == 'table':
-                table_descriptors.append(MibTableDescriptor.build(mib, node.name))
-        return table_descriptors
+        return [
+            MibTableDescriptor.build(mib, name)
+            for name in mib.node_index.get_names_by_nodetype('table')
+        ]
 
 
 class MibTableResultRow(dict):
@@ -266,6 +271,38 @@ class MibRetrieverMaker(type):
             # This may be the MibRetriever base class or a MixIn of some sort
             return
 
+        if isinstance(mib, LazyMib) and not mib.is_loaded():
+            # Postpone all the hard work until the class is actually used
+            cls._mib_loaded = False
+            for attr in _LAZY_ATTRIBUTES:
+                setattr(cls, attr, _LazyMibAttribute(attr))
+            MibRetrieverMaker.modules[mib.name] = cls
+        else:
+            cls._mib_loaded = True
+            MibRetrieverMaker.__imbue(cls)
+
+    def __call__(cls, *args, **kwargs):
+        cls.load_mib()
+        return super(MibRetrieverMaker, cls).__call__(*args, **kwargs)
+
+    def load_mib(cls):
+        """Loads the MIB of a lazily created retriever class, and imbues the
+        class with knowledge of it, if this hasn't already been done.
+        """
+        if cls.__dict__.get('_mib_loaded', True):
+            return
+        cls._mib_loaded = True
+        for attr in _LAZY_ATTRIBUTES:
+            delattr(cls, attr)
+        if isinstance(cls.mib, LazyMib):
+            cls.mib = cls.mib.load()
+        MibRetrieverMaker.__imbue(cls)
+
+    @staticmethod
+    def __imbue(cls):
+        cls.node_index = getattr(cls.mib, 'index', None) or MibIndex.from_nodes(
+            cls.mib['nodes']
+        )
         MibRetrieverMaker.__make_node_objects(cls)
         cls.tables = dict((t.table.name, t) for t in MibTableDescriptor.build_all(cls))
 
@@ -273,7 +310,7 @@ class MibRetrieverMaker(type):
         MibRetrieverMaker.__make_table_getters(cls)
         MibRetrieverMaker.__prepopulate_text_columns(cls)
 
-        MibRetrieverMaker.modules[mib['moduleName']] = cls
+        MibRetrieverMaker.modules[cls.mib['moduleName']] = cls
 
     # following is a collection of helper methods to modify the
     # MIB-aware retriever class that is being created.
@@ -281,14 +318,11 @@ class MibRetrieverMaker(type):
     @staticmethod
     def __make_scalar_getters(cls):
         """Make a get_* method for every scalar MIB node."""
-        for node in cls.nodes.values():
-            if node.raw_mib_data['nodetype'] == 'scalar':
-                method_name = 'get_%s' % node.name
-                # Only create method if a custom one was not present
-                if not hasattr(cls, method_name):
-                    setattr(
-                        cls, method_name, MibRetrieverMaker.__scalar_getter(node.name)
-                    )
+        for node_name in cls.node_index.get_names_by_nodetype('scalar'):
+            method_name = 'get_%s' % node_name
+            # Only create method if a custom one was not present
+            if not hasattr(cls, method_name):
+                setattr(cls, method_name, MibRetrieverMaker.__scalar_getter(node_name))
 
     @staticmethod
     def __scalar_getter(node_name):
@@ -340,10 +374,7 @@ class MibRetrieverMaker(type):
 
     @staticmethod
     def __make_node_objects(cls):
-        cls.nodes = dict(
-            (node_name, MIBObject(cls.mib, node_name))
-            for node_name in cls.mib['nodes'].keys()
-        )
+        cls.nodes = MibNodes(cls.mib, cls.node_index)
 
     @staticmethod
     def __prepopulate_text_columns(cls):
@@ -352,14 +383,60 @@ class MibRetrieverMaker(type):
         text types.
 
         """
+        index = cls.node_index
         nodes = {
             node_name
-            for node_name in cls.mib['nodes']
-            if is_text_object(cls.mib, node_name)
+            for node_name in index
+            if _is_text_type(*index.get_syntax_type_names(node_name))
         }
         cls.text_columns = nodes
 
 
+_LAZY_ATTRIBUTES = ('node_index', 'nodes', 'tables', 'text_columns')
+
+
+class MibNodes(Mapping):
+    """Maps the node names of a MIB to MIBObject instances, which are only
+    created when first accessed.
+    """
+
+    def __init__(self, mib, index):
+        self._mib = mib
+        self._index = index
+        self._objects = {}
+
+    def __getitem__(self, name):
+        try:
+            return self._objects[name]
+        except KeyError:
+            if name not in self._index:
+                raise
+        node = self._objects[name] = MIBObject(self._mib, name)
+        return node
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+
+class _LazyMibAttribute(object):
+    """Placeholder for a MIB-derived attribute of a lazily created retriever
+    class. Loads the class' MIB when accessed.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        owner.load_mib()
+        return getattr(owner, self.name)
+
+
 class MibRetriever(object, metaclass=MibRetrieverMaker):
     """Base class for functioning MIB retriever classes."""
 
@@ -405,32 +482,7 @@ class MibRetriever(object, metaclass=MibRetrieverMaker):
             self._logger.debug("%s is not a table column", column_name)
 
         def _result_formatter(result):
-            formatted_result = {}
-            # result keys may be OID objects/tuples or strings, depending on
-            # snmp library used
-            if node.oid not in result and str(node.oid) not in result:
-                self._logger.debug(
-                    "%s (%s) seems to be unsupported, result " "keys were: %r",
-                    column_name,
-                    node.oid,
-                    result.keys(),
-                )
-                return {}
-            varlist = result.get(node.oid, result.get(str(node.oid), None))
-
-            for oid, value in varlist.items():
-                # Extract index information from oid
-                row_index = OID(oid).strip_prefix(node.oid)
-                if column_name in self.text_columns:
-                    value = safestring(value)
-                formatted_result[row_index] = value
-
-            return formatted_result
-
-        def _snmp_timeout_handler(failure: Failure):
-            """Transforms SnmpTimeoutErrors into "regular" TimeoutErrors"""
-            failure.trap(SnmpTimeoutError)
-            raise TimeoutError(failure.value)
+            return self._format_column_result(column_name, result)
 
         def _valueerror_handler(failure):
             failure.trap(ValueError)
@@ -448,11 +500,84 @@ class MibRetriever(object, metaclass=MibRetrieverMaker):
         deferred.addCallbacks(_result_formatter, _valueerror_handler)
         return deferred
 
+    def _format_column_result(self, column_name, result):
+        """Extracts the { row_index: column_value } dictionary of a single
+        column from an AgentProxy getTable() or getColumns() result.
+        """
+        node = self.nodes[column_name]
+        formatted_result = {}
+        # result keys may be OID objects/tuples or strings, depending on
+        # snmp library used
+        if node.oid not in result and str(node.oid) not in result:
+            self._logger.debug(
+                "%s (%s) seems to be unsupported, result " "keys were: %r",
+                column_name,
+                node.oid,
+                result.keys(),
+            )
+            return {}
+        varlist = result.get(node.oid, result.get(str(node.oid), None))
+
+        for oid, value in varlist.items():
+            # Extract index information from oid
+            row_index = OID(oid).strip_prefix(node.oid)
+            if column_name in self.text_columns:
+                value = safestring(value)
+            formatted_result[row_index] = value
+
+        return formatted_result
+
     def retrieve_columns(self, column_names):
         """Retrieve a set of table columns.
 
         The table columns may come from different tables, as long as
-        the table rows are indexed the same way.
+        the table rows are indexed the same way. The columns are walked in
+        lockstep, using as few GET-BULK requests as possible.
+
+        Returns a deferred whose result is a dictionary:
+
+          { row_index: MibTableResultRow instance }
+
+        """
+
+        def _sortkey(col):
+            return self.nodes[col].oid
+
+        columns = sorted(column_names, key=_sortkey)
+
+        def _result_formatter(result):
+            final_result = {}
+            for column in columns:
+                for row_index, value in self._format_column_result(
+                    column, result
+                ).items():
+                    if row_index not in final_result:
+                        final_result[row_index] = MibTableResultRow(
+                            row_index, column_names
+                        )
+                    final_result[row_index][column] = value
+            return final_result
+
+        def _valueerror_handler(failure):
+            failure.trap(ValueError)
+            self._logger.debug(
+                "got a possibly strange response from device when walking "
+                "%s::%s in lockstep, retrieving one column at a time: %s",
+                self.mib.get('moduleName', ''),
+                columns,
+                failure.getErrorMessage(),
+            )
+            return self._retrieve_columns_sequentially(column_names)
+
+        deferred = self.agent_proxy.getColumns(
+            [str(self.nodes[column].oid) for column in columns]
+        )
+        deferred.addErrback(_snmp_timeout_handler)
+        deferred.addCallbacks(_result_formatter, _valueerror_handler)
+        return deferred
+
+    def _retrieve_columns_sequentially(self, column_names):
+        """Retrieves a set of table columns, one column at a time.
 
         Returns a deferred whose result is a dictionary:
 
@@ -741,8 +866,8 @@ def is_text_object(mib_dict, obj_name):
     """
     if not mib_dict or "nodes" not in mib_dict:
         return False
-    syntax_type = mib_dict["nodes"][obj_name].get("syntax", {}).get("type", {})
-    type_name = syntax_type.get("name", "")
-    parent_type_name = syntax_type.get("parent module", {}).get("type", "")
+    return _is_text_type(*get_syntax_type_names(mib_dict["nodes"][obj_name]))
+
 
+def _is_text_type(type_name, parent_type_name):
     return type_name in TEXT_TYPES or parent_type_name in TEXT_TYPES
@@ -659,25 +659,11 @@ class AlertProfile(models.Model):
         now = datetime.now()
 
         # Limit our query to the correct type of time periods
-        if now.isoweekday() in [6, 7]:
-            valid_during = [TimePeriod.ALL_WEEK, TimePeriod.WEEKENDS]
-        else:
-            valid_during = [TimePeriod.ALL_WEEK, TimePeriod.WEEKDAYS]
-
-        # The following code should get the currently active timeperiod.
-        active_timeperiod = None
+        valid_during = TimePeriod.get_valid_during_for(now)
         timeperiods = list(
             self.time_periods.filter(valid_during__in=valid_during).order_by('start')
         )
-        # If the current time is before the start of the first time
-        # period, the active time period is the last one (i.e. from
-        # the day before)
-        if timeperiods and timeperiods[0].start > now.time():
-            active_timeperiod = timeperiods[-1]
-        else:
-            for period in timeperiods:
-                if period.start <= now.time():
-                    active_timeperiod = period
+        active_timeperiod = self.find_active_timeperiod(timeperiods, now)
 
         if active_timeperiod:
             _logger.debug(
@@ -691,6 +677,27 @@ class AlertProfile(models.Model):
 
         return active_timeperiod
 
+    @staticmethod
+    def find_active_timeperiod(timeperiods, now):
+        """Finds the currently active timeperiod among a profile's timeperiods.
+
+        :param timeperiods: A list of the profile's timeperiods that are valid
+                            today, ordered by their start time.
+        :type now: datetime
+        """
+        # The following code should get the currently active timeperiod.
+        active_timeperiod = None
+        # If the current time is before the start of the first time
+        # period, the active time period is the last one (i.e. from
+        # the day before)
+        if timeperiods and timeperiods[0].start > now.time():
+            active_timeperiod = timeperiods[-1]
+        else:
+            for period in timeperiods:
+                if period.start <= now.time():
+                    active_timeperiod = period
+        return active_timeperiod
+
 
 class TimePeriod(models.Model):
     """Defines TimerPeriods and which part of the week they are valid"""
@@ -717,6 +724,16 @@ class TimePeriod(models.Model):
     class Meta(object):
         db_table = u'timeperiod'
 
+    @classmethod
+    def get_valid_during_for(cls, now):
+        """Returns the valid_during values of timeperiods that apply to the
+        weekday of now.
+        """
+        if now.isoweekday() in [6, 7]:
+            return [cls.ALL_WEEK, cls.WEEKENDS]
+        else:
+            return [cls.ALL_WEEK, cls.WEEKDAYS]
+
     def __str__(self):
         return u'from %s for %s profile on %s' % (
             self.start,
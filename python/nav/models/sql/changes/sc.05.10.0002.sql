@@ -0,0 +1,68 @@
+-- Notify ipdevpoll when the netboxes it polls change, so that it can reload
+-- only the affected netboxes instead of periodically reloading all of them.
+-- The notification payload is the netboxid of the affected netbox.
+
+CREATE OR REPLACE FUNCTION notify_ipdevpoll_netbox_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('ipdevpoll_netbox_changed', OLD.netboxid::text);
+    ELSE
+        PERFORM pg_notify('ipdevpoll_netbox_changed', NEW.netboxid::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ language plpgsql;
+
+CREATE OR REPLACE FUNCTION notify_ipdevpoll_management_profile_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('ipdevpoll_netbox_changed', netboxid::text)
+       FROM netbox_profile
+      WHERE profileid = NEW.management_profileid;
+    RETURN NULL;
+END;
+$$ language plpgsql;
+
+CREATE TRIGGER trig_notify_ipdevpoll_netbox_added_or_deleted
+    AFTER INSERT OR DELETE ON netbox
+    FOR EACH ROW
+    EXECUTE PROCEDURE notify_ipdevpoll_netbox_changed();
+
+-- ipdevpoll updates netbox rows all the time, only notify about changes to
+-- the columns that affect its job schedules
+CREATE TRIGGER trig_notify_ipdevpoll_netbox_updated
+    AFTER UPDATE ON netbox
+    FOR EACH ROW
+    WHEN (OLD.ip IS DISTINCT FROM NEW.ip
+          OR OLD.typeid IS DISTINCT FROM NEW.typeid
+          OR OLD.sysname IS DISTINCT FROM NEW.sysname
+          OR OLD.catid IS DISTINCT FROM NEW.catid
+          OR OLD.roomid IS DISTINCT FROM NEW.roomid
+          OR OLD.orgid IS DISTINCT FROM NEW.orgid
+          OR OLD.up IS DISTINCT FROM NEW.up
+          OR OLD.uptodate IS DISTINCT FROM NEW.uptodate
+          OR OLD.deleted_at IS DISTINCT FROM NEW.deleted_at)
+    EXECUTE PROCEDURE notify_ipdevpoll_netbox_changed();
+
+CREATE TRIGGER trig_notify_ipdevpoll_netbox_profile_changed
+    AFTER INSERT OR UPDATE OR DELETE ON netbox_profile
+    FOR EACH ROW
+    EXECUTE PROCEDURE notify_ipdevpoll_netbox_changed();
+
+CREATE TRIGGER trig_notify_ipdevpoll_management_profile_changed
+    AFTER UPDATE ON management_profile
+    FOR EACH ROW
+    EXECUTE PROCEDURE notify_ipdevpoll_management_profile_changed();
+
+-- group memberships are used by the netbox filters of ipdevpoll instances
+CREATE TRIGGER trig_notify_ipdevpoll_netboxcategory_changed
+    AFTER INSERT OR UPDATE OR DELETE ON netboxcategory
+    FOR EACH ROW
+    EXECUTE PROCEDURE notify_ipdevpoll_netbox_changed();
+
+CREATE TRIGGER trig_notify_ipdevpoll_snmpagentstate_changed
+    AFTER INSERT OR UPDATE OF end_time ON alerthist
+    FOR EACH ROW
+    WHEN (NEW.eventtypeid = 'snmpAgentState' AND NEW.netboxid IS NOT NULL)
+    EXECUTE PROCEDURE notify_ipdevpoll_netbox_changed();
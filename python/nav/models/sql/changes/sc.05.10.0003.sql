@@ -0,0 +1,12 @@
+-- Cache table for Graphite render results, shared between NAV processes.
+-- The layout is that of Django's database cache backend (see the 'graphite'
+-- cache in nav.django.settings).
+
+CREATE TABLE manage.graphite_render_cache (
+    cache_key VARCHAR(255) NOT NULL PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires TIMESTAMP NOT NULL
+);
+
+CREATE INDEX graphite_render_cache_expires
+    ON manage.graphite_render_cache (expires);
@@ -22,13 +22,11 @@ from nav.metrics.data import get_metric_average
 from nav.metrics.graphs import get_metric_meta
 from nav.metrics.templates import metric_path_for_interface
 from nav.models.manage import Interface
-from nav.util import chunks
 from nav.web.netmap.common import get_traffic_rgb, get_traffic_load_in_percent
 
 TRAFFIC_TIMEPERIOD = '-15min'
 INOCTETS = 'ifInOctets'
 OUTOCTETS = 'ifOutOctets'
-MAX_TARGETS_PER_REQUEST = 500
 
 _logger = logging.getLogger(__name__)
 
@@ -111,15 +109,8 @@ def get_traffic_for(interfaces):
 
     targets = [transform.format(id=m) for m in _merge_metrics(sorted(metrics))]
 
-    _logger.debug(
-        "getting data for %d targets in chunks of %d",
-        len(targets),
-        MAX_TARGETS_PER_REQUEST,
-    )
-
-    data = {}
-    for request in chunks(targets, MAX_TARGETS_PER_REQUEST):
-        data.update(get_metric_average(request, start=TRAFFIC_TIMEPERIOD))
+    _logger.debug("getting data for %d targets", len(targets))
+    data = get_metric_average(targets, start=TRAFFIC_TIMEPERIOD)
 
     _logger.debug("received %d metrics in response", len(data))
 
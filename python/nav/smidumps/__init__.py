@@ -2,15 +2,26 @@
 
 As dumped by smidump dump using the python format option.
 
+Some of these dumps are very large, so they are not imported until their
+contents are actually accessed: :py:func:`get_mib` only locates the dump module,
+and returns a :py:class:`LazyMib` mapping that loads it on first use. A
+compiled form of the dump is preferred, if one exists, see
+:py:mod:`nav.smidumps.compiled`.
+
 """
 from __future__ import absolute_import
 
+from collections.abc import Mapping
 from itertools import chain
 import importlib
+import importlib.util
+import logging
 
 from nav.config import NAV_CONFIG
 from nav.oids import OID
+from nav.smidumps import compiled
 
+_logger = logging.getLogger(__name__)
 _mib_map = {}
 
 
@@ -18,25 +29,36 @@ def get_mib(mib_module):
     """Returns the smidumped MIB definition of a named MIB module, if it exists
     in NAV.
 
+    The returned definition is a :py:class:`LazyMib`, which will not import the
+    actual dump until its contents are accessed.
+
     """
     if not mib_module:
         return None
 
     if mib_module not in _mib_map:
-        for path in get_search_path():
-            try:
-                name = '.' + mib_module if path else mib_module  # support top namespace
-                module = importlib.import_module(name, path)
-            except ImportError:
-                continue
-            else:
-                convert_oids(module.MIB)
-                _mib_map[mib_module] = module
-                break
-        else:
+        import_name = find_mib_module(mib_module)
+        if not import_name:
             return None
+        _mib_map[mib_module] = LazyMib(mib_module, import_name)
+
+    return _mib_map[mib_module]
 
-    return _mib_map[mib_module].MIB
+
+def find_mib_module(mib_module):
+    """Returns the full import name of the dump of a named MIB module, without
+    importing it, or None if no such dump can be found in the search path.
+
+    """
+    for path in get_search_path():
+        name = path + '.' + mib_module if path else mib_module  # support top namespace
+        try:
+            spec = importlib.util.find_spec(name)
+        except (ImportError, ValueError):
+            continue
+        if spec:
+            return name
+    return None
 
 
 def get_search_path():
@@ -44,6 +66,62 @@ def get_search_path():
     return NAV_CONFIG.get("SMIDUMPS", "nav.smidumps").split(':')
 
 
+class LazyMib(Mapping):
+    """A read-only mapping of a smidumped MIB definition, whose dump module is
+    imported the first time its contents are accessed.
+
+    """
+
+    def __init__(self, name, import_name):
+        self.name = name
+        self.import_name = import_name
+        self._mib = None
+
+    def __repr__(self):
+        return "<LazyMib %s loaded=%r>" % (self.name, self.is_loaded())
+
+    def is_loaded(self):
+        """Returns True if the dump module has been imported"""
+        return self._mib is not None
+
+    def load(self):
+        """Loads the dump, if necessary, and returns its MIB definition.
+
+        If an up-to-date compiled form of the dump module exists, it is loaded
+        as a :py:class:`nav.smidumps.compiled.CompiledMib` instead of importing
+        the module.
+        """
+        if self._mib is None:
+            self._mib = self._load_compiled()
+        if self._mib is None:
+            module = importlib.import_module(self.import_name)
+            convert_oids(module.MIB)
+            self._mib = module.MIB
+        return self._mib
+
+    def _load_compiled(self):
+        spec = importlib.util.find_spec(self.import_name)
+        if not spec or not spec.origin:
+            return None
+        path = compiled.find_compiled(spec.origin)
+        if not path:
+            return None
+        try:
+            return compiled.load(path)
+        except (OSError, ValueError) as error:
+            _logger.warning("ignoring compiled MIB %s: %s", path, error)
+            return None
+
+    def __getitem__(self, key):
+        return self.load()[key]
+
+    def __iter__(self):
+        return iter(self.load())
+
+    def __len__(self):
+        return len(self.load())
+
+
 def convert_oids(mib):
     """Converts a mib data structure's oid strings to OID objects.
 
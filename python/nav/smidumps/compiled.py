@@ -0,0 +1,370 @@
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+# more details.  You should have received a copy of the GNU General Public
+# License along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""A compact, precompiled format for smidumped MIB modules.
+
+Importing a smidump Python module builds every dict and string of the MIB
+definition at once, and some of these modules are huge. A compiled MIB file
+(``<MIB-NAME>.mibc``, placed next to the dump module by the ``build_mibs``
+build step) stores the same definition as a :py:mod:`marshal` blob, in which
+every node definition is kept as a separately marshalled byte string. Nodes are
+only unmarshalled when they are first accessed.
+
+A compiled file starts with a SHA-1 digest of the dump module it was compiled
+from, which is compared to the dump module to tell whether the compiled file is
+up to date. File modification times cannot be relied on for this, as they are
+not preserved when NAV is installed from a wheel.
+
+Each compiled file also contains a :py:class:`MibIndex`: the OID, node type and
+syntax type name of every node, sorted for OID lookups. This is enough for
+:py:class:`nav.mibs.mibretriever.MibRetriever` classes to be built without
+touching any of the full node definitions.
+
+To compile the dumps of a source tree in place, e.g. for a development
+environment, run::
+
+    python -m nav.smidumps.compiled python/nav/smidumps
+
+"""
+from bisect import bisect_right
+from collections.abc import Mapping
+import argparse
+import glob
+import hashlib
+import logging
+import marshal
+import os
+
+from nav.oids import OID
+
+_logger = logging.getLogger(__name__)
+
+MAGIC = b'NAVMIB\x02\n'
+DIGEST_SIZE = hashlib.sha1().digest_size
+NO_DIGEST = b'\0' * DIGEST_SIZE
+HEADER_SIZE = len(MAGIC) + DIGEST_SIZE
+SUFFIX = '.mibc'
+SMIDUMP_HEADER = b'# python version'
+NODES = 'nodes'
+MODULE_NAME = 'moduleName'
+
+
+class MibIndex(object):
+    """An index of the nodes of a MIB module, by name and by OID.
+
+    :param names: The node names, in MIB definition order.
+    :param oids: The node OIDs, as tuples of integers.
+    :param nodetypes: The node types, e.g. ``table`` or ``column``.
+    :param syntax_types: The syntax type names of the nodes, as (name,
+                         parent type name) tuples of strings.
+    """
+
+    def __init__(self, names, oids, nodetypes, syntax_types):
+        self.names = tuple(names)
+        self.oids = tuple(tuple(oid) for oid in oids)
+        self.nodetypes = tuple(nodetypes)
+        self.syntax_types = tuple(tuple(types) for types in syntax_types)
+
+        self._positions = {name: i for i, name in enumerate(self.names)}
+        self._names_by_oid = dict(zip(self.oids, self.names))
+        self._sorted = sorted(zip(self.oids, self.names))
+        self._sorted_oids = [oid for oid, _name in self._sorted]
+
+    @classmethod
+    def from_nodes(cls, nodes):
+        """Builds an index of a dict of smidumped node definitions"""
+        names, oids, nodetypes, syntax_types = [], [], [], []
+        for name, node in nodes.items():
+            names.append(name)
+            oids.append(OID(node['oid']) if 'oid' in node else ())
+            nodetypes.append(node.get('nodetype', ''))
+            syntax_types.append(get_syntax_type_names(node))
+        return cls(names, oids, nodetypes, syntax_types)
+
+    def to_tuple(self):
+        """Returns the contents of this index in a marshallable form"""
+        return self.names, self.oids, self.nodetypes, self.syntax_types
+
+    def __repr__(self):
+        return "<MibIndex of %d nodes>" % len(self.names)
+
+    def __contains__(self, name):
+        return name in self._positions
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def get_oid(self, name):
+        """Returns the OID of a named node"""
+        return OID(self.oids[self._positions[name]])
+
+    def get_nodetype(self, name):
+        """Returns the node type of a named node"""
+        return self.nodetypes[self._positions[name]]
+
+    def get_syntax_type_names(self, name):
+        """Returns the syntax type name and parent type name of a named node"""
+        return self.syntax_types[self._positions[name]]
+
+    def get_names_by_nodetype(self, nodetype):
+        """Returns the names of all nodes of a given type, in MIB definition
+        order.
+        """
+        return [
+            name for name, typ in zip(self.names, self.nodetypes) if typ == nodetype
+        ]
+
+    def get_descendants(self, oid):
+        """Returns the names of all nodes below oid, in OID order"""
+        prefix = tuple(oid)
+        length = len(prefix)
+        descendants = []
+        for position in range(
+            bisect_right(self._sorted_oids, prefix), len(self._sorted_oids)
+        ):
+            node_oid, name = self._sorted[position]
+            if node_oid[:length] != prefix:
+                break
+            descendants.append(name)
+        return descendants
+
+    def lookup(self, oid):
+        """Finds the node whose OID is the longest prefix of oid.
+
+        :returns: A (name, suffix) tuple, where suffix is the remainder of oid
+                  after the node's OID, or None if no node matches.
+        """
+        oid = tuple(oid)
+        for length in range(len(oid), 0, -1):
+            name = self._names_by_oid.get(oid[:length])
+            if name is not None:
+                return name, OID(oid[length:])
+        return None
+
+
+def get_syntax_type_names(node):
+    """Returns the syntax type name and parent type name of a smidumped node
+    definition, as a tuple of strings.
+    """
+    syntax_type = node.get('syntax', {}).get('type', {})
+    return (
+        syntax_type.get('name', ''),
+        syntax_type.get('parent module', {}).get('type', ''),
+    )
+
+
+class CompiledMib(Mapping):
+    """A read-only mapping of a compiled MIB definition.
+
+    It looks like the MIB dict of a smidump module, with OIDs converted to
+    :py:class:`nav.oids.OID` objects, but materializes node definitions and other
+    top-level sections only when they are accessed.
+    """
+
+    def __init__(self, data):
+        self._sections = data['sections']
+        self._loaded = {
+            MODULE_NAME: data[MODULE_NAME],
+            NODES: CompiledNodes(data[NODES]),
+        }
+        self.index = MibIndex(*data['index'])
+
+    def __repr__(self):
+        return "<CompiledMib %s>" % self._loaded[MODULE_NAME]
+
+    def __getitem__(self, key):
+        try:
+            return self._loaded[key]
+        except KeyError:
+            if key not in self._sections:
+                raise
+        value = marshal.loads(self._sections[key])
+        if key == 'notifications':
+            for node in value.values():
+                node['oid'] = OID(node['oid'])
+        self._loaded[key] = value
+        return value
+
+    def __contains__(self, key):
+        return key in self._loaded or key in self._sections
+
+    def __iter__(self):
+        yield MODULE_NAME
+        yield NODES
+        yield from self._sections
+
+    def __len__(self):
+        return len(self._sections) + 2
+
+
+class CompiledNodes(Mapping):
+    """A read-only mapping of the node definitions of a compiled MIB, which
+    are unmarshalled on first access.
+    """
+
+    def __init__(self, blobs):
+        self._blobs = blobs
+        self._nodes = {}
+
+    def __getitem__(self, name):
+        try:
+            return self._nodes[name]
+        except KeyError:
+            node = marshal.loads(self._blobs[name])
+        if 'oid' in node:
+            node['oid'] = OID(node['oid'])
+        self._nodes[name] = node
+        return node
+
+    def __contains__(self, name):
+        return name in self._blobs
+
+    def __iter__(self):
+        return iter(self._blobs)
+
+    def __len__(self):
+        return len(self._blobs)
+
+
+def compile_mib(mib, source_digest=NO_DIGEST):
+    """Compiles a MIB dict, as found in a smidump module, to a byte string.
+
+    OIDs in the MIB dict must be strings, i.e. not yet converted by
+    :py:func:`nav.smidumps.convert_oids`.
+
+    :param source_digest: The digest of the dump module the MIB dict is from,
+                          as returned by :py:func:`get_source_digest`.
+    """
+    nodes = mib.get(NODES, {})
+    data = {
+        MODULE_NAME: mib.get(MODULE_NAME),
+        'index': MibIndex.from_nodes(nodes).to_tuple(),
+        NODES: {name: marshal.dumps(node) for name, node in nodes.items()},
+        'sections': {
+            key: marshal.dumps(value)
+            for key, value in mib.items()
+            if key not in (MODULE_NAME, NODES)
+        },
+    }
+    return MAGIC + source_digest + marshal.dumps(data)
+
+
+def compile_dump(source_path, target_path=None):
+    """Compiles a smidump module file to a compiled MIB file.
+
+    :returns: The path of the compiled file.
+    """
+    if not target_path:
+        target_path = get_compiled_path(source_path)
+    namespace = {}
+    with open(source_path, 'rb') as source:
+        code = source.read()
+    exec(compile(code, source_path, 'exec'), namespace)
+    with open(target_path, 'wb') as target:
+        target.write(compile_mib(namespace['MIB'], hashlib.sha1(code).digest()))
+    return target_path
+
+
+def compile_directory(directory):
+    """Compiles every smidump module in a directory.
+
+    :returns: The number of compiled modules.
+    """
+    count = 0
+    for source_path in sorted(glob.glob(os.path.join(directory, '*.py'))):
+        if is_smidump(source_path):
+            compile_dump(source_path)
+            count += 1
+    return count
+
+
+def is_smidump(path):
+    """Returns True if path looks like a module generated by smidump"""
+    with open(path, 'rb') as source:
+        # the header may be preceded by a coding declaration
+        return any(source.readline().startswith(SMIDUMP_HEADER) for _ in range(2))
+
+
+def load(path):
+    """Loads a compiled MIB file.
+
+    :raises ValueError: if the file is not a compiled MIB.
+    """
+    with open(path, 'rb') as compiled:
+        data = compiled.read()
+    if not data.startswith(MAGIC):
+        raise ValueError("%s is not a compiled MIB file" % path)
+    try:
+        return CompiledMib(marshal.loads(data[HEADER_SIZE:]))
+    except (EOFError, TypeError, KeyError) as error:
+        raise ValueError("%s is corrupt: %s" % (path, error))
+
+
+def get_compiled_path(source_path):
+    """Returns the path of the compiled form of a smidump module file"""
+    return os.path.splitext(source_path)[0] + SUFFIX
+
+
+def get_source_digest(source_path):
+    """Returns the SHA-1 digest of a smidump module file"""
+    with open(source_path, 'rb') as source:
+        return hashlib.sha1(source.read()).digest()
+
+
+def find_compiled(source_path):
+    """Returns the path of an up-to-date compiled form of a smidump module
+    file, or None if there is none.
+
+    A compiled file is up to date if it was compiled from a module with the
+    same contents as the one at source_path.
+    """
+    compiled_path = get_compiled_path(source_path)
+    try:
+        with open(compiled_path, 'rb') as compiled:
+            header = compiled.read(HEADER_SIZE)
+    except OSError:
+        return None
+    if len(header) < HEADER_SIZE or not header.startswith(MAGIC):
+        return None
+    try:
+        source_digest = get_source_digest(source_path)
+    except OSError:
+        return compiled_path  # a compiled file without a source is fine
+    if header[len(MAGIC) :] != source_digest:
+        return None
+    return compiled_path
+
+
+def main():
+    """Compiles smidump modules from the command line"""
+    parser = argparse.ArgumentParser(
+        description="Compiles smidump modules to NAV's compact MIB format"
+    )
+    parser.add_argument(
+        "paths", nargs='+', help="smidump module files or directories of them"
+    )
+    args = parser.parse_args()
+    for path in args.paths:
+        if os.path.isdir(path):
+            print("%s: compiled %d modules" % (path, compile_directory(path)))
+        else:
+            print("compiled %s" % compile_dump(path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,312 @@
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.  You should have received a copy of the GNU General Public License
+# along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""An event-driven ICMP echo engine with per-host scheduling.
+
+:py:class:`nav.statemon.megaping.MegaPing` sends echo requests to all hosts in
+one burst, with a fixed delay between each packet, and then waits for
+replies. The length of a sweep therefore grows linearly with the number of
+hosts.
+
+:py:class:`IcmpEngine` instead runs a single event loop over the raw sockets,
+using :py:mod:`selectors` (i.e. epoll on Linux), and keeps the send, retransmit
+and timeout schedules of all hosts in a :py:class:`TimerWheel`. The first
+requests of a sweep are spread evenly across the check interval, and hosts
+that do not reply within their adaptive retransmit timeout (based on their
+smoothed round trip times, like a TCP retransmit timer) are probed again,
+until their reply timeout is reached.
+
+It is a drop-in replacement for MegaPing, with the same :py:meth:`set_hosts`,
+:py:meth:`ping` and :py:meth:`results` methods. Its :py:meth:`burst` method
+is used by pping to quickly confirm whether hosts that missed a reply are
+really down.
+"""
+import errno
+import logging
+import os
+import selectors
+import socket
+import time
+
+from nav.statemon import config
+
+from .icmppacket import PacketV4, PacketV6
+from .megaping import Host, make_sockets
+from .timerwheel import TimerWheel
+
+_logger = logging.getLogger(__name__)
+
+MIN_RETRANSMIT_TIMEOUT = 0.2
+TIMER_RESOLUTION = 0.01
+
+SEND = 'send'
+EXPIRE = 'expire'
+
+
+class HostState(object):
+    """The scheduling state of a single host"""
+
+    __slots__ = ('host', 'first_sent', 'attempts', 'done', 'srtt', 'rttvar')
+
+    def __init__(self, host):
+        self.host = host
+        self.first_sent = None
+        self.attempts = 0
+        self.done = False
+        # smoothed round trip time and its variation, as per RFC 6298
+        self.srtt = None
+        self.rttvar = None
+
+    def reset(self):
+        """Resets the state for a new sweep"""
+        self.first_sent = None
+        self.attempts = 0
+        self.done = False
+        self.host.reply = None
+
+    def update_rtt(self, rtt):
+        """Updates the smoothed round trip time estimate with a new sample"""
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+
+    def get_retransmit_timeout(self, default, maximum):
+        """Returns the time to wait for a reply before retransmitting"""
+        if self.srtt is None:
+            return default
+        return min(max(self.srtt + 4 * self.rttvar, MIN_RETRANSMIT_TIMEOUT), maximum)
+
+
+class IcmpEngine(object):
+    """
+    Sends icmp echo to multiple hosts, spread across the check interval.
+    Typical use:
+    pinger = icmpengine.IcmpEngine(sockets)
+    pinger.set_hosts(['127.0.0.1','10.0.0.1'])
+    timeUsed = pinger.ping()
+    results = pinger.results()
+    """
+
+    def __init__(self, sockets, conf=None, ident=None):
+        if conf is None:
+            try:
+                conf = config.pingconf()
+            except Exception:  # pylint: disable=W0703
+                _logger.critical("Failed to open config file. Using default values.")
+                conf = {}
+        self._conf = conf
+
+        # Interval across which the requests of a sweep are spread
+        self._interval = float(conf.get('checkinterval', 60))
+        # Timeout before considering hosts as down
+        self._timeout = float(conf.get('timeout', 5))
+        # Number of retransmits to non-responding hosts per sweep
+        self._retries = int(conf.get('retries', 2))
+
+        packetsize = int(conf.get('packetsize', 64))
+        if packetsize < 44:
+            raise ValueError(
+                "Packetsize (%s) too small to create a proper cookie; "
+                "Must be at least 44." % packetsize
+            )
+        self._packetsize = packetsize
+        self._ident = (os.getpid() if ident is None else ident) % 65536
+
+        if sockets is None:
+            sockets = make_sockets()
+            _logger.info("No sockets passed as argument, creating own")
+        self._sock6, self._sock4 = sockets
+
+        self._hosts = {}  # ip -> HostState
+        self._requests = {}  # cookie -> (HostState, send time)
+        self._wheel = None
+        self._pending = 0
+        self._sweep_retries = self._retries
+        self._sweep_timeout = self._timeout
+        self._retransmit_interval = None
+        self._elapsedtime = 0
+
+    def set_hosts(self, ips):
+        """
+        Specify a list of ip addresses to ping. If we alredy have the host
+        in our list, we reuse that host object to ensure proper sequence
+        increment
+        """
+        hosts = {}
+        for ip in ips:
+            hosts[ip] = self._hosts.get(ip) or HostState(self._make_host(ip))
+        self._hosts = hosts
+
+    def _make_host(self, ip):
+        host = Host(ip)
+        host.packet.id = self._ident
+        return host
+
+    def get_sweep_window(self):
+        """Returns the length of the time window in which the first requests
+        of a sweep are sent, leaving enough time for the last of them to time
+        out before the check interval ends.
+        """
+        return max(self._interval - self._timeout, 0)
+
+    def ping(self):
+        """
+        Runs one sweep of all configured hosts. Returns the time used.
+        """
+        spacing = self.get_sweep_window() / max(len(self._hosts), 1)
+        return self._sweep(spacing, self._retries, self._timeout)
+
+    def burst(self, count, interval):
+        """
+        Probes all configured hosts at once, with up to count requests sent
+        interval seconds apart, stopping at the first reply from each host.
+        Replies are awaited until `timeout` seconds after the last request.
+        Returns the time used.
+        """
+        timeout = (count - 1) * interval + self._timeout
+        return self._sweep(0, count - 1, timeout, interval)
+
+    def _sweep(self, spacing, retries, timeout, retransmit_interval=None):
+        start = time.time()
+        self._requests = {}
+        self._wheel = TimerWheel(start, TIMER_RESOLUTION)
+        self._pending = len(self._hosts)
+        self._sweep_retries = retries
+        self._sweep_timeout = timeout
+        self._retransmit_interval = retransmit_interval
+
+        for index, state in enumerate(self._hosts.values()):
+            state.reset()
+            self._wheel.schedule(start + index * spacing, (SEND, state))
+
+        sockets = (self._sock6, self._sock4)
+        blocking = [sock.getblocking() for sock in sockets]
+        with selectors.DefaultSelector() as selector:
+            for sock in sockets:
+                sock.setblocking(False)
+                selector.register(sock, selectors.EVENT_READ)
+            try:
+                self._run(selector)
+            finally:
+                for sock, flag in zip(sockets, blocking):
+                    sock.setblocking(flag)
+
+        self._elapsedtime = time.time() - start
+        return self._elapsedtime
+
+    def _run(self, selector):
+        while self._pending:
+            timeout = self._wheel.time_until_next(time.time())
+            for key, _events in selector.select(timeout):
+                self._read_responses(key.fileobj)
+            for action, state in self._wheel.advance(time.time()):
+                if state.done:
+                    continue
+                if action == SEND:
+                    self._send_request(state)
+                else:
+                    self._expire(state)
+
+    def _send_request(self, state):
+        now = time.time()
+        host = state.host
+        host.time = now
+        packet, cookie = host.make_packet(self._packetsize)
+        self._requests[cookie] = (state, now)
+        host.next_seq()
+
+        try:
+            if host.is_v6():
+                self._sock6.sendto(packet, (host.ip, 0, 0, 0))
+            else:
+                self._sock4.sendto(packet, (host.ip, 0))
+        except Exception as error:  # pylint: disable=W0703
+            _logger.info("Failed to ping %s [%s]", host.ip, error)
+
+        if state.first_sent is None:
+            state.first_sent = now
+            self._wheel.schedule(now + self._sweep_timeout, (EXPIRE, state))
+        state.attempts += 1
+        if state.attempts <= self._sweep_retries:
+            retransmit = now + (
+                self._retransmit_interval
+                or state.get_retransmit_timeout(
+                    self._sweep_timeout / (self._sweep_retries + 1),
+                    self._sweep_timeout,
+                )
+            )
+            if retransmit < state.first_sent + self._sweep_timeout:
+                self._wheel.schedule(retransmit, (SEND, state))
+
+    def _expire(self, state):
+        state.done = True
+        state.host.reply = None
+        self._pending -= 1
+
+    def _read_responses(self, sock):
+        is_ipv6 = sock is self._sock6
+        while True:
+            try:
+                raw_pong, sender = sock.recvfrom(4096)
+            except socket.error as error:
+                if error.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    _logger.critical("RealityError -2", exc_info=True)
+                return
+            self._process_response(raw_pong, sender, is_ipv6, time.time())
+
+    def _process_response(self, raw_pong, sender, is_ipv6, arrival):
+        packet_class = PacketV6 if is_ipv6 else PacketV4
+        try:
+            pong = packet_class(raw_pong)
+        except Exception as error:  # pylint: disable=W0703
+            _logger.critical("could not disassemble packet from %r: %s", sender, error)
+            return
+
+        if pong.type != pong.ICMP_ECHO_REPLY or pong.id != self._ident:
+            return
+
+        cookie = pong.data[: Host.COOKIE_LENGTH]
+        try:
+            state, sent = self._requests.pop(cookie)
+        except KeyError:
+            _logger.debug(
+                "packet from %r does not match any outstanding request: %r",
+                sender,
+                pong,
+            )
+            return
+
+        pingtime = arrival - sent
+        state.update_rtt(pingtime)
+        if state.done:
+            return  # a late reply to an earlier request of this sweep
+        state.done = True
+        state.host.reply = pingtime
+        self._pending -= 1
+        _logger.debug("Response from %-16s in %03.3f ms", sender, pingtime * 1000)
+
+    def results(self):
+        """
+        Returns a tuple of
+        (ip, roundtriptime) for all hosts.
+        Unreachable hosts will have roundtriptime = -1
+        """
+        return [
+            (ip, state.host.reply if state.host.reply else -1)
+            for ip, state in self._hosts.items()
+        ]
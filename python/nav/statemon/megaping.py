@@ -155,7 +155,7 @@ class MegaPing(object):
 
     _requests = _sender = _getter = _sender_finished = None
 
-    def __init__(self, sockets, conf=None):
+    def __init__(self, sockets, conf=None, ident=None):
 
         # Get config in /etc/pping.conf
         if conf is None:
@@ -184,7 +184,8 @@ class MegaPing(object):
                 % packetsize
             )
         self._packetsize = packetsize
-        self._pid = os.getpid() % 65536
+        # ICMP identifier of our packets, the PID unless otherwise specified
+        self._pid = (os.getpid() if ident is None else ident) % 65536
 
         # Global timing of the ppinger
         self._elapsedtime = 0
@@ -214,6 +215,7 @@ class MegaPing(object):
         for ip in ips:
             if ip not in self._hosts:
                 currenthosts[ip] = Host(ip)
+                currenthosts[ip].packet.id = self._pid
             else:
                 currenthosts[ip] = self._hosts[ip]
         self._hosts = currenthosts
@@ -0,0 +1,310 @@
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.  You should have received a copy of the GNU General Public License
+# along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""Sharding of ping sweeps across multiple worker processes.
+
+A single pinger parses every reply packet in pure Python, so the number of
+replies one pping process can handle per second is bounded by a single CPU
+core. :py:class:`ShardedPinger` partitions the hosts to ping between a number
+of forked worker processes, by a hash of their IP addresses, and runs the
+sweeps of all the workers in parallel.
+
+Raw sockets can only be created with root privileges, so pping creates one pair
+of them per worker before dropping its privileges. Every raw ICMP socket
+receives a copy of every incoming ICMP packet, so each worker uses its own ICMP
+identifier, and attaches a socket filter (on Linux) that makes the kernel drop
+any echo replies not addressed to it, rather than having every worker parse
+the replies of all the others.
+"""
+import ctypes
+import logging
+import multiprocessing
+import signal
+import socket
+import struct
+import time
+import zlib
+
+_logger = logging.getLogger(__name__)
+
+SO_ATTACH_FILTER = getattr(socket, 'SO_ATTACH_FILTER', 26)
+
+# classic BPF opcodes, from linux/filter.h
+BPF_LD, BPF_LDX, BPF_JMP, BPF_RET = 0x00, 0x01, 0x05, 0x06
+BPF_H, BPF_B = 0x08, 0x10
+BPF_ABS, BPF_IND, BPF_MSH = 0x20, 0x40, 0xA0
+BPF_JEQ, BPF_K = 0x10, 0x00
+
+ICMP_ECHO_REPLY = 0
+ICMP6_ECHO_REPLY = 129
+ACCEPT, REJECT = 0xFFFFFFFF, 0
+
+# The default number of seconds to wait for the workers to complete a sweep
+DEFAULT_TIMEOUT = 60
+# Seconds to wait for a sweep beyond the end of its last reply timeouts
+SWEEP_SLACK = 5
+# The number of times a worker may be restarted while executing one command
+MAX_RESTARTS = 2
+
+_NO_REPLY = object()
+
+
+def make_ident_filter(ident, ipv6):
+    """Returns a classic BPF program, as a list of (code, jt, jf, k) tuples,
+    that accepts only echo replies carrying the ICMP identifier ident.
+
+    IPv4 raw sockets receive the IP header too, while IPv6 raw sockets only
+    receive the ICMPv6 message.
+    """
+    # packets are assembled in native byte order, while BPF loads are
+    # big-endian
+    wire_ident = struct.unpack('!H', struct.pack('H', ident))[0]
+    if ipv6:
+        return [
+            (BPF_LD | BPF_B | BPF_ABS, 0, 0, 0),  # A = ICMP type
+            (BPF_JMP | BPF_JEQ | BPF_K, 0, 3, ICMP6_ECHO_REPLY),
+            (BPF_LD | BPF_H | BPF_ABS, 0, 0, 4),  # A = ICMP identifier
+            (BPF_JMP | BPF_JEQ | BPF_K, 0, 1, wire_ident),
+            (BPF_RET | BPF_K, 0, 0, ACCEPT),
+            (BPF_RET | BPF_K, 0, 0, REJECT),
+        ]
+    return [
+        (BPF_LDX | BPF_B | BPF_MSH, 0, 0, 0),  # X = IP header length
+        (BPF_LD | BPF_B | BPF_IND, 0, 0, 0),  # A = ICMP type
+        (BPF_JMP | BPF_JEQ | BPF_K, 0, 3, ICMP_ECHO_REPLY),
+        (BPF_LD | BPF_H | BPF_IND, 0, 0, 4),  # A = ICMP identifier
+        (BPF_JMP | BPF_JEQ | BPF_K, 0, 1, wire_ident),
+        (BPF_RET | BPF_K, 0, 0, ACCEPT),
+        (BPF_RET | BPF_K, 0, 0, REJECT),
+    ]
+
+
+def attach_ident_filter(sock, ident, ipv6):
+    """Attaches a socket filter to a raw ICMP socket, so that it only receives
+    echo replies carrying the ICMP identifier ident.
+
+    :returns: True if the filter was attached, False if the platform does not
+              support it.
+    """
+    program = make_ident_filter(ident, ipv6)
+    instructions = ctypes.create_string_buffer(
+        b''.join(struct.pack('HBBI', *insn) for insn in program)
+    )
+    fprog = struct.pack('HP', len(program), ctypes.addressof(instructions))
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+    except OSError as error:
+        _logger.info("Could not attach ICMP identifier filter: %s", error)
+        return False
+    return True
+
+
+def get_sweep_timeout(conf):
+    """Returns the number of seconds to wait for the workers to complete a
+    sweep, given pping's config.
+
+    The scheduled engine spreads its requests across the whole check interval,
+    so the last reply timeouts of a sweep expire at the end of it, or slightly
+    after. A worker is given the reply timeout and some slack on top of that.
+    """
+    return (
+        float(conf.get("checkinterval", 60))
+        + float(conf.get("timeout", 5))
+        + SWEEP_SLACK
+    )
+
+
+def get_shard(ip, shards):
+    """Returns the shard number of an IP address"""
+    return zlib.crc32(ip.encode('ascii')) % shards
+
+
+class ShardedPinger(object):
+    """
+    Partitions hosts between worker processes, each running its own pinger.
+    Has the same set_hosts(), ping() and results() methods as the pingers.
+
+    A worker that dies or doesn't reply within timeout seconds is restarted,
+    at most :py:const:`MAX_RESTARTS` times per command. If it still gives no
+    reply, its hosts are left out of the results of that sweep.
+
+    :param sockets: A list of (IPv6, IPv4) raw socket pairs, one per worker.
+    :param factory: A callable that makes a pinger from a socket pair and an
+                    ICMP identifier, e.g. :py:class:`IcmpEngine`.
+    :param base_ident: The ICMP identifier of the parent process. Workers use
+                       the identifiers that follow it.
+    :param timeout: The number of seconds to wait for the workers to complete
+                    a command, e.g. a sweep.
+    """
+
+    def __init__(self, sockets, factory, base_ident, timeout=DEFAULT_TIMEOUT):
+        self._sockets = list(sockets)
+        self._factory = factory
+        self._idents = [(base_ident + 1 + i) % 65536 for i in range(len(sockets))]
+        self._timeout = timeout
+        self._hosts = [[] for _ in self._sockets]
+        self._results = []
+        self._seq = 0
+        self._workers = [self._start_worker(shard) for shard in range(len(sockets))]
+
+    def _start_worker(self, shard):
+        parent_conn, child_conn = multiprocessing.Pipe()
+        process = multiprocessing.get_context('fork').Process(
+            target=run_worker,
+            name="pping-shard-%d" % shard,
+            args=(child_conn, self._sockets[shard], self._factory, self._idents[shard]),
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        _logger.debug("Started shard %d worker, pid %s", shard, process.pid)
+        return process, parent_conn
+
+    def set_hosts(self, ips):
+        """
+        Specify a list of ip addresses to ping, which are partitioned between
+        the workers.
+        """
+        hosts = [[] for _ in self._sockets]
+        for ip in ips:
+            hosts[get_shard(ip, len(hosts))].append(ip)
+        self._hosts = hosts
+        for shard, shard_hosts in enumerate(hosts):
+            self._call(shard, 'set_hosts', shard_hosts)
+
+    def ping(self):
+        """
+        Runs one sweep in all workers, in parallel. Returns the time used by
+        the slowest worker.
+        """
+        requests = [self._send(shard, 'ping') for shard in range(len(self._workers))]
+        deadline = time.time() + self._timeout
+        elapsed, results = 0, []
+        for shard, seq in enumerate(requests):
+            reply = self._receive(shard, seq, deadline, 'ping')
+            if reply is None:
+                continue
+            shard_elapsed, shard_results = reply
+            elapsed = max(elapsed, shard_elapsed)
+            results.extend(shard_results)
+        self._results = results
+        return elapsed
+
+    def results(self):
+        """
+        Returns a tuple of
+        (ip, roundtriptime) for all hosts of all workers.
+        Unreachable hosts will have roundtriptime = -1
+        """
+        return self._results
+
+    def _call(self, shard, command, *args):
+        seq = self._send(shard, command, *args)
+        return self._receive(shard, seq, time.time() + self._timeout, command, *args)
+
+    def _send(self, shard, command, *args):
+        """Sends a command to a worker, returning its sequence number"""
+        self._seq += 1
+        try:
+            self._workers[shard][1].send((self._seq, command, args))
+        except (OSError, ValueError):
+            pass  # a dead worker is detected and replaced by _receive()
+        return self._seq
+
+    def _receive(self, shard, seq, deadline, command, *args):
+        """Returns a worker's reply to the command numbered seq, restarting the
+        worker and repeating the command if it dies or doesn't reply before
+        deadline. Returns None if no reply could be had.
+        """
+        reply = self._wait(shard, seq, deadline)
+        restarts = 0
+        while reply is _NO_REPLY and restarts < MAX_RESTARTS:
+            restarts += 1
+            _logger.error("Shard %d worker died or hung, restarting it", shard)
+            seq = self._restart_worker(shard)
+            if time.time() >= deadline:
+                break
+            if command != 'set_hosts':
+                seq = self._send(shard, command, *args)
+            reply = self._wait(shard, seq, deadline)
+
+        if reply is _NO_REPLY:
+            _logger.error(
+                "Shard %d worker gave no reply to %s, skipping its %d hosts",
+                shard,
+                command,
+                len(self._hosts[shard]),
+            )
+            return None
+        return reply
+
+    def _wait(self, shard, seq, deadline):
+        """Waits until deadline for a worker's reply to the command numbered
+        seq, discarding any late replies to earlier commands.
+        """
+        _process, conn = self._workers[shard]
+        try:
+            while conn.poll(max(deadline - time.time(), 0)):
+                reply_seq, reply = conn.recv()
+                if reply_seq == seq:
+                    return reply
+        except (EOFError, OSError):
+            pass
+        return _NO_REPLY
+
+    def _restart_worker(self, shard):
+        """Replaces a worker by a new one, and gives it the hosts of its shard.
+        Returns the sequence number of the set_hosts command.
+        """
+        process, conn = self._workers[shard]
+        conn.close()
+        if process.is_alive():
+            process.terminate()
+        process.join(1)
+        self._workers[shard] = self._start_worker(shard)
+        return self._send(shard, 'set_hosts', self._hosts[shard])
+
+    def close(self):
+        """Stops all worker processes"""
+        for shard, (process, conn) in enumerate(self._workers):
+            self._send(shard, 'stop')
+            conn.close()
+            process.join(5)
+
+
+def run_worker(conn, sockets, factory, ident):
+    """Runs a shard worker, executing commands received on conn until told to
+    stop, or the parent process goes away.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    for sock, ipv6 in zip(sockets, (True, False)):
+        attach_ident_filter(sock, ident, ipv6)
+    pinger = factory(sockets, ident=ident)
+
+    while True:
+        try:
+            seq, command, args = conn.recv()
+        except EOFError:
+            break
+        if command == 'stop':
+            break
+        if command == 'set_hosts':
+            pinger.set_hosts(*args)
+            conn.send((seq, len(args[0])))
+        elif command == 'ping':
+            elapsed = pinger.ping()
+            conn.send((seq, (elapsed, pinger.results())))
@@ -26,6 +26,7 @@ import time
 from nav.metrics.carbon import send_metrics
 from nav.metrics.templates import (
     metric_path_for_packet_loss,
+    metric_path_for_ping_detection_latency,
     metric_path_for_roundtrip_time,
     metric_path_for_service_availability,
     metric_path_for_service_response_time,
@@ -65,3 +66,20 @@ def update(sysname, timestamp, status, responsetime, serviceid=None, handler="")
         (response_name, (timestamp, responsetime)),
     ]
     send_metrics(metrics)
+
+
+def update_detection_latency(sysname, timestamp, latency):
+    """Sends the time it took to detect that a device went down to graphite.
+
+    :param sysname: Sysname of the device in question.
+    :param timestamp: Timestamp of the detection. If None or 'N', the current
+                      time will be used.
+    :param latency: The number of seconds from the first unanswered ping
+                    sweep of the device until it was declared down.
+
+    """
+    if timestamp is None or timestamp == 'N':
+        timestamp = time.time()
+    send_metrics(
+        [(metric_path_for_ping_detection_latency(sysname), (timestamp, latency))]
+    )
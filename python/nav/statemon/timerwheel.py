@@ -0,0 +1,108 @@
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.  You should have received a copy of the GNU General Public License
+# along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""A hashed timer wheel.
+
+Timers are kept in a fixed number of slots, each covering one tick of a fixed
+resolution, that the wheel rotates through as time passes. Scheduling a timer
+and expiring a due timer are both constant time operations, no matter how
+many timers are pending, which makes the wheel suitable for keeping separate
+send and timeout schedules for tens of thousands of hosts.
+
+Timers further into the future than one full rotation of the wheel are kept in
+the slot of their tick, and are skipped until the wheel has rotated far enough.
+"""
+import math
+
+
+class TimerWheel(object):
+    """A hashed timer wheel.
+
+    :param now: The current time, in seconds.
+    :param resolution: The length of a tick, in seconds. Timers never expire
+                       early, but may expire up to one tick late.
+    :param slots: The number of slots in the wheel.
+    """
+
+    def __init__(self, now, resolution=0.01, slots=1024):
+        self.resolution = resolution
+        self._slots = [[] for _ in range(slots)]
+        self._tick = self._get_tick(now)
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __repr__(self):
+        return "<TimerWheel with %d timers>" % self._count
+
+    def _get_tick(self, when):
+        return int(when / self.resolution)
+
+    def schedule(self, when, item):
+        """Schedules item to expire at the time when.
+
+        Items scheduled for a time that has already passed expire on the next
+        tick.
+        """
+        tick = max(math.ceil(when / self.resolution), self._tick + 1)
+        self._slots[tick % len(self._slots)].append((tick, item))
+        self._count += 1
+
+    def advance(self, now):
+        """Rotates the wheel up to the time now.
+
+        :returns: A list of the items that expired, in the order of their
+                  expiry ticks.
+        """
+        target = self._get_tick(now)
+        if target <= self._tick:
+            return []
+
+        expired = []
+        steps = min(target - self._tick, len(self._slots))
+        for step in range(1, steps + 1):
+            index = (self._tick + step) % len(self._slots)
+            slot = self._slots[index]
+            if not slot:
+                continue
+            remaining = []
+            for entry in slot:
+                (expired if entry[0] <= target else remaining).append(entry)
+            self._slots[index] = remaining
+
+        self._tick = target
+        self._count -= len(expired)
+        expired.sort(key=lambda entry: entry[0])
+        return [item for _tick, item in expired]
+
+    def time_until_next(self, now):
+        """Returns the number of seconds from now until the next timer expires,
+        or None if there are no pending timers.
+        """
+        if not self._count:
+            return None
+        next_tick = None
+        for step in range(1, len(self._slots) + 1):
+            tick = self._tick + step
+            for entry_tick, _item in self._slots[tick % len(self._slots)]:
+                if entry_tick == tick:
+                    next_tick = tick
+                    break
+                if next_tick is None or entry_tick < next_tick:
+                    next_tick = entry_tick
+            if next_tick == tick:
+                break
+        return max(0.0, next_tick * self.resolution - now)
@@ -18,9 +18,13 @@
 
 from __future__ import absolute_import
 
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
 import logging
+import math
 from optparse import OptionParser
-from collections import defaultdict
+from collections import Counter, defaultdict, namedtuple
+import time
 
 import django
 from django.db import transaction
@@ -32,8 +36,11 @@ from nav.models.manage import Netbox, Interface, Sensor
 from nav.models.thresholds import ThresholdRule
 from nav.models.event import EventQueue as Event, AlertHistory
 from nav.metrics.lookup import lookup
+from nav.metrics.thresholds import MIN_TIMEOUT, ThresholdPlanner
 
 LOG_FILE = 'thresholdmon.log'
+SLOWEST_RULES_TO_LOG = 5
+DEFAULT_RULE_TIMEOUT = 300
 
 _logger = logging.getLogger('nav.thresholdmon')
 
@@ -41,7 +48,9 @@ _logger = logging.getLogger('nav.thresholdmon')
 def main():
     """Main thresholdmon program"""
     parser = make_option_parser()
-    (_options, _args) = parser.parse_args()
+    (options, _args) = parser.parse_args()
+    if options.workers < 1:
+        parser.error("--workers must be a positive number")
 
     init_generic_logging(
         logfile=LOG_FILE,
@@ -50,7 +59,10 @@ def main():
         read_config=True,
     )
     django.setup()
-    scan()
+    timeout = options.timeout
+    if timeout is None and options.workers > 1:
+        timeout = DEFAULT_RULE_TIMEOUT
+    scan(workers=options.workers, timeout=timeout)
 
 
 def make_option_parser():
@@ -62,31 +74,186 @@ def make_option_parser():
             "to configured threshold rules."
         ),
     )
+    parser.add_option(
+        "-w",
+        "--workers",
+        type="int",
+        default=1,
+        metavar="N",
+        help="evaluate up to N rules concurrently (default: %default)",
+    )
+    parser.add_option(
+        "-t",
+        "--timeout",
+        type="float",
+        metavar="SECONDS",
+        help=(
+            "give up on a rule if evaluating it takes longer than this; a "
+            "value of 0 disables the timeout (default: %d when using multiple "
+            "workers, otherwise no timeout)" % DEFAULT_RULE_TIMEOUT
+        ),
+    )
     return parser
 
 
-def scan():
-    """Scans for threshold rules and evaluates them"""
+class RuleResult(namedtuple('RuleResult', 'status started cleared elapsed')):
+    """The outcome of evaluating a single threshold rule"""
+
+    OK = 'ok'
+    FAILED = 'failed'
+    TIMED_OUT = 'timed out'
+
+
+def scan(workers=1, timeout=None):
+    """Scans for threshold rules and evaluates them.
+
+    :param workers: The number of rules to evaluate concurrently.
+    :param timeout: The number of seconds a single rule may spend on
+                    evaluation before it is abandoned without posting any
+                    events. Batch retrieval of values for all rules is given
+                    the same amount of time.
+    """
     rules = ThresholdRule.objects.all()
     alerts = get_unresolved_threshold_alerts()
 
-    _logger.info("evaluating %d rules", len(rules))
-    for rule in rules:
-        evaluate_rule(rule, alerts)
+    _logger.info("evaluating %d rules using %d workers", len(rules), workers)
+    scan_start = time.time()
+    evaluators = fetch_values(rules, workers, timeout)
+    fetch_time = time.time() - scan_start
+
+    evaluate = partial(_timed_evaluate_rule, alerts=alerts, timeout=timeout)
+    tasks = [(rule, evaluators.get(rule.id)) for rule in rules]
+    if workers > 1:
+        results = evaluate_concurrently(evaluate, tasks, workers, timeout)
+    else:
+        results = dict(evaluate(*task) for task in tasks)
+
+    log_summary(results, fetch_time, time.time() - scan_start)
     _logger.info("done")
 
 
+def evaluate_concurrently(evaluate, tasks, workers, timeout=None):
+    """Evaluates rules in a pool of worker threads.
+
+    Each rule is expected to give up by itself when its timeout has passed, so
+    the pool as a whole is given enough time to evaluate `workers` rules at a
+    time. Rules that are still running after that are abandoned and reported
+    as timed out.
+
+    :param evaluate: A function that evaluates a rule and its evaluator, and
+                     returns a (rule, RuleResult) tuple.
+    :param tasks: A list of (rule, evaluator) tuples.
+    :returns: A dict of {rule: RuleResult}
+    """
+    executor = ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix="thresholdmon"
+    )
+    futures = {executor.submit(evaluate, *task): task[0] for task in tasks}
+    budget = timeout * math.ceil(len(futures) / workers) if timeout else None
+    done, not_done = wait(futures, timeout=budget)
+    for future in not_done:
+        future.cancel()
+    executor.shutdown(wait=False)
+
+    results = dict(future.result() for future in done)
+    for future in not_done:
+        rule = futures[future]
+        _logger.error("abandoned rule %r after %.2fs", rule, budget)
+        results[rule] = RuleResult(RuleResult.TIMED_OUT, 0, 0, budget)
+    return results
+
+
+def fetch_values(rules, workers=1, timeout=None):
+    """
+    Retrieves values for the evaluators of a list of rules in as few Graphite
+    requests as possible.
+
+    :param timeout: The number of seconds to spend on retrieval. Rules whose
+                    values were not retrieved by then are left unfetched.
+    :returns: A dict of {rule_id: ThresholdEvaluator}
+    """
+    planner = ThresholdPlanner()
+    evaluators = {}
+    for rule in rules:
+        evaluators[rule.id] = evaluator = rule.get_evaluator()
+        planner.add(evaluator)
+    planner.fetch(workers, timeout)
+
+    unfetched = sum(1 for e in evaluators.values() if not e.fetched)
+    _logger.debug(
+        "batch fetched values for %d of %d rules",
+        len(evaluators) - unfetched,
+        len(evaluators),
+    )
+    return evaluators
+
+
+def log_summary(results, fetch_time, total_time):
+    """Logs a summary of a scan's rule results and evaluation times"""
+    statuses = Counter(result.status for result in results.values())
+    _logger.info(
+        "evaluated %d rules in %.2fs (%.2fs spent on batch retrieval): "
+        "%d ok, %d failed, %d timed out; %d alerts started, %d cleared",
+        len(results),
+        total_time,
+        fetch_time,
+        statuses[RuleResult.OK],
+        statuses[RuleResult.FAILED],
+        statuses[RuleResult.TIMED_OUT],
+        sum(result.started for result in results.values()),
+        sum(result.cleared for result in results.values()),
+    )
+    slowest = sorted(results.items(), key=lambda item: item[1].elapsed, reverse=True)
+    for rule, result in slowest[:SLOWEST_RULES_TO_LOG]:
+        _logger.info(
+            "slow rule: %.2fs (%s) for %r", result.elapsed, result.status, rule
+        )
+
+
+def _timed_evaluate_rule(rule, evaluator, alerts, timeout):
+    start = time.time()
+    deadline = start + timeout if timeout else None
+    result = evaluate_rule(rule, alerts, evaluator, deadline)
+    _logger.debug("evaluated rule %r in %.3fs: %s", rule, result.elapsed, result.status)
+    return rule, result
+
+
 # pylint: disable=W0703
-def evaluate_rule(rule, alerts):
+def evaluate_rule(rule, alerts, evaluator=None, deadline=None):
     """
     Evaluates the current status of a single rule and posts events if
     necessary.
+
+    Events are only posted for metrics that do not already have an unresolved
+    alert in `alerts`, or to clear those that do. Since the subject of a
+    threshold event is prefixed by its rule's id, rules may be evaluated
+    concurrently against the same `alerts` map.
+
+    :param evaluator: The rule's ThresholdEvaluator. If it has not already
+                      fetched its values, they are retrieved from Graphite.
+    :param deadline: A time.time() value. If evaluation is not finished by
+                     then, the rule is abandoned before any events are posted.
+    :rtype: RuleResult
     """
     _logger.debug("evaluating rule %r", rule)
+    start = time.time()
+
+    def _result(status, started=0, cleared=0):
+        return RuleResult(status, started, cleared, time.time() - start)
 
-    evaluator = rule.get_evaluator()
+    if evaluator is None:
+        evaluator = rule.get_evaluator()
     try:
-        if not evaluator.get_values():
+        if evaluator.fetched:
+            values = evaluator.result
+        elif deadline:
+            if time.time() >= deadline:
+                return _timed_out(rule, start, _result)
+            timeout = max(deadline - time.time(), MIN_TIMEOUT)
+            values = evaluator.get_values(timeout=timeout)
+        else:
+            values = evaluator.get_values()
+        if not values:
             _logger.warning(
                 "did not find any matching values for rule %r %s",
                 rule.target,
@@ -94,26 +261,17 @@ def evaluate_rule(rule, alerts):
             )
     except Exception:
         _logger.exception("Unhandled exception while getting values for rule: %r", rule)
-        return
+        return _result(RuleResult.FAILED)
 
-    # post new exceed events
     try:
         exceeded = evaluator.evaluate(rule.alert)
     except Exception:
         _logger.exception("Unhandled exception while evaluating rule alert: %r", rule)
-        return
-
-    for metric, value in exceeded:
-        alert = alerts.get(rule.id, {}).get(metric, None)
-        _logger.info(
-            "%s: %s %s (=%s)", "old" if alert else "new", metric, rule.alert, value
-        )
-        if not alert:
-            start_event(rule, metric, value)
+        return _result(RuleResult.FAILED)
 
-    # try to clear any existing threshold alerts
-    if rule.id in alerts:
-        clearable = alerts[rule.id]
+    clearable = alerts.get(rule.id, {})
+    cleared = []
+    if clearable:
         try:
             if rule.clear:
                 cleared = evaluator.evaluate(rule.clear)
@@ -123,12 +281,43 @@ def evaluate_rule(rule, alerts):
             _logger.exception(
                 "Unhandled exception while evaluating rule clear: %r", rule
             )
-            return
+            cleared = None
+
+    if deadline and time.time() > deadline:
+        return _timed_out(rule, start, _result)
 
-        for metric, value in cleared:
-            if metric in clearable:
-                _logger.info("cleared: %s %s (=%s)", metric, rule.clear, value)
-                end_event(rule, metric, value)
+    # post new exceed events
+    started = 0
+    for metric, value in exceeded:
+        alert = clearable.get(metric, None)
+        _logger.info(
+            "%s: %s %s (=%s)", "old" if alert else "new", metric, rule.alert, value
+        )
+        if not alert:
+            start_event(rule, metric, value)
+            started += 1
+
+    if cleared is None:
+        return _result(RuleResult.FAILED, started)
+
+    # try to clear any existing threshold alerts
+    ended = 0
+    for metric, value in cleared:
+        if metric in clearable:
+            _logger.info("cleared: %s %s (=%s)", metric, rule.clear, value)
+            end_event(rule, metric, value)
+            ended += 1
+
+    return _result(RuleResult.OK, started, ended)
+
+
+def _timed_out(rule, start, make_result):
+    _logger.error(
+        "rule %r timed out after %.2fs, not posting any events",
+        rule,
+        time.time() - start,
+    )
+    return make_result(RuleResult.TIMED_OUT)
 
 
 def get_unresolved_threshold_alerts():
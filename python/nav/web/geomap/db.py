@@ -29,7 +29,7 @@ Based on datacollector.py from the old Java-applet based Netmap.
 import logging
 
 from django.core.cache import cache
-from urllib.error import HTTPError
+from requests import HTTPError
 
 import nav
 from nav.config import NAV_CONFIG
@@ -43,7 +43,6 @@ from nav.metrics.templates import (
     metric_path_for_cpu_utilization,
 )
 from nav.web.geomap.utils import lazy_dict, subdict, is_nan
-from nav.util import chunks
 
 _logger = logging.getLogger(__name__)
 
@@ -377,7 +376,6 @@ def get_data(db_cursor, bounds, time_interval=None):
 # TRAFFIC DATA
 
 MEGABIT = 1e6
-METRIC_CHUNK_SIZE = 500  # number of metrics to ask for in a single request
 CACHE_TIMEOUT = 5 * 60  # 5 minutes
 
 
@@ -441,12 +439,8 @@ def get_multiple_link_load(items, time_interval):
         targets = [get_metric_meta(t)['target'] for t in targets]
         target_map.update({t: properties for t in targets})
 
-    _logger.debug(
-        "getting %s graphite traffic targets in chunks", len(target_map.keys())
-    )
-    data = {}
-    for chunk in chunks(target_map.keys(), METRIC_CHUNK_SIZE):
-        data.update(_get_metric_average(chunk, time_interval))
+    _logger.debug("getting %s graphite traffic targets", len(target_map))
+    data = _get_metric_average(list(target_map), time_interval)
 
     for key, value in data.items():
         properties = target_map.get(key, None)
@@ -526,10 +520,8 @@ def get_multiple_cpu_load(items, time_interval):
             ]
         )
 
-    _logger.debug("getting %s graphite cpu targets in chunks", len(targets))
-    data = {}
-    for chunk in chunks(targets, METRIC_CHUNK_SIZE):
-        data.update(_get_metric_average(chunk, time_interval))
+    _logger.debug("getting %s graphite cpu targets", len(targets))
+    data = _get_metric_average(targets, time_interval)
 
     for key, value in data.items():
         for sysname, netbox in target_map.items():
@@ -556,5 +548,5 @@ def _get_metric_average(targets, time_interval):
             err,
         )
         if isinstance(err.cause, HTTPError):
-            _logger.debug("error cause: %s", err.cause.read())
+            _logger.debug("error cause: %s", err.cause.response.text)
         return {}
@@ -1,14 +1,52 @@
+import importlib.util
+import os
+import sys
 from glob import glob
-from setuptools import setup
+from setuptools import Command, setup
 from setuptools.command.build import build
 
 
-# Ensure CSS files are built every time build is invoked
-build.sub_commands = [('build_sass', None)] + build.sub_commands
+class build_mibs(Command):
+    """Compiles the bundled smidump modules to NAV's compact MIB format"""
+
+    description = "compile MIB dumps to NAV's compact precompiled format"
+    user_options = []
+
+    def initialize_options(self):
+        self.build_lib = None
+
+    def finalize_options(self):
+        self.set_undefined_options('build_py', ('build_lib', 'build_lib'))
+
+    def run(self):
+        compiled = _load_source_module('nav.smidumps.compiled')
+        directory = os.path.join(self.build_lib, 'nav', 'smidumps')
+        count = compiled.compile_directory(directory)
+        self.announce("compiled %d MIB modules in %s" % (count, directory), level=2)
+
+
+def _load_source_module(name):
+    """Loads a single module from the source tree, without importing its
+    parent packages.
+    """
+    sys.path.insert(0, 'python')  # for the few NAV modules it may depend on
+    path = os.path.join('python', *name.split('.')) + '.py'
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# Ensure CSS files are built every time build is invoked, and that MIB dumps are
+# compiled once they have been copied to the build directory
+build.sub_commands = (
+    [('build_sass', None)] + build.sub_commands + [('build_mibs', None)]
+)
 
 
 setup(
     setup_requires=['libsass', 'setuptools_scm'],
+    cmdclass={'build_mibs': build_mibs},
     sass_manifests={
         'nav.web': {
             'sass_path': 'sass',
@@ -0,0 +1,122 @@
+import datetime
+
+import pytest
+from IPy import IP
+
+from nav.ipdevpoll import shadows
+from nav.ipdevpoll.shadows import cam as cam_module
+from nav.ipdevpoll.storage import ContainerRepository
+from nav.models.fields import INFINITY
+from nav.models.manage import Arp, Cam
+
+YESTERDAY = datetime.datetime.now() - datetime.timedelta(days=1)
+
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_cam_records_should_be_reconciled(db, localhost, monkeypatch, bulk):
+    monkeypatch.setattr(cam_module, 'use_bulk_reconciliation', lambda: bulk)
+    _make_cam(localhost, 1, '00:00:00:00:00:0a', INFINITY, 0)  # kept
+    _make_cam(localhost, 1, '00:00:00:00:00:0b', YESTERDAY, 1)  # reclaimed
+    _make_cam(localhost, 2, '00:00:00:00:00:0c', INFINITY, 0)  # closed
+    _make_cam(localhost, 2, '00:00:00:00:00:0d', YESTERDAY, 2)  # expired
+    _make_cam(localhost, 3, '00:00:00:00:00:0e', YESTERDAY, None)  # ignored
+
+    containers = _make_containers(localhost)
+    for ifindex, mac in [
+        (1, '00:00:00:00:00:0a'),
+        (1, '00:00:00:00:00:0b'),
+        (3, '00:00:00:00:00:0e'),  # new
+    ]:
+        containers.factory((ifindex, mac), shadows.Cam, ifindex, mac)
+    shadows.Cam.manager.add_sentinel(containers)
+    _run_manager(shadows.Cam, containers)
+
+    records = {
+        (cam.ifindex, cam.mac, cam.end_time >= INFINITY, cam.miss_count)
+        for cam in Cam.objects.filter(netbox=localhost)
+    }
+    assert records == {
+        (1, '00:00:00:00:00:0a', True, 0),
+        (1, '00:00:00:00:00:0b', True, 0),
+        (2, '00:00:00:00:00:0c', False, 1),
+        (2, '00:00:00:00:00:0d', False, None),
+        (3, '00:00:00:00:00:0e', False, None),
+        (3, '00:00:00:00:00:0e', True, 0),
+    }
+
+
+def test_arp_records_should_be_reconciled_in_bulk(db, localhost):
+    _make_arp(localhost, '10.0.0.1', '00:00:00:00:00:0a', INFINITY)  # kept
+    _make_arp(localhost, '10.0.0.2', '00:00:00:00:00:0b', INFINITY)  # expired
+    _make_arp(localhost, '10.0.0.3', '00:00:00:00:00:0c', YESTERDAY)  # ignored
+
+    containers = _make_containers(localhost)
+    for ip, mac in [
+        (IP('10.0.0.1'), '00:00:00:00:00:0a'),
+        (IP('10.0.0.3'), '00:00:00:00:00:0c'),  # new
+        (IP('2001:db8::1'), '00:00:00:00:00:0d'),  # new
+    ]:
+        containers.factory((ip, mac), shadows.ArpMapping, ip, mac, None)
+    shadows.ArpMapping.manager.add_sentinel(containers)
+    _run_manager(shadows.ArpMapping, containers)
+
+    records = {
+        (arp.ip, arp.mac, arp.end_time >= INFINITY)
+        for arp in Arp.objects.filter(netbox=localhost)
+    }
+    assert records == {
+        ('10.0.0.1', '00:00:00:00:00:0a', True),
+        ('10.0.0.2', '00:00:00:00:00:0b', False),
+        ('10.0.0.3', '00:00:00:00:00:0c', False),
+        ('10.0.0.3', '00:00:00:00:00:0c', True),
+        ('2001:db8::1', '00:00:00:00:00:0d', True),
+    }
+
+
+def test_arp_records_should_all_be_expired_when_none_are_found(db, localhost):
+    _make_arp(localhost, '10.0.0.1', '00:00:00:00:00:0a', INFINITY)
+
+    containers = _make_containers(localhost)
+    shadows.ArpMapping.manager.add_sentinel(containers)
+    _run_manager(shadows.ArpMapping, containers)
+
+    assert not Arp.objects.filter(netbox=localhost, end_time__gte=INFINITY).exists()
+
+
+def _make_containers(netbox):
+    containers = ContainerRepository()
+    shadow = containers.factory(None, shadows.Netbox)
+    shadow.id = netbox.id
+    shadow.sysname = netbox.sysname
+    return containers
+
+
+def _run_manager(shadow_class, containers):
+    manager = shadow_class.manager(shadow_class, containers)
+    manager.prepare()
+    manager.save()
+    manager.cleanup()
+
+
+def _make_cam(netbox, ifindex, mac, end_time, miss_count):
+    Cam(
+        netbox=netbox,
+        sysname=netbox.sysname,
+        ifindex=ifindex,
+        port='port%d' % ifindex,
+        mac=mac,
+        start_time=YESTERDAY,
+        end_time=end_time,
+        miss_count=miss_count,
+    ).save()
+
+
+def _make_arp(netbox, ip, mac, end_time):
+    Arp(
+        netbox=netbox,
+        sysname=netbox.sysname,
+        ip=ip,
+        mac=mac,
+        start_time=YESTERDAY,
+        end_time=end_time,
+    ).save()
@@ -1,6 +1,7 @@
 from datetime import time, datetime
-from mock import Mock
-from nav.alertengine.base import _calculate_timeperiod_start
+from mock import Mock, patch
+from nav.alertengine.base import _calculate_timeperiod_start, handle_new_alerts_in_batch
+from nav.models.profiles import AlertProfile
 
 
 def test_calculate_timeperiod_start_should_detect_period_starting_yesterday():
@@ -15,3 +16,84 @@ def test_calculate_timeperiod_start_should_detect_period_starting_today():
     timeperiod = Mock(start=time(hour=8, minute=0))
     result = _calculate_timeperiod_start(timeperiod, now=mock_now)
     assert result.date() == mock_now.date()
+
+
+class TestActiveTimeperiod:
+    def test_should_find_latest_started_period(self):
+        now = datetime(year=2020, month=8, day=3, hour=12)
+        periods = [Mock(start=time(hour=8)), Mock(start=time(hour=16))]
+        assert AlertProfile.find_active_timeperiod(periods, now) is periods[0]
+
+    def test_should_wrap_around_to_last_period_of_the_day_before(self):
+        now = datetime(year=2020, month=8, day=3, hour=7)
+        periods = [Mock(start=time(hour=8)), Mock(start=time(hour=16))]
+        assert AlertProfile.find_active_timeperiod(periods, now) is periods[-1]
+
+    def test_should_return_none_when_no_periods(self):
+        assert AlertProfile.find_active_timeperiod([], datetime.now()) is None
+
+
+class TestHandleNewAlertsInBatch:
+    def _run(self, subscribers, contents, matches):
+        handle = handle_new_alerts_in_batch.__wrapped__
+        with patch(
+            'nav.alertengine.base._load_active_subscribers', return_value=subscribers
+        ), patch(
+            'nav.alertengine.base._load_filter_group_contents', return_value=contents
+        ), patch(
+            'nav.alertengine.base.check_alert_against_filtergroupcontents',
+            side_effect=lambda alert, contents, atype, compiler: matches.get(
+                (alert.id, contents)
+            ),
+        ), patch(
+            'nav.alertengine.base.AccountAlertQueue'
+        ) as queue:
+            handle(self.alerts)
+        return queue
+
+    def setup_method(self):
+        self.alerts = [Mock(id=1), Mock(id=2)]
+
+    def test_should_queue_matching_and_permitted_alerts(self):
+        account = Mock(id=10)
+        subscription = Mock(id=100, filter_group_id=1000, alert_address_id=5)
+        subscribers = [(account, [subscription], {2000})]
+        contents = {1000: 'subscribed', 2000: 'permitted'}
+        matches = {
+            (1, 'subscribed'): True,
+            (1, 'permitted'): True,
+            (2, 'subscribed'): False,
+            (2, 'permitted'): True,
+        }
+        queue = self._run(subscribers, contents, matches)
+
+        queue.assert_called_once_with(
+            account=account, alert=self.alerts[0], subscription=subscription
+        )
+        queue.objects.bulk_create.assert_called_once()
+
+    def test_should_not_queue_alerts_without_permission(self):
+        account = Mock(id=10)
+        subscription = Mock(id=100, filter_group_id=1000, alert_address_id=5)
+        subscribers = [(account, [subscription], {2000})]
+        contents = {1000: 'subscribed', 2000: 'permitted'}
+        matches = {(1, 'subscribed'): True, (2, 'subscribed'): True}
+        queue = self._run(subscribers, contents, matches)
+
+        queue.assert_not_called()
+        queue.objects.bulk_create.assert_not_called()
+
+    def test_should_queue_alert_only_once_per_address(self):
+        account = Mock(id=10)
+        subscriptions = [
+            Mock(id=100, filter_group_id=1000, alert_address_id=5),
+            Mock(id=101, filter_group_id=1000, alert_address_id=5),
+        ]
+        subscribers = [(account, subscriptions, {1000})]
+        contents = {1000: 'subscribed'}
+        matches = {(1, 'subscribed'): True}
+        queue = self._run(subscribers, contents, matches)
+
+        queue.assert_called_once_with(
+            account=account, alert=self.alerts[0], subscription=subscriptions[0]
+        )
@@ -0,0 +1,129 @@
+import pytest
+from mock import Mock
+
+from nav.alertengine.filters import CompiledFilter
+from nav.models.event import AlertQueue
+from nav.models.manage import Netbox
+from nav.models.profiles import Expression, MatchField, Operator
+
+
+def _make_filter(*expressions):
+    return CompiledFilter(Mock(id=1), expressions)
+
+
+def _make_expression(value_id, operator, value, data_type=MatchField.STRING):
+    match_field = MatchField(
+        name=value_id, value_id=value_id, data_type=data_type, list_limit=0
+    )
+    return Expression(match_field=match_field, operator=operator, value=value)
+
+
+@pytest.fixture
+def alert():
+    netbox = Netbox(id=1, sysname='gw.example.org', ip='10.0.1.1')
+    return AlertQueue(id=1, netbox=netbox, severity=3, value=100)
+
+
+class TestPlainLookups:
+    def test_equal_sysname_should_match(self, alert):
+        compiled = _make_filter(
+            _make_expression('netbox.sysname', Operator.EQUALS, 'gw.example.org')
+        )
+        assert compiled.verify(alert)
+
+    def test_equal_sysname_should_be_case_sensitive(self, alert):
+        compiled = _make_filter(
+            _make_expression('netbox.sysname', Operator.EQUALS, 'GW.example.org')
+        )
+        assert not compiled.verify(alert)
+
+    def test_startswith_should_be_case_insensitive(self, alert):
+        compiled = _make_filter(
+            _make_expression('netbox.sysname', Operator.STARTSWITH, 'GW.')
+        )
+        assert compiled.verify(alert)
+
+    def test_integer_comparison_should_coerce_value(self, alert):
+        compiled = _make_filter(
+            _make_expression('alertq.severity', Operator.GREATER_EQ, '3')
+        )
+        assert compiled.verify(alert)
+
+    def test_in_should_match_any_value(self, alert):
+        compiled = _make_filter(
+            _make_expression('alertq.severity', Operator.IN, '1|3|5')
+        )
+        assert compiled.verify(alert)
+
+    def test_not_equal_should_exclude(self, alert):
+        compiled = _make_filter(
+            _make_expression('netbox.sysname', Operator.NOT_EQUAL, 'gw.example.org')
+        )
+        assert not compiled.verify(alert)
+
+    def test_not_equal_should_match_missing_netbox(self, alert):
+        alert.netbox = None
+        compiled = _make_filter(
+            _make_expression('netbox.sysname', Operator.NOT_EQUAL, 'gw.example.org')
+        )
+        assert compiled.verify(alert)
+
+    def test_equal_should_not_match_missing_netbox(self, alert):
+        alert.netbox = None
+        compiled = _make_filter(
+            _make_expression('netbox.sysname', Operator.EQUALS, 'gw.example.org')
+        )
+        assert not compiled.verify(alert)
+
+    def test_all_expressions_must_match(self, alert):
+        compiled = _make_filter(
+            _make_expression('netbox.sysname', Operator.CONTAINS, 'example'),
+            _make_expression('alertq.severity', Operator.LESS, '3'),
+        )
+        assert not compiled.verify(alert)
+
+    def test_wildcard_should_match_like_pattern(self, alert):
+        compiled = _make_filter(
+            _make_expression('netbox.sysname', Operator.WILDCARD, 'GW.%.org')
+        )
+        assert compiled.verify(alert)
+
+
+class TestIpLookups:
+    def test_in_should_match_containing_prefix(self, alert):
+        compiled = _make_filter(
+            _make_expression(
+                'netbox.ip', Operator.IN, '10.0.2.0/24|10.0.0.0/16', MatchField.IP
+            )
+        )
+        assert compiled.verify(alert)
+
+    def test_in_should_not_match_other_prefix(self, alert):
+        compiled = _make_filter(
+            _make_expression('netbox.ip', Operator.IN, '10.0.2.0/24', MatchField.IP)
+        )
+        assert not compiled.verify(alert)
+
+    def test_contains_should_only_match_the_address_itself(self, alert):
+        compiled = _make_filter(
+            _make_expression('netbox.ip', Operator.CONTAINS, '10.0.1.1', MatchField.IP)
+        )
+        assert compiled.verify(alert)
+
+
+class TestFallback:
+    def test_multivalued_relation_should_fall_back_to_sql(self):
+        compiled = _make_filter(_make_expression('arp.mac', Operator.EQUALS, 'x'))
+        assert compiled.fallback
+
+    def test_string_ordering_should_fall_back_to_sql(self):
+        compiled = _make_filter(
+            _make_expression('netbox.sysname', Operator.GREATER, 'a')
+        )
+        assert compiled.fallback
+
+    def test_fallback_should_call_filter_verify(self, alert):
+        compiled = _make_filter(_make_expression('arp.mac', Operator.EQUALS, 'x'))
+        compiled.filter.verify.return_value = True
+        assert compiled.verify(alert)
+        compiled.filter.verify.assert_called_once_with(alert)
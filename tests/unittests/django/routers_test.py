@@ -0,0 +1,24 @@
+from django.core.cache.backends.db import DatabaseCache
+from django.test import override_settings
+
+from nav.django.routers import GraphiteCacheRouter
+from nav.models.manage import Netbox
+
+CACHE_MODEL = DatabaseCache('graphite_render_cache', {}).cache_model_class
+
+
+@override_settings(DATABASES={'default': {}, 'graphite_cache': {}})
+def test_cache_queries_should_use_graphite_cache_connection():
+    router = GraphiteCacheRouter()
+    assert router.db_for_read(CACHE_MODEL) == 'graphite_cache'
+    assert router.db_for_write(CACHE_MODEL) == 'graphite_cache'
+
+
+@override_settings(DATABASES={'default': {}, 'graphite_cache': {}})
+def test_other_queries_should_not_be_routed():
+    assert GraphiteCacheRouter().db_for_write(Netbox) is None
+
+
+@override_settings(DATABASES={'default': {}})
+def test_cache_queries_should_use_default_without_graphite_cache_connection():
+    assert GraphiteCacheRouter().db_for_read(CACHE_MODEL) is None
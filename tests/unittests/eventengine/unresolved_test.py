@@ -0,0 +1,68 @@
+import datetime
+
+import pytest
+from mock import Mock
+
+from nav.eventengine import unresolved
+from nav.models.fields import INFINITY
+
+
+@pytest.fixture(autouse=True)
+def empty_map():
+    unresolved._clear()
+    yield
+    unresolved._clear()
+
+
+def _make_alert(alert_id, key, end_time=INFINITY):
+    alert = Mock(id=alert_id, end_time=end_time)
+    alert.get_key.return_value = key
+    return alert
+
+
+def _make_event(key):
+    event = Mock()
+    event.get_key.return_value = key
+    return event
+
+
+def test_track_should_add_unresolved_alert():
+    alert = _make_alert(1, (10, '', 'boxState'))
+    unresolved.track(alert)
+    assert unresolved.refers_to_unresolved_alert(_make_event((10, '', 'boxState')))
+
+
+def test_track_should_remove_resolved_alert():
+    alert = _make_alert(1, (10, '', 'boxState'))
+    unresolved.track(alert)
+    alert.end_time = datetime.datetime.now()
+    unresolved.track(alert)
+    assert not unresolved.refers_to_unresolved_alert(_make_event((10, '', 'boxState')))
+
+
+def test_track_should_ignore_unsaved_alert():
+    unresolved.track(_make_alert(None, (10, '', 'boxState')))
+    assert unresolved.get_map() == {}
+
+
+def test_resolving_one_of_duplicate_alerts_should_keep_the_other():
+    key = (10, '42', 'linkState')
+    first = _make_alert(1, key)
+    second = _make_alert(2, key)
+    unresolved.track(first)
+    unresolved.track(second)
+
+    second.end_time = datetime.datetime.now()
+    unresolved.track(second)
+
+    assert unresolved.refers_to_unresolved_alert(_make_event(key)) is first
+
+
+def test_track_should_not_disturb_unrelated_alerts():
+    unresolved.track(_make_alert(1, (10, '', 'boxState')))
+    other = _make_alert(2, (11, '', 'boxState'))
+    unresolved.track(other)
+    other.end_time = datetime.datetime.now()
+    unresolved.track(other)
+
+    assert list(unresolved.get_map()) == [(10, '', 'boxState')]
@@ -0,0 +1,142 @@
+import time
+
+import pytest
+from mock import Mock
+
+from nav.ipdevpoll import adaptive
+from nav.ipdevpoll.config import IpdevpollConfig
+
+
+class TestGetJitter:
+    def test_should_be_deterministic(self):
+        assert adaptive.get_jitter('inventory', 42) == adaptive.get_jitter(
+            'inventory', 42
+        )
+
+    def test_should_differ_between_jobs(self):
+        assert adaptive.get_jitter('inventory', 42) != adaptive.get_jitter('topo', 42)
+
+    def test_should_be_a_fraction(self):
+        assert all(0 <= adaptive.get_jitter('inventory', i) < 1 for i in range(100))
+
+
+class TestGetStartDelays:
+    def test_should_spread_equal_jobs_evenly(self):
+        delays = adaptive.get_start_delays('inventory', 100, {}, list(range(10)))
+        gaps = _get_gaps(delays, 100)
+        assert all(gap == pytest.approx(10) for gap in gaps)
+
+    def test_should_keep_delays_within_interval(self):
+        delays = adaptive.get_start_delays('inventory', 300, {}, list(range(500)))
+        assert all(0 <= delay < 300 for delay in delays.values())
+
+    def test_should_give_slow_jobs_larger_slots(self):
+        runtimes = {1: 30.0, 2: 10.0, 3: 10.0, 4: 10.0}
+        delays = adaptive.get_start_delays('inventory', 60, runtimes, [1, 2, 3, 4])
+        next_start = min(
+            (d for d in delays.values() if d > delays[1]), default=min(delays.values())
+        )
+        assert (next_start - delays[1]) % 60 == pytest.approx(30)
+
+    def test_should_weigh_unknown_jobs_by_median_runtime(self):
+        runtimes = {1: 10.0, 2: 20.0, 3: 30.0}
+        delays = adaptive.get_start_delays('inventory', 100, runtimes, [1, 2, 3, 4])
+        gaps = _get_gaps(delays, 100)
+        assert sum(gaps) == pytest.approx(100)
+        assert sorted(gaps) == pytest.approx([12.5, 25, 25, 37.5])
+
+    def test_single_netbox_should_start_at_its_jitter_offset(self):
+        delays = adaptive.get_start_delays('inventory', 100, {}, [7])
+        assert delays[7] == pytest.approx(adaptive.get_jitter('inventory', 7) * 100)
+
+
+def _get_gaps(delays, interval):
+    starts = sorted(delays.values())
+    return [
+        (following - current) % interval or interval
+        for current, following in zip(starts, starts[1:] + starts[:1])
+    ]
+
+
+class TestScheduleStats:
+    def test_should_report_and_reset_skew(self):
+        stats = adaptive.ScheduleStats()
+        stats.add_skew(1.0)
+        stats.add_skew(3.0)
+        metrics = dict(stats.get_metrics('prefix', 42))
+        assert metrics['prefix.skew.avg'] == (42, 2.0)
+        assert metrics['prefix.skew.max'] == (42, 3.0)
+        assert metrics['prefix.jobs-started'] == (42, 2)
+        assert stats.started == 0
+
+    def test_should_ignore_early_starts(self):
+        stats = adaptive.ScheduleStats()
+        stats.add_skew(-1.0)
+        assert stats.max_skew == 0.0
+
+
+class TestLoadMonitor:
+    def test_should_be_overloaded_by_threadpool_backlog(self):
+        monitor = _make_monitor(queue_depth=11)
+        assert monitor.is_overloaded()
+
+    def test_should_be_overloaded_by_db_latency(self):
+        monitor = _make_monitor()
+        monitor.db_latency = 2.0
+        assert monitor.is_overloaded()
+
+    def test_should_not_be_overloaded_within_limits(self):
+        monitor = _make_monitor(queue_depth=10)
+        monitor.db_latency = 0.5
+        assert not monitor.is_overloaded()
+
+    def test_stalled_probe_should_count_as_latency(self):
+        monitor = _make_monitor()
+        monitor._probe_started_at = time.time() - 5
+        assert monitor.get_db_latency() >= 5
+        assert monitor.is_overloaded()
+
+    def test_release_should_be_rate_limited(self):
+        monitor = _make_monitor()
+        schedulers = [Mock(cancelled=False) for _ in range(3)]
+        for scheduler in schedulers:
+            monitor.hold_back(scheduler)
+
+        monitor.release(2)
+
+        assert [s.start.called for s in schedulers] == [True, True, False]
+        assert monitor.queue == schedulers[2:]
+
+    def test_release_should_skip_cancelled_schedulers(self):
+        monitor = _make_monitor()
+        cancelled, waiting = Mock(cancelled=True), Mock(cancelled=False)
+        monitor.hold_back(cancelled)
+        monitor.hold_back(waiting)
+
+        monitor.release(1)
+
+        assert not cancelled.start.called
+        assert waiting.start.called
+
+    def test_from_config_should_read_scheduling_section(self):
+        config = IpdevpollConfig()
+        config.set('scheduling', 'max_queue_depth', '42')
+        assert adaptive.LoadMonitor.from_config(config).max_queue_depth == 42
+
+
+def _make_monitor(queue_depth=0):
+    threadpool = Mock()
+    threadpool._queue.qsize.return_value = queue_depth
+    return adaptive.LoadMonitor(
+        max_queue_depth=10, max_db_latency=1.0, threadpool=threadpool
+    )
+
+
+def test_scheduling_mode_should_default_to_fixed():
+    assert adaptive.get_scheduling_mode(IpdevpollConfig()) == adaptive.SCHEDULING_FIXED
+
+
+def test_unknown_scheduling_mode_should_fall_back_to_fixed():
+    config = IpdevpollConfig()
+    config.set('scheduling', 'mode', 'chaotic')
+    assert adaptive.get_scheduling_mode(config) == adaptive.SCHEDULING_FIXED
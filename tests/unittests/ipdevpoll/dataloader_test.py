@@ -0,0 +1,76 @@
+import pytest
+from mock import Mock
+
+from nav.ipdevpoll import dataloader
+
+
+class FakeNetbox(object):
+    def __init__(self, id, type_id=1, up='y'):
+        self.id = id
+        self.sysname = 'netbox%d' % id
+        self.ip = '10.0.0.%d' % id
+        self.type = Mock(id=type_id)
+        self.up = up
+        self.snmp_up = True
+        self.snmp_parameters = None
+        self.deleted_at = None
+        self.up_to_date = True
+
+    def copy(self, other):
+        vars(self).update(vars(other))
+
+
+@pytest.fixture(autouse=True)
+def signalled_types(monkeypatch):
+    signalled = {}
+    monkeypatch.setattr(dataloader, '_signalled_types', signalled)
+    return signalled
+
+
+@pytest.fixture
+def loader():
+    loader = dataloader.NetboxLoader()
+    loader._update({i: FakeNetbox(i) for i in (1, 2, 3)})
+    return loader
+
+
+class TestPartialUpdate:
+    def test_should_leave_unlisted_netboxes_alone(self, loader):
+        result = loader._update({1: FakeNetbox(1, up='n')}, {1})
+        assert result == (set(), set(), {1})
+        assert sorted(loader) == [1, 2, 3]
+
+    def test_should_find_lost_netbox(self, loader):
+        result = loader._update({}, {2})
+        assert result == (set(), {2}, set())
+        assert sorted(loader) == [1, 3]
+
+    def test_should_find_new_netbox(self, loader):
+        result = loader._update({4: FakeNetbox(4)}, {4})
+        assert result == ({4}, set(), set())
+        assert sorted(loader) == [1, 2, 3, 4]
+
+
+class TestTypeChanges:
+    def test_should_be_detected(self, loader):
+        loader._update({1: FakeNetbox(1, type_id=2)}, {1})
+        changes = loader.pop_type_changes()
+        assert list(changes) == [1]
+        assert changes[1].id == 2
+
+    def test_should_only_be_returned_once(self, loader):
+        loader._update({1: FakeNetbox(1, type_id=2)}, {1})
+        loader.pop_type_changes()
+        assert loader.pop_type_changes() == {}
+
+    def test_should_not_be_returned_if_already_signalled(self, loader):
+        dataloader.signals.netbox_type_changed.send(
+            sender=None, netbox_id=1, new_type=Mock(id=2)
+        )
+        loader._update({1: FakeNetbox(1, type_id=2)}, {1})
+        assert loader.pop_type_changes() == {}
+
+    def test_should_not_include_netbox_with_previously_unknown_type(self, loader):
+        loader[1].type = None
+        loader._update({1: FakeNetbox(1, type_id=2)}, {1})
+        assert loader.pop_type_changes() == {}
@@ -0,0 +1,53 @@
+from mock import Mock
+
+from nav.ipdevpoll.db import copy_to_temporary_table, _copy_escape
+
+
+def test_copy_escape_should_format_none_as_null():
+    assert _copy_escape(None) == '\\N'
+
+
+def test_copy_escape_should_escape_special_characters():
+    assert _copy_escape('a\tb\nc\rd\\e') == 'a\\tb\\nc\\rd\\\\e'
+
+
+def test_copy_escape_should_format_non_strings():
+    assert _copy_escape(42) == '42'
+
+
+class TestCopyToTemporaryTable:
+    @staticmethod
+    def _copy(rows):
+        cursor = Mock()
+        copied = {}
+
+        def _copy_expert(sql, data):
+            copied['sql'] = sql
+            copied['data'] = data.read()
+
+        cursor.copy_expert.side_effect = _copy_expert
+        count = copy_to_temporary_table(
+            cursor, 'found', [('ifindex', 'INTEGER'), ('mac', 'MACADDR')], rows
+        )
+        return cursor, copied, count
+
+    def test_should_create_temporary_table_dropped_on_commit(self):
+        cursor, _, _ = self._copy([])
+        sql = [call[0][0] for call in cursor.execute.call_args_list]
+        assert sql[:2] == [
+            "DROP TABLE IF EXISTS pg_temp.found",
+            "CREATE TEMPORARY TABLE found (ifindex INTEGER, mac MACADDR) "
+            "ON COMMIT DROP",
+        ]
+
+    def test_should_analyze_table_after_copy(self):
+        cursor, _, _ = self._copy([])
+        assert cursor.execute.call_args[0][0] == "ANALYZE found"
+
+    def test_should_copy_rows_as_text(self):
+        _, copied, count = self._copy(
+            iter([(1, '00:00:00:00:00:01'), (None, '00:00:00:00:00:02')])
+        )
+        assert count == 2
+        assert copied['sql'] == "COPY found (ifindex, mac) FROM STDIN"
+        assert copied['data'] == "1\t00:00:00:00:00:01\n\\N\t00:00:00:00:00:02\n"
@@ -0,0 +1,76 @@
+from collections import namedtuple
+
+import psycopg2
+import pytest
+from mock import Mock
+from twisted.internet import task
+
+from nav.ipdevpoll import dbnotify
+
+Notify = namedtuple('Notify', 'pid channel payload')
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = task.Clock()
+    reactor = Mock(callLater=clock.callLater)
+    monkeypatch.setattr(dbnotify, 'reactor', reactor)
+    return clock
+
+
+@pytest.fixture
+def listener(clock):
+    listener = dbnotify.NetboxChangeListener(Mock(), reconnect_interval=60)
+    listener.connection = Mock(notifies=[])
+    return listener
+
+
+def test_get_netbox_ids_should_ignore_other_channels_and_bad_payloads():
+    notifies = [
+        Notify(1, dbnotify.CHANNEL, '42'),
+        Notify(1, dbnotify.CHANNEL, '42'),
+        Notify(1, dbnotify.CHANNEL, 'foo'),
+        Notify(1, 'new_event', '10'),
+    ]
+    assert dbnotify.get_netbox_ids(notifies) == {42}
+
+
+def test_doread_should_pass_changed_netbox_ids_to_callback(listener):
+    listener.connection.notifies.extend(
+        [Notify(1, dbnotify.CHANNEL, '1'), Notify(1, dbnotify.CHANNEL, '2')]
+    )
+    listener.doRead()
+    listener.callback.assert_called_once_with({1, 2})
+    assert listener.connection.notifies == []
+
+
+def test_doread_should_not_call_callback_without_notifications(listener):
+    listener.doRead()
+    assert not listener.callback.called
+
+
+def test_lost_connection_should_request_full_reload_and_reconnect(
+    listener, clock, monkeypatch
+):
+    listener.connection.poll.side_effect = psycopg2.OperationalError("gone")
+    listener.doRead()
+
+    listener.callback.assert_called_once_with(None)
+    assert not listener.is_listening()
+
+    start = Mock()
+    monkeypatch.setattr(listener, 'start', start)
+    clock.advance(60)
+    assert start.called
+    assert listener.callback.call_count == 2
+
+
+def test_failed_reconnect_should_retry(listener, clock, monkeypatch):
+    listener.connectionLost("gone")
+    start = Mock(side_effect=psycopg2.OperationalError("still gone"))
+    monkeypatch.setattr(listener, 'start', start)
+
+    clock.advance(60)
+    clock.advance(60)
+    assert start.call_count == 2
+    listener.callback.assert_called_once_with(None)
@@ -0,0 +1,143 @@
+import json
+from configparser import ConfigParser
+
+import pytest
+import pytest_twisted
+from mock import Mock
+from twisted.internet import defer
+
+from nav.ipdevpoll import Plugin, fingerprint, shadows, storage
+from nav.ipdevpoll.fingerprint import (
+    ENTLASTCHANGETIME,
+    INFO_KEY_NAME,
+    FingerprintChecker,
+)
+from nav.ipdevpoll.snmpcache import SYSUPTIME
+
+
+class ModulesPlugin(Plugin):
+    alias = 'modules'
+    FINGERPRINT_OIDS = (ENTLASTCHANGETIME,)
+    FINGERPRINT_SHADOWS = (shadows.Module,)
+
+
+class PlainPlugin(Plugin):
+    alias = 'plain'
+
+
+NOW = 1700000000.0
+
+
+@pytest.fixture
+def containers():
+    containers = storage.ContainerRepository()
+    containers.factory(None, shadows.Netbox, id=1)
+    return containers
+
+
+def make_checker(containers, loaded, uptime=100000, lastchange=5000, every=4):
+    agent = Mock()
+    agent.get.return_value = defer.succeed(
+        {str(SYSUPTIME): uptime, str(ENTLASTCHANGETIME): lastchange}
+    )
+    checker = FingerprintChecker(agent, containers, every)
+    checker._load = Mock(return_value=loaded)
+    return checker
+
+
+def stored(containers, name='modules'):
+    info = containers.get((INFO_KEY_NAME, name), shadows.NetboxInfo)
+    return json.loads(info.value)
+
+
+@pytest.fixture(autouse=True)
+def frozen_time(monkeypatch):
+    monkeypatch.setattr(fingerprint.time, 'time', lambda: NOW)
+    monkeypatch.setattr(fingerprint.db, 'run_in_thread', defer.maybeDeferred)
+
+
+def previous(skipped=0, lastchange=5000, elapsed=600):
+    return {
+        'modules': dict(
+            uptime=[NOW - elapsed, 100000 - elapsed * 100],
+            values=[lastchange],
+            skipped=skipped,
+        )
+    }
+
+
+class TestFingerprintChecker:
+    @pytest.mark.twisted
+    @pytest_twisted.inlineCallbacks
+    def test_unchanged_fingerprint_should_skip_plugin(self, containers):
+        checker = make_checker(containers, previous())
+        unchanged = yield checker.get_unchanged([ModulesPlugin, PlainPlugin])
+        assert unchanged == [ModulesPlugin]
+        assert stored(containers)['skipped'] == 1
+
+    @pytest.mark.twisted
+    @pytest_twisted.inlineCallbacks
+    def test_should_fetch_all_fingerprints_in_one_request(self, containers):
+        checker = make_checker(containers, previous())
+        yield checker.get_unchanged([ModulesPlugin, PlainPlugin])
+        assert checker.agent.get.call_count == 1
+
+    @pytest.mark.twisted
+    @pytest_twisted.inlineCallbacks
+    def test_changed_fingerprint_should_run_plugin(self, containers):
+        checker = make_checker(containers, previous(lastchange=4000))
+        unchanged = yield checker.get_unchanged([ModulesPlugin])
+        assert unchanged == []
+        assert stored(containers)['values'] == [5000]
+        assert stored(containers)['skipped'] == 0
+
+    @pytest.mark.twisted
+    @pytest_twisted.inlineCallbacks
+    def test_missing_fingerprint_should_run_plugin(self, containers):
+        checker = make_checker(containers, previous(), lastchange=None)
+        unchanged = yield checker.get_unchanged([ModulesPlugin])
+        assert unchanged == []
+
+    @pytest.mark.twisted
+    @pytest_twisted.inlineCallbacks
+    def test_first_run_should_run_plugin(self, containers):
+        checker = make_checker(containers, {})
+        unchanged = yield checker.get_unchanged([ModulesPlugin])
+        assert unchanged == []
+        assert stored(containers)['skipped'] == 0
+
+    @pytest.mark.twisted
+    @pytest_twisted.inlineCallbacks
+    def test_reboot_should_run_plugin(self, containers):
+        checker = make_checker(containers, previous(), uptime=1000)
+        unchanged = yield checker.get_unchanged([ModulesPlugin])
+        assert unchanged == []
+
+    @pytest.mark.twisted
+    @pytest_twisted.inlineCallbacks
+    def test_should_force_full_run_every_n_runs(self, containers):
+        checker = make_checker(containers, previous(skipped=3), every=4)
+        unchanged = yield checker.get_unchanged([ModulesPlugin])
+        assert unchanged == []
+        assert stored(containers)['skipped'] == 0
+
+    @pytest.mark.twisted
+    @pytest_twisted.inlineCallbacks
+    def test_should_do_nothing_without_fingerprinted_plugins(self, containers):
+        checker = make_checker(containers, previous())
+        unchanged = yield checker.get_unchanged([PlainPlugin])
+        assert unchanged == []
+        assert not checker.agent.get.called
+
+
+class TestGetFullRunEvery:
+    def test_should_read_job_option(self):
+        config = ConfigParser()
+        config.read_string("[job_inventory]\nfull_run_every = 4\n")
+        assert fingerprint.get_full_run_every(config, 'inventory') == 4
+
+    def test_should_default_to_zero(self):
+        config = ConfigParser()
+        config.read_string("[job_inventory]\ninterval = 6h\n")
+        assert fingerprint.get_full_run_every(config, 'inventory') == 0
+        assert fingerprint.get_full_run_every(config, 'topo') == 0
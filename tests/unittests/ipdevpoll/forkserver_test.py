@@ -0,0 +1,81 @@
+import os
+
+import pytest
+from twisted.internet.epollreactor import EPollReactor
+
+from nav.ipdevpoll import forkserver
+from nav.ipdevpoll.config import IpdevpollConfig
+from nav.ipdevpoll.forkserver import ForkServer, ForkServerError
+
+
+class TestForkServer:
+    def test_spawned_worker_should_be_connected_to_socket(self, server):
+        pid, sock = server.spawn()
+        with sock:
+            sock.sendall(b"ping\n")
+            assert _read_line(sock) == b"pong from %d\n" % pid
+
+    def test_should_spawn_several_workers(self, server):
+        pids = set()
+        for _ in range(3):
+            pid, sock = server.spawn()
+            sock.close()
+            pids.add(pid)
+        assert len(pids) == 3
+
+    def test_spawn_should_fail_when_server_is_stopped(self, server):
+        server.stop()
+        with pytest.raises(ForkServerError):
+            server.spawn()
+
+
+def test_reinitialize_reactor_should_replace_poller_and_waker():
+    reactor = EPollReactor()
+    poller, waker = reactor._poller, reactor.waker
+    forkserver.reinitialize_reactor(reactor)
+    try:
+        assert reactor._poller is not poller
+        assert reactor.waker is not waker
+        assert poller.closed
+    finally:
+        reactor._poller.close()
+        reactor.waker.connectionLost(None)
+
+
+def test_startup_mode_should_default_to_spawn():
+    assert forkserver.get_startup_mode(IpdevpollConfig()) == forkserver.STARTUP_SPAWN
+
+
+def test_unknown_startup_mode_should_fall_back_to_spawn():
+    config = IpdevpollConfig()
+    config.set('multiprocess', 'startup', 'clone')
+    assert forkserver.get_startup_mode(config) == forkserver.STARTUP_SPAWN
+
+
+def _echo_worker():
+    line = os.read(0, 100)
+    if line == b"ping\n":
+        os.write(1, b"pong from %d\n" % os.getpid())
+
+
+def _read_line(sock):
+    data = b''
+    while not data.endswith(b"\n"):
+        chunk = sock.recv(100)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+@pytest.fixture
+def server(monkeypatch):
+    # These are inherited by the forked processes
+    monkeypatch.setattr(forkserver, 'preload', lambda config=None: None)
+    monkeypatch.setattr(forkserver, 'reinitialize_reactor', lambda: None)
+    monkeypatch.setattr(forkserver, '_close_django_connections', lambda: None)
+    server = ForkServer(_echo_worker)
+    server.start()
+    yield server
+    server.stop()
+    os.waitpid(server.pid, 0)
@@ -28,6 +28,7 @@ from nav.ipdevpoll.shadows import PowerSupplyOrFan, Device
 from nav.mibs.cisco_hsrp_mib import CiscoHSRPMib
 from nav.models.manage import NetboxEntity
 from nav.oids import OID
+from nav.mibs.if_mib import IfMib
 from nav.mibs.ip_mib import IpMib, IndexToIpException
 from nav.mibs.ipv6_mib import Ipv6Mib
 from nav.mibs.entity_mib import (
@@ -377,3 +378,36 @@ def entity_physical_table(scope="session"):
             "entPhysicalIsFRU": 1,
         },
     }
+
+
+class TestRetrieveColumns(object):
+    IFDESCR = str(IfMib.nodes['ifDescr'].oid)
+    IFTYPE = str(IfMib.nodes['ifType'].oid)
+
+    def test_should_walk_columns_together(self):
+        agent = Mock('AgentProxy')
+        agent.getColumns = Mock(
+            return_value=defer.succeed(
+                {
+                    self.IFDESCR: {self.IFDESCR + '.1': b'eth0'},
+                    self.IFTYPE: {self.IFTYPE + '.1': 6, self.IFTYPE + '.2': 24},
+                }
+            )
+        )
+        mib = IfMib(agent)
+        df = mib.retrieve_columns(['ifType', 'ifDescr'])
+
+        agent.getColumns.assert_called_once_with([self.IFDESCR, self.IFTYPE])
+        assert df.result[OID('.1')]['ifDescr'] == 'eth0'
+        assert df.result[OID('.1')]['ifType'] == 6
+        assert df.result[OID('.2')]['ifDescr'] is None
+
+    def test_should_retrieve_columns_sequentially_on_strange_response(self):
+        agent = Mock('AgentProxy')
+        agent.getColumns = Mock(return_value=defer.fail(ValueError("strange")))
+        mib = IfMib(agent)
+        mib._retrieve_columns_sequentially = Mock(return_value=defer.succeed({}))
+        df = mib.retrieve_columns(['ifDescr'])
+
+        mib._retrieve_columns_sequentially.assert_called_once_with(['ifDescr'])
+        assert df.result == {}
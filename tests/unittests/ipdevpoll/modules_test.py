@@ -1,5 +1,10 @@
 from configparser import ConfigParser
 
+import pytest
+import pytest_twisted
+from mock import Mock
+from twisted.internet import defer
+
 from nav.ipdevpoll.plugins import modules
 
 
@@ -26,3 +31,19 @@ class TestModulesPlugin:
     def test_should_load_default_config_without_error(self):
         modules.Modules.on_plugin_load()
         assert modules.Modules.ignored_serials == ['BUILTIN']
+
+    @pytest.mark.twisted
+    @pytest_twisted.inlineCallbacks
+    def test_forced_run_should_collect_despite_unchanged_timestamp(self):
+        plugin = modules.Modules(Mock(), Mock(), Mock())
+        plugin.forced_run = True
+        plugin._need_to_collect = Mock(return_value=defer.succeed(False))
+        plugin.stampcheck = Mock()
+        plugin.entitymib = Mock()
+        plugin.entitymib.get_entity_physical_table.return_value = defer.succeed([])
+        plugin.entitymib.get_alias_mapping.return_value = defer.succeed({})
+        plugin._process_entities = Mock()
+
+        yield plugin.handle()
+
+        plugin._process_entities.assert_called_once_with([])
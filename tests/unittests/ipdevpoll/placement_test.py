@@ -0,0 +1,96 @@
+import time
+from collections import Counter
+
+import pytest
+
+from nav.ipdevpoll import placement
+
+
+class FakeWorker:
+    def __init__(self, slot, active_jobs=0, expected_runtimes=None):
+        self.slot = slot
+        self.active_jobs = active_jobs
+        self.expected_runtimes = expected_runtimes or {}
+
+    def __repr__(self):
+        return "<FakeWorker slot={}>".format(self.slot)
+
+
+class TestRuntimeEstimator:
+    def test_should_return_default_for_unknown_job(self):
+        estimator = placement.RuntimeEstimator(default=5)
+        assert estimator.estimate('inventory', 1) == 5
+
+    def test_should_smooth_runtimes(self):
+        estimator = placement.RuntimeEstimator(smoothing=0.5)
+        estimator.record('inventory', 1, 10)
+        estimator.record('inventory', 1, 20)
+        assert estimator.estimate('inventory', 1) == 15
+
+    def test_should_fall_back_to_job_estimate_for_unknown_netbox(self):
+        estimator = placement.RuntimeEstimator()
+        estimator.record('inventory', 1, 10)
+        assert estimator.estimate('inventory', 2) == 10
+
+
+def test_outstanding_runtime_should_subtract_elapsed_time():
+    now = time.time()
+    worker = FakeWorker(0, expected_runtimes={1: (now - 5, 20), 2: (now - 30, 10)})
+    assert placement.get_outstanding_runtime(worker, now) == 15 + 1
+
+
+def test_least_runtime_should_prefer_worker_with_lighter_jobs():
+    now = time.time()
+    busy = FakeWorker(0, 1, {1: (now, 300)})
+    light = FakeWorker(1, 3, {2: (now, 5), 3: (now, 5), 4: (now, 5)})
+    policy = placement.LeastRuntimePolicy()
+    assert policy.choose([busy, light], 'inventory', 1) is light
+
+
+class TestAffinityPolicy:
+    def test_should_place_netbox_on_the_same_worker_every_time(self):
+        policy = placement.AffinityPolicy(slots=4)
+        workers = [FakeWorker(slot) for slot in range(4)]
+        chosen = {policy.choose(workers, 'inventory', 42) for _ in range(10)}
+        assert len(chosen) == 1
+        assert policy.stats['preferred'] == 10
+
+    def test_should_spread_netboxes_across_workers(self):
+        policy = placement.AffinityPolicy(slots=4)
+        workers = [FakeWorker(slot) for slot in range(4)]
+        counts = Counter(
+            policy.choose(workers, 'inventory', netbox).slot for netbox in range(1000)
+        )
+        assert len(counts) == 4
+        assert min(counts.values()) > 150
+
+    def test_should_move_only_the_missing_workers_netboxes(self):
+        policy = placement.AffinityPolicy(slots=4)
+        workers = [FakeWorker(slot) for slot in range(4)]
+        before = {n: policy.choose(workers, 'inventory', n).slot for n in range(200)}
+        after = {n: policy.choose(workers[1:], 'inventory', n).slot for n in range(200)}
+
+        moved = [n for n in before if before[n] != after[n]]
+        assert moved
+        assert all(before[n] == 0 for n in moved)
+        assert policy.stats['rehashed'] == len(moved)
+
+    def test_should_fall_back_when_preferred_worker_is_overloaded(self):
+        policy = placement.AffinityPolicy(slots=2, max_imbalance=1.5)
+        preferred_slot = policy.get_slots(42)[0]
+        workers = [FakeWorker(0), FakeWorker(1)]
+        workers[preferred_slot].active_jobs = 10
+
+        chosen = policy.choose(workers, 'inventory', 42)
+
+        assert chosen.slot != preferred_slot
+        assert policy.stats['overloaded'] == 1
+
+
+def test_get_policy_should_reject_unknown_policies():
+    with pytest.raises(ValueError):
+        placement.get_policy('most-random')
+
+
+def test_get_policy_should_return_named_policy():
+    assert isinstance(placement.get_policy('affinity'), placement.AffinityPolicy)
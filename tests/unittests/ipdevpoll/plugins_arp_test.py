@@ -1,4 +1,8 @@
+from IPy import IP
+
+from nav.ipdevpoll import shadows
 from nav.ipdevpoll.storage import ContainerRepository
+from nav.iptrie import PrefixTrie
 from nav.ipdevpoll.plugins.arp import ipv6_address_in_mappings, Arp
 
 
@@ -11,3 +15,41 @@ def test_make_new_mappings_should_not_raise_on_empty_ip():
     a = Arp(None, None, ContainerRepository())
     mappings = [(None, '00:0b:ad:c0:ff:ee')]
     a._make_new_mappings(mappings)
+
+
+def test_find_largest_matching_prefix_should_find_most_specific_prefix(monkeypatch):
+    monkeypatch.setattr(Arp, 'prefix_cache', PrefixTrie())
+    Arp._update_prefix_cache_with_result(
+        [
+            {'id': 3, 'net_address': '10.0.0.0/8'},
+            {'id': 2, 'net_address': '10.0.1.0/24'},
+            {'id': 1, 'net_address': '10.0.0.0/16'},
+        ]
+    )
+    a = Arp(None, None, ContainerRepository())
+    assert a._find_largest_matching_prefix(IP('10.0.1.5')) == 2
+    assert a._find_largest_matching_prefix(IP('10.0.2.5')) == 1
+    assert a._find_largest_matching_prefix(IP('10.1.2.5')) == 3
+    assert a._find_largest_matching_prefix(IP('192.168.0.1')) is None
+
+
+def test_store_found_mappings_should_add_mappings_and_sentinel(monkeypatch):
+    monkeypatch.setattr(Arp, 'prefix_cache', PrefixTrie([('10.0.0.0/8', 1)]))
+    containers = ContainerRepository()
+    a = Arp(None, None, containers)
+    a._store_found_mappings(
+        [
+            (IP('10.0.0.1'), '00:0b:ad:c0:ff:ee'),
+            (IP('192.168.0.1'), '00:0b:ad:c0:ff:ef'),
+            (None, '00:0b:ad:c0:ff:f0'),
+        ]
+    )
+    mappings = containers[shadows.ArpMapping]
+    assert mappings[(IP('10.0.0.1'), '00:0b:ad:c0:ff:ee')] == (
+        IP('10.0.0.1'),
+        '00:0b:ad:c0:ff:ee',
+        1,
+    )
+    assert mappings[(IP('192.168.0.1'), '00:0b:ad:c0:ff:ef')].prefix_id is None
+    assert shadows.ArpMapping.sentinel in mappings
+    assert len(mappings) == 3
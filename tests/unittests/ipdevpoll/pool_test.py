@@ -1,11 +1,14 @@
 import signal
+import socket
 from unittest.mock import patch, Mock
 
 import pytest
 import pytest_twisted
 import twisted.internet.defer
+from twisted.internet import protocol
 
-from nav.ipdevpoll.pool import Worker
+from nav.ipdevpoll.forkserver import ForkServerError
+from nav.ipdevpoll.pool import ProcessAMP, Shutdown, Worker, WorkerPool
 
 
 class TestWorker:
@@ -28,3 +31,93 @@ class TestWorker:
                 yield worker._euthanize_unresponsive_worker()
 
                 mock_kill.assert_called_with(worker.pid, signal.SIGTERM)
+
+    def test_fork_should_connect_protocol_to_forked_worker(self):
+        ours, theirs = socket.socketpair()
+        fork_server = Mock()
+        fork_server.spawn.return_value = (4242, ours)
+        worker = Worker(
+            pool=None, threadpoolsize=0, max_jobs=5, fork_server=fork_server
+        )
+        factory = protocol.Factory.forProtocol(lambda: ProcessAMP(is_worker=False))
+
+        process = worker._fork(factory)
+        try:
+            assert isinstance(process, ProcessAMP)
+            assert process.transport is not None
+            assert worker.pid == 4242
+        finally:
+            process.transport.abortConnection()
+            theirs.close()
+
+    @pytest.mark.twisted
+    @pytest_twisted.inlineCallbacks
+    def test_should_spawn_worker_when_fork_fails(self):
+        fork_server = Mock()
+        fork_server.spawn.side_effect = ForkServerError("Mock failure")
+        worker = Worker(
+            pool=None, threadpoolsize=0, max_jobs=5, fork_server=fork_server
+        )
+        process = Mock()
+        with patch('nav.ipdevpoll.pool.ProcessEndpoint') as endpoint, patch.object(
+            worker, '_ping_loop'
+        ):
+            endpoint.return_value.connect.return_value = twisted.internet.defer.succeed(
+                process
+            )
+            yield worker.start()
+
+        assert worker.process is process
+
+
+class TestWorkerPool:
+    def test_should_recycle_worker_above_max_rss(self, pool):
+        worker = _make_worker(pool, slot=1, rss=200 * 2**20)
+        pool.workers.add(worker)
+
+        with patch.object(pool, '_spawn_worker') as spawn:
+            pool.check_workers()
+
+        worker.process.callRemote.assert_called_once_with(Shutdown)
+        assert worker.done()
+        spawn.assert_called_once_with(1)
+        assert pool.stats['recycled_rss'] == 1
+
+    def test_should_not_recycle_worker_below_max_rss(self, pool):
+        worker = _make_worker(pool, slot=0, rss=50 * 2**20)
+        pool.workers.add(worker)
+
+        pool.check_workers()
+
+        assert not worker.done()
+
+    def test_execute_should_track_expected_runtime(self, pool):
+        worker = _make_worker(pool)
+        pool.workers.add(worker)
+        response = twisted.internet.defer.Deferred()
+        worker.process.callRemote.return_value = response
+
+        pool.execute_job('inventory', 42, plugins=[], interval=60)
+        assert len(worker.expected_runtimes) == 1
+
+        response.callback({'result': True, 'reschedule': 0})
+        assert not worker.expected_runtimes
+        assert worker.active_jobs == 0
+        assert pool.runtimes.estimate('inventory', 42) < 1
+
+
+def _make_worker(pool, slot=0, rss=None):
+    worker = Worker(pool=pool, threadpoolsize=0, max_jobs=0, slot=slot)
+    worker.process = Mock()
+    worker.update_rss = Mock(return_value=rss)
+    return worker
+
+
+@pytest.fixture
+def pool():
+    with patch.object(WorkerPool, '_spawn_worker'), patch(
+        'twisted.internet.task.LoopingCall'
+    ), patch('nav.ipdevpoll.pool.send_metrics'):
+        yield WorkerPool(
+            workers=2, max_jobs=0, policy='least-runtime', max_rss=100 * 2**20
+        )
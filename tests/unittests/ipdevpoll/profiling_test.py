@@ -0,0 +1,79 @@
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from nav.ipdevpoll import db, profiling
+from nav.ipdevpoll.config import IpdevpollConfig
+from nav.ipdevpoll.profiling import JobProfile, estimate_snmp_response_size
+
+
+class TestJobProfile:
+    def test_should_attribute_queries_to_current_stage(self, profile):
+        profile.set_stage("plugin.interfaces")
+        profile.add_db_query(0.5)
+        profile.add_db_query(0.25)
+        assert profile.stages["plugin.interfaces"]["db_queries"] == 2
+        assert profile.stages["plugin.interfaces"]["db_time"] == 0.75
+
+    def test_in_stage_should_restore_previous_stage(self, profile):
+        profile.set_stage("plugin.interfaces")
+        with profile.in_stage("storage.Interface"):
+            profile.add_db_query(1)
+        assert profile.stage == "plugin.interfaces"
+        assert profile.stages["storage.Interface"]["db_queries"] == 1
+
+    def test_as_dict_should_omit_idle_stages(self, profile):
+        profile.set_stage("plugin.idle")
+        profile.add_queue_wait("plugin.busy", 0.1)
+        assert list(profile.as_dict()) == ["plugin.busy"]
+
+    def test_get_metrics_should_use_stage_as_path(self, profile):
+        profile.add_snmp_request("plugin.dns-name", 0.5, 100)
+        metrics = dict(profile.get_metrics("nav.job", timestamp=42))
+        assert metrics["nav.job.profile.plugin.dns-name.snmp_requests"] == (42, 1)
+        assert metrics["nav.job.profile.plugin.dns-name.snmp_bytes"] == (42, 100)
+
+    def test_get_metrics_should_escape_stage_names(self, profile):
+        profile.add_queue_wait("storage.Foo.Bar", 1)
+        metrics = dict(profile.get_metrics("nav", timestamp=42))
+        assert "nav.profile.storage.Foo_Bar.queue_wait" in metrics
+
+    def test_execute_wrapper_should_count_queries(self, profile):
+        execute = Mock(return_value="result")
+        assert profile.execute_wrapper(execute, "SELECT 1", (), False, {}) == "result"
+        assert profile.stages["job"]["db_queries"] == 1
+
+    def test_run_should_set_current_profile_only_within_call(self, profile):
+        assert profile.run(profiling.get_current_profile) is profile
+        assert profiling.get_current_profile() is None
+
+
+def test_estimate_snmp_response_size_should_count_oids_and_values():
+    result = {".1.3.6.1.2.1.1.5.0": b"foo", ".1.3.6": 42}
+    assert estimate_snmp_response_size(result) == 18 + 3 + 6 + 8
+
+
+def test_estimate_snmp_response_size_should_ignore_non_varbinds():
+    assert estimate_snmp_response_size(None) == 0
+
+
+def test_profiling_should_be_disabled_by_default():
+    assert not profiling.is_enabled(IpdevpollConfig())
+
+
+def test_profiled_thread_function_should_record_queue_wait_in_submitting_stage(
+    profile,
+):
+    profile.set_stage("plugin.arp")
+    func = db._profiled_in_thread(lambda: "ok", profile)
+    profile.set_stage()
+    time.sleep(0.01)
+
+    assert func() == "ok"
+    assert profile.stages["plugin.arp"]["queue_wait"] >= 0.01
+
+
+@pytest.fixture
+def profile():
+    return JobProfile()
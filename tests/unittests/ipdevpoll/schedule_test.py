@@ -1,4 +1,4 @@
-from mock import Mock
+from mock import MagicMock, Mock
 
 import pytest
 from twisted.internet import defer, task
@@ -30,3 +30,81 @@ def test_netbox_job_scheduler_reschedule_on_success(netbox_job_scheduler):
     clock.advance(10)
     assert pool.execute_job.call_count == 2
     pool.execute_job.assert_called_with('myjob', 1, plugins=[], interval=10)
+
+
+def test_netbox_job_scheduler_should_honor_start_delay(netbox_job_scheduler):
+    pool = netbox_job_scheduler.pool
+    pool.execute_job.return_value = defer.Deferred()
+    clock = task.Clock()
+    netbox_job_scheduler.callLater = clock.callLater
+    netbox_job_scheduler.start(5)
+    clock.advance(4)
+    assert not pool.execute_job.called
+    clock.advance(1)
+    assert pool.execute_job.called
+
+
+def test_netbox_job_scheduler_should_hold_back_job_when_overloaded(
+    netbox_job_scheduler, monkeypatch
+):
+    monitor = Mock()
+    monitor.is_overloaded.return_value = True
+    monkeypatch.setattr(schedule.NetboxJobScheduler, 'load_monitor', monitor)
+
+    netbox_job_scheduler.run_job()
+
+    assert not netbox_job_scheduler.pool.execute_job.called
+    monitor.hold_back.assert_called_once_with(netbox_job_scheduler)
+
+
+def test_netbox_job_scheduler_should_record_schedule_skew(
+    netbox_job_scheduler, monkeypatch
+):
+    stats = Mock()
+    monkeypatch.setattr(schedule.NetboxJobScheduler, 'schedule_stats', stats)
+    netbox_job_scheduler.pool.execute_job.return_value = defer.Deferred()
+    netbox_job_scheduler.callLater = task.Clock().callLater
+    netbox_job_scheduler.start()
+
+    netbox_job_scheduler.run_job()
+
+    assert stats.add_skew.call_count == 1
+    assert stats.add_skew.call_args[0][0] >= 0
+
+
+class TestJobSchedulerNetboxReload:
+    @pytest.fixture
+    def scheduler(self, monkeypatch):
+        monkeypatch.setattr(schedule.JobScheduler, 'active_schedulers', set())
+        job = Mock(interval=10)
+        job.name = 'myjob'
+        scheduler = schedule.JobScheduler(job, Mock())
+        scheduler.netboxes = MagicMock()
+        scheduler.netboxes.pop_type_changes.return_value = {}
+        monkeypatch.setattr(scheduler, 'add_netbox_scheduler', Mock())
+        return scheduler
+
+    def test_changed_netboxes_should_be_reloaded_together(self, scheduler, monkeypatch):
+        clock = task.Clock()
+        monkeypatch.setattr(schedule, 'reactor', clock)
+        scheduler.netboxes.load_some.return_value = defer.succeed((set(), set(), set()))
+        schedule.JobScheduler.on_netboxes_changed({1})
+        schedule.JobScheduler.on_netboxes_changed({2, 3})
+        clock.advance(scheduler.netbox_change_delay)
+
+        scheduler.netboxes.load_some.assert_called_once_with({1, 2, 3})
+
+    def test_type_changes_should_be_signalled_instead_of_rescheduled(
+        self, scheduler, monkeypatch
+    ):
+        new_type = Mock()
+        scheduler.netboxes.pop_type_changes.return_value = {1: new_type}
+        signal = Mock()
+        monkeypatch.setattr(schedule.signals, 'netbox_type_changed', signal)
+
+        scheduler._process_reloaded_netboxes((set(), set(), {1, 2}))
+
+        signal.send.assert_called_once_with(
+            sender=scheduler.netboxes, netbox_id=1, new_type=new_type
+        )
+        scheduler.add_netbox_scheduler.assert_called_once_with(2)
@@ -0,0 +1,108 @@
+import pytest
+from twisted.internet import defer
+
+from nav.ipdevpoll.snmp.bulkwalk import ColumnWalker
+from nav.oids import OID
+
+IFDESCR = '.1.3.6.1.2.1.2.2.1.2'
+IFTYPE = '.1.3.6.1.2.1.2.2.1.3'
+IFALIAS = '.1.3.6.1.2.1.31.1.1.1.18'
+
+
+class FakeAgent(object):
+    """Answers GET-BULK requests from a dict of OID strings, like an agent
+    that truncates responses at max_varbinds, and responds with an error if
+    asked for more than too_big varbinds.
+    """
+
+    def __init__(self, mib, max_varbinds=None, too_big=None):
+        self.mib = sorted((OID(oid), value) for oid, value in mib.items())
+        self.max_varbinds = max_varbinds
+        self.too_big = too_big
+        self.requests = []
+
+    def _getbulk(self, nonrepeaters, maxrepetitions, oids):
+        self.requests.append((maxrepetitions, len(oids)))
+        if self.too_big and maxrepetitions * len(oids) > self.too_big:
+            return defer.succeed([])
+        columns = [self._next(oid, maxrepetitions) for oid in oids]
+        response = [
+            column[repetition]
+            for repetition in range(maxrepetitions)
+            for column in columns
+        ]
+        if self.max_varbinds:
+            response = response[: self.max_varbinds]
+        return defer.succeed(response)
+
+    def _next(self, oid, count):
+        following = [(tuple(o), v) for o, v in self.mib if o > OID(oid)][:count]
+        end = (tuple(oid), None)  # endOfMibView
+        return following + [end] * (count - len(following))
+
+
+def _make_mib(rows=20, alias_rows=5):
+    mib = {}
+    for index in range(1, rows + 1):
+        mib['%s.%d' % (IFDESCR, index)] = 'eth%d' % index
+        mib['%s.%d' % (IFTYPE, index)] = 6
+    for index in range(1, alias_rows + 1):
+        mib['%s.%d' % (IFALIAS, index)] = 'uplink%d' % index
+    return mib
+
+
+def _walk(agent, oids=(IFDESCR, IFTYPE, IFALIAS), **kwargs):
+    walker = ColumnWalker(agent, list(oids), **kwargs)
+    return walker, walker.walk().result
+
+
+class TestColumnWalker:
+    def test_should_retrieve_all_rows_of_columns_of_different_lengths(self):
+        agent = FakeAgent(_make_mib())
+        _walker, result = _walk(agent)
+        assert len(result[IFDESCR]) == 20
+        assert len(result[IFTYPE]) == 20
+        assert len(result[IFALIAS]) == 5
+        assert result[IFALIAS][IFALIAS + '.5'] == 'uplink5'
+
+    def test_should_walk_columns_in_lockstep(self):
+        agent = FakeAgent(_make_mib())
+        _walker, _result = _walk(agent, max_repetitions=10)
+        assert agent.requests[0] == (10, 3)
+        assert len(agent.requests) < 6
+
+    def test_should_drop_finished_columns_from_requests(self):
+        agent = FakeAgent(_make_mib(rows=30, alias_rows=2))
+        _walk(agent, max_repetitions=10)
+        assert agent.requests[-1][1] == 2
+
+    def test_should_stay_within_response_size_budget(self):
+        agent = FakeAgent(_make_mib())
+        _walk(agent, max_repetitions=50, max_response_size=48 * 12)
+        assert agent.requests[0] == (4, 3)
+
+    def test_should_adapt_to_truncated_responses(self):
+        agent = FakeAgent(_make_mib(), max_varbinds=4)
+        walker, result = _walk(agent, max_repetitions=10)
+        assert walker.max_varbinds == 4
+        assert len(result[IFDESCR]) == 20
+        assert len(result[IFALIAS]) == 5
+
+    def test_should_back_off_on_error_responses(self):
+        agent = FakeAgent(_make_mib(), too_big=10)
+        walker, result = _walk(agent, max_repetitions=10)
+        assert walker.max_varbinds <= 10
+        assert len(result[IFDESCR]) == 20
+
+    def test_should_finish_on_empty_single_varbind_response(self):
+        agent = FakeAgent({})
+        _walker, result = _walk(agent, oids=[IFDESCR])
+        assert result == {IFDESCR: {}}
+
+    @pytest.mark.parametrize("max_varbinds", [1, 2])
+    def test_should_make_progress_when_agent_returns_fewer_varbinds_than_columns(
+        self, max_varbinds
+    ):
+        agent = FakeAgent(_make_mib(rows=3, alias_rows=3), max_varbinds=max_varbinds)
+        _walker, result = _walk(agent)
+        assert [len(result[oid]) for oid in (IFDESCR, IFTYPE, IFALIAS)] == [3, 3, 3]
@@ -2,7 +2,16 @@ from unittest.mock import Mock
 
 import pytest
 
-from nav.ipdevpoll.snmp.common import SNMPParameters
+from twisted.internet import defer
+
+from nav.ipdevpoll.profiling import JobProfile
+from nav.ipdevpoll.snmpcache import (
+    CacheStats,
+    IFTABLELASTCHANGE,
+    ResponseCache,
+    SYSUPTIME,
+)
+from nav.ipdevpoll.snmp.common import AgentProxyMixIn, SNMPParameters, profiled
 from nav.Snmp.defines import AuthenticationProtocol, PrivacyProtocol, SecurityLevel
 from nav.models.manage import ManagementProfile
 
@@ -81,3 +90,117 @@ def snmpv2c_profile():
         },
     )
     yield profile
+
+
+class TestProfiledDecorator:
+    def test_should_record_request_in_stage_active_when_sent(self):
+        profile = JobProfile()
+        response = defer.Deferred()
+        agent = _make_agent(profile, response)
+        profile.set_stage("plugin.system")
+        agent.get()
+        profile.set_stage()
+        response.callback({".1.3.6": b"abc"})
+
+        counters = profile.stages["plugin.system"]
+        assert counters["snmp_requests"] == 1
+        assert counters["snmp_bytes"] == 9
+
+    def test_should_not_touch_unprofiled_agents(self):
+        response = defer.succeed({})
+        agent = _make_agent(None, response)
+        assert agent.get() is response
+
+
+class TestGetColumns:
+    def test_should_walk_uncached_columns_in_lockstep(self):
+        agent = _make_column_agent(version=2)
+        agent._getbulk.return_value = defer.succeed(
+            [((1, 2, 1), 'a'), ((1, 3, 1), 'b'), ((1, 3, 1), 'b'), ((1, 4), 'c')]
+        )
+        result = agent.getColumns(['.1.2', '.1.3']).result
+
+        assert result == {'.1.2': {'.1.2.1': 'a'}, '.1.3': {'.1.3.1': 'b'}}
+        assert not agent.getTable.called
+
+    def test_should_cache_columns_for_session(self):
+        agent = _make_column_agent(version=2)
+        agent._result_cache[('.1.2',)] = {'.1.2': {'.1.2.1': 'a'}}
+        agent._result_cache[('.1.3',)] = {'.1.3': {'.1.3.1': 'b'}}
+        result = agent.getColumns(['.1.2', '.1.3']).result
+
+        assert result == {'.1.2': {'.1.2.1': 'a'}, '.1.3': {'.1.3.1': 'b'}}
+        assert not agent._getbulk.called
+
+    def test_should_walk_columns_separately_with_snmpv1(self):
+        agent = _make_column_agent(version=1)
+        agent.getTable.side_effect = lambda oids: defer.succeed({oids[0]: {}})
+        result = agent.getColumns(['.1.2', '.1.3']).result
+
+        assert result == {'.1.2': {}, '.1.3': {}}
+        assert agent.getTable.call_count == 2
+
+
+class TestResponseCache:
+    IFNAME = '.1.3.6.1.2.1.31.1.1.1.1'
+
+    @pytest.fixture
+    def agent(self):
+        agent = _make_column_agent(version=2)
+        agent._get.return_value = defer.succeed(
+            [(tuple(SYSUPTIME), 1000), (tuple(IFTABLELASTCHANGE), 10)]
+        )
+        agent.netbox_id = 1
+        agent.response_cache = ResponseCache(ttls={self.IFNAME: 300})
+        return agent
+
+    def test_get_columns_should_use_cached_columns(self, agent):
+        agent.response_cache.put(1, self.IFNAME, {self.IFNAME + '.1': b'Gi1/1'})
+        agent._getbulk.return_value = defer.succeed([((1, 4), 'x'), ((1, 4), 'x')])
+
+        result = agent.getColumns([self.IFNAME, '.1.3']).result
+
+        assert result[self.IFNAME] == {self.IFNAME + '.1': b'Gi1/1'}
+        assert agent._getbulk.call_args[0][2] == [(1, 3)]
+        assert agent.response_cache_stats.hits == 1
+        assert agent.response_cache_stats.misses == 1
+
+    def test_get_columns_should_cache_walked_columns(self, agent):
+        agent._getbulk.return_value = defer.succeed(
+            [((1, 3, 6, 1, 2, 1, 31, 1, 1, 1, 1, 1), b'Gi1/1'), ((1, 4), 'x')]
+        )
+        agent.getColumns([self.IFNAME, '.1.3'])
+
+        assert agent.response_cache.get(1, self.IFNAME) == {
+            self.IFNAME + '.1': b'Gi1/1'
+        }
+        assert agent.response_cache.get(1, '.1.3') is None
+
+    def test_validation_should_only_be_done_once_per_session(self, agent):
+        agent.validate_response_cache()
+        agent.validate_response_cache()
+        assert agent._get.call_count == 1
+
+
+def _make_column_agent(version):
+    agent = AgentProxyMixIn.__new__(AgentProxyMixIn)
+    agent.snmp_parameters = SNMPParameters(version=version)
+    agent._result_cache = {}
+    agent._response_cache_validated = False
+    agent.response_cache = None
+    agent.response_cache_stats = CacheStats()
+    agent._get = Mock()
+    agent._getbulk = Mock()
+    agent.getTable = Mock()
+    return agent
+
+
+def _make_agent(profile, response):
+    class Agent:
+        @profiled
+        def get(self):
+            return response
+
+    agent = Agent()
+    agent.profile = profile
+    return agent
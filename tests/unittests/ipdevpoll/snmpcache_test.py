@@ -0,0 +1,101 @@
+from configparser import ConfigParser
+
+import pytest
+
+from nav.ipdevpoll import snmpcache
+from nav.ipdevpoll.snmpcache import ResponseCache
+
+IFNAME = '.1.3.6.1.2.1.31.1.1.1.1'
+IFHCINOCTETS = '.1.3.6.1.2.1.31.1.1.1.6'
+ENTITY = '.1.3.6.1.2.1.47.1.1.1'
+
+
+@pytest.fixture
+def cache():
+    return ResponseCache(ttls={IFNAME: 300, ENTITY: 900, ENTITY + '.1.7': 60})
+
+
+class TestResponseCache:
+    def test_should_return_cached_result(self, cache):
+        cache.put(1, IFNAME, {IFNAME + '.1': b'Gi1/1'})
+        assert cache.get(1, IFNAME) == {IFNAME + '.1': b'Gi1/1'}
+        assert cache.stats['hits'] == 1
+
+    def test_should_keep_netboxes_apart(self, cache):
+        cache.put(1, IFNAME, {})
+        assert cache.get(2, IFNAME) is None
+        assert cache.stats['misses'] == 1
+
+    def test_should_not_cache_subtrees_without_ttl(self, cache):
+        cache.put(1, IFHCINOCTETS, {IFHCINOCTETS + '.1': 42})
+        assert cache.get(1, IFHCINOCTETS) is None
+
+    def test_should_use_most_specific_subtree_ttl(self, cache):
+        assert cache.get_ttl(ENTITY + '.1.7') == 60
+        assert cache.get_ttl(ENTITY + '.1.2') == 900
+
+    def test_should_expire_results(self, cache, monkeypatch):
+        cache.put(1, IFNAME, {})
+        now = snmpcache.time.time()
+        monkeypatch.setattr(snmpcache.time, 'time', lambda: now + 301)
+        assert cache.get(1, IFNAME) is None
+        assert cache.size == 0
+
+    def test_should_evict_least_recently_used_results(self):
+        entry_size = snmpcache.ENTRY_OVERHEAD + len('.1.1.1abcde')
+        cache = ResponseCache(max_size=2 * entry_size, ttls={'.1': 60})
+        cache.put(1, '.1.1', {'.1.1.1': b'abcde'})
+        cache.put(1, '.1.2', {'.1.2.1': b'abcde'})
+        cache.get(1, '.1.1')
+        cache.put(1, '.1.3', {'.1.3.1': b'abcde'})
+
+        assert cache.get(1, '.1.1') is not None
+        assert cache.get(1, '.1.2') is None
+        assert cache.stats['evictions'] == 1
+        assert cache.size <= cache.max_size
+
+
+class TestValidation:
+    @pytest.fixture
+    def cache(self, cache):
+        cache.validate(1, 1000, 50)
+        cache.put(1, IFNAME, {})
+        cache.put(2, IFNAME, {})
+        return cache
+
+    def test_increasing_uptime_should_keep_results(self, cache):
+        cache.validate(1, 2000, 50)
+        assert cache.get(1, IFNAME) == {}
+
+    def test_restart_should_invalidate_results(self, cache):
+        cache.validate(1, 10, 50)
+        assert cache.get(1, IFNAME) is None
+        assert cache.get(2, IFNAME) == {}
+
+    def test_iftable_change_should_invalidate_results(self, cache):
+        cache.validate(1, 2000, 1500)
+        assert cache.get(1, IFNAME) is None
+
+    def test_unknown_uptime_should_invalidate_results(self, cache):
+        cache.validate(1, None, 50)
+        assert cache.get(1, IFNAME) is None
+
+
+def test_response_cache_should_be_configurable():
+    config = ConfigParser()
+    config.read_string(
+        """
+        [snmp_cache]
+        enabled = yes
+        max_size = 2
+        ttl = 1m
+
+        [snmp_cache_ttl]
+        .1.3.6.1.2.1.31.1.1.1.1 = 5m
+        .1.3.6.1.2.1.47 = bogus
+        """
+    )
+    cache = ResponseCache.from_config(config)
+    assert cache.max_size == 2 * 1024 * 1024
+    assert cache.get_ttl(IFNAME) == 300
+    assert cache.get_ttl(ENTITY) == 60
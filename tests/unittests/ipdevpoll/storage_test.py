@@ -1,5 +1,12 @@
-from nav.ipdevpoll.storage import get_shadow_sort_order
+from mock import patch
+
+from nav.ipdevpoll.storage import (
+    BulkManager,
+    ContainerRepository,
+    get_shadow_sort_order,
+)
 from nav.ipdevpoll import shadows
+from nav.models import manage
 
 
 # debateable whether this is a proper unit test, since it is in reality
@@ -8,3 +15,78 @@ from nav.ipdevpoll import shadows
 def test_netboxinfo_should_always_sort_last():
     classes = get_shadow_sort_order()
     assert classes[-1] is shadows.NetboxInfo
+
+
+class TestBulkManager:
+    @staticmethod
+    def _make_manager(*sensors):
+        containers = ContainerRepository()
+        for index, sensor in enumerate(sensors):
+            containers.setdefault(shadows.Sensor, {})[index] = sensor
+        return BulkManager(shadows.Sensor, containers)
+
+    @staticmethod
+    def _make_sensor(internal_name, **kwargs):
+        netbox = shadows.Netbox(id=1)
+        netbox.set_existing_model(manage.Netbox(id=1))
+        return shadows.Sensor(
+            netbox=netbox, internal_name=internal_name, mib="X", **kwargs
+        )
+
+    def test_should_resolve_existing_models_in_one_query(self):
+        found = self._make_sensor('found')
+        new = self._make_sensor('new')
+        manager = self._make_manager(found, new)
+        existing = manage.Sensor(id=10, netbox_id=1, internal_name='found', mib='X')
+
+        with patch.object(manage.Sensor, 'objects') as objects:
+            objects.filter.return_value = [existing]
+            missing = manager.resolve_existing([found, new])
+
+        assert objects.filter.call_count == 1
+        assert found.id == 10
+        assert found.get_existing_model() is existing
+        assert missing == {new}
+
+    def test_ambiguous_lookup_should_be_left_for_the_shadow(self):
+        sensor = self._make_sensor('dupe')
+        manager = self._make_manager(sensor)
+        dupes = [
+            manage.Sensor(id=pk, netbox_id=1, internal_name='dupe', mib='X')
+            for pk in (10, 11)
+        ]
+
+        with patch.object(manage.Sensor, 'objects') as objects:
+            objects.filter.return_value = dupes
+            missing = manager.resolve_existing([sensor])
+
+        assert not missing
+        assert sensor.id is None
+
+    def test_save_should_bulk_write_changes_and_new_objects(self):
+        changed = self._make_sensor('changed', name='new name')
+        unchanged = self._make_sensor('unchanged', name='same')
+        new = self._make_sensor('new')
+        manager = self._make_manager(changed, unchanged, new)
+        existing = [
+            manage.Sensor(id=10, netbox_id=1, internal_name='changed', mib='X'),
+            manage.Sensor(
+                id=11, netbox_id=1, internal_name='unchanged', mib='X', name='same'
+            ),
+        ]
+
+        def _bulk_create(objs, batch_size):
+            for pk, obj in enumerate(objs, start=20):
+                obj.pk = pk
+
+        with patch.object(manage.Sensor, 'objects') as objects:
+            objects.filter.return_value = existing
+            objects.bulk_create.side_effect = _bulk_create
+            manager.save()
+
+        objects.bulk_update.assert_called_once_with(
+            [existing[0]], ('name',), batch_size=manager.batch_size
+        )
+        assert existing[0].name == 'new name'
+        assert objects.bulk_create.call_count == 1
+        assert new.id == 20
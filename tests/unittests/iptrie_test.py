@@ -0,0 +1,84 @@
+import random
+
+import pytest
+from IPy import IP
+
+from nav.iptrie import PrefixTrie
+
+
+@pytest.fixture
+def trie():
+    return PrefixTrie(
+        [
+            ('10.0.0.0/8', 'ten'),
+            ('10.1.0.0/16', 'ten-one'),
+            ('10.1.2.0/24', 'ten-one-two'),
+            ('10.1.2.128/25', 'ten-one-two-upper'),
+            ('192.168.0.0/24', 'private'),
+            ('2001:db8::/32', 'documentation'),
+            ('2001:db8:1::/48', 'documentation-one'),
+        ]
+    )
+
+
+class TestPrefixTrie:
+    @pytest.mark.parametrize(
+        "address,expected",
+        [
+            ('10.2.3.4', 'ten'),
+            ('10.1.3.4', 'ten-one'),
+            ('10.1.2.3', 'ten-one-two'),
+            ('10.1.2.200', 'ten-one-two-upper'),
+            ('192.168.0.255', 'private'),
+            ('192.168.1.1', None),
+            ('2001:db8:1::1', 'documentation-one'),
+            ('2001:db8:2::1', 'documentation'),
+            ('2001:db9::1', None),
+        ],
+    )
+    def test_lookup_should_find_longest_matching_prefix(self, trie, address, expected):
+        assert trie.lookup(IP(address)) == expected
+
+    def test_ipv4_and_ipv6_should_not_mix(self, trie):
+        assert trie.lookup('::a01:203') is None
+
+    def test_lookup_should_return_default_on_no_match(self, trie):
+        assert trie.lookup('172.16.0.1', 'nothing') == 'nothing'
+
+    def test_lookup_prefix_should_return_matching_prefix(self, trie):
+        assert trie.lookup_prefix('10.1.2.3') == (IP('10.1.2.0/24'), 'ten-one-two')
+
+    def test_default_route_should_match_everything(self, trie):
+        trie.add('0.0.0.0/0', 'default')
+        assert trie.lookup('172.16.0.1') == 'default'
+        assert trie.lookup('10.1.2.3') == 'ten-one-two'
+
+    def test_host_prefix_should_match_only_itself(self, trie):
+        trie.add('10.1.2.3/32', 'host')
+        assert trie.lookup('10.1.2.3') == 'host'
+        assert trie.lookup('10.1.2.4') == 'ten-one-two'
+
+    def test_add_should_replace_existing_value(self, trie):
+        trie.add('10.1.0.0/16', 'replaced')
+        assert trie.lookup('10.1.3.4') == 'replaced'
+        assert len(trie) == 7
+
+    def test_clear_should_remove_all_prefixes(self, trie):
+        trie.clear()
+        assert len(trie) == 0
+        assert trie.lookup('10.1.2.3') is None
+
+    def test_should_match_linear_scan_of_random_prefixes(self):
+        rng = random.Random(42)
+        prefixes = {}
+        for value in range(500):
+            length = rng.randint(8, 30)
+            network = rng.getrandbits(32) >> (32 - length) << (32 - length)
+            prefixes[IP(network).make_net(length)] = value
+        by_length = sorted(prefixes.items(), key=lambda p: -p[0].prefixlen())
+        trie = PrefixTrie(prefixes.items())
+
+        for _ in range(1000):
+            address = IP(rng.getrandbits(32))
+            expected = next((v for p, v in by_length if address in p), None)
+            assert trie.lookup(address) == expected
@@ -0,0 +1,183 @@
+import logging
+import pickle
+import socket
+import struct
+
+import pytest
+from mock import Mock
+
+from nav.metrics.carbon import (
+    CarbonSender,
+    MAX_UDP_PAYLOAD,
+    PROTOCOL_PICKLE,
+    _PickleTransport,
+    _UDPTransport,
+    metrics_to_packets,
+)
+
+METRICS = [("nav.test.metric%d" % i, (1700000000, i)) for i in range(100)]
+
+
+@pytest.fixture
+def udp_receiver():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    sock.settimeout(1)
+    yield sock
+    sock.close()
+
+
+def test_metrics_to_packets_should_not_exceed_max_payload():
+    packets = list(metrics_to_packets(METRICS))
+    assert len(packets) > 1
+    assert all(len(packet) <= MAX_UDP_PAYLOAD for packet in packets)
+
+
+def test_metrics_to_packets_should_produce_line_protocol():
+    packets = list(metrics_to_packets(METRICS[:1]))
+    assert packets == [b"nav.test.metric0 0 1700000000\n"]
+
+
+def test_sender_should_send_synchronously_when_not_started(udp_receiver):
+    host, port = udp_receiver.getsockname()
+    sender = CarbonSender(host, port)
+    sender.send(METRICS[:2])
+
+    data = udp_receiver.recv(MAX_UDP_PAYLOAD)
+    assert data == b"nav.test.metric0 0 1700000000\nnav.test.metric1 1 1700000000\n"
+    assert sender.stats['sent'] == 2
+
+
+def test_background_sender_should_flush_queue(udp_receiver):
+    host, port = udp_receiver.getsockname()
+    sender = CarbonSender(host, port, flush_interval=0.01)
+    sender.start()
+    try:
+        sender.send(METRICS[:1])
+        assert udp_receiver.recv(MAX_UDP_PAYLOAD) == b"nav.test.metric0 0 1700000000\n"
+    finally:
+        sender.stop()
+    assert sender.stats['sent'] == 1
+
+
+def test_full_queue_should_drop_metrics():
+    sender = CarbonSender('127.0.0.1', 2003, queue_size=10)
+    sender._thread = Mock()  # pretend to be a background sender
+    sender.send(METRICS[:15])
+    assert sender.stats == {'enqueued': 10, 'sent': 0, 'dropped': 5, 'queued': 10}
+
+
+def test_failed_flush_should_keep_metrics_queued():
+    sender = CarbonSender('127.0.0.1', 2003, batch_size=4)
+    sender.transport = Mock(connection_oriented=True)
+    sender.transport.send.side_effect = socket.error("connection refused")
+    sender._thread = Mock()
+    sender.send(METRICS[:10])
+
+    assert not sender.flush()
+    assert sender.stats['queued'] == 10
+    assert sender.stats['sent'] == 0
+
+
+def test_failed_send_should_back_off_reconnection():
+    sender = CarbonSender('127.0.0.1', 2003)
+    sender.transport = Mock(connection_oriented=True)
+    sender.transport.send.side_effect = socket.error("connection refused")
+    sender.send(METRICS[:1])
+    sender.send(METRICS[:1])
+
+    assert sender.transport.send.call_count == 1
+    assert sender.stats['dropped'] == 2
+
+
+def test_failed_background_udp_send_should_back_off():
+    sender = CarbonSender('127.0.0.1', 2003)
+    sender.transport = Mock(connection_oriented=False)
+    sender.transport.send.side_effect = socket.error("network unreachable")
+    sender._thread = Mock()
+    sender.send(METRICS[:1])
+
+    assert not sender.flush()
+    assert not sender.flush()
+    assert sender.transport.send.call_count == 1
+    sender.transport.close.assert_not_called()
+
+
+def test_failed_synchronous_udp_send_should_not_back_off():
+    sender = CarbonSender('127.0.0.1', 2003)
+    sender.transport = Mock(connection_oriented=False)
+    sender.transport.send.side_effect = [socket.error("connection refused"), None]
+    sender.send(METRICS[:1])
+    sender.send(METRICS[:1])
+
+    assert sender.transport.send.call_count == 2
+    assert sender.stats['sent'] == 1
+    assert sender.stats['dropped'] == 1
+
+
+def test_interrupted_udp_send_should_only_requeue_unsent_metrics():
+    sender = CarbonSender('127.0.0.1', 2003, batch_size=len(METRICS))
+    sender.transport = _UDPTransport('127.0.0.1', 2003)
+    sender.transport.socket = Mock()
+    sender.transport.socket.send.side_effect = [None, socket.error("no buffers")]
+    sender._thread = Mock()
+    sender.send(METRICS)
+    first_packet = next(metrics_to_packets(METRICS))
+
+    assert not sender.flush()
+    assert sender.stats['sent'] == first_packet.count(b"\n")
+    assert sender.stats['queued'] == len(METRICS) - sender.stats['sent']
+    assert sender._queue[0] == METRICS[sender.stats['sent']]
+
+
+def test_log_stats_should_warn_about_dropped_metrics(caplog):
+    sender = CarbonSender('127.0.0.1', 2003, queue_size=1)
+    sender._thread = Mock()
+    sender.send(METRICS[:2])
+    with caplog.at_level(logging.INFO, logger='nav.metrics.carbon'):
+        sender.log_stats()
+        sender.log_stats()
+
+    assert [record.levelno for record in caplog.records] == [
+        logging.WARNING,
+        logging.INFO,
+    ]
+    assert "1 dropped since last report" in caplog.records[0].getMessage()
+
+
+def test_pickle_transport_should_send_length_prefixed_pickle():
+    transport = _PickleTransport('127.0.0.1', 2004)
+    transport.socket = Mock()
+    transport.send(METRICS[:2])
+
+    payload = transport.socket.sendall.call_args[0][0]
+    (length,) = struct.unpack("!L", payload[:4])
+    assert length == len(payload) - 4
+    assert pickle.loads(payload[4:]) == [
+        ("nav.test.metric0", (1700000000, 0.0)),
+        ("nav.test.metric1", (1700000000, 1.0)),
+    ]
+
+
+def test_unknown_protocol_should_raise():
+    with pytest.raises(ValueError):
+        CarbonSender('127.0.0.1', 2003, protocol='carrier-pigeon')
+
+
+def test_pickle_protocol_should_be_selectable():
+    sender = CarbonSender('127.0.0.1', 2004, protocol=PROTOCOL_PICKLE)
+    assert isinstance(sender.transport, _PickleTransport)
+
+
+def test_metrics_to_packets_should_split_on_line_boundaries():
+    metrics = [("nav.test.metric%d" % i, (1700000000, i)) for i in range(1000)]
+    packets = list(metrics_to_packets(metrics, 100))
+    assert all(len(packet) <= 100 for packet in packets)
+    assert all(packet.endswith(b"\n") for packet in packets)
+    assert sum(packet.count(b"\n") for packet in packets) == 1000
+
+
+def test_metrics_to_packets_should_yield_overlong_line_on_its_own():
+    metrics = [("x" * 50 + ".a", (1, 1)), ("x" * 50 + ".b", (1, 2))]
+    packets = list(metrics_to_packets(metrics, 20))
+    assert packets == [b"x" * 50 + b".a 1 1\n", b"x" * 50 + b".b 2 1\n"]
@@ -1,9 +1,18 @@
 import pytest
-from mock import patch
-from io import BytesIO
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from mock import Mock, patch
 
 from nav.metrics.errors import GraphiteUnreachableError
-from nav.metrics.data import get_metric_data
+from nav.metrics.data import GraphiteRenderClient, RenderCache, get_metric_data
+
+
+@pytest.fixture(autouse=True)
+def graphite_cache(tmp_path):
+    """Replaces the shared Graphite render cache with a private one"""
+    cache = FileBasedCache(str(tmp_path / 'graphite'), {})
+    with patch('nav.metrics.data.caches', {'graphite': cache}):
+        yield cache
 
 
 def test_get_metric_data_without_target_should_return_empty_list():
@@ -14,12 +23,135 @@ def test_get_metric_data_with_no_graphite_server_should_fail():
     target = "nav.devices.example-sw_example_org.ports.1.ifInOctets"
     with patch('nav.metrics.data.CONFIG') as config:
         config.get.return_value = 'http://localhost:65042/'
+        config.getint.return_value = 4
+        config.getfloat.return_value = 5.0
         with pytest.raises(GraphiteUnreachableError):
             get_metric_data(target)
 
 
 def test_get_metric_data_can_parse_response():
     target = "nav.devices.example-sw_example_org.ports.1.ifInOctets"
-    with patch('nav.metrics.data.urlopen') as urlopen:
-        urlopen.return_value = BytesIO(b'[1]')
+    with patch('nav.metrics.data.requests.Session.post') as post:
+        post.return_value.json.return_value = [1]
         assert get_metric_data(target) == [1]
+
+
+def test_get_metric_data_should_not_cache_by_default(graphite_cache):
+    target = "nav.devices.example-sw_example_org.ports.1.ifInOctets"
+    with patch('nav.metrics.data.requests.Session.post') as post:
+        post.return_value.json.return_value = [{'target': target}]
+        get_metric_data(target)
+        get_metric_data(target)
+        assert post.call_count == 2
+    assert not graphite_cache._list_cache_files()
+
+
+def test_get_metric_data_should_use_cache_when_enabled(graphite_cache):
+    target = "nav.devices.example-sw_example_org.ports.1.ifInOctets"
+    with patch('nav.metrics.data.requests.Session.post') as post, patch(
+        'nav.metrics.data.CONFIG.getint', return_value=60
+    ):
+        post.return_value.json.return_value = [{'target': target}]
+        assert get_metric_data(target) == [{'target': target}]
+        assert get_metric_data(target) == [{'target': target}]
+        assert post.call_count == 1
+    assert graphite_cache._list_cache_files()
+
+
+class TestGraphiteRenderClient:
+    @staticmethod
+    def _make_client(**kwargs):
+        client = GraphiteRenderClient('http://localhost:8000/', **kwargs)
+        client.session = Mock()
+
+        def _post(url, data, timeout):
+            response = Mock()
+            response.json.return_value = [
+                {'target': t, 'datapoints': []} for t in data['target']
+            ]
+            return response
+
+        client.session.post.side_effect = _post
+        return client
+
+    def test_should_split_large_target_lists(self):
+        client = self._make_client(max_targets=10)
+        client.render(["metric%d" % i for i in range(25)])
+        assert client.session.post.call_count == 3
+
+    def test_should_merge_results_in_target_order(self):
+        client = self._make_client(max_targets=10, concurrency=3)
+        targets = ["metric%d" % i for i in range(25)]
+        result = client.render(targets)
+        assert [r['target'] for r in result] == targets
+
+    def test_should_accept_single_target_string(self):
+        client = self._make_client()
+        assert client.render("metric") == [{'target': 'metric', 'datapoints': []}]
+
+    def test_undecodable_response_should_return_empty_list(self):
+        client = self._make_client()
+        client.session.post.side_effect = None
+        client.session.post.return_value.json.side_effect = ValueError
+        assert client.render("metric") == []
+
+
+class TestRenderCache:
+    @pytest.fixture
+    def client(self):
+        client = Mock()
+        client.render.side_effect = lambda targets, start, end, timeout=None: [
+            {'target': t, 'datapoints': [[1, 0]]} for t in targets
+        ]
+        return client
+
+    @pytest.fixture
+    def render_cache(self, client):
+        cache = LocMemCache('render-test', {})
+        cache.clear()
+        return RenderCache(client, cache, step=60)
+
+    def test_second_render_should_be_served_from_cache(self, render_cache, client):
+        first = render_cache.render(['a', 'b'])
+        second = render_cache.render(['a', 'b'])
+        assert first == second
+        assert client.render.call_count == 1
+
+    def test_should_cache_each_request_separately(self, render_cache, client):
+        render_cache.render(['a', 'b'])
+        render_cache.render(['b', 'c'])
+        assert client.render.call_args[0][0] == ['b', 'c']
+        assert client.render.call_count == 2
+
+    def test_should_return_series_in_target_order(self, render_cache):
+        result = render_cache.render(['b', 'a', 'c'])
+        assert [r['target'] for r in result] == ['b', 'a', 'c']
+
+    def test_cache_operations_should_not_grow_with_targets(self, render_cache):
+        render_cache.cache = Mock(wraps=render_cache.cache)
+        render_cache.render(['target.%d' % i for i in range(500)])
+        assert render_cache.cache.get.call_count == 1
+        assert render_cache.cache.add.call_count == 1
+        assert render_cache.cache.set.call_count == 1
+        assert render_cache.cache.delete.call_count == 1
+
+    def test_should_wait_for_request_leased_by_other(self, render_cache, client):
+        window = render_cache._make_window()
+        lease_key = render_cache._make_key(window, 'a') + ':lease'
+        render_cache.cache.add(lease_key, True)
+        render_cache.lease_timeout = 0.05
+        render_cache.poll_interval = 0.01
+        result = render_cache.render(['a'])
+        # the lease holder never delivered, so we fetch it ourselves
+        assert [r['target'] for r in result] == ['a']
+        assert client.render.call_count == 1
+
+    def test_should_use_result_from_lease_holder(self, render_cache, client):
+        window = render_cache._make_window()
+        key = render_cache._make_key(window, 'a')
+        render_cache.cache.add(key + ':lease', True)
+        render_cache.poll_interval = 0.01
+        # simulate the lease holder having finished between lookups
+        with patch.object(render_cache.cache, 'get_many', return_value={key: ['x']}):
+            assert render_cache.render(['a']) == ['x']
+        assert client.render.call_count == 0
@@ -0,0 +1,97 @@
+import pytest
+from mock import Mock
+
+from nav.metrics import templates
+from nav.metrics.templates import (
+    MetricPathCache,
+    metric_path_for_cpu_load,
+    metric_path_for_interface,
+    metric_path_for_multicast_usage,
+    metric_path_for_packet_loss,
+    metric_path_for_roundtrip_time,
+    metric_prefix_for_device,
+    metric_prefix_for_prefix,
+)
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    templates.clear_path_cache()
+    yield
+    templates.clear_path_cache()
+
+
+def test_interface_path_should_be_escaped():
+    assert (
+        metric_path_for_interface('sw.example.org', 'Gi1/0/1', 'ifInOctets')
+        == 'nav.devices.sw_example_org.ports.Gi1_0_1.ifInOctets'
+    )
+
+
+def test_repeated_lookup_should_hit_cache():
+    metric_path_for_interface('sw.example.org', 'Gi1/0/1', 'ifInOctets')
+    misses = templates.get_path_cache_stats()['misses']
+    metric_path_for_interface('sw.example.org', 'Gi1/0/1', 'ifInOctets')
+    stats = templates.get_path_cache_stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == misses
+
+
+def test_netbox_object_should_share_cache_with_sysname():
+    metric_prefix_for_device('sw.example.org')
+    assert metric_prefix_for_device(Mock(sysname='sw.example.org')) == (
+        'nav.devices.sw_example_org'
+    )
+    assert templates.get_path_cache_stats()['hits'] == 1
+
+
+def test_other_builders_should_hit_cache():
+    metric_path_for_cpu_load('sw.example.org', 'cpu1', interval=5)
+    metric_path_for_multicast_usage('239.0.0.1', Mock(sysname='sw.example.org'))
+    metric_prefix_for_prefix(Mock(spec=['net_address'], net_address='10.0.0.0/24'))
+    misses = templates.get_path_cache_stats()['misses']
+
+    assert metric_path_for_cpu_load('sw.example.org', 'cpu1', interval=5) == (
+        'nav.devices.sw_example_org.cpu.cpu1.loadavg5min'
+    )
+    assert metric_path_for_multicast_usage('239.0.0.1', 'sw.example.org') == (
+        'nav.multicast.groups.239_0_0_1.igmp_usage.sw_example_org'
+    )
+    assert metric_prefix_for_prefix('10.0.0.0/24') == 'nav.prefixes.10_0_0_0_24'
+    stats = templates.get_path_cache_stats()
+    assert stats['hits'] == 3
+    assert stats['misses'] == misses
+
+
+def test_builders_with_the_same_arguments_should_not_share_entries():
+    assert metric_path_for_roundtrip_time('sw.example.org') == (
+        'nav.devices.sw_example_org.ping.roundTripTime'
+    )
+    assert metric_path_for_packet_loss('sw.example.org') == (
+        'nav.devices.sw_example_org.ping.packetLoss'
+    )
+
+
+def test_invalidate_sysname_should_only_evict_that_device():
+    metric_path_for_interface('a.example.org', 'Gi1/0/1', 'ifInOctets')
+    metric_path_for_interface('b.example.org', 'Gi1/0/1', 'ifInOctets')
+    before = templates.get_path_cache_stats()['size']
+    templates.invalidate_sysname('a.example.org')
+    assert templates.get_path_cache_stats()['size'] == before // 2
+
+
+class TestMetricPathCache:
+    def test_should_evict_least_recently_used(self):
+        cache = MetricPathCache(maxsize=2)
+        cache.get(('a',), lambda: 'A')
+        cache.get(('b',), lambda: 'B')
+        cache.get(('a',), lambda: 'A')
+        cache.get(('c',), lambda: 'C')
+        assert cache.get(('a',), lambda: 'new A') == 'A'
+        assert cache.get(('b',), lambda: 'new B') == 'new B'
+
+    def test_eviction_should_forget_sysname_index(self):
+        cache = MetricPathCache(maxsize=1)
+        cache.get(('a',), lambda: 'A')
+        cache.get(('b',), lambda: 'B')
+        assert 'a' not in cache._keys_by_sysname
@@ -1,5 +1,10 @@
 """Unit tests for nav.metrics.thresholds"""
-from nav.metrics.thresholds import ThresholdEvaluator
+import threading
+import time
+
+from mock import patch
+
+from nav.metrics.thresholds import ThresholdEvaluator, ThresholdPlanner
 
 
 class TestThatThresholdEvaluator:
@@ -22,3 +27,109 @@ class TestThatThresholdEvaluator:
         }
 
         assert ('data.zero', 0.0) in t.evaluate('>-120')
+
+
+class TestThresholdPlanner:
+    def test_should_fetch_same_period_rules_in_one_request(self):
+        first = ThresholdEvaluator('nav.devices.a.cpu.*.loadavg5min', raw=True)
+        second = ThresholdEvaluator('nav.devices.b.cpu.*.loadavg5min', raw=True)
+        planner = ThresholdPlanner()
+        planner.add(first)
+        planner.add(second)
+
+        averages = {
+            'nav.devices.a.cpu.x.loadavg5min': 10.0,
+            'nav.devices.b.cpu.x.loadavg5min': 20.0,
+        }
+        with patch(
+            'nav.metrics.thresholds.get_metric_average', return_value=averages
+        ) as get_metric_average:
+            planner.fetch()
+
+        assert get_metric_average.call_count == 1
+        assert first.result == {'nav.devices.a.cpu.x.loadavg5min': {'value': 10.0}}
+        assert second.result == {'nav.devices.b.cpu.x.loadavg5min': {'value': 20.0}}
+
+    def test_overlapping_rules_should_share_series(self):
+        wide = ThresholdEvaluator('nav.devices.*.cpu.x.loadavg5min', raw=True)
+        narrow = ThresholdEvaluator('nav.devices.a.cpu.x.loadavg5min', raw=True)
+        planner = ThresholdPlanner()
+        planner.add(wide)
+        planner.add(narrow)
+
+        averages = {
+            'nav.devices.a.cpu.x.loadavg5min': 10.0,
+            'nav.devices.b.cpu.x.loadavg5min': 20.0,
+        }
+        with patch('nav.metrics.thresholds.get_metric_average', return_value=averages):
+            planner.fetch()
+
+        assert len(wide.result) == 2
+        assert list(narrow.result) == ['nav.devices.a.cpu.x.loadavg5min']
+
+    def test_different_transforms_should_be_fetched_separately(self):
+        raw = ThresholdEvaluator('nav.devices.a.cpu.x.loadavg5min', raw=True)
+        scaled = ThresholdEvaluator(
+            'scale(nav.devices.a.cpu.x.loadavg5min,2)', raw=True
+        )
+        planner = ThresholdPlanner()
+        planner.add(raw)
+        planner.add(scaled)
+
+        with patch(
+            'nav.metrics.thresholds.get_metric_average', return_value={}
+        ) as get_metric_average:
+            planner.fetch()
+
+        assert get_metric_average.call_count == 2
+
+    def test_fetch_should_abandon_groups_that_exceed_timeout(self):
+        fast = ThresholdEvaluator('nav.devices.a.cpu.x.loadavg5min', raw=True)
+        slow = ThresholdEvaluator('scale(nav.devices.a.cpu.x.loadavg5min,2)', raw=True)
+        planner = ThresholdPlanner()
+        planner.add(fast)
+        planner.add(slow)
+        release = threading.Event()
+
+        def _get_metric_average(targets, timeout, **_kwargs):
+            assert 0 < timeout <= 0.2
+            if targets[0].startswith('scale'):
+                release.wait(5)
+            return {'nav.devices.a.cpu.x.loadavg5min': 1.0}
+
+        with patch(
+            'nav.metrics.thresholds.get_metric_average', side_effect=_get_metric_average
+        ):
+            start = time.time()
+            planner.fetch(workers=2, timeout=0.2)
+            elapsed = time.time() - start
+            release.set()
+
+        assert elapsed < 1
+        assert fast.fetched
+        assert not slow.fetched
+
+    def test_unmatched_evaluator_should_stay_unfetched(self):
+        evaluator = ThresholdEvaluator('nav.devices.a.cpu.x.loadavg5min', raw=True)
+        planner = ThresholdPlanner()
+        planner.add(evaluator)
+
+        with patch('nav.metrics.thresholds.get_metric_average', return_value={}):
+            planner.fetch()
+
+        assert not evaluator.fetched
+
+    def test_maxima_should_be_memoized_across_evaluators(self):
+        planner = ThresholdPlanner()
+        evaluators = [ThresholdEvaluator('data.*', raw=True) for _ in range(2)]
+        for evaluator in evaluators:
+            planner.add(evaluator)
+            evaluator.result = {'data.x': {'value': 50.0}}
+
+        with patch(
+            'nav.metrics.thresholds.get_metric_maximum', return_value=100.0
+        ) as get_metric_maximum:
+            for evaluator in evaluators:
+                assert evaluator.evaluate('>40%') == [('data.x', 50.0)]
+
+        assert get_metric_maximum.call_count == 1
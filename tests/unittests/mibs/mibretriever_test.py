@@ -0,0 +1,67 @@
+from importlib.util import find_spec
+from unittest.mock import Mock
+
+import pytest
+
+from nav.mibs.mibretriever import MibRetriever, MibRetrieverMaker
+from nav.smidumps import LazyMib, compiled
+
+
+def make_lazy_retriever():
+    class LazyIfMib(MibRetriever):
+        mib = LazyMib('IF-MIB', 'nav.smidumps.IF-MIB')
+
+    return LazyIfMib
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    """Keeps the test classes out of the global MIB retriever registry"""
+    monkeypatch.setattr(MibRetrieverMaker, 'modules', dict(MibRetrieverMaker.modules))
+
+
+class TestLazyMibRetriever:
+    def test_class_should_not_load_mib_when_created(self):
+        retriever = make_lazy_retriever()
+        assert not retriever.mib.is_loaded()
+        assert 'get_ifTable' not in retriever.__dict__
+
+    def test_class_should_be_registered_under_requested_name(self):
+        retriever = make_lazy_retriever()
+        assert MibRetrieverMaker.modules['IF-MIB'] is retriever
+
+    def test_instantiation_should_load_mib(self):
+        retriever = make_lazy_retriever()
+        instance = retriever(Mock())
+        assert retriever.mib['moduleName'] == 'IF-MIB'
+        assert 'ifTable' in instance.tables
+        assert hasattr(instance, 'get_ifTable')
+
+    def test_accessing_nodes_should_load_mib(self):
+        retriever = make_lazy_retriever()
+        assert 'ifDescr' in retriever.nodes
+        assert 'ifDescr' in retriever.text_columns
+        assert not isinstance(retriever.mib, LazyMib)
+
+
+class TestCompiledMibRetriever:
+    def test_should_build_same_tables_as_dump(self, tmp_path):
+        source = find_spec('nav.smidumps.IF-MIB').origin
+        path = compiled.compile_dump(source, str(tmp_path / 'IF-MIB.mibc'))
+
+        class CompiledIfMib(MibRetriever):
+            mib = compiled.load(path)
+
+        plain = make_lazy_retriever()
+        assert list(CompiledIfMib.tables) == list(plain.tables)
+        assert CompiledIfMib.text_columns == plain.text_columns
+        ifentry = CompiledIfMib.tables['ifTable']
+        assert ifentry.row.name == 'ifEntry'
+        assert ifentry.columns.keys() == plain.tables['ifTable'].columns.keys()
+
+    def test_nodes_should_be_created_on_first_access(self):
+        retriever = make_lazy_retriever()
+        retriever.load_mib()
+        assert 'ifNumber' in retriever.nodes
+        assert 'ifNumber' not in retriever.nodes._objects
+        assert retriever.nodes['ifNumber'].name == 'ifNumber'
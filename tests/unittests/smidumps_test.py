@@ -0,0 +1,160 @@
+import os
+import shutil
+import sys
+import time
+import zipfile
+from importlib.util import find_spec
+
+import pytest
+
+from nav.oids import OID
+from nav.smidumps import LazyMib, compiled, find_mib_module, get_mib
+
+
+class TestGetMib:
+    def test_should_not_import_dump(self):
+        mib = get_mib('IF-MIB')
+        assert isinstance(mib, LazyMib)
+        assert mib.name == 'IF-MIB'
+
+    def test_should_return_same_definition_every_time(self):
+        assert get_mib('IF-MIB') is get_mib('IF-MIB')
+
+    def test_should_return_none_for_unknown_mib(self):
+        assert get_mib('NON-EXISTENT-MIB') is None
+        assert get_mib(None) is None
+
+
+def test_find_mib_module_should_return_import_name():
+    assert find_mib_module('IF-MIB') == 'nav.smidumps.IF-MIB'
+
+
+class TestLazyMib:
+    def test_should_load_on_first_access(self):
+        mib = LazyMib('IF-MIB', 'nav.smidumps.IF-MIB')
+        assert not mib.is_loaded()
+        assert mib['moduleName'] == 'IF-MIB'
+        assert mib.is_loaded()
+
+    def test_loaded_mib_should_have_converted_oids(self):
+        mib = LazyMib('IF-MIB', 'nav.smidumps.IF-MIB')
+        assert isinstance(mib['nodes']['ifTable']['oid'], OID)
+
+    def test_should_behave_like_a_dict(self):
+        mib = LazyMib('IF-MIB', 'nav.smidumps.IF-MIB')
+        assert 'nodes' in mib
+        assert mib.get('no-such-key') is None
+        assert len(mib) == len(dict(mib))
+
+
+class TestCompiledMib:
+    def test_should_have_same_contents_as_dump(self, compiled_if_mib):
+        mib = get_mib('IF-MIB').load()
+        loaded = compiled.load(compiled_if_mib)
+        assert dict(loaded['nodes']) == dict(mib['nodes'])
+        assert loaded['moduleName'] == 'IF-MIB'
+        assert loaded['typedefs'] == mib['typedefs']
+
+    def test_should_materialize_nodes_on_access(self, compiled_if_mib):
+        nodes = compiled.load(compiled_if_mib)['nodes']
+        assert 'ifDescr' in nodes
+        assert not nodes._nodes
+        assert isinstance(nodes['ifDescr']['oid'], OID)
+        assert list(nodes._nodes) == ['ifDescr']
+
+    def test_should_reject_other_files(self, tmp_path):
+        junk = tmp_path / 'JUNK-MIB.mibc'
+        junk.write_bytes(b'not a MIB')
+        with pytest.raises(ValueError):
+            compiled.load(str(junk))
+
+
+class TestMibIndex:
+    def test_should_find_descendants_in_oid_order(self, if_mib_index):
+        assert if_mib_index.get_descendants(OID('.1.3.6.1.2.1.2.2'))[:3] == [
+            'ifEntry',
+            'ifIndex',
+            'ifDescr',
+        ]
+
+    def test_lookup_should_find_longest_matching_node(self, if_mib_index):
+        assert if_mib_index.lookup(OID('.1.3.6.1.2.1.2.2.1.2.5')) == (
+            'ifDescr',
+            OID('.5'),
+        )
+
+    def test_lookup_should_return_none_for_unknown_oid(self, if_mib_index):
+        assert if_mib_index.lookup(OID('.2.5')) is None
+
+    def test_should_know_node_types(self, if_mib_index):
+        assert if_mib_index.get_nodetype('ifTable') == 'table'
+        assert 'ifTable' in if_mib_index.get_names_by_nodetype('table')
+        assert if_mib_index.get_syntax_type_names('ifDescr') == (
+            '',
+            'DisplayString',
+        )
+
+
+class TestLazyMibWithCompiledDump:
+    def test_should_prefer_compiled_dump(self, dump_package):
+        compiled.compile_dump(str(dump_package / 'IF-MIB.py'))
+        mib = LazyMib('IF-MIB', 'lazydumps.IF-MIB')
+        assert isinstance(mib.load(), compiled.CompiledMib)
+
+    def test_should_ignore_stale_compiled_dump(self, dump_package):
+        source = dump_package / 'IF-MIB.py'
+        compiled.compile_dump(str(source))
+        with open(str(source), 'a') as dump:
+            dump.write('\n# changed\n')
+        mib = LazyMib('IF-MIB', 'lazydumps.IF-MIB')
+        assert not isinstance(mib.load(), compiled.CompiledMib)
+        assert mib['moduleName'] == 'IF-MIB'
+
+    def test_should_use_compiled_dump_extracted_before_source(
+        self, dump_package, tmp_path
+    ):
+        """Emulates a wheel install, which writes IF-MIB.mibc before IF-MIB.py
+        and does not preserve modification times
+        """
+        source = dump_package / 'IF-MIB.py'
+        build = tmp_path / 'build'
+        build.mkdir()
+        shutil.copy(str(source), str(build / 'IF-MIB.py'))
+        compiled.compile_dump(str(build / 'IF-MIB.py'))
+        source.unlink()
+        with zipfile.ZipFile(str(tmp_path / 'dumps.whl'), 'w') as wheel:
+            for name in sorted(os.listdir(str(build))):
+                wheel.write(str(build / name), name)
+        with zipfile.ZipFile(str(tmp_path / 'dumps.whl')) as wheel:
+            assert wheel.namelist() == ['IF-MIB.mibc', 'IF-MIB.py']
+            for name in wheel.namelist():
+                wheel.extract(name, str(dump_package))
+                os.utime(str(dump_package / name), None)
+                time.sleep(0.01)
+
+        assert source.stat().st_mtime > (dump_package / 'IF-MIB.mibc').stat().st_mtime
+        mib = LazyMib('IF-MIB', 'lazydumps.IF-MIB')
+        assert isinstance(mib.load(), compiled.CompiledMib)
+
+
+@pytest.fixture
+def compiled_if_mib(tmp_path):
+    source = find_spec('nav.smidumps.IF-MIB').origin
+    return compiled.compile_dump(source, str(tmp_path / 'IF-MIB.mibc'))
+
+
+@pytest.fixture
+def if_mib_index(compiled_if_mib):
+    return compiled.load(compiled_if_mib).index
+
+
+@pytest.fixture
+def dump_package(tmp_path, monkeypatch):
+    package = tmp_path / 'lazydumps'
+    package.mkdir()
+    (package / '__init__.py').write_text('')
+    shutil.copy(find_spec('nav.smidumps.IF-MIB').origin, str(package / 'IF-MIB.py'))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield package
+    for name in ('lazydumps', 'lazydumps.IF-MIB'):
+        sys.modules.pop(name, None)
@@ -0,0 +1,164 @@
+import socket
+import struct
+
+import pytest
+
+from nav.statemon.icmpengine import HostState, IcmpEngine
+from nav.statemon.icmppacket import Packet, PacketV4, PacketV6
+from nav.statemon.megaping import Host
+
+
+class FakeRawSocket(object):
+    """A stand-in for a raw ICMP socket, which immediately echoes requests sent
+    to any of the alive addresses.
+    """
+
+    def __init__(self, ipv6, alive):
+        self.ipv6 = ipv6
+        self.alive = alive
+        self.sent = []
+        self._mine, self._network = socket.socketpair()
+
+    def fileno(self):
+        return self._mine.fileno()
+
+    def getblocking(self):
+        return self._mine.getblocking()
+
+    def setblocking(self, flag):
+        self._mine.setblocking(flag)
+
+    def sendto(self, packet, address):
+        ip = address[0]
+        self.sent.append(ip)
+        if ip in self.alive:
+            frame = ip.encode('ascii') + b'\0' + make_reply(packet, self.ipv6)
+            self._network.sendall(struct.pack('!H', len(frame)) + frame)
+
+    def recvfrom(self, _bufsize):
+        (size,) = struct.unpack('!H', self._mine.recv(2))
+        ip, packet = self._mine.recv(size).split(b'\0', 1)
+        return packet, (ip.decode('ascii'), 0)
+
+    def close(self):
+        self._mine.close()
+        self._network.close()
+
+
+def make_reply(request, ipv6):
+    request = Packet(request, verify=False)
+    reply = PacketV6() if ipv6 else PacketV4()
+    reply.type = reply.ICMP_ECHO_REPLY
+    reply.id = request.id
+    reply.sequence = request.sequence
+    reply.data = request.data
+    # IPv4 raw sockets include the IP header in received datagrams
+    return reply.assemble() if ipv6 else b'\0' * 20 + reply.assemble()
+
+
+ALIVE = {'10.0.0.1', '2001:db8::1'}
+DEAD = {'10.0.0.2', '2001:db8::2'}
+CONF = {'checkinterval': 0.3, 'timeout': 0.2, 'retries': 2}
+
+
+@pytest.fixture
+def sockets():
+    sockets = [FakeRawSocket(True, ALIVE), FakeRawSocket(False, ALIVE)]
+    yield sockets
+    for sock in sockets:
+        sock.close()
+
+
+@pytest.fixture
+def engine(sockets):
+    engine = IcmpEngine(sockets, CONF)
+    engine.set_hosts(sorted(ALIVE | DEAD))
+    return engine
+
+
+def test_ping_should_report_rtt_of_alive_hosts_only(engine):
+    engine.ping()
+    results = dict(engine.results())
+    assert set(results) == ALIVE | DEAD
+    assert all(results[ip] > 0 for ip in ALIVE)
+    assert all(results[ip] == -1 for ip in DEAD)
+
+
+def test_ping_should_retransmit_to_dead_hosts_only(engine, sockets):
+    engine.ping()
+    sent = sockets[0].sent + sockets[1].sent
+    for ip in ALIVE:
+        assert sent.count(ip) == 1
+    for ip in DEAD:
+        assert sent.count(ip) == CONF['retries'] + 1
+
+
+def test_ping_should_finish_within_check_interval(engine):
+    assert engine.ping() < CONF['checkinterval'] + 0.05
+
+
+def test_ping_should_not_keep_replies_of_previous_sweeps(engine, sockets):
+    engine.ping()
+    sockets[1].alive = set()
+    engine.ping()
+    assert dict(engine.results())['10.0.0.1'] == -1
+
+
+def test_set_hosts_should_keep_existing_host_state(engine):
+    engine.ping()
+    state = engine._hosts['10.0.0.1']
+    engine.set_hosts(['10.0.0.1', '10.0.0.3'])
+    assert engine._hosts['10.0.0.1'] is state
+    assert engine._hosts['10.0.0.1'].srtt is not None
+    assert set(ip for ip, _rtt in engine.results()) == {'10.0.0.1', '10.0.0.3'}
+
+
+def test_should_ignore_replies_with_foreign_identifier(sockets):
+    engine = IcmpEngine(sockets, CONF, ident=1)
+    engine.set_hosts(['10.0.0.1'])
+    state = engine._hosts['10.0.0.1']
+    packet, cookie = state.host.make_packet(64)
+    engine._requests[cookie] = (state, 0)
+
+    reply = Packet(make_reply(packet, False)[20:], verify=False)
+    reply.id = 2
+    engine._process_response(b'\0' * 20 + reply.assemble(), None, False, 1)
+    assert not state.done
+    assert cookie in engine._requests
+
+
+class TestHostState:
+    def test_retransmit_timeout_should_default_without_samples(self):
+        assert HostState(Host('10.0.0.1')).get_retransmit_timeout(1.5, 5) == 1.5
+
+    def test_retransmit_timeout_should_adapt_to_rtt(self):
+        state = HostState(Host('10.0.0.1'))
+        for _ in range(10):
+            state.update_rtt(0.1)
+        assert 0.1 < state.get_retransmit_timeout(1.5, 5) < 1.5
+
+    def test_retransmit_timeout_should_be_bounded(self):
+        state = HostState(Host('10.0.0.1'))
+        state.update_rtt(0.001)
+        assert state.get_retransmit_timeout(1.5, 5) == 0.2
+        state.update_rtt(30)
+        assert state.get_retransmit_timeout(1.5, 5) == 5
+
+
+def test_burst_should_probe_dead_hosts_count_times(engine, sockets):
+    engine.burst(4, 0.02)
+    sent = sockets[0].sent + sockets[1].sent
+    for ip in ALIVE:
+        assert sent.count(ip) == 1
+    for ip in DEAD:
+        assert sent.count(ip) == 4
+
+
+def test_burst_should_wait_for_timeout_after_last_request(engine):
+    elapsed = engine.burst(4, 0.02)
+    assert 3 * 0.02 + CONF['timeout'] <= elapsed < 3 * 0.02 + CONF['timeout'] + 0.05
+
+
+def test_ping_should_restore_blocking_mode_of_sockets(engine, sockets):
+    engine.ping()
+    assert all(sock.getblocking() for sock in sockets)
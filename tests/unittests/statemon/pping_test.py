@@ -0,0 +1,91 @@
+from mock import DEFAULT, patch
+import pytest
+
+from nav.statemon.event import Event
+
+CONF = {'nrping': 3, 'checkinterval': 20}
+HOSTS = [
+    (1, 'up.example.org', '10.0.0.1', 'y'),
+    (2, 'down.example.org', '10.0.0.2', 'y'),
+]
+
+
+@pytest.fixture
+def pinger():
+    with patch.multiple(
+        'nav.bin.pping',
+        config=DEFAULT,
+        db=DEFAULT,
+        init_generic_logging=DEFAULT,
+        signal=DEFAULT,
+        make_pinger=DEFAULT,
+        make_confirmer=DEFAULT,
+        statistics=DEFAULT,
+    ) as mocks:
+        from nav.bin.pping import Pinger
+
+        mocks['config'].pingconf.return_value = CONF
+        mocks['db'].db.return_value.hosts_to_ping.return_value = HOSTS
+        pinger = Pinger(foreground=True)
+        pinger.statistics = mocks['statistics']
+        pinger.update_host_list()
+        yield pinger
+
+
+def test_make_confirmer_should_return_none_unless_enabled():
+    from nav.bin.pping import make_confirmer
+
+    assert make_confirmer(None, {}) is None
+    assert make_confirmer(None, {'fast_confirm': 'no'}) is None
+
+
+def test_confirm_suspects_should_only_probe_unanswered_hosts(pinger):
+    pinger.confirmer.results.return_value = [('10.0.0.2', -1)]
+    pinger.confirmer.burst.return_value = 1.5
+    answers, down, elapsed = pinger.confirm_suspects(
+        [('10.0.0.1', 0.01), ('10.0.0.2', -1)]
+    )
+    pinger.confirmer.set_hosts.assert_called_once_with(['10.0.0.2'])
+    assert answers == [('10.0.0.1', 0.01), ('10.0.0.2', -1)]
+    assert down == {'10.0.0.2'}
+    assert elapsed == 1.5
+
+
+def test_confirm_suspects_should_use_replies_to_burst(pinger):
+    pinger.confirmer.results.return_value = [('10.0.0.2', 0.02)]
+    pinger.confirmer.burst.return_value = 0.1
+    answers, down, _elapsed = pinger.confirm_suspects(
+        [('10.0.0.1', 0.01), ('10.0.0.2', -1)]
+    )
+    assert answers == [('10.0.0.1', 0.01), ('10.0.0.2', 0.02)]
+    assert not down
+
+
+def test_confirm_suspects_should_not_probe_hosts_already_down(pinger):
+    pinger.down = [2]
+    answers = [('10.0.0.1', 0.01), ('10.0.0.2', -1)]
+    assert pinger.confirm_suspects(answers) == (answers, set(), 0)
+    assert not pinger.confirmer.set_hosts.called
+
+
+def test_generate_events_should_not_report_single_miss_as_down(pinger):
+    pinger.generate_events([('10.0.0.1', 0.01), ('10.0.0.2', -1)])
+    assert not pinger.db.new_event.called
+
+
+def test_generate_events_should_report_confirmed_down_right_away(pinger):
+    pinger.generate_events([('10.0.0.1', 0.01), ('10.0.0.2', -1)], {'10.0.0.2'})
+    event = pinger.db.new_event.call_args[0][0]
+    assert event.netboxid == 2
+    assert event.status == Event.DOWN
+    assert pinger.down == [2]
+
+
+def test_generate_events_should_report_detection_latency(pinger):
+    pinger._sweep_start = 0
+    pinger.generate_events([('10.0.0.1', 0.01), ('10.0.0.2', -1)], {'10.0.0.2'})
+    sysname, _timestamp, latency = pinger.statistics.update_detection_latency.call_args[
+        0
+    ]
+    assert sysname == 'down.example.org'
+    assert latency > 0
@@ -0,0 +1,201 @@
+import os
+import socket
+import time
+
+import pytest
+
+from nav.statemon.icmppacket import Packet, PacketV4, PacketV6
+from nav.statemon.shard import (
+    ShardedPinger,
+    attach_ident_filter,
+    get_shard,
+    get_sweep_timeout,
+)
+
+HOSTS = ['10.0.0.%d' % index for index in range(1, 21)] + ['2001:db8::1']
+
+
+class FakePinger(object):
+    """A pinger whose results identify the worker process that produced them.
+
+    Hosts that are paths of existing files make it misbehave: it crashes once
+    on a file named crash, always on one named crash-always, and hangs once
+    on one named hang.
+    """
+
+    def __init__(self, sockets, ident):
+        self.ident = ident
+        self.hosts = []
+
+    def set_hosts(self, ips):
+        self.hosts = ips
+
+    def ping(self):
+        for host in self.hosts:
+            if not os.path.exists(host):
+                continue
+            behavior = os.path.basename(host)
+            if behavior != 'crash-always':
+                os.remove(host)  # misbehave only once
+            if behavior == 'hang':
+                time.sleep(30)
+            else:
+                os._exit(1)
+        return self.ident / 1000
+
+    def results(self):
+        return [(ip, (os.getpid(), self.ident)) for ip in self.hosts]
+
+
+class ScheduledPinger(FakePinger):
+    """A pinger with the timing of the scheduled engine, whose requests are
+    spread across the check interval and whose last reply timeouts expire
+    slightly after its end.
+    """
+
+    conf = {'checkinterval': 0.5, 'timeout': 0.2}
+
+    def ping(self):
+        time.sleep(self.conf['checkinterval'] + 0.01)
+        return self.conf['checkinterval']
+
+
+@pytest.fixture
+def shard_sockets():
+    pairs = [socket.socketpair() for _ in range(3)]
+    yield pairs
+    for pair in pairs:
+        for sock in pair:
+            sock.close()
+
+
+@pytest.fixture
+def pinger(shard_sockets):
+    pinger = ShardedPinger(shard_sockets, FakePinger, base_ident=100)
+    yield pinger
+    pinger.close()
+
+
+def test_get_shard_should_be_stable():
+    assert [get_shard(ip, 4) for ip in HOSTS] == [get_shard(ip, 4) for ip in HOSTS]
+    assert all(0 <= get_shard(ip, 4) < 4 for ip in HOSTS)
+
+
+def test_hosts_should_be_spread_across_shards():
+    assert len(set(get_shard(ip, 3) for ip in HOSTS)) == 3
+
+
+def test_ping_should_aggregate_results_of_all_workers(pinger):
+    pinger.set_hosts(HOSTS)
+    elapsed = pinger.ping()
+    results = dict(pinger.results())
+
+    assert sorted(results) == sorted(HOSTS)
+    assert elapsed == 0.103
+    for ip, (pid, ident) in results.items():
+        assert pid != os.getpid()
+        assert ident == 101 + get_shard(ip, 3)
+
+
+def test_dead_worker_should_be_restarted(pinger, tmp_path):
+    crash = tmp_path / 'crash'
+    crash.touch()
+    hosts = HOSTS + [str(crash)]
+    pinger.set_hosts(hosts)
+    elapsed = pinger.ping()
+    results = dict(pinger.results())
+
+    assert not crash.exists()
+    assert sorted(results) == sorted(hosts)
+    assert elapsed == 0.103
+
+
+def test_worker_that_keeps_dying_should_be_skipped(pinger, tmp_path):
+    crash = tmp_path / 'crash-always'
+    crash.touch()
+    crashing_shard = get_shard(str(crash), 3)
+    pinger.set_hosts(HOSTS + [str(crash)])
+    pinger.ping()
+    results = dict(pinger.results())
+
+    assert sorted(results) == sorted(
+        ip for ip in HOSTS if get_shard(ip, 3) != crashing_shard
+    )
+
+
+def test_hung_worker_should_be_skipped_until_restarted(shard_sockets, tmp_path):
+    hang = tmp_path / 'hang'
+    hang.touch()
+    hosts = HOSTS + [str(hang)]
+    hung_shard = get_shard(str(hang), 3)
+    pinger = ShardedPinger(shard_sockets, FakePinger, base_ident=100, timeout=1)
+    try:
+        pinger.set_hosts(hosts)
+        start = time.time()
+        pinger.ping()
+        assert time.time() - start < 5
+        assert sorted(dict(pinger.results())) == sorted(
+            ip for ip in hosts if get_shard(ip, 3) != hung_shard
+        )
+
+        pinger.ping()
+        assert sorted(dict(pinger.results())) == sorted(hosts)
+    finally:
+        pinger.close()
+
+
+def test_sweep_using_whole_interval_should_not_time_out(shard_sockets):
+    conf = ScheduledPinger.conf
+    pinger = ShardedPinger(
+        shard_sockets, ScheduledPinger, base_ident=100, timeout=get_sweep_timeout(conf)
+    )
+    try:
+        pinger.set_hosts(HOSTS)
+        pinger.ping()
+        first = dict(pinger.results())
+        pinger.ping()
+        second = dict(pinger.results())
+    finally:
+        pinger.close()
+
+    assert sorted(first) == sorted(HOSTS)
+    # no worker should have been restarted
+    assert first == second
+
+
+def test_sweep_timeout_should_exceed_check_interval_and_reply_timeout():
+    assert get_sweep_timeout({'checkinterval': '60', 'timeout': '5'}) > 65
+
+
+@pytest.mark.parametrize("ipv6", [True, False])
+def test_ident_filter_should_only_accept_own_echo_replies(ipv6):
+    sender, receiver = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+    with sender, receiver:
+        if not attach_ident_filter(receiver, 1234, ipv6):
+            pytest.skip("socket filters are not supported on this platform")
+        for icmp_type, ident in [
+            ('ICMP_ECHO_REPLY', 4321),
+            ('ICMP_ECHO', 1234),
+            ('ICMP_ECHO_REPLY', 1234),
+        ]:
+            sender.send(make_packet(icmp_type, ident, ipv6))
+
+        receiver.setblocking(False)
+        received = receiver.recv(4096)
+        with pytest.raises(BlockingIOError):
+            receiver.recv(4096)
+
+    if not ipv6:
+        received = received[20:]
+    packet = Packet(received, verify=False)
+    assert packet.id == 1234
+
+
+def make_packet(icmp_type, ident, ipv6):
+    packet = PacketV6() if ipv6 else PacketV4()
+    packet.type = getattr(packet, icmp_type)
+    packet.id = ident
+    packet.sequence = 1
+    packet.data = b'x' * 44
+    # IPv4 raw sockets include the IP header in received datagrams
+    return packet.assemble() if ipv6 else b'\x45' + b'\0' * 19 + packet.assemble()
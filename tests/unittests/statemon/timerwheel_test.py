@@ -0,0 +1,50 @@
+from nav.statemon.timerwheel import TimerWheel
+
+
+class TestTimerWheel:
+    def test_should_expire_timers_in_order(self):
+        wheel = TimerWheel(0, resolution=0.01, slots=8)
+        wheel.schedule(0.03, 'c')
+        wheel.schedule(0.01, 'a')
+        wheel.schedule(0.02, 'b')
+        assert wheel.advance(0.05) == ['a', 'b', 'c']
+        assert len(wheel) == 0
+
+    def test_should_never_expire_timers_early(self):
+        wheel = TimerWheel(0, resolution=0.01, slots=8)
+        wheel.schedule(0.015, 'a')
+        assert wheel.advance(0.014) == []
+        assert wheel.advance(0.02) == ['a']
+
+    def test_should_keep_timers_beyond_one_rotation(self):
+        wheel = TimerWheel(0, resolution=0.01, slots=8)
+        wheel.schedule(0.01, 'near')
+        wheel.schedule(0.09, 'far')
+        assert wheel.advance(0.01) == ['near']
+        assert wheel.advance(0.08) == []
+        assert wheel.advance(0.09) == ['far']
+
+    def test_should_expire_everything_after_a_long_gap(self):
+        wheel = TimerWheel(0, resolution=0.01, slots=8)
+        wheel.schedule(0.5, 'b')
+        wheel.schedule(0.02, 'a')
+        assert wheel.advance(10) == ['a', 'b']
+
+    def test_should_expire_past_timers_on_next_tick(self):
+        wheel = TimerWheel(1, resolution=0.01, slots=8)
+        wheel.schedule(0, 'late')
+        assert wheel.advance(1.01) == ['late']
+
+    def test_time_until_next_should_be_none_when_empty(self):
+        assert TimerWheel(0).time_until_next(0) is None
+
+    def test_time_until_next_should_find_nearest_timer(self):
+        wheel = TimerWheel(0, resolution=0.01, slots=8)
+        wheel.schedule(0.5, 'far')
+        wheel.schedule(0.05, 'near')
+        assert round(wheel.time_until_next(0.01), 3) == 0.04
+
+    def test_time_until_next_should_find_timer_beyond_one_rotation(self):
+        wheel = TimerWheel(0, resolution=0.01, slots=8)
+        wheel.schedule(0.5, 'far')
+        assert round(wheel.time_until_next(0), 3) == 0.5
@@ -1,8 +1,87 @@
-from mock import patch
-from nav.thresholdmon import _add_subject_details
+import threading
+import time
+
+from mock import Mock, patch
+from nav.thresholdmon import (
+    RuleResult,
+    _add_subject_details,
+    evaluate_concurrently,
+    evaluate_rule,
+    make_option_parser,
+)
 
 
 def test_non_model_subject_should_not_crash():
     varmap = {}
     with patch("nav.thresholdmon.lookup", return_value="bar"):
         _add_subject_details(None, 'foo', varmap)
+
+
+def test_evaluate_rule_should_not_refetch_batched_values():
+    rule = Mock(id=1, alert='>10', clear=None)
+    evaluator = Mock(fetched=True, result={'foo.bar': {'value': 20}})
+    evaluator.evaluate.return_value = [('foo.bar', 20)]
+    with patch("nav.thresholdmon.start_event") as start_event:
+        evaluate_rule(rule, {}, evaluator)
+
+    evaluator.get_values.assert_not_called()
+    start_event.assert_called_once_with(rule, 'foo.bar', 20)
+
+
+def test_evaluate_rule_should_not_post_events_after_deadline():
+    rule = Mock(id=1, alert='>10', clear=None)
+    evaluator = Mock(fetched=True, result={'foo.bar': {'value': 20}})
+    evaluator.evaluate.return_value = [('foo.bar', 20)]
+    with patch("nav.thresholdmon.start_event") as start_event:
+        result = evaluate_rule(rule, {}, evaluator, deadline=time.time() - 1)
+
+    assert result.status == RuleResult.TIMED_OUT
+    start_event.assert_not_called()
+
+
+def test_evaluate_rule_should_clear_unresolved_alerts_only():
+    rule = Mock(id=1, alert='>10', clear='<5')
+    evaluator = Mock(fetched=True, result={'a': {'value': 1}, 'b': {'value': 2}})
+    evaluator.evaluate.side_effect = [[], [('a', 1), ('b', 2)]]
+    alerts = {1: {'a': Mock()}}
+    with patch("nav.thresholdmon.end_event") as end_event:
+        result = evaluate_rule(rule, alerts, evaluator)
+
+    end_event.assert_called_once_with(rule, 'a', 1)
+    assert result.cleared == 1
+
+
+def test_evaluate_rule_should_pass_remaining_time_to_retrieval():
+    rule = Mock(id=1, alert='>10', clear=None)
+    evaluator = Mock(fetched=False)
+    evaluator.get_values.return_value = {}
+    evaluator.evaluate.return_value = []
+    evaluate_rule(rule, {}, evaluator, deadline=time.time() + 10)
+
+    timeout = evaluator.get_values.call_args[1]['timeout']
+    assert 9 < timeout <= 10
+
+
+def test_evaluate_concurrently_should_abandon_hung_rules():
+    release = threading.Event()
+
+    def _evaluate(rule, _evaluator):
+        if rule == 'hung':
+            release.wait(5)
+        return rule, RuleResult(RuleResult.OK, 0, 0, 0)
+
+    start = time.time()
+    results = evaluate_concurrently(
+        _evaluate, [('ok', None), ('hung', None)], workers=2, timeout=0.1
+    )
+    elapsed = time.time() - start
+    release.set()
+
+    assert elapsed < 1
+    assert results['ok'].status == RuleResult.OK
+    assert results['hung'].status == RuleResult.TIMED_OUT
+
+
+def test_timeout_should_not_be_set_by_default():
+    options, _args = make_option_parser().parse_args([])
+    assert options.timeout is None
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.  You should have received a copy of the GNU General Public License
+# along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Measures the startup time and memory footprint of ipdevpoll worker processes,
+in the spawn and fork startup modes (see the [multiprocess] section of
+ipdevpoll.conf).
+
+In spawn mode, every worker is a new Python process that must import all the
+configured plugins and load the preloaded MIBs by itself. In fork mode, a single
+template process does this once and then forks all the workers.
+
+For each worker, the time it took until it was ready, and its resident (RSS)
+and proportional (PSS) set sizes are reported. PSS divides the size of every
+shared memory page evenly between the processes sharing it, so the sum of PSS
+values is a fair measure of the total memory used by the workers.
+
+Needs a working NAV configuration, but does not need a database connection.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+MODES = ('spawn', 'fork')
+
+
+def main():
+    args = parse_args()
+    if args.child is not None:
+        return run_child(args.child)
+
+    modes = MODES if args.mode == 'both' else (args.mode,)
+    for mode in modes:
+        report(mode, benchmark(mode, args.workers))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n\n')[0])
+    parser.add_argument(
+        "-n",
+        "--workers",
+        type=int,
+        default=4,
+        help="the number of worker processes to start (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-m",
+        "--mode",
+        choices=MODES + ('both',),
+        default='both',
+        help="the startup mode to measure (default: %(default)s)",
+    )
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def benchmark(mode, workers):
+    """Starts workers in the given startup mode and measures them.
+
+    :returns: A list of (pid, startup seconds, rss kB, pss kB) tuples.
+    """
+    if mode == 'spawn':
+        children = [_start_child(0) for _ in range(workers)]
+        results = [(child, _read_status(child)) for child in children]
+        measured = [
+            (status['pid'], status['startup']) + read_memory(status['pid'])
+            for _child, status in results
+        ]
+    else:
+        template = _start_child(workers)
+        status = _read_status(template)
+        children = [template]
+        measured = [
+            (pid, status['startup'] + fork_time) + read_memory(pid)
+            for pid, fork_time in status['workers']
+        ]
+
+    for child in children:
+        child.stdin.close()
+        child.wait()
+    return measured
+
+
+def report(mode, measured):
+    """Prints a report of measurements made by benchmark()"""
+    print("%s mode, %d workers:" % (mode, len(measured)))
+    print("  %8s  %10s  %10s  %10s" % ("pid", "startup s", "RSS kB", "PSS kB"))
+    for pid, startup, rss, pss in measured:
+        print("  %8d  %10.3f  %10d  %10d" % (pid, startup, rss, pss))
+    print(
+        "  %8s  %10.3f  %10d  %10d"
+        % (
+            "total",
+            sum(m[1] for m in measured),
+            sum(m[2] for m in measured),
+            sum(m[3] for m in measured),
+        )
+    )
+    print()
+
+
+def read_memory(pid):
+    """Returns the RSS and PSS of a process, in kB, as a tuple"""
+    sizes = {'Rss:': 0, 'Pss:': 0}
+    path = '/proc/%d/smaps_rollup' % pid
+    if not os.path.exists(path):
+        path = '/proc/%d/smaps' % pid
+    with open(path) as smaps:
+        for line in smaps:
+            fields = line.split()
+            if fields and fields[0] in sizes:
+                sizes[fields[0]] += int(fields[1])
+    return sizes['Rss:'], sizes['Pss:']
+
+
+def _start_child(workers):
+    return subprocess.Popen(
+        [sys.executable, __file__, "--child", str(workers)],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    )
+
+
+def _read_status(child):
+    line = child.stdout.readline()
+    if not line:
+        sys.exit("benchmark process %s failed" % child.pid)
+    return json.loads(line)
+
+
+def run_child(workers):
+    """Loads everything an ipdevpoll worker would load, and then forks the
+    requested number of workers, if any.
+
+    Reports its status to the benchmarking process as a JSON line on stdout,
+    and then waits for stdin to be closed.
+    """
+    start = time.monotonic()
+    load_worker_state()
+    status = {'pid': os.getpid(), 'startup': time.monotonic() - start}
+
+    read_end, write_end = os.pipe()
+    forked = []
+    for _ in range(workers):
+        start = time.monotonic()
+        pid = os.fork()
+        if pid == 0:
+            os.close(write_end)
+            os.read(read_end, 1)
+            os._exit(0)
+        forked.append((pid, time.monotonic() - start))
+    status['workers'] = forked
+
+    print(json.dumps(status), flush=True)
+    sys.stdin.read()
+
+    os.close(write_end)
+    for pid, _fork_time in forked:
+        os.waitpid(pid, 0)
+
+
+def load_worker_state():
+    """Imports plugins and preloads MIBs the way the ipdevpoll fork server
+    does.
+    """
+    from nav.bootstrap import bootstrap_django
+
+    bootstrap_django(__file__)
+
+    from nav.ipdevpoll import plugins, forkserver
+
+    plugins.import_plugins()
+    forkserver.preload()
+
+
+if __name__ == '__main__':
+    main()
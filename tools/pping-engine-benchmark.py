@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.  You should have received a copy of the GNU General Public License
+# along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Runs one sweep of the pping engines (see the engine option of pping.conf)
+against a synthetic network of hosts, and compares them.
+
+No raw sockets (or root privileges) are needed: The engines are given fake
+sockets, whose requests are answered by a responder thread after a simulated
+latency. A given fraction of the hosts never answer, and every packet may also
+be lost at random.
+
+For each engine, the time taken by the sweep, the peak send rate, the CPU time
+used by the whole benchmark process, and the number of hosts found to be up are
+reported.
+"""
+import argparse
+import heapq
+import random
+import socket
+import struct
+import threading
+import time
+
+from nav.statemon.icmpengine import IcmpEngine
+from nav.statemon.icmppacket import Packet, PacketV4, PacketV6
+from nav.statemon.megaping import MegaPing
+
+ENGINES = {'megaping': MegaPing, 'scheduled': IcmpEngine}
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    hosts = make_hosts(args.hosts)
+    alive = set(host for host in hosts if rng.random() >= args.down)
+    conf = {
+        'checkinterval': args.interval,
+        'timeout': args.timeout,
+        'delay': args.delay,
+        'retries': args.retries,
+        'packetsize': 64,
+    }
+    print(
+        "%d hosts (%d alive), latency %d ms, packet loss %.1f%%, "
+        "check interval %d s"
+        % (len(hosts), len(alive), args.latency, args.loss * 100, args.interval)
+    )
+    print(
+        "%-10s %10s %12s %10s %8s" % ("engine", "sweep s", "peak pkts/s", "CPU s", "up")
+    )
+    engines = ENGINES if args.engine == 'both' else [args.engine]
+    for name in engines:
+        network = FakeNetwork(alive, args.latency / 1000, args.loss, args.seed)
+        engine = ENGINES[name](network.sockets, conf)
+        engine.set_hosts(hosts)
+        cpu = time.process_time()
+        elapsed = engine.ping()
+        cpu = time.process_time() - cpu
+        network.stop()
+        up = sum(1 for _ip, rtt in engine.results() if rtt != -1)
+        print(
+            "%-10s %10.2f %12d %10.2f %8d"
+            % (name, elapsed, network.get_peak_rate(), cpu, up)
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n\n')[0])
+    parser.add_argument(
+        "-n",
+        "--hosts",
+        type=int,
+        default=5000,
+        help="the number of hosts (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-e",
+        "--engine",
+        choices=tuple(ENGINES) + ('both',),
+        default='both',
+        help="the engine to benchmark (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--interval",
+        type=int,
+        default=20,
+        help="the check interval, in seconds (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=5,
+        help="the reply timeout, in seconds (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--delay",
+        type=float,
+        default=2,
+        help="the megaping request delay, in ms (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=2,
+        help="the scheduled engine retransmits (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=5,
+        help="the simulated round trip time, in ms (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--down",
+        type=float,
+        default=0.02,
+        help="the fraction of hosts that never reply (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--loss",
+        type=float,
+        default=0.01,
+        help="the probability of a packet being lost (default: %(default)s)",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    return parser.parse_args()
+
+
+def make_hosts(count):
+    """Returns count distinct addresses, every tenth of them IPv6"""
+    return [
+        '2001:db8::%x' % index
+        if index % 10 == 0
+        else '10.%d.%d.%d'
+        % (
+            index >> 16 & 255,
+            index >> 8 & 255,
+            index & 255,
+        )
+        for index in range(1, count + 1)
+    ]
+
+
+class FakeNetwork(object):
+    """A responder thread that answers echo requests sent through a pair of
+    fake raw sockets.
+    """
+
+    def __init__(self, alive, latency, loss, seed):
+        self.alive = alive
+        self.latency = latency
+        self.loss = loss
+        self.sockets = [FakeRawSocket(self, True), FakeRawSocket(self, False)]
+        self.send_times = []
+        self._rng = random.Random(seed)
+        self._queue = []
+        self._lock = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._respond, daemon=True)
+        self._thread.start()
+
+    def request(self, sock, packet, ip):
+        """Receives a request sent through sock"""
+        now = time.time()
+        with self._lock:
+            self.send_times.append(now)
+            if ip not in self.alive or self._rng.random() < self.loss * 2:
+                return  # lost on the way there or back
+            reply = make_reply(packet, sock.ipv6)
+            heapq.heappush(
+                self._queue, (now + self.latency, id(reply), sock, ip, reply)
+            )
+            self._lock.notify()
+
+    def _respond(self):
+        with self._lock:
+            while self._running:
+                if not self._queue:
+                    self._lock.wait()
+                    continue
+                wait = self._queue[0][0] - time.time()
+                if wait > 0:
+                    self._lock.wait(wait)
+                    continue
+                _when, _id, sock, ip, reply = heapq.heappop(self._queue)
+                sock.deliver(ip, reply)
+
+    def stop(self):
+        """Stops the responder thread and closes the sockets"""
+        with self._lock:
+            self._running = False
+            self._lock.notify()
+        self._thread.join()
+        for sock in self.sockets:
+            sock.close()
+
+    def get_peak_rate(self, window=0.1):
+        """Returns the highest number of requests sent per second, as measured
+        over sliding windows of the given length.
+        """
+        peak = start = 0
+        for end, sent in enumerate(self.send_times):
+            while sent - self.send_times[start] > window:
+                start += 1
+            peak = max(peak, end - start + 1)
+        return peak / window
+
+
+class FakeRawSocket(object):
+    """A stand-in for a raw ICMP socket, which frames packets on a stream
+    socket pair.
+    """
+
+    def __init__(self, network, ipv6):
+        self.network = network
+        self.ipv6 = ipv6
+        self._mine, self._network = socket.socketpair()
+
+    def fileno(self):
+        return self._mine.fileno()
+
+    def getblocking(self):
+        return self._mine.getblocking()
+
+    def setblocking(self, flag):
+        self._mine.setblocking(flag)
+
+    def sendto(self, packet, address):
+        self.network.request(self, packet, address[0])
+
+    def deliver(self, ip, packet):
+        """Delivers a packet from ip to this socket"""
+        frame = ip.encode('ascii') + b'\0' + packet
+        self._network.sendall(struct.pack('!H', len(frame)) + frame)
+
+    def recvfrom(self, _bufsize):
+        (size,) = struct.unpack('!H', self._mine.recv(2))
+        ip, packet = self._mine.recv(size).split(b'\0', 1)
+        return packet, (ip.decode('ascii'), 0)
+
+    def close(self):
+        self._mine.close()
+        self._network.close()
+
+
+def make_reply(request, ipv6):
+    """Makes an echo reply packet for a raw echo request packet"""
+    request = Packet(request, verify=False)
+    reply = PacketV6() if ipv6 else PacketV4()
+    reply.type = reply.ICMP_ECHO_REPLY
+    reply.id = request.id
+    reply.sequence = request.sequence
+    reply.data = request.data
+    # IPv4 raw sockets include the IP header in received datagrams
+    return reply.assemble() if ipv6 else b'\0' * 20 + reply.assemble()
+
+
+if __name__ == '__main__':
+    main()
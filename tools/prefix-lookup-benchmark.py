@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026 Sikt
+#
+# This file is part of Network Administration Visualized (NAV).
+#
+# NAV is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License version 3 as published by
+# the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.  You should have received a copy of the GNU General Public License
+# along with NAV. If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Compares longest-prefix-match lookups of IP addresses using a linear scan of a
+prefix list, as previously done by the ipdevpoll arp plugin, to lookups using
+nav.iptrie.PrefixTrie.
+
+Random IPv4 and IPv6 prefixes and addresses (mostly within those prefixes) are
+generated, and both methods are verified to give the same answers.
+"""
+import argparse
+import random
+import time
+
+from IPy import IP
+
+from nav.iptrie import PrefixTrie
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n\n')[0])
+    parser.add_argument(
+        "-p",
+        "--prefixes",
+        type=int,
+        default=2000,
+        help="the number of prefixes (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-a",
+        "--addresses",
+        type=int,
+        default=5000,
+        help="the number of addresses to look up (default: %(default)s)",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    prefixes = make_prefixes(rng, args.prefixes)
+    addresses = make_addresses(rng, list(prefixes), args.addresses)
+    print(
+        "%d prefixes, %d addresses (%d IPv6)"
+        % (
+            len(prefixes),
+            len(addresses),
+            sum(1 for address in addresses if address.version() == 6),
+        )
+    )
+
+    start = time.perf_counter()
+    prefix_list = sorted(prefixes.items(), key=lambda p: p[0].prefixlen(), reverse=True)
+    list_build = time.perf_counter() - start
+    start = time.perf_counter()
+    scanned = [scan(prefix_list, address) for address in addresses]
+    list_lookup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    trie = PrefixTrie(prefixes.items())
+    trie_build = time.perf_counter() - start
+    start = time.perf_counter()
+    looked_up = [trie.lookup(address) for address in addresses]
+    trie_lookup = time.perf_counter() - start
+
+    if scanned != looked_up:
+        raise SystemExit("ERROR: results differ between list scan and trie")
+
+    print("%-10s %12s %12s %14s" % ("method", "build s", "lookup s", "lookups/s"))
+    for method, build, lookup in (
+        ("list scan", list_build, list_lookup),
+        ("trie", trie_build, trie_lookup),
+    ):
+        print(
+            "%-10s %12.4f %12.4f %14.0f"
+            % (method, build, lookup, len(addresses) / lookup)
+        )
+    print("speedup: %.1fx" % (list_lookup / trie_lookup))
+
+
+def make_prefixes(rng, count):
+    """Returns a dict of count random prefixes, mapped to integer IDs"""
+    prefixes = {}
+    while len(prefixes) < count:
+        if rng.random() < 0.8:
+            width, length = 32, rng.randint(16, 30)
+            base = 10 << 24
+        else:
+            width, length = 128, rng.choice((48, 56, 64))
+            base = 0x20010DB8 << 96
+        bits = length - 8 if width == 32 else length - 32
+        network = base | (rng.getrandbits(bits) << (width - length))
+        prefix = IP(network, ipversion=4 if width == 32 else 6).make_net(length)
+        prefixes[prefix] = len(prefixes)
+    return prefixes
+
+
+def make_addresses(rng, prefixes, count):
+    """Returns count random addresses, 95% of them within one of prefixes"""
+    addresses = []
+    for _ in range(count):
+        if rng.random() < 0.95:
+            prefix = rng.choice(prefixes)
+            width = 32 if prefix.version() == 4 else 128
+            host = rng.getrandbits(width - prefix.prefixlen())
+            addresses.append(IP(prefix.int() | host, ipversion=prefix.version()))
+        else:
+            addresses.append(IP(rng.getrandbits(32)))
+    return addresses
+
+
+def scan(prefix_list, address):
+    """Finds the longest matching prefix by linear scan"""
+    for prefix, prefix_id in prefix_list:
+        if address in prefix:
+            return prefix_id
+    return None
+
+
+if __name__ == '__main__':
+    main()